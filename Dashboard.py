@@ -6,6 +6,7 @@ import admin_utils
 import auth
 import utils.ui_components as ui_components
 import utils.backup_utils as backup_utils
+import utils.page_profiler as page_profiler
 
 # Page config
 st.set_page_config(page_title="Dashboard", page_icon="📊", layout="wide", initial_sidebar_state="expanded")
@@ -22,9 +23,11 @@ def startup_db():
 
 startup_db()
 
-# Run automatic backup check (utility handles frequency logic)
-with database.db_session() as conn_bkp:
-    backup_utils.run_backup_if_needed(conn_bkp)
+profiler = page_profiler.start("Dashboard")
+
+# Scheduled backup and periodic checkpoints/archive run on a background thread
+backup_utils.start_background_maintenance()
+profiler.checkpoint("maintenance")
 
 def get_db_connection():
     return database.get_connection()
@@ -40,6 +43,7 @@ if not auth.require_login(conn):
 
 # Render custom sidebar
 auth.render_custom_sidebar()
+profiler.checkpoint("setup")
 
 # Get current user
 current_user = auth.get_current_user()
@@ -285,4 +289,5 @@ try:
 except Exception as e:
     st.error(f"Erro no dashboard: {e}")
 finally:
+    profiler.finish()
     conn.close()
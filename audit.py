@@ -3,8 +3,22 @@ Audit Module for CeramicAdmin OS
 Handles logging of data changes and rollback capabilities.
 """
 import json
-from datetime import datetime
+import zlib
+import sqlite3
+from datetime import date, datetime, timedelta
 import streamlit as st
+from database import AUDIT_ARCHIVE_PREFIX, STUDENT_BALANCE_REFRESH, create_audit_archive
+from utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Payloads at least this long are stored zlib-compressed (BLOB); shorter ones stay JSON text
+COMPRESS_MIN_BYTES = 200
+# Months kept in the hot audit_log table; older rows move to audit_log_YYYYMM
+HOT_MONTHS = 3
+ARCHIVE_INTERVAL_DAYS = 7
+
+_AUDIT_COLUMNS = "id, timestamp, user_id, username, action, table_name, record_id, old_data, new_data"
 
 def get_current_user_info():
     """Get current user ID and username from session state."""
@@ -13,6 +27,40 @@ def get_current_user_info():
         return user.get('id'), user.get('username', 'unknown')
     return None, 'system'
 
+def _compress(text):
+    if text is None or len(text) < COMPRESS_MIN_BYTES:
+        return text
+    return zlib.compress(text.encode('utf-8'))
+
+def pack_payload(data):
+    """dict -> stored payload (JSON text, or zlib BLOB when long)."""
+    if not data:
+        return None
+    return _compress(json.dumps(data, default=str))
+
+def unpack_payload(value):
+    """Stored payload -> JSON text (handles plain text and compressed BLOBs)."""
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode('utf-8')
+    return value
+
+def load_payload(value):
+    """Stored payload -> dict (or None)."""
+    text = unpack_payload(value)
+    return json.loads(text) if text else None
+
+def _changed_fields(old_data: dict, new_data: dict):
+    """
+    UPDATE payloads keep only the fields whose value changed, plus fields
+    present on one side only. Rollback and history only need those.
+    """
+    if not old_data or not new_data:
+        return old_data, new_data
+    same = {k for k in old_data.keys() & new_data.keys()
+            if json.dumps(old_data[k], default=str) == json.dumps(new_data[k], default=str)}
+    return ({k: v for k, v in old_data.items() if k not in same},
+            {k: v for k, v in new_data.items() if k not in same})
+
 def log_action(conn, action: str, table_name: str, record_id: int, 
                old_data: dict = None, new_data: dict = None, commit: bool = True):
     """
@@ -26,8 +74,12 @@ def log_action(conn, action: str, table_name: str, record_id: int,
         old_data: Previous state of the record (for UPDATE/DELETE)
         new_data: New state of the record (for CREATE/UPDATE)
         commit: Whether to commit the transaction (default: True)
+
+    UPDATE entries store only the changed fields; long payloads are compressed.
     """
     user_id, username = get_current_user_info()
+    if action == 'UPDATE':
+        old_data, new_data = _changed_fields(old_data, new_data)
     
     cursor = conn.cursor()
     cursor.execute("""
@@ -40,70 +92,228 @@ def log_action(conn, action: str, table_name: str, record_id: int,
         action,
         table_name,
         record_id,
-        json.dumps(old_data, default=str) if old_data else None,
-        json.dumps(new_data, default=str) if new_data else None
+        pack_payload(old_data),
+        pack_payload(new_data)
     ))
     if commit:
         conn.commit()
 
+def get_archive_tables(conn, start_date: str = None, end_date: str = None):
+    """Monthly archive tables (newest first), optionally only those overlapping [start_date, end_date]."""
+    rows = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE ? ORDER BY name DESC",
+        (f"{AUDIT_ARCHIVE_PREFIX}%",)
+    ).fetchall()
+    tables = []
+    for (name,) in rows:
+        period = name[len(AUDIT_ARCHIVE_PREFIX):]
+        if not (len(period) == 6 and period.isdigit()):
+            continue
+        month = f"{period[:4]}-{period[4:]}"
+        if start_date and month < start_date[:7]:
+            continue
+        if end_date and month > end_date[:7]:
+            continue
+        tables.append(name)
+    return tables
+
+_SUMMARY_COLUMNS = ("id, timestamp, username, action, table_name, record_id, "
+                    "old_data IS NOT NULL AS has_old, new_data IS NOT NULL AS has_new")
+
+def _read_sources(conn, where: str, params: list, limit: int = None, start_date: str = None,
+                  end_date: str = None, columns: str = _AUDIT_COLUMNS):
+    """
+    Runs the same filtered query on audit_log and then on the archives,
+    newest first, stopping once `limit` rows were found (the sources hold
+    disjoint, successively older time ranges). Payloads come back as JSON text.
+    """
+    import pandas as pd
+
+    frames = []
+    remaining = limit
+    for source in ['audit_log'] + get_archive_tables(conn, start_date, end_date):
+        query = f"SELECT {columns} FROM {source} WHERE {where} ORDER BY timestamp DESC, id DESC"
+        query_params = list(params)
+        if remaining is not None:
+            query += " LIMIT ?"
+            query_params.append(int(remaining))
+        df = pd.read_sql(query, conn, params=query_params)
+        if not df.empty:
+            frames.append(df)
+        if remaining is not None:
+            remaining -= len(df)
+            if remaining <= 0:
+                break
+
+    if not frames:
+        return pd.DataFrame(columns=[c.split(' AS ')[-1].strip() for c in columns.split(', ')])
+    df = pd.concat(frames, ignore_index=True)
+    for col in ('old_data', 'new_data'):
+        if col in df.columns:
+            df[col] = pd.Series([unpack_payload(v) if isinstance(v, (bytes, str)) else None for v in df[col]],
+                                index=df.index, dtype=object)
+    return df
+
 def get_record_history(conn, table_name: str, record_id: int):
     """
     Get the change history for a specific record.
     
     Returns a list of audit log entries for the record.
     """
-    import pandas as pd
-    
-    df = pd.read_sql("""
-        SELECT id, timestamp, username, action, old_data, new_data
-        FROM audit_log
-        WHERE table_name = ? AND record_id = ?
-        ORDER BY timestamp DESC
-    """, conn, params=(table_name, record_id))
-    
-    return df
+    df = _read_sources(conn, "table_name = ? AND record_id = ?", [table_name, record_id])
+    return df[['id', 'timestamp', 'username', 'action', 'old_data', 'new_data']]
 
-def get_audit_log(conn, filters: dict = None, limit: int = 100):
+def get_audit_log(conn, filters: dict = None, limit: int = 100, after: tuple = None):
     """
-    Get audit log entries with optional filters.
-    
+    Get one page of audit log summaries (newest first), with optional filters.
+
     Filters can include:
         - user_id: Filter by user
+        - username: Filter by user name
         - table_name: Filter by table
         - action: Filter by action type
         - start_date: Filter from date
         - end_date: Filter to date
+
+    Pagination is keyset-based: pass the (timestamp, id) of the last row of
+    the previous page as `after` (see next_page_key). Payloads are not
+    returned, only has_old/has_new flags; load them with get_audit_payload.
     """
-    import pandas as pd
-    
-    query = """
-        SELECT al.id, al.timestamp, al.username, al.action, al.table_name, 
-               al.record_id, al.old_data, al.new_data
-        FROM audit_log al
-        WHERE 1=1
-    """
+    conditions = []
     params = []
-    
-    if filters:
-        if filters.get('user_id'):
-            query += " AND al.user_id = ?"
-            params.append(filters['user_id'])
-        if filters.get('table_name'):
-            query += " AND al.table_name = ?"
-            params.append(filters['table_name'])
-        if filters.get('action'):
-            query += " AND al.action = ?"
-            params.append(filters['action'])
-        if filters.get('start_date'):
-            query += " AND al.timestamp >= ?"
-            params.append(filters['start_date'])
-        if filters.get('end_date'):
-            query += " AND al.timestamp <= ?"
-            params.append(filters['end_date'])
-    
-    query += f" ORDER BY al.timestamp DESC LIMIT {limit}"
-    
-    return pd.read_sql(query, conn, params=params)
+    filters = filters or {}
+
+    if filters.get('user_id'):
+        conditions.append("user_id = ?")
+        params.append(filters['user_id'])
+    if filters.get('username'):
+        conditions.append("username = ?")
+        params.append(filters['username'])
+    if filters.get('table_name'):
+        conditions.append("table_name = ?")
+        params.append(filters['table_name'])
+    if filters.get('action'):
+        conditions.append("action = ?")
+        params.append(filters['action'])
+    if filters.get('start_date'):
+        conditions.append("timestamp >= ?")
+        params.append(filters['start_date'])
+    end_date = filters.get('end_date')
+    if end_date:
+        conditions.append("timestamp <= ?")
+        params.append(end_date)
+    if after:
+        conditions.append("(timestamp, id) < (?, ?)")
+        params.extend([after[0], int(after[1])])
+        # Archive months newer than the page key cannot hold further rows
+        end_date = min(end_date, after[0]) if end_date else after[0]
+
+    where = " AND ".join(conditions) or "1=1"
+    df = _read_sources(conn, where, params, limit, filters.get('start_date'), end_date, columns=_SUMMARY_COLUMNS)
+    for col in ('has_old', 'has_new'):
+        df[col] = df[col].astype(bool)
+    return df
+
+def next_page_key(page_df):
+    """Keyset for the page after `page_df` (None when it is empty)."""
+    if page_df.empty:
+        return None
+    last = page_df.iloc[-1]
+    return (last['timestamp'], int(last['id']))
+
+def get_audit_payload(conn, audit_id: int):
+    """(old_data, new_data) of one entry as JSON text, loaded on demand."""
+    entry = _get_entry(conn, audit_id)
+    if entry is None:
+        return None, None
+    return unpack_payload(entry['old_data']), unpack_payload(entry['new_data'])
+
+def get_audit_users(conn):
+    """Distinct user names found in the audit log and its archives."""
+    users = set()
+    for source in ['audit_log'] + get_archive_tables(conn):
+        users.update(row[0] for row in conn.execute(f"SELECT DISTINCT username FROM {source}") if row[0])
+    return sorted(users)
+
+def _get_entry(conn, audit_id: int):
+    """Audit entry as a dict of plain Python values (hot table first, then archives)."""
+    for source in ['audit_log'] + get_archive_tables(conn):
+        cursor = conn.execute(f"SELECT {_AUDIT_COLUMNS} FROM {source} WHERE id = ?", (int(audit_id),))
+        row = cursor.fetchone()
+        if row is not None:
+            return dict(zip((col[0] for col in cursor.description), row))
+    return None
+
+def archive_audit_log(conn, hot_months: int = HOT_MONTHS) -> int:
+    """
+    Moves entries older than the last `hot_months` months from audit_log to
+    the monthly archive tables (audit_log_YYYYMM), compressing their
+    payloads. Returns the number of moved entries.
+    """
+    today = date.today()
+    month_index = today.year * 12 + today.month - 1 - hot_months
+    cutoff = f"{month_index // 12:04d}-{month_index % 12 + 1:02d}-01"
+
+    conn.create_function('audit_compress', 1, _compress, deterministic=True)
+    cursor = conn.cursor()
+    moved = 0
+    try:
+        periods = [row[0] for row in cursor.execute(
+            "SELECT DISTINCT substr(timestamp, 1, 7) FROM audit_log WHERE timestamp < ?", (cutoff,)
+        ).fetchall()]
+        for period in periods:
+            table = create_audit_archive(cursor, period.replace('-', ''))
+            year, month = int(period[:4]), int(period[5:7])
+            start = f"{period}-01"
+            end = f"{year + month // 12:04d}-{month % 12 + 1:02d}-01"
+            cursor.execute(f"""
+                INSERT OR IGNORE INTO {table} ({_AUDIT_COLUMNS})
+                SELECT id, timestamp, user_id, username, action, table_name, record_id,
+                       audit_compress(old_data), audit_compress(new_data)
+                FROM audit_log WHERE timestamp >= ? AND timestamp < ?
+            """, (start, end))
+            cursor.execute("DELETE FROM audit_log WHERE timestamp >= ? AND timestamp < ?", (start, end))
+            moved += cursor.rowcount
+        cursor.execute("""
+            INSERT INTO settings (key, value) VALUES ('last_audit_archive', ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        """, (datetime.now().isoformat(),))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erro ao arquivar auditoria: {e}")
+        raise
+
+    if moved:
+        logger.info(f"Audit archive: {moved} entries moved to {len(periods)} monthly table(s)")
+    return moved
+
+def run_archive_if_needed(conn, interval_days: int = ARCHIVE_INTERVAL_DAYS) -> bool:
+    """Archives old audit entries when the last run is older than `interval_days`."""
+    try:
+        row = conn.execute("SELECT value FROM settings WHERE key = 'last_audit_archive'").fetchone()
+        if row and datetime.now() - datetime.fromisoformat(row[0]) < timedelta(days=interval_days):
+            return False
+        archive_audit_log(conn)
+        return True
+    except sqlite3.Error as e:
+        logger.warning(f"Audit archive skipped: {e}")
+        return False
+
+# Tables feeding student_balances; restoring their rows must refresh the students' balances
+BALANCE_TABLES = ('tuitions', 'student_consumptions')
+
+def _refresh_student_balances(cursor, table_name: str, states):
+    """Recomputes student_balances for the students of the given row states (caller commits)."""
+    if table_name not in BALANCE_TABLES:
+        return
+    for student_id in {state.get('student_id') for state in states if state} - {None}:
+        cursor.execute(STUDENT_BALANCE_REFRESH.format(
+            tuition_filter=" AND student_id = :sid",
+            consumption_filter=" AND student_id = :sid",
+            ledger_filter=" AND student_id = :sid",
+            student_filter="WHERE s.id = :sid"
+        ), {'sid': int(student_id)})
 
 def rollback_record(conn, audit_id: int) -> bool:
     """
@@ -111,27 +321,21 @@ def rollback_record(conn, audit_id: int) -> bool:
     
     Returns True if successful, False otherwise.
     """
-    import pandas as pd
-    
-    # Get the audit log entry
-    entry = pd.read_sql(
-        "SELECT * FROM audit_log WHERE id = ?", 
-        conn, 
-        params=(audit_id,)
-    )
+    # Get the audit log entry (hot table or archives)
+    entry = _get_entry(conn, audit_id)
     
-    if entry.empty:
+    if entry is None:
         return False
     
-    entry = entry.iloc[0]
     action = entry['action']
     table_name = entry['table_name']
     record_id = entry['record_id']
-    old_data = json.loads(entry['old_data']) if entry['old_data'] else None
+    old_data = load_payload(entry['old_data'])
     
     cursor = conn.cursor()
     
     try:
+        before = record_state(conn, table_name, record_id) if table_name in BALANCE_TABLES else None
         if action == 'DELETE' and old_data:
             # Re-insert the deleted record
             columns = ', '.join(old_data.keys())
@@ -156,6 +360,8 @@ def rollback_record(conn, audit_id: int) -> bool:
         else:
             return False
         
+        if table_name in BALANCE_TABLES:
+            _refresh_student_balances(cursor, table_name, [before, record_state(conn, table_name, record_id)])
         conn.commit()
         
         # Log the rollback action
@@ -170,13 +376,307 @@ def rollback_record(conn, audit_id: int) -> bool:
         st.error(f"Erro ao reverter: {e}")
         return False
 
+# --- Point-in-time reconstruction ---
+CHECKPOINT_INTERVAL_DAYS = 7
+
+def _to_ts(at) -> str:
+    return at.isoformat() if isinstance(at, (datetime, date)) else str(at)
+
+def _table_columns(conn, table_name: str):
+    """Columns of an existing table with an id column (guards the dynamic SQL below)."""
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)).fetchone()
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table_name})")] if exists else []
+    if 'id' not in columns:
+        raise ValueError(f"Tabela inválida para auditoria: {table_name}")
+    return columns
+
+def _audited_tables(conn):
+    tables = set()
+    for source in ['audit_log'] + get_archive_tables(conn):
+        tables.update(row[0] for row in conn.execute(f"SELECT DISTINCT table_name FROM {source}"))
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return sorted(tables & existing)
+
+def record_state(conn, table_name: str, record_id: int):
+    """Full current row of a record as a dict (None if it does not exist); use it for CREATE/DELETE payloads."""
+    cursor = conn.execute(f"SELECT * FROM {table_name} WHERE id = ?", (int(record_id),))
+    row = cursor.fetchone()
+    return dict(zip((col[0] for col in cursor.description), row)) if row else None
+
+def create_audit_checkpoint(conn) -> int:
+    """
+    Stores the full current state of audited records in audit_checkpoints.
+    The first checkpoint of a table covers all its rows; later ones only the
+    records changed since the previous checkpoint (deleted ones as NULL).
+    Returns the number of states written.
+    """
+    taken_at = datetime.now().isoformat()
+    cursor = conn.cursor()
+    written = 0
+    try:
+        for table_name in _audited_tables(conn):
+            last = cursor.execute(
+                "SELECT MAX(taken_at) FROM audit_checkpoints WHERE table_name = ?", (table_name,)
+            ).fetchone()[0]
+            if last is None:
+                ids = [row[0] for row in cursor.execute(f"SELECT id FROM {table_name}")]
+            else:
+                ids = [row[0] for row in cursor.execute(
+                    "SELECT DISTINCT record_id FROM audit_log WHERE table_name = ? AND timestamp > ? AND record_id IS NOT NULL",
+                    (table_name, last)
+                )]
+            rows = []
+            for record_id in ids:
+                state = record_state(conn, table_name, record_id)
+                rows.append((table_name, int(record_id), taken_at, pack_payload(state) if state else None))
+            cursor.executemany(
+                "INSERT INTO audit_checkpoints (table_name, record_id, taken_at, state) VALUES (?, ?, ?, ?)", rows
+            )
+            written += len(rows)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erro ao criar checkpoint de auditoria: {e}")
+        raise
+    logger.info(f"Audit checkpoint: {written} record states")
+    return written
+
+def run_checkpoint_if_needed(conn, interval_days: int = CHECKPOINT_INTERVAL_DAYS) -> bool:
+    """Creates an audit checkpoint when the latest one is older than `interval_days`."""
+    try:
+        last = conn.execute("SELECT MAX(taken_at) FROM audit_checkpoints").fetchone()[0]
+        if last and datetime.now() - datetime.fromisoformat(last) < timedelta(days=interval_days):
+            return False
+        create_audit_checkpoint(conn)
+        return True
+    except sqlite3.Error as e:
+        logger.warning(f"Audit checkpoint skipped: {e}")
+        return False
+
+def _record_entries(conn, table_name: str, record_id: int, after: str = None, until: str = None):
+    """Audit entries of one record in (after, until], oldest first, payloads as dicts."""
+    conditions = ["table_name = ?", "record_id = ?"]
+    params = [table_name, int(record_id)]
+    if after:
+        conditions.append("timestamp > ?")
+        params.append(after)
+    if until:
+        conditions.append("timestamp <= ?")
+        params.append(until)
+    df = _read_sources(conn, " AND ".join(conditions), params, start_date=after, end_date=until)
+    entries = []
+    for row in df.iloc[::-1].itertuples(index=False):
+        entries.append({
+            'id': int(row.id), 'timestamp': row.timestamp, 'action': row.action,
+            'old': json.loads(row.old_data) if row.old_data else None,
+            'new': json.loads(row.new_data) if row.new_data else None,
+        })
+    return entries
+
+# Actions replayed by reconstruct_record as they are stored
+_REPLAYABLE_ACTIONS = ('CREATE', 'UPDATE', 'DELETE', 'REWIND', 'ROLLBACK')
+# Actions logged under their own name: replayed as (action, {payload key: column})
+ACTION_MAPPINGS = {
+    'CANCEL_TUITION': ('UPDATE', {'old_status': 'status', 'new_status': 'status'}),
+    'CANCEL_CONSUMPTION': ('UPDATE', {'old_status': 'status', 'new_status': 'status'}),
+    'UPDATE_CLASS': ('UPDATE', {'class_id': 'class_id'}),
+    'CONSUME_MAT': ('CREATE', {'mat_id': 'material_id', 'qty': 'quantity'}),
+}
+
+def _replayable(entry):
+    """
+    `entry` with its action and payloads expressed as column changes
+    (ACTION_MAPPINGS). Raises ValueError for actions with no known mapping.
+    """
+    action = entry['action']
+    if action in _REPLAYABLE_ACTIONS:
+        return entry
+    if action not in ACTION_MAPPINGS:
+        raise ValueError(f"Ação '{action}' (auditoria #{entry['id']}) não pode ser reconstruída.")
+    replay_as, columns = ACTION_MAPPINGS[action]
+
+    def rename(payload):
+        return {columns[k]: v for k, v in payload.items() if k in columns} if payload else None
+
+    return {**entry, 'action': replay_as, 'old': rename(entry['old']), 'new': rename(entry['new'])}
+
+def _apply_forward(conn, state, entry):
+    """State after `entry` (None: record does not exist)."""
+    entry = _replayable(entry)
+    action = entry['action']
+    if action == 'CREATE':
+        return dict(entry['new'] or {})
+    if action == 'UPDATE':
+        return {**(state or {}), **(entry['new'] or {})}
+    if action == 'DELETE':
+        return None
+    if action == 'REWIND':
+        return dict(entry['new']) if entry['new'] else None
+    # ROLLBACK
+    source = _get_entry(conn, (entry['old'] or {}).get('rollback_from_audit_id', 0))
+    restored = (entry['new'] or {}).get('restored_to')
+    if source is None or source['action'] == 'CREATE':
+        return None
+    if source['action'] == 'UPDATE':
+        return {**(state or {}), **(restored or {})}
+    return dict(restored or {})
+
+def _apply_backward(state, entry):
+    """State before `entry`. ROLLBACK entries do not record what they overwrote and are skipped."""
+    entry = _replayable(entry)
+    action = entry['action']
+    if action == 'CREATE':
+        return None
+    if action == 'UPDATE':
+        return {**(state or {}), **(entry['old'] or {})}
+    if action == 'DELETE':
+        return dict(entry['old'] or {})
+    if action == 'REWIND':
+        return dict(entry['old']) if entry['old'] else None
+    return state
+
+def reconstruct_record(conn, table_name: str, record_id: int, at):
+    """
+    State of a record at `at` (datetime or ISO string) as a dict, or None if
+    it did not exist then.
+
+    Replays the record's audit entries forward from its latest checkpoint
+    taken before `at`. Without such a checkpoint, it replays forward from the
+    record's CREATE entry. Records older than the audit log are rewound
+    backward from their current row instead. Raises ValueError when an entry
+    on the way has an action with no known column mapping.
+    """
+    _table_columns(conn, table_name)
+    at = _to_ts(at)
+    checkpoint = conn.execute("""
+        SELECT taken_at, state FROM audit_checkpoints
+        WHERE table_name = ? AND record_id = ? AND taken_at <= ?
+        ORDER BY taken_at DESC LIMIT 1
+    """, (table_name, int(record_id), at)).fetchone()
+
+    if checkpoint is not None:
+        state = load_payload(checkpoint[1])
+        for entry in _record_entries(conn, table_name, record_id, after=checkpoint[0], until=at):
+            state = _apply_forward(conn, state, entry)
+        return state
+
+    history = _record_entries(conn, table_name, record_id, until=at)
+    if history and history[0]['action'] == 'CREATE':
+        state = None
+        for entry in history:
+            state = _apply_forward(conn, state, entry)
+        return state
+
+    state = record_state(conn, table_name, record_id)
+    for entry in reversed(_record_entries(conn, table_name, record_id, after=at)):
+        state = _apply_backward(state, entry)
+    return state
+
+def missing_columns(conn, table_name: str, state) -> list:
+    """
+    Table columns a reconstructed state does not cover. Partial CREATE/DELETE
+    payloads (e.g. only the name) leave these unknown.
+    """
+    if state is None:
+        return []
+    return [c for c in _table_columns(conn, table_name) if c != 'id' and c not in state]
+
+def rewind_table(conn, table_name: str, at, dry_run: bool = True):
+    """
+    Brings every record of `table_name` changed after `at` back to its
+    state at `at` (re-inserting, updating or deleting rows). With dry_run
+    only the plan is returned. Each applied change is audited as REWIND.
+    Returns a DataFrame (record_id, operation, current, target, missing,
+    unreconstructable); `missing` lists the columns the audit trail cannot
+    reconstruct and `unreconstructable` names an audit action that cannot be
+    replayed. A plan with any such record is refused (nothing is written).
+    """
+    import pandas as pd
+
+    columns = _table_columns(conn, table_name)
+    at = _to_ts(at)
+    changed_ids = set()
+    for source in ['audit_log'] + get_archive_tables(conn, start_date=at):
+        changed_ids.update(row[0] for row in conn.execute(
+            f"SELECT DISTINCT record_id FROM {source} WHERE table_name = ? AND timestamp > ? AND record_id IS NOT NULL",
+            (table_name, at)
+        ))
+
+    plan = []
+    for record_id in sorted(changed_ids):
+        current = record_state(conn, table_name, record_id)
+        try:
+            target = reconstruct_record(conn, table_name, record_id, at)
+        except ValueError as e:
+            plan.append({'record_id': record_id, 'operation': None, 'current': current,
+                         'target': None, 'missing': [], 'unreconstructable': str(e)})
+            continue
+        if target is not None:
+            target = {k: v for k, v in target.items() if k in columns}
+            target['id'] = record_id
+        if current is None and target is None:
+            continue
+        if current is None:
+            operation = 'INSERT'
+        elif target is None:
+            operation = 'DELETE'
+        elif any(current.get(k) != v and str(current.get(k)) != str(v) for k, v in target.items()):
+            operation = 'UPDATE'
+        else:
+            continue
+        missing = [c for c in columns if c != 'id' and c not in target] if target is not None else []
+        plan.append({'record_id': record_id, 'operation': operation, 'current': current,
+                     'target': target, 'missing': missing, 'unreconstructable': None})
+
+    plan_df = pd.DataFrame(plan, columns=['record_id', 'operation', 'current', 'target', 'missing', 'unreconstructable'])
+    if dry_run or plan_df.empty:
+        return plan_df
+
+    incomplete = [item['record_id'] for item in plan if item['missing'] or item['unreconstructable']]
+    if incomplete:
+        raise ValueError(
+            f"Reconstrução incompleta para {len(incomplete)} registro(s) de {table_name} "
+            f"(IDs {', '.join(map(str, incomplete[:10]))}{'...' if len(incomplete) > 10 else ''}): "
+            f"a auditoria não guarda todas as colunas ou tem ações sem mapeamento. Nada foi alterado."
+        )
+
+    cursor = conn.cursor()
+    try:
+        for item in plan:
+            record_id, target = item['record_id'], item['target']
+            if item['operation'] == 'DELETE':
+                cursor.execute(f"DELETE FROM {table_name} WHERE id = ?", (record_id,))
+            elif item['operation'] == 'INSERT':
+                cols = list(target.keys())
+                cursor.execute(
+                    f"INSERT INTO {table_name} ({', '.join(cols)}) VALUES ({', '.join('?' for _ in cols)})",
+                    [target[c] for c in cols]
+                )
+            else:
+                cols = [c for c in target if c != 'id']
+                cursor.execute(
+                    f"UPDATE {table_name} SET {', '.join(f'{c} = ?' for c in cols)} WHERE id = ?",
+                    [target[c] for c in cols] + [record_id]
+                )
+            log_action(conn, 'REWIND', table_name, record_id, old_data=item['current'],
+                       new_data=target, commit=False)
+        _refresh_student_balances(cursor, table_name, [item[k] for item in plan for k in ('current', 'target')])
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erro ao retroceder tabela {table_name}: {e}")
+        raise
+    logger.info(f"Table {table_name} rewound to {at}: {len(plan)} records")
+    return plan_df
+
 def format_action(action: str) -> str:
     """Format action for display."""
     actions = {
         'CREATE': '➕ Criação',
         'UPDATE': '✏️ Alteração',
         'DELETE': '🗑️ Exclusão',
-        'ROLLBACK': '↩️ Reversão'
+        'ROLLBACK': '↩️ Reversão',
+        'REWIND': '⏪ Retrocesso'
     }
     return actions.get(action, action)
 
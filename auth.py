@@ -4,10 +4,16 @@ Handles user login, password hashing, session management, and role-based access
 """
 import streamlit as st
 import bcrypt
+import hashlib
 import time
-import pandas as pd
 import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from datetime import datetime
+import config
+from utils.logging_config import get_logger
+
+logger = get_logger(__name__)
 
 # Role definitions
 ROLES = {
@@ -31,6 +37,7 @@ PAGE_ACCESS = {
     'Producao': ['admin', 'vendedor'],
     'Relatorios': ['admin', 'vendedor'],
     'Administracao': ['admin'],
+    'Perfil_Paginas': ['admin'],  # hidden (not in NAV_MENU), linked from Administração
     'Gestao_Aulas': ['admin', 'vendedor']
 }
 
@@ -71,54 +78,187 @@ NAV_MENU = {
     ]
 }
 
+# --- Password hashing (bounded worker pool) ---
+# bcrypt runs on a small shared pool so a burst of logins cannot take every
+# script thread; callers wait for their own result with a timeout.
+_pool = None
+_pool_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(config.AUTH_MAX_PENDING)
+# Verified against when the username does not exist (same cost, no user enumeration by timing)
+_DUMMY_HASH = None
+
+def _run_in_pool(fn, *args):
+    global _pool
+    if not _pending.acquire(blocking=False):
+        raise RuntimeError("Servidor ocupado verificando senhas. Tente novamente em instantes.")
+    try:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=config.AUTH_WORKERS, thread_name_prefix="bcrypt")
+        future = _pool.submit(fn, *args)
+    except BaseException:
+        _pending.release()
+        raise
+    # The slot is held until the job finishes, even when the caller stops waiting
+    future.add_done_callback(lambda _: _pending.release())
+    try:
+        return future.result(timeout=config.AUTH_VERIFY_TIMEOUT_S)
+    except FutureTimeout:
+        raise RuntimeError("Tempo esgotado verificando a senha.")
+
+def _checkpw(password: str, password_hash: str) -> bool:
+    try:
+        return bcrypt.checkpw(password.encode(), password_hash.encode())
+    except ValueError:
+        # Not a bcrypt hash (legacy SHA256 passwords were reset on migration)
+        return False
+
 def hash_password(password: str) -> str:
-    """Hash password using bcrypt."""
+    """Hash password using bcrypt (cost config.BCRYPT_ROUNDS)."""
     # bcrypt requires bytes, returns bytes. We store as string.
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    return _run_in_pool(
+        lambda: bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=config.BCRYPT_ROUNDS)).decode()
+    )
 
 def verify_password(password: str, password_hash: str) -> bool:
-    """Verify a password against its hash."""
+    """Verify a password against its hash (on the bcrypt pool)."""
+    return _run_in_pool(_checkpw, password, password_hash)
+
+def needs_rehash(password_hash: str) -> bool:
+    """True when a bcrypt hash was made with a cost other than config.BCRYPT_ROUNDS."""
     try:
-        return bcrypt.checkpw(password.encode(), password_hash.encode())
-    except ValueError:
-        # Fallback for old SHA256 hashes (optional, but requested to reset admin anyway)
-        # If we wanted to support legacy hashes we would check len or prefix.
-        # For now, we assume all valid passwords will be bcrypt after migration.
+        return int(password_hash.split('$')[2]) != config.BCRYPT_ROUNDS
+    except (IndexError, ValueError):
         return False
 
-def login(conn, username: str, password: str) -> dict | None:
+# --- Login throttling ---
+class TokenBucket:
+    """Allows `capacity` attempts at once, regaining `refill_per_s` attempts per second."""
+
+    def __init__(self, capacity: float, refill_per_s: float):
+        self.capacity = capacity
+        self.refill_per_s = refill_per_s
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_s)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until one attempt is available (0 when available now)."""
+        self._refill(time.monotonic())
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.refill_per_s
+
+    def consume(self) -> bool:
+        self._refill(time.monotonic())
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+_MAX_BUCKETS = 10000
+
+def _client_ip() -> str | None:
+    try:
+        return getattr(st.context, 'ip_address', None)
+    except Exception:
+        return None
+
+def _user_key(username: str, ip: str | None):
+    return ('user', (username or '').strip().lower(), ip)
+
+def _throttle_buckets(username: str, ip: str | None):
+    """(key, capacity, refill per second): username on this IP, plus every username from this IP."""
+    buckets = [(_user_key(username, ip), config.LOGIN_BURST, config.LOGIN_REFILL_PER_MIN / 60)]
+    if ip:
+        buckets.append((('ip', ip), config.LOGIN_IP_BURST, config.LOGIN_IP_REFILL_PER_MIN / 60))
+    return buckets
+
+def login_wait_time(username: str, ip: str | None = None) -> float:
+    """Seconds the next attempt for this username/IP must wait (0 = allowed)."""
+    with _buckets_lock:
+        return max((_buckets[k].wait_time() for k, *_ in _throttle_buckets(username, ip) if k in _buckets), default=0.0)
+
+def _consume_attempt(username: str, ip: str | None) -> bool:
+    with _buckets_lock:
+        if len(_buckets) > _MAX_BUCKETS:
+            # Forget buckets that are full again
+            for key in [k for k, b in _buckets.items() if b.wait_time() == 0 and b.tokens >= b.capacity]:
+                del _buckets[key]
+        buckets = [
+            _buckets.setdefault(key, TokenBucket(capacity, refill_per_s))
+            for key, capacity, refill_per_s in _throttle_buckets(username, ip)
+        ]
+        if any(b.wait_time() > 0 for b in buckets):
+            return False
+        for b in buckets:
+            b.consume()
+        return True
+
+def _reset_attempts(username: str, ip: str | None):
+    with _buckets_lock:
+        _buckets.pop(_user_key(username, ip), None)
+
+_USER_COLUMNS = "id, username, role, name, active, auth_version"
+
+def _fetch_user(conn, where: str, params: tuple, with_hash: bool = False) -> dict | None:
+    """Single user row as a plain dict (no DataFrame round trip)."""
+    columns = _USER_COLUMNS + (", password_hash" if with_hash else "")
+    cursor = conn.execute(f"SELECT {columns} FROM users WHERE {where}", params)
+    row = cursor.fetchone()
+    return dict(zip((col[0] for col in cursor.description), row)) if row else None
+
+def _password_stamp(password_hash: str) -> str:
+    return hashlib.sha256(password_hash.encode()).hexdigest()[:16]
+
+def _session_user(user: dict) -> dict:
+    """What a session keeps about its user: identity, role and the auth_version it was resolved at."""
+    return {
+        'id': int(user['id']),
+        'username': user['username'],
+        'role': user['role'],
+        'name': user['name'] or user['username'],
+        'auth_version': int(user['auth_version'] or 0),
+        'password_stamp': _password_stamp(user['password_hash'])
+    }
+
+def login(conn, username: str, password: str, ip: str | None = None) -> dict | None:
     """
-    Attempt to login a user. Returns user dict if successful, None otherwise.
+    Attempt to login a user. Returns user dict if successful, None otherwise
+    (also when the username/IP is throttled; see login_wait_time).
+    Hashes made with an outdated cost factor are replaced on success.
     """
-    import pandas as pd
-    
+    global _DUMMY_HASH
+    if not _consume_attempt(username, ip):
+        logger.warning(f"Login throttled for '{username}' ({ip or 'no ip'})")
+        return None
+
     try:
-        user_df = pd.read_sql(
-            "SELECT * FROM users WHERE username=? AND active=1", 
-            conn, 
-            params=(username,)
-        )
+        user = _fetch_user(conn, "username=? AND active=1", (username,), with_hash=True)
         
-        if user_df.empty:
+        if user is None:
+            if _DUMMY_HASH is None:
+                _DUMMY_HASH = hash_password("amicando-dummy")
+            verify_password(password, _DUMMY_HASH)
             return None
         
-        user = user_df.iloc[0]
-        
         if verify_password(password, user['password_hash']):
-            # Update last login
+            _reset_attempts(username, ip)
             cursor = conn.cursor()
+            if needs_rehash(user['password_hash']):
+                cursor.execute("UPDATE users SET password_hash=? WHERE id=?", (hash_password(password), user['id']))
+                logger.info(f"Password hash of user {user['id']} upgraded to cost {config.BCRYPT_ROUNDS}")
+            # Update last login
             cursor.execute(
                 "UPDATE users SET last_login=? WHERE id=?", 
                 (datetime.now().isoformat(), user['id'])
             )
             conn.commit()
             
-            return {
-                'id': user['id'],
-                'username': user['username'],
-                'role': user['role'],
-                'name': user['name'] or user['username']
-            }
+            return _session_user(_fetch_user(conn, "id=?", (user['id'],), with_hash=True))
         
         return None
     except Exception as e:
@@ -127,26 +267,20 @@ def login(conn, username: str, password: str) -> dict | None:
 
 def verify_admin_authorization(conn, password: str) -> bool:
     """
-    Verify if a given password belongs to an active admin user.
+    Verify if a given password belongs to the active 'admin' user.
     Useful for overriding restricted areas.
     """
+    if not _consume_attempt('admin-override', _client_ip()):
+        st.error("Muitas tentativas. Aguarde alguns instantes.")
+        return False
     try:
-        # Check against specific 'admin' user or ANY admin? 
-        # Requirement usually implies the 'admin' superuser or any admin. 
-        # Let's check against the specific 'admin' user first for simplicity, 
-        # or iterate all admins? 'admin' user is guaranteed by create_default_admin.
-        # Let's use the 'admin' username for the override.
-        
-        user_df = pd.read_sql(
-            "SELECT password_hash FROM users WHERE username='admin' AND active=1", 
-            conn
-        )
+        user = _fetch_user(conn, "username='admin' AND active=1", (), with_hash=True)
         
-        if user_df.empty:
+        if user is None:
             return False
             
-        return verify_password(password, user_df.iloc[0]['password_hash'])
-    except Exception as e:
+        return verify_password(password, user['password_hash'])
+    except (sqlite3.Error, RuntimeError) as e:
         print(f"Auth Check Error: {e}")
         return False
 
@@ -174,6 +308,28 @@ def logout():
     if 'last_activity' in st.session_state:
         del st.session_state.last_activity
 
+def revalidate_session(conn, user: dict) -> bool:
+    """
+    Keeps the cached session user in sync with the users table.
+
+    The only per-rerun cost is reading the user's auth_version (primary key
+    lookup) and comparing it with the stamp cached at login. The stamp is
+    bumped by a trigger whenever username, password, role, name or active
+    change (admin_service.update_user, audit rollbacks...), and a deleted
+    user has no row: only then is the user resolved again, or logged out
+    when inactive or gone. A password change always ends the session.
+    """
+    row = conn.execute("SELECT auth_version FROM users WHERE id = ?", (user['id'],)).fetchone()
+    if row is not None and row[0] == user.get('auth_version'):
+        return True
+
+    fresh = _fetch_user(conn, "id=?", (user['id'],), with_hash=True) if row is not None else None
+    if fresh is None or not fresh['active'] or _password_stamp(fresh['password_hash']) != user.get('password_stamp'):
+        logout()
+        return False
+    set_current_user(_session_user(fresh))
+    return True
+
 def require_login(conn):
     """
     Require user to be logged in. Shows login form if not.
@@ -181,7 +337,7 @@ def require_login(conn):
     """
     user = get_current_user()
     
-    if user:
+    if user and revalidate_session(conn, user):
         return True
     
     # Hide sidebar if not logged in (Unified Login View)
@@ -202,7 +358,12 @@ def require_login(conn):
             password = st.text_input("Senha", type="password")
             
             if st.form_submit_button("Entrar", type="primary", use_container_width=True):
-                user = login(conn, username, password)
+                ip = _client_ip()
+                wait = login_wait_time(username, ip)
+                if wait > 0:
+                    st.error(f"Muitas tentativas. Aguarde {int(wait) + 1}s para tentar novamente.")
+                    return False
+                user = login(conn, username, password, ip)
                 if user:
                     set_current_user(user)
                     st.success(f"Bem-vindo(a), {user['name']}!")
@@ -271,12 +432,10 @@ def render_user_info():
 
 def create_default_admin(conn):
     """Create default admin user if no users exist."""
-    import pandas as pd
-    
     cursor = conn.cursor()
     
     # Check if any users exist
-    count = pd.read_sql("SELECT count(*) as c FROM users", conn).iloc[0]['c']
+    count = cursor.execute("SELECT count(*) FROM users").fetchone()[0]
     
     if count == 0:
         # Create default admin
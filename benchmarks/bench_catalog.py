@@ -0,0 +1,69 @@
+"""
+Catalog loaders used by Produtos, Vendas and Produção. st.cache_data is a
+passthrough here, so these measure the cache-miss cost of each loader.
+"""
+from datetime import date
+
+from services import product_service, production_service
+
+START = date(2025, 1, 1)
+END = date(2025, 12, 31)
+# Products per page of the Vendas catalog grid
+GRID_PAGE = 60
+
+
+def bench_get_all_products(benchmark, conn):
+    benchmark(product_service.get_all_products, conn)
+
+
+def bench_get_all_materials(benchmark, conn):
+    benchmark(product_service.get_all_materials, conn)
+
+
+def bench_get_wip_stock_value(benchmark, conn):
+    benchmark(product_service.get_wip_stock_value, conn)
+
+
+def bench_get_categories(benchmark, conn):
+    benchmark(product_service.get_categories, conn)
+
+
+def bench_get_category_list(benchmark, conn):
+    benchmark(product_service.get_category_list, conn)
+
+
+def bench_vendas_catalog_grid(benchmark, conn):
+    """Per-card lookups of one Vendas grid page: images, kit stock and variants."""
+    product_ids = product_service.get_all_products(conn)['id'].head(GRID_PAGE).tolist()
+
+    def render_grid():
+        for product_id in product_ids:
+            product_service.get_product_images(conn, product_id)
+            product_service.get_kit_stock_status(conn, product_id)
+            product_service.get_product_variants(conn, product_id)
+
+    benchmark(render_grid)
+
+
+def bench_get_wip_items(benchmark, conn):
+    benchmark(production_service.get_wip_items, conn)
+
+
+def bench_get_loss_statistics(benchmark, conn):
+    benchmark(production_service.get_loss_statistics, conn, START, END)
+
+
+def bench_get_production_history_stats(benchmark, conn):
+    benchmark(production_service.get_production_history_stats, conn, 180)
+
+
+def bench_get_stage_duration_stats(benchmark, conn):
+    benchmark(production_service.get_stage_duration_stats, conn)
+
+
+def bench_get_production_log_report(benchmark, conn):
+    benchmark(production_service.get_production_log_report, conn, START, END)
+
+
+def bench_get_yield_analysis_data(benchmark, conn):
+    benchmark(production_service.get_yield_analysis_data, conn, START, END)
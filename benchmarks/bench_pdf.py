@@ -0,0 +1,105 @@
+"""
+PDF generators fed with the same data their pages build. The sales report
+grows with the database size; receipts, quotes and statements use the
+largest order and the busiest student.
+"""
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import reports
+from services import order_service, report_service
+
+MONTH_START = date(2025, 12, 1)
+END = date(2025, 12, 31)
+
+
+def _largest_order(conn):
+    order = pd.read_sql("""
+        SELECT co.*, c.name AS client_name
+        FROM commission_orders co
+        JOIN commission_items ci ON ci.order_id = co.id
+        LEFT JOIN clients c ON co.client_id = c.id
+        GROUP BY co.id ORDER BY COUNT(ci.id) DESC, co.id LIMIT 1
+    """, conn)
+    if order.empty:
+        pytest.skip("Nenhuma encomenda no banco")
+    order = order.iloc[0]
+    return order, order_service.get_order_items_detail(conn, int(order['id']))
+
+
+def bench_generate_report_pdf(benchmark, conn):
+    # Relatórios > Vendas exported to PDF for the last month (one row per sale)
+    df = report_service.get_sales_data(conn, MONTH_START, END)
+    df['Data'] = pd.to_datetime(df['Data']).dt.strftime('%d/%m/%Y')
+    benchmark(reports.generate_report_pdf,
+              title="Relatório de Vendas",
+              info_lines={"Período": f"{MONTH_START:%d/%m/%Y} a {END:%d/%m/%Y}", "Vendedor": "Todos"},
+              headers=list(df.columns),
+              data=df.values.tolist(),
+              totals=[("Total Vendido", f"R$ {df['Valor'].sum():,.2f}"), ("Nº de Vendas", str(len(df)))],
+              orientation='L')
+
+
+def bench_generate_receipt_pdf(benchmark, conn):
+    order, items = _largest_order(conn)
+    benchmark(reports.generate_receipt_pdf, {
+        "id": f"ENC-{int(order['id']):04d}",
+        "type": "Encomenda",
+        "date": pd.to_datetime(order['date_created']).strftime('%d/%m/%Y'),
+        "date_due": pd.to_datetime(order['date_due']).strftime('%d/%m/%Y'),
+        "client_name": order['client_name'] or "Cliente",
+        "notes": order['notes'],
+        "items": [{
+            "name": f"{r['name']} ({r['variant_name']})" if r['variant_name'] else r['name'],
+            "qty": r['quantity'], "price": r['unit_price'], "notes": r['notes'], "images": r['image_paths']
+        } for _, r in items.iterrows()],
+        "total": order['total_price'],
+        "discount": order['manual_discount'] or 0,
+        "deposit": order['deposit_amount'] or 0,
+        "status": order['status'],
+    })
+
+
+def bench_generate_quote_pdf(benchmark, conn):
+    # No quotes in the synthetic history: quote the items of the largest order
+    order, items = _largest_order(conn)
+    benchmark(reports.generate_quote_pdf, {
+        "id": f"ORC-{int(order['id'])}",
+        "client_name": order['client_name'] or "Cliente",
+        "date_created": END.strftime('%d/%m/%Y'),
+        "date_valid_until": END.strftime('%d/%m/%Y'),
+        "items": [{
+            "id": r['product_id'], "name": r['name'], "qty": r['quantity'], "price": r['unit_price'], "notes": r['notes']
+        } for _, r in items.iterrows()],
+        "total": order['total_price'],
+        "discount": 0,
+        "notes": order['notes'],
+        "delivery": "A combinar",
+        "payment": "50% na encomenda, 50% na entrega",
+    })
+
+
+def bench_generate_student_statement(benchmark, conn):
+    student = conn.execute("""
+        SELECT s.id, s.name FROM students s
+        LEFT JOIN student_consumptions c ON c.student_id = s.id
+        GROUP BY s.id ORDER BY COUNT(c.id) DESC, s.id LIMIT 1
+    """).fetchone()
+    if student is None:
+        pytest.skip("Nenhum aluno no banco")
+    student_id, name = student
+    items = []
+    for month_year, amount, paid, status in conn.execute(
+            "SELECT month_year, amount, amount_paid, status FROM tuitions WHERE student_id = ? ORDER BY month_year",
+            (student_id,)):
+        items.append({"date": month_year, "description": f"Mensalidade {month_year}", "quantity": 1,
+                      "value": amount, "paid": paid, "status": status})
+    for day, description, quantity, value, paid, status in conn.execute(
+            "SELECT date, description, quantity, total_value, amount_paid, status FROM student_consumptions "
+            "WHERE student_id = ? ORDER BY date", (student_id,)):
+        items.append({"date": day, "description": description, "quantity": quantity,
+                      "value": value, "paid": paid, "status": status})
+    total = sum(float(it['value'] or 0) - float(it['paid'] or 0) for it in items)
+    benchmark(reports.generate_student_statement, {'name': name, 'month': END.strftime('%m/%Y')}, items, total)
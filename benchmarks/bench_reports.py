@@ -0,0 +1,49 @@
+"""
+Every report_service query, with the arguments the Relatórios page passes
+for the last year of the synthetic history.
+"""
+from datetime import date, timedelta
+
+import pytest
+
+from services import report_service
+
+START = date(2025, 1, 1)
+END = date(2025, 12, 31)
+PERIOD_DAYS = 90
+CUTOFF = (END - timedelta(days=PERIOD_DAYS)).isoformat()
+
+REPORTS = {
+    'get_sales_data': lambda conn: report_service.get_sales_data(conn, START, END),
+    'get_sales_total_period': lambda conn: report_service.get_sales_total_period(conn, START, END),
+    'get_top_products': lambda conn: report_service.get_top_products(conn, START, END, 10, "Quantidade"),
+    'get_expenses_data': lambda conn: report_service.get_expenses_data(conn, START, END),
+    'get_expenses_total_period': lambda conn: report_service.get_expenses_total_period(conn, START, END),
+    'get_material_consumption': lambda conn: report_service.get_material_consumption(conn, START, END),
+    'get_product_profitability': lambda conn: report_service.get_product_profitability(conn),
+    'get_sales_trend': lambda conn: report_service.get_sales_trend(conn, END.year),
+    'get_realized_profitability': lambda conn: report_service.get_realized_profitability(conn, START, END, 20),
+    'get_customer_history': lambda conn: report_service.get_customer_history(conn, START, END),
+    'get_cash_flow_data': lambda conn: report_service.get_cash_flow_data(conn, START, END, '%Y-%m'),
+    'get_stock_forecast_products': lambda conn: report_service.get_stock_forecast_products(conn, PERIOD_DAYS, CUTOFF, END),
+    'get_stock_forecast_materials': lambda conn: report_service.get_stock_forecast_materials(conn, PERIOD_DAYS, CUTOFF, END),
+    'get_dead_stock_products': lambda conn: report_service.get_dead_stock_products(conn, CUTOFF, END),
+    'get_dead_stock_materials': lambda conn: report_service.get_dead_stock_materials(conn, CUTOFF, END),
+    'get_pending_orders': lambda conn: report_service.get_pending_orders(conn, "", "date_due ASC"),
+    'get_production_cost_data': lambda conn: report_service.get_production_cost_data(conn, START, END),
+    'get_period_material_cost': lambda conn: report_service.get_period_material_cost(conn, START, END),
+    'get_seasonality_data': lambda conn: report_service.get_seasonality_data(conn, 12, ['2025', '2024', '2023']),
+    'get_supplier_purchases': lambda conn: report_service.get_supplier_purchases(conn, START, END),
+    'get_supplier_purchases_all': lambda conn: report_service.get_supplier_purchases_all(conn, START, END),
+}
+
+
+def test_every_report_is_benchmarked():
+    public = {name for name in dir(report_service)
+              if name.startswith('get_') and callable(getattr(report_service, name))}
+    assert public == set(REPORTS), f"Relatórios sem benchmark: {sorted(public - set(REPORTS))}"
+
+
+@pytest.mark.parametrize("report", sorted(REPORTS))
+def bench_report(benchmark, conn, report):
+    benchmark(REPORTS[report], conn)
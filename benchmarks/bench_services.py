@@ -0,0 +1,93 @@
+"""
+Write paths of the order and production flows. Each round runs on the same
+rows: the cursor-based services are rolled back after every round and the
+deliveries (which commit) are undone by the teardown.
+"""
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from services import finance_service, order_service, product_service, production_service
+
+
+def _rollback(conn):
+    return lambda: conn.rollback()
+
+
+def bench_deduct_production_materials_central(benchmark, conn):
+    # Product with the longest recipe (kits expand recursively)
+    row = conn.execute("""
+        SELECT product_id FROM product_recipes GROUP BY product_id ORDER BY COUNT(*) DESC, product_id LIMIT 1
+    """).fetchone()
+    if row is None:
+        pytest.skip("Nenhuma receita no banco")
+    cursor = conn.cursor()
+    benchmark.pedantic(product_service.deduct_production_materials_central,
+                       args=(cursor, row[0], 5), teardown=_rollback(conn))
+
+
+def bench_move_stage(benchmark, conn):
+    # Fila de Espera -> Modelagem deducts the clay of the recipe
+    wip = production_service.get_wip_items(conn, 'Fila de Espera')
+    wip = wip[wip['materials_deducted'] == 0]
+    if wip.empty:
+        pytest.skip("Nenhum card na Fila de Espera")
+    item = wip.iloc[0]
+    cursor = conn.cursor()
+    benchmark.pedantic(production_service.move_stage,
+                       args=(cursor, conn, int(item['id']), 'Fila de Espera', 'Modelagem',
+                             int(item['quantity']), int(item['quantity'])),
+                       teardown=_rollback(conn))
+
+
+def bench_finalize_production(benchmark, conn):
+    wip = production_service.get_wip_items(conn)
+    wip = wip[wip['real_order_id'].notna()]
+    if wip.empty:
+        pytest.skip("Nenhum card de encomenda em produção")
+    item = wip.iloc[0]
+    cursor = conn.cursor()
+    benchmark.pedantic(production_service.finalize_production,
+                       args=(cursor, item, int(item['quantity']), True),
+                       teardown=_rollback(conn))
+
+
+def bench_deliver_order(benchmark, conn):
+    order = pd.read_sql("""
+        SELECT co.id, co.client_id, co.total_price, co.deposit_amount, co.status, COUNT(ci.id) AS n_items
+        FROM commission_orders co JOIN commission_items ci ON ci.order_id = co.id
+        WHERE co.status IN ('Concluída', 'Em Produção')
+        GROUP BY co.id ORDER BY n_items DESC, co.id LIMIT 1
+    """, conn)
+    if order.empty:
+        pytest.skip("Nenhuma encomenda pendente")
+    order = order.iloc[0]
+    order_id = int(order['id'])
+    order_data = {
+        'client_id': order['client_id'], 'total_price': order['total_price'],
+        'deposit_amount': order['deposit_amount'], 'status': order['status'],
+    }
+    marks = {}
+
+    def setup():
+        marks['sale'] = conn.execute("SELECT COALESCE(MAX(id), 0) FROM sales").fetchone()[0]
+        marks['audit'] = conn.execute("SELECT COALESCE(MAX(id), 0) FROM audit_log").fetchone()[0]
+        marks['stock'] = conn.execute("SELECT id, stock_quantity FROM products").fetchall()
+        items_df = order_service.get_order_items_detail(conn, order_id)
+        return (conn, order_id, order_data, items_df), {}
+
+    def teardown():
+        # Same order, same stock on every round
+        conn.execute("DELETE FROM sales WHERE id > ?", (marks['sale'],))
+        conn.execute("DELETE FROM audit_log WHERE id > ?", (marks['audit'],))
+        conn.executemany("UPDATE products SET stock_quantity = ? WHERE id = ?",
+                         [(qty, pid) for pid, qty in marks['stock']])
+        conn.execute("UPDATE commission_orders SET status = ? WHERE id = ?", (order_data['status'], order_id))
+        conn.commit()
+
+    benchmark.pedantic(order_service.deliver_order, setup=setup, teardown=teardown)
+
+
+def bench_get_financial_summary(benchmark, conn):
+    benchmark(finance_service.get_financial_summary, conn, date(2025, 1, 1), date(2025, 12, 31))
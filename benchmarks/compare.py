@@ -0,0 +1,79 @@
+"""
+Compares two benchmark result files (written by `python -m pytest benchmarks`).
+
+    python -m benchmarks.compare benchmarks/results/OLD.json benchmarks/results/NEW.json [--threshold 20]
+
+Exits with status 1 when a median got slower than the threshold (and by at
+least 1 ms).
+"""
+import argparse
+import json
+import sys
+
+# Changes smaller than this are timer noise, whatever the percentage
+MIN_DELTA_S = 0.001
+
+
+def _key(result):
+    return (result['group'], result['name'], result['size'])
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:10.2f}"
+
+
+def format_table(results):
+    lines = [f"{'grupo':<10} {'benchmark':<48} {'tamanho':<8} {'mediana ms':>10} {'mín ms':>10} {'máx ms':>10} {'desvio ms':>10}"]
+    for result in sorted(results, key=_key):
+        s = result['stats']
+        lines.append(f"{result['group']:<10} {result['name']:<48} {result['size']:<8} "
+                     f"{_ms(s['median'])} {_ms(s['min'])} {_ms(s['max'])} {_ms(s['stddev'])}")
+    return lines
+
+
+def compare(old, new, threshold_pct=20.0):
+    """Returns (lines, regressions) comparing the medians of two result payloads."""
+    old_by_key = {_key(r): r['stats'] for r in old['benchmarks']}
+    lines = [f"Base: {old['meta'].get('commit') or '?'} ({old['meta'].get('created_at')})  "
+             f"Atual: {new['meta'].get('commit') or '?'} ({new['meta'].get('created_at')})",
+             f"{'grupo':<10} {'benchmark':<48} {'tamanho':<8} {'base ms':>10} {'atual ms':>10} {'variação':>9}"]
+    regressions = []
+    for result in sorted(new['benchmarks'], key=_key):
+        before = old_by_key.get(_key(result))
+        now = result['stats']['median']
+        if before is None:
+            lines.append(f"{result['group']:<10} {result['name']:<48} {result['size']:<8} {'-':>10} {_ms(now)}      novo")
+            continue
+        change = (now - before['median']) / before['median'] * 100 if before['median'] else 0.0
+        flag = ""
+        if abs(now - before['median']) < MIN_DELTA_S:
+            pass
+        elif change > threshold_pct:
+            flag = "  << mais lento"
+            regressions.append(result)
+        elif change < -threshold_pct:
+            flag = "  >> mais rápido"
+        lines.append(f"{result['group']:<10} {result['name']:<48} {result['size']:<8} "
+                     f"{_ms(before['median'])} {_ms(now)} {change:+8.1f}%{flag}")
+    lines.append(f"{len(regressions)} regressão(ões) acima de {threshold_pct:.0f}%")
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara dois resultados de benchmark (medianas).")
+    parser.add_argument("old", help="Resultado base (JSON)")
+    parser.add_argument("new", help="Resultado novo (JSON)")
+    parser.add_argument("--threshold", type=float, default=20.0, help="Variação considerada regressão, em %% (padrão: 20)")
+    args = parser.parse_args(argv)
+
+    with open(args.old, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    lines, regressions = compare(old, new, args.threshold)
+    print("\n".join(lines))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""
+Benchmark harness: Streamlit mocked (as in scripts/verify_health_check.py),
+synthetic databases from scripts/generate_synthetic_data.py and a
+`benchmark` fixture with the pytest-benchmark calling style:
+
+    def bench_something(benchmark, conn):
+        result = benchmark(service.function, conn, arg)
+        benchmark.pedantic(fn, setup=prepare, teardown=undo, rounds=5)
+
+    python -m pytest benchmarks --sizes small,medium [--rounds 5] [--compare benchmarks/results/OLD.json]
+
+Every benchmark runs once per selected database size (generated on first
+use into benchmarks/.data/, ~1 min for large). Results are written to
+benchmarks/results/<timestamp>_<commit>.json; --compare prints the change of
+each median against an earlier file (see benchmarks/compare.py).
+"""
+import gc
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCH_DIR)
+DATA_DIR = os.path.join(BENCH_DIR, ".data")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+# Fixed history end so every run (and every commit) measures the same rows
+END_DATE = date(2025, 12, 31)
+SEED = 42
+SIZES = ('small', 'medium', 'large')
+
+
+# --- 1. STREAMLIT MOCK ---
+def _passthrough_cache(func=None, **_kwargs):
+    """st.cache_data / st.cache_resource stand-in: no caching, so every call is measured."""
+    def decorate(f):
+        f.clear = lambda *args, **kwargs: None
+        return f
+    return decorate(func) if callable(func) else decorate
+
+
+_st = MagicMock()
+_st.cache_data = _passthrough_cache
+_st.cache_resource = _passthrough_cache
+_st.session_state = {}
+sys.modules["streamlit"] = _st
+
+sys.path.insert(0, PROJECT_ROOT)
+# reports.py loads the logo by relative path
+os.chdir(PROJECT_ROOT)
+
+import config  # noqa: E402
+
+# The instrumented connection would add its own overhead to every statement
+config.QUERY_PROFILING = False
+# Keep benchmark runs out of the application log
+config.LOG_FOLDER = tempfile.mkdtemp(prefix="amicando-bench-")
+config.LOG_FILE = os.path.join(config.LOG_FOLDER, "amicando.log")
+
+import database  # noqa: E402
+from scripts import generate_synthetic_data  # noqa: E402
+
+
+# --- 2. OPTIONS ---
+def pytest_addoption(parser):
+    group = parser.getgroup("benchmarks")
+    group.addoption("--sizes", default="small",
+                    help="Tamanhos de banco separados por vírgula: small,medium,large (padrão: small)")
+    group.addoption("--rounds", type=int, default=5, help="Rodadas medidas por benchmark (padrão: 5)")
+    group.addoption("--bench-json", default=None, help="Arquivo de resultados (padrão: benchmarks/results/<data>_<commit>.json)")
+    group.addoption("--compare", default=None, help="Resultado anterior (JSON) para comparar as medianas")
+    group.addoption("--regression-pct", type=float, default=20.0,
+                    help="Variação da mediana considerada regressão em --compare (padrão: 20%%)")
+
+
+def pytest_configure(config):
+    config._bench_results = []
+
+
+def pytest_generate_tests(metafunc):
+    if "db_size" in metafunc.fixturenames:
+        sizes = [s.strip() for s in metafunc.config.getoption("--sizes").split(",") if s.strip()]
+        unknown = set(sizes) - set(SIZES)
+        if unknown:
+            raise pytest.UsageError(f"Tamanho desconhecido: {', '.join(sorted(unknown))}")
+        metafunc.parametrize("db_size", sizes, indirect=True, scope="session")
+
+
+# --- 3. DATABASES ---
+def _base_database(size):
+    """Generated once per size, seed and end date; reused by later runs."""
+    path = os.path.join(DATA_DIR, f"{size}_seed{SEED}_{END_DATE.isoformat()}_v{database.SCHEMA_VERSION}.db")
+    if not os.path.exists(path):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        tmp_path = path + ".tmp"
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(tmp_path + suffix):
+                os.remove(tmp_path + suffix)
+        generate_synthetic_data.generate(tmp_path, size, seed=SEED, end_date=END_DATE)
+        # Fold the WAL in so the file can be copied alone
+        conn = sqlite3.connect(tmp_path)
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.close()
+        os.replace(tmp_path, path)
+    return path
+
+
+@pytest.fixture(scope="session")
+def db_size(request):
+    return request.param
+
+
+@pytest.fixture(scope="session")
+def db(db_size, tmp_path_factory):
+    """
+    Working copy of the synthetic database for `db_size`, set as database.DB_PATH.
+    Write benchmarks change it; material stock is raised so deductions never fail.
+    """
+    path = str(tmp_path_factory.mktemp(db_size) / "bench.db")
+    shutil.copyfile(_base_database(db_size), path)
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE materials SET stock_level = stock_level + 1000000")
+    conn.commit()
+    conn.close()
+
+    previous = database.DB_PATH
+    database.DB_PATH = path
+    yield path
+    database.DB_PATH = previous
+
+
+@pytest.fixture
+def conn(db):
+    connection = database.get_connection()
+    yield connection
+    connection.close()
+
+
+# --- 4. BENCHMARK FIXTURE ---
+class BenchmarkFixture:
+    """Times a callable over several rounds (one warm-up first) and records the stats."""
+
+    def __init__(self, name, group, size, rounds, results):
+        self.name = name
+        self.group = group
+        self.size = size
+        self.rounds = rounds
+        self._results = results
+        self.stats = None
+
+    def __call__(self, func, *args, **kwargs):
+        return self.pedantic(func, args=args, kwargs=kwargs)
+
+    def pedantic(self, func, args=(), kwargs=None, setup=None, teardown=None, rounds=None, warmup_rounds=1):
+        """
+        setup() runs before each round and may return (args, kwargs) for it;
+        teardown() runs after. Neither is timed.
+        """
+        kwargs = kwargs or {}
+        rounds = rounds or self.rounds
+        timings, result = [], None
+        gc_was_enabled = gc.isenabled()
+        for index in range(warmup_rounds + rounds):
+            call_args, call_kwargs = args, kwargs
+            if setup is not None:
+                prepared = setup()
+                if prepared is not None:
+                    call_args, call_kwargs = prepared
+            gc.disable()
+            started = time.perf_counter()
+            try:
+                result = func(*call_args, **call_kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                if gc_was_enabled:
+                    gc.enable()
+            if teardown is not None:
+                teardown()
+            if index >= warmup_rounds:
+                timings.append(elapsed)
+
+        self.stats = {
+            'rounds': len(timings),
+            'min': min(timings),
+            'max': max(timings),
+            'mean': statistics.fmean(timings),
+            'median': statistics.median(timings),
+            'stddev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        }
+        self._results.append({'name': self.name, 'group': self.group, 'size': self.size, 'stats': self.stats})
+        return result
+
+
+@pytest.fixture
+def benchmark(request):
+    params = dict(request.node.callspec.params) if hasattr(request.node, 'callspec') else {}
+    size = params.pop('db_size', '-')
+    name = request.node.originalname
+    if params:
+        name += "[" + "-".join(str(v) for v in params.values()) + "]"
+    group = request.node.module.__name__.rsplit('.', 1)[-1].replace('bench_', '')
+    return BenchmarkFixture(name, group, size, request.config.getoption("--rounds"), request.config._bench_results)
+
+
+# --- 5. REPORT ---
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def _results_path(config, commit):
+    path = config.getoption("--bench-json")
+    if path:
+        return path
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    return os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{commit or 'nogit'}.json")
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    results = config._bench_results
+    if not results:
+        return
+    from benchmarks import compare
+
+    commit = _git("rev-parse", "--short", "HEAD")
+    payload = {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'commit': commit,
+            'branch': _git("rev-parse", "--abbrev-ref", "HEAD"),
+            'dirty': bool(_git("status", "--porcelain", "--untracked-files=no")),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'machine': f"{platform.system()} {platform.machine()} {platform.node()}",
+            'seed': SEED,
+            'end_date': END_DATE.isoformat(),
+            'schema_version': database.SCHEMA_VERSION,
+            'rounds': config.getoption("--rounds"),
+        },
+        'benchmarks': results,
+    }
+    path = _results_path(config, commit)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+
+    terminalreporter.section("benchmarks")
+    for line in compare.format_table(results):
+        terminalreporter.write_line(line)
+    terminalreporter.write_line(f"Resultados: {os.path.relpath(path, PROJECT_ROOT)}")
+
+    baseline = config.getoption("--compare")
+    if baseline:
+        with open(baseline, encoding="utf-8") as f:
+            old = json.load(f)
+        terminalreporter.section(f"comparação com {os.path.basename(baseline)}")
+        lines, _ = compare.compare(old, payload, config.getoption("--regression-pct"))
+        for line in lines:
+            terminalreporter.write_line(line)
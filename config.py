@@ -8,6 +8,25 @@ DB_FOLDER = os.path.join(BASE_DIR, "data")
 DB_NAME = "ceramic_admin.db"
 DB_PATH = os.path.join(DB_FOLDER, DB_NAME)
 
+# Authentication
+# bcrypt cost factor for new hashes; older hashes are upgraded on the next login
+BCRYPT_ROUNDS = int(os.environ.get("AMICANDO_BCRYPT_ROUNDS", "12"))
+AUTH_WORKERS = 2             # bcrypt threads (bcrypt releases the GIL)
+AUTH_MAX_PENDING = 8         # queued verifications beyond this are refused
+AUTH_VERIFY_TIMEOUT_S = 10
+LOGIN_BURST = 5              # attempts allowed at once per username on one IP
+LOGIN_REFILL_PER_MIN = 6     # attempts regained per minute
+LOGIN_IP_BURST = 20          # attempts allowed at once per IP, any username
+LOGIN_IP_REFILL_PER_MIN = 20
+
+# Query profiling (utils/query_stats.py): per-shape p50/p95 and slow-query log.
+# Off by default: every statement then pays for a caller lookup, a fingerprint and a lock.
+QUERY_PROFILING = os.environ.get("AMICANDO_QUERY_PROFILING", "0") == "1"
+SLOW_QUERY_MS = int(os.environ.get("AMICANDO_SLOW_QUERY_MS", "200"))
+# Page profiling (utils/page_profiler.py): section timings per page run, for every session.
+# Off by default; admins can also turn it on for their own session on the Perfil_Paginas page.
+PAGE_PROFILING = os.environ.get("AMICANDO_PAGE_PROFILING", "0") == "1"
+
 # Logging Configuration
 LOG_FOLDER = os.path.join(BASE_DIR, "logs")
 LOG_FILE = os.path.join(LOG_FOLDER, "amicando.log")
@@ -15,6 +34,15 @@ MAX_LOG_SIZE_MB = 5
 BACKUP_COUNT = 5
 LOG_FORMAT = "%(asctime)s | %(levelname)-8s | %(name)s | %(message)s"
 DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+# One JSON object per line in the log file (for log shippers)
+LOG_JSON = os.environ.get("AMICANDO_LOG_JSON", "0") == "1"
+# Keep 1 of every N DEBUG/INFO/WARNING records of each message shape (the text with
+# numbers masked) in these loggers; the first of a shape and errors always pass
+LOG_SAMPLING = {
+    'services.admin_service': 10,   # repeated import warnings
+    'services.product_service': 10, # per-product image parsing
+    'reports': 10,                  # per-image PDF warnings
+}
 
 # Assets & Backups
 ASSETS_DIR = os.path.join(BASE_DIR, "assets")
@@ -1,7 +1,10 @@
 import sqlite3
 import os
 import contextlib
+import threading
+import time
 import config
+from utils import query_stats
 from utils.logging_config import get_logger
 
 logger = get_logger(__name__)
@@ -10,8 +13,132 @@ DB_FOLDER = config.DB_FOLDER
 DB_NAME = config.DB_NAME
 DB_PATH = config.DB_PATH
 
+# (item_type, table, stock column) tracked by the stock ledger triggers
+STOCK_LEDGER_SOURCES = (
+    ('product', 'products', 'stock_quantity'),
+    ('variant', 'product_variants', 'stock_quantity'),
+    ('material', 'materials', 'stock_level'),
+)
+
+# --- Query instrumentation ---
+# Connections come from InstrumentedConnection when config.QUERY_PROFILING is
+# on: each statement's shape, duration (execute to last fetch), row count and
+# caller go to utils.query_stats (p50/p95 per shape, slow-query log). A SELECT
+# is recorded when its rows run out, on close, or when the cursor is collected
+# (conn.execute(...).fetchone() never runs out).
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """sqlite3 cursor that reports each statement to utils.query_stats."""
+    _sql = None
+    _rows = 0
+    _elapsed = 0.0
+
+    def _begin(self, sql):
+        self._finish()
+        self._sql = sql
+        self._rows = 0
+        self._elapsed = 0.0
+
+    def _finish(self):
+        sql = self._sql
+        if sql is not None:
+            self._sql = None
+            query_stats.record(sql, self._elapsed, self._rows)
+
+    def execute(self, sql, parameters=()):
+        self._begin(sql)
+        start = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        finally:
+            self._elapsed += time.perf_counter() - start
+            if self.description is None:
+                self._rows = self.rowcount
+                self._finish()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._begin(sql)
+        start = time.perf_counter()
+        try:
+            super().executemany(sql, seq_of_parameters)
+        finally:
+            self._elapsed += time.perf_counter() - start
+            self._rows = self.rowcount
+            self._finish()
+        return self
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._elapsed += time.perf_counter() - start
+        if row is None:
+            self._finish()
+        else:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._elapsed += time.perf_counter() - start
+        self._rows += len(rows)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._elapsed += time.perf_counter() - start
+        self._rows += len(rows)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._elapsed += time.perf_counter() - start
+            self._finish()
+            raise
+        self._elapsed += time.perf_counter() - start
+        self._rows += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # Partially read cursors (single-row lookups) are recorded with the time spent so far
+        self._finish()
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3 connection whose cursors (including conn.execute) are instrumented."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+# Cleared while a restore swaps the database contents: new connections wait for it
+_maintenance_gate = threading.Event()
+_maintenance_gate.set()
+_maintenance_lock = threading.Lock()
+MAINTENANCE_WAIT_S = 60
+
 def get_connection():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False, timeout=30)
+    if not _maintenance_gate.wait(MAINTENANCE_WAIT_S):
+        raise sqlite3.OperationalError("Banco em manutenção (restauração em andamento)")
+    factory = InstrumentedConnection if config.QUERY_PROFILING else sqlite3.Connection
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, timeout=30, factory=factory)
     conn.execute("PRAGMA journal_mode=WAL")
     # run_migrations(conn) # Ensure DB is always up to date (Removed: Locking DB)
     return conn
@@ -25,109 +152,41 @@ def db_session():
     finally:
         conn.close()
 
-def run_migrations(conn):
-    cursor = conn.cursor()
-    
-    # --- Migrations for Existing Tables ---
-    
-    # 1. Materials: Add 'type', 'supplier_id', 'category_id', 'image_path'
-    try:
-        cursor.execute("ALTER TABLE materials ADD COLUMN type TEXT DEFAULT 'Material'")
-    except sqlite3.OperationalError as e:
-        logger.warning(f"Migration (materials.type): {e}")
-        
-    try:
-        cursor.execute("ALTER TABLE materials ADD COLUMN supplier_id INTEGER")
-    except sqlite3.OperationalError as e:
-        logger.warning(f"Migration (materials.supplier_id): {e}")
-
-    try:
-        cursor.execute("ALTER TABLE materials ADD COLUMN category_id INTEGER")
-    except sqlite3.OperationalError as e:
-        logger.warning(f"Migration (materials.category_id): {e}")
-
-    try:
-        cursor.execute("ALTER TABLE materials ADD COLUMN image_path TEXT")
-    except sqlite3.OperationalError as e:
-        logger.warning(f"Migration (materials.image_path): {e}")
-
-    # 2. Sales: Add 'client_id'
-    try:
-        cursor.execute("ALTER TABLE sales ADD COLUMN client_id INTEGER")
-    except sqlite3.OperationalError: pass
-
-    # 3. Commission Orders: Add 'image_paths' for reference photos
-    try:
-        cursor.execute("ALTER TABLE commission_orders ADD COLUMN image_paths TEXT")
-    except sqlite3.OperationalError: pass
-
-    # inventory transactions (stock history) - ensuring existence
-    # Moved to init_db or handled there.
-    # Check if table exists before create in migration is fine, but init_db handles creation.
-    
-    # 10. Production Losses (Migration stage)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS production_losses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            product_id INTEGER,
-            variant_id INTEGER,
-            stage TEXT,
-            quantity INTEGER,
-            reason TEXT,
-            order_id INTEGER,
-            FOREIGN KEY (product_id) REFERENCES products(id),
-            FOREIGN KEY (variant_id) REFERENCES product_variants(id),
-            FOREIGN KEY (order_id) REFERENCES commission_orders(id)
-        )
-    ''')
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_losses_product ON production_losses(product_id)")
-
-    # 11. Student Consumptions: Add 'payment_date', 'material_id'
-    try:
-        cursor.execute("ALTER TABLE student_consumptions ADD COLUMN payment_date TEXT")
-    except sqlite3.OperationalError: pass
-
-    try:
-        cursor.execute("ALTER TABLE student_consumptions ADD COLUMN material_id INTEGER")
-    except sqlite3.OperationalError: pass
-
-    try:
-        cursor.execute("ALTER TABLE tuitions ADD COLUMN created_at TEXT")
-    except sqlite3.OperationalError: pass
-
-    # 13. Settings Table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS settings (
-            key TEXT PRIMARY KEY,
-            value TEXT
-        )
-    ''')
-    
-    # Initialize default settings
-    cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('backup_frequency', 'Diário')")
-    cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('last_backup_timestamp', '2000-01-01T00:00:00')")
-
-    # 14. Partial Payments (Classes Module)
-    try:
-        cursor.execute("ALTER TABLE tuitions ADD COLUMN amount_paid REAL DEFAULT 0")
-    except sqlite3.OperationalError: pass
-
+@contextlib.contextmanager
+def maintenance_mode():
+    """
+    Holds new connections back (get_connection waits) while the block runs.
+    Connections already open keep working; SQLite locking serializes them
+    against the maintenance writer.
+    """
+    if not _maintenance_lock.acquire(blocking=False):
+        raise RuntimeError("Outra manutenção do banco já está em andamento")
+    _maintenance_gate.clear()
     try:
-        cursor.execute("ALTER TABLE student_consumptions ADD COLUMN amount_paid REAL DEFAULT 0")
-    except sqlite3.OperationalError: pass
+        yield
+    finally:
+        _maintenance_gate.set()
+        _maintenance_lock.release()
 
-    conn.commit()
+def in_maintenance():
+    return not _maintenance_gate.is_set()
 
-def init_db():
-    if not os.path.exists(DB_FOLDER):
-        os.makedirs(DB_FOLDER)
+# --- Schema Migrations ---
+# The schema is built by the ordered steps in MIGRATIONS (bottom of this module).
+# Applied steps are recorded in schema_version, so a current database costs a
+# single SELECT at startup. Steps must stay idempotent: databases created
+# before versioning replay every step once.
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+def _column_exists(cursor, table, column):
+    return any(row[1] == column for row in cursor.execute(f"PRAGMA table_info({table})"))
 
-    # --- Table Creations ---
+def _add_column(cursor, table, column, definition):
+    """ALTER TABLE ... ADD COLUMN, skipped when the column already exists."""
+    if not _column_exists(cursor, table, column):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
 
+def _migration_baseline(cursor):
+    """Schema as of the first versioned release (tables, indexes, legacy columns, seeds)."""
     # Material Categories
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS material_categories (
@@ -296,7 +355,6 @@ def init_db():
                 cursor.execute("INSERT INTO expense_categories (name) VALUES (?)", (d,))
             except Exception:
                 pass
-        conn.commit()
 
     # Firings (Update existing if needed, else created above)
     cursor.execute('''
@@ -312,150 +370,17 @@ def init_db():
             FOREIGN KEY (kiln_id) REFERENCES kilns (id)
         )
     ''')
-    
-    # ...
-
-    # --- Migrations for Existing Tables ---
-    
-    # ... (previous materials migrations)
 
-    # 3. Firings: Add 'kiln_id', 'observation', 'image_path'
-    try:
-        cursor.execute("ALTER TABLE firings ADD COLUMN kiln_id INTEGER")
-    except sqlite3.OperationalError: pass
-
-    try:
-        cursor.execute("ALTER TABLE firings ADD COLUMN observation TEXT")
-    except sqlite3.OperationalError: pass
-
-    try:
-        cursor.execute("ALTER TABLE firings ADD COLUMN image_path TEXT")
-    except sqlite3.OperationalError: pass
-
-    # 4. Fixed Costs: Add 'due_day', 'periodicity', 'category'
-    try:
-        cursor.execute("ALTER TABLE fixed_costs ADD COLUMN due_day INTEGER")
-    except sqlite3.OperationalError: pass
-    
-    try:
-        cursor.execute("ALTER TABLE fixed_costs ADD COLUMN periodicity TEXT")
-    except sqlite3.OperationalError: pass
-    
-    try:
-        cursor.execute("ALTER TABLE fixed_costs ADD COLUMN category TEXT")
-    except sqlite3.OperationalError: pass
-
-    # 5. Sales: Add 'discount', 'payment_method', 'notes', 'salesperson'
-    try:
-        cursor.execute("ALTER TABLE sales ADD COLUMN discount REAL DEFAULT 0")
-    except sqlite3.OperationalError: pass
-
-    try:
-        cursor.execute("ALTER TABLE sales ADD COLUMN payment_method TEXT")
-    except sqlite3.OperationalError: pass
-
-    try:
-        cursor.execute("ALTER TABLE sales ADD COLUMN notes TEXT")
-    except sqlite3.OperationalError: pass
-    
-    try:
-        cursor.execute("ALTER TABLE sales ADD COLUMN salesperson TEXT")
-    except sqlite3.OperationalError: pass
-
-    try:
-        cursor.execute("ALTER TABLE sales ADD COLUMN order_id TEXT")
-    except sqlite3.OperationalError: pass
-
-    # 6. Sales & Commission Items: Add 'variant_id'
-    try:
-        cursor.execute("ALTER TABLE sales ADD COLUMN variant_id INTEGER REFERENCES product_variants(id)")
-    except sqlite3.OperationalError: pass
-
-    try:
-        cursor.execute("ALTER TABLE commission_items ADD COLUMN variant_id INTEGER REFERENCES product_variants(id)")
-    except sqlite3.OperationalError: pass
-
-    # 7. Create product_kits table (Migration)
-    # 7. Create product_kits table (Migration) - Handled in init_db bottom section or consolidated
-    # Removing duplicate create here if it exists below.
-    # Actually, keep it here if it's considered a migration for old DBs? 
-    # But init_db has it at the bottom.
-    pass
-
-
-    # 8. Students: Add 'class_id' (Migration)
-    try:
-        cursor.execute("ALTER TABLE students ADD COLUMN class_id INTEGER")
-    except sqlite3.OperationalError: pass
-    
-    # 9. Product Variants (Migration)
-    try:
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS product_variants (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                product_id INTEGER,
-                variant_name TEXT,
-                stock_quantity INTEGER DEFAULT 0,
-                price_adder REAL DEFAULT 0.0,
-                material_id INTEGER,
-                FOREIGN KEY (product_id) REFERENCES products(id),
-                FOREIGN KEY (material_id) REFERENCES materials(id)
-            )
-        ''')
-        # Check if indices exist, if not create them (Migration safe)
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_prod_variants_product ON product_variants(product_id)")
-    except Exception: pass
-
-    # 10. Commission Items: Add 'notes', 'variant_id'
-    try:
-        cursor.execute("ALTER TABLE commission_items ADD COLUMN notes TEXT")
-    except sqlite3.OperationalError: pass
-
-    # 11. Quote Items: Add 'item_notes', 'variant_id'
-    try:
-        cursor.execute("ALTER TABLE quote_items ADD COLUMN item_notes TEXT")
-    except sqlite3.OperationalError: pass
-
-    try:
-        cursor.execute("ALTER TABLE quote_items ADD COLUMN variant_id INTEGER REFERENCES product_variants(id)")
-    except sqlite3.OperationalError: pass
-
-    # 12. Quotes: Add 'delivery_terms', 'payment_terms'
-    try:
-        cursor.execute("ALTER TABLE quotes ADD COLUMN delivery_terms TEXT")
-    except sqlite3.OperationalError: pass
-
-    try:
-        cursor.execute("ALTER TABLE quotes ADD COLUMN payment_terms TEXT")
-    except sqlite3.OperationalError: pass
-
-    # 13. Product Variants: Add 'material_quantity'
-    try:
-        cursor.execute("ALTER TABLE product_variants ADD COLUMN material_quantity REAL DEFAULT 0.0")
-    except sqlite3.OperationalError: pass
-
-
-
-
-
-    # Security Upgrade: Password reset REMOVED (User request)
-    # Admin creation is handled by auth.create_default_admin
-    pass
-
-    conn.commit()
-    
     # Seed Kilns
     cursor.execute("SELECT count(*) FROM kilns")
     if cursor.fetchone()[0] == 0:
         cursor.execute("INSERT INTO kilns (name) VALUES ('Jung (Pequeno)')")
         cursor.execute("INSERT INTO kilns (name) VALUES ('Arimbá (Grande)')")
-        conn.commit()
 
     # Ensure default data for categories (previous)
     cursor.execute("SELECT count(*) FROM material_categories")
     if cursor.fetchone()[0] == 0:
         cursor.execute("INSERT INTO material_categories (name) VALUES ('Geral')")
-        conn.commit()
 
     # Ensure default data for Product categories
     cursor.execute("SELECT count(*) FROM product_categories")
@@ -463,7 +388,6 @@ def init_db():
         def_prods = ["Utilitário", "Decorativo", "Outros"]
         for dp in def_prods:
             cursor.execute("INSERT INTO product_categories (name) VALUES (?)", (dp,))
-        conn.commit()
 
     # Products
     cursor.execute('''
@@ -730,7 +654,23 @@ def init_db():
         )
     ''')
     
-    # Production Losses (Breakage Tracking) - Handled in run_migrations
+    # Production Losses (Breakage Tracking)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS production_losses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            product_id INTEGER,
+            variant_id INTEGER,
+            stage TEXT,
+            quantity INTEGER,
+            reason TEXT,
+            order_id INTEGER,
+            FOREIGN KEY (product_id) REFERENCES products(id),
+            FOREIGN KEY (variant_id) REFERENCES product_variants(id),
+            FOREIGN KEY (order_id) REFERENCES commission_orders(id)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_losses_product ON production_losses(product_id)")
     
     # Commission Orders indexes
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_status ON commission_orders(status)")
@@ -755,19 +695,738 @@ def init_db():
 
     # Product Variants indexes
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_prod_variants_product ON product_variants(product_id)")
-    
+
+    # Columns added to early databases (new tables already have them)
+    _add_column(cursor, 'materials', 'type', "TEXT DEFAULT 'Material'")
+    _add_column(cursor, 'materials', 'supplier_id', "INTEGER")
+    _add_column(cursor, 'materials', 'category_id', "INTEGER")
+    _add_column(cursor, 'materials', 'image_path', "TEXT")
+    _add_column(cursor, 'firings', 'kiln_id', "INTEGER")
+    _add_column(cursor, 'firings', 'observation', "TEXT")
+    _add_column(cursor, 'firings', 'image_path', "TEXT")
+    _add_column(cursor, 'fixed_costs', 'due_day', "INTEGER")
+    _add_column(cursor, 'fixed_costs', 'periodicity', "TEXT")
+    _add_column(cursor, 'fixed_costs', 'category', "TEXT")
+    _add_column(cursor, 'sales', 'client_id', "INTEGER")
+    _add_column(cursor, 'sales', 'discount', "REAL DEFAULT 0")
+    _add_column(cursor, 'sales', 'payment_method', "TEXT")
+    _add_column(cursor, 'sales', 'notes', "TEXT")
+    _add_column(cursor, 'sales', 'salesperson', "TEXT")
+    _add_column(cursor, 'sales', 'order_id', "TEXT")
+    _add_column(cursor, 'sales', 'variant_id', "INTEGER REFERENCES product_variants(id)")
+    _add_column(cursor, 'commission_orders', 'image_paths', "TEXT")
+    _add_column(cursor, 'commission_items', 'variant_id', "INTEGER REFERENCES product_variants(id)")
+    _add_column(cursor, 'commission_items', 'notes', "TEXT")
+    _add_column(cursor, 'students', 'class_id', "INTEGER")
+    _add_column(cursor, 'quote_items', 'item_notes', "TEXT")
+    _add_column(cursor, 'quote_items', 'variant_id', "INTEGER REFERENCES product_variants(id)")
+    _add_column(cursor, 'quotes', 'delivery_terms', "TEXT")
+    _add_column(cursor, 'quotes', 'payment_terms', "TEXT")
+    _add_column(cursor, 'product_variants', 'material_quantity', "REAL DEFAULT 0.0")
+    _add_column(cursor, 'student_consumptions', 'payment_date', "TEXT")
+    _add_column(cursor, 'student_consumptions', 'material_id', "INTEGER")
+    _add_column(cursor, 'tuitions', 'created_at', "TEXT")
+
+    # Partial Payments (Classes Module)
+    _add_column(cursor, 'tuitions', 'amount_paid', "REAL DEFAULT 0")
+    _add_column(cursor, 'student_consumptions', 'amount_paid', "REAL DEFAULT 0")
+
+def _migration_inventory_unit_cost(cursor):
+    """Inventory Transactions: unit cost applied at the time (see services/cost_service.py)."""
+    _add_column(cursor, 'inventory_transactions', 'unit_cost', "REAL")
+
+    # Consumption rows without an explicit cost take the current average price
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_inv_trans_unit_cost
+        AFTER INSERT ON inventory_transactions
+        WHEN NEW.unit_cost IS NULL AND NOT (NEW.type = 'ENTRADA' AND NEW.cost IS NOT NULL)
+        BEGIN
+            UPDATE inventory_transactions
+            SET unit_cost = (SELECT price_per_unit FROM materials WHERE id = NEW.material_id)
+            WHERE id = NEW.id;
+        END
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_inv_trans_material_date ON inventory_transactions(material_id, date)")
+
+def _migration_tuition_period(cursor):
+    """Tuitions: ISO reference month (YYYY-MM-01) derived from month_year (MM/AAAA)."""
+    _add_column(cursor, 'tuitions', 'period_date', "TEXT")
+    cursor.execute("""
+        UPDATE tuitions SET period_date = SUBSTR(month_year, 4, 4) || '-' || SUBSTR(month_year, 1, 2) || '-01'
+        WHERE period_date IS NULL AND month_year GLOB '[0-9][0-9]/[0-9][0-9][0-9][0-9]'
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tuitions_status_period ON tuitions(status, period_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tuitions_student_period ON tuitions(student_id, period_date)")
+
+def _migration_backup_metrics(cursor):
+    """Backup Metrics: one row per backup run (see utils/backup_utils.py)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS backup_metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at TEXT NOT NULL,
+            finished_at TEXT,
+            kind TEXT NOT NULL, -- full
+            file_name TEXT,
+            db_size_bytes INTEGER,
+            file_size_bytes INTEGER,
+            duration_s REAL,
+            status TEXT NOT NULL, -- ok, erro
+            error TEXT
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_backup_metrics_started ON backup_metrics(started_at)")
+
+# Monthly audit archives: audit_log_YYYYMM, same columns as audit_log (payloads zlib-compressed)
+AUDIT_ARCHIVE_PREFIX = 'audit_log_'
+
+def create_audit_archive(cursor, period):
+    """Creates the archive table for `period` (YYYYMM) and returns its name."""
+    if not (len(period) == 6 and period.isdigit()):
+        raise ValueError(f"Período de arquivo inválido: {period}")
+    table = f"{AUDIT_ARCHIVE_PREFIX}{period}"
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY,
+            timestamp TEXT NOT NULL,
+            user_id INTEGER,
+            username TEXT,
+            action TEXT NOT NULL,
+            table_name TEXT NOT NULL,
+            record_id INTEGER,
+            old_data BLOB,
+            new_data BLOB
+        )
+    ''')
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_record ON {table}(table_name, record_id, timestamp)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_user ON {table}(username, timestamp)")
+    return table
+
+def _migration_audit_indexes(cursor):
+    """Audit Log: composite indexes for record history and per-user listing."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_record ON audit_log(table_name, record_id, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_user ON audit_log(username, timestamp)")
+    # Prefix of idx_audit_record
+    cursor.execute("DROP INDEX IF EXISTS idx_audit_table")
+
+def _migration_audit_checkpoints(cursor):
+    """Audit Checkpoints: full record states that bound audit replay (see audit.reconstruct_record)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS audit_checkpoints (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            record_id INTEGER NOT NULL,
+            taken_at TEXT NOT NULL,
+            state BLOB -- NULL: record did not exist at taken_at
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_checkpoints_record ON audit_checkpoints(table_name, record_id, taken_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_checkpoints_taken ON audit_checkpoints(taken_at)")
+
+def _migration_users_auth_version(cursor):
+    """Users: auth_version stamp, bumped on any change that affects open sessions (see auth.require_login)."""
+    _add_column(cursor, 'users', 'auth_version', "INTEGER NOT NULL DEFAULT 0")
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_users_auth_version
+        AFTER UPDATE OF username, password_hash, role, name, active ON users
+        BEGIN
+            UPDATE users SET auth_version = auth_version + 1 WHERE id = NEW.id;
+        END
+    ''')
+
+def _migration_page_metrics(cursor):
+    """Page Metrics: per-section timings written by utils.page_profiler (opt-in)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS page_metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            recorded_at TEXT NOT NULL,
+            run_id TEXT NOT NULL,
+            page TEXT NOT NULL,
+            section TEXT NOT NULL, -- 'total' for the whole run
+            duration_ms REAL,
+            sql_ms REAL,
+            queries INTEGER,
+            widgets INTEGER,
+            elements INTEGER,
+            render_ms REAL, -- time inside Streamlit widget/element calls
+            reruns INTEGER, -- st.rerun() calls chained before this run ('total' only)
+            status TEXT -- ok / rerun / interrompida ('total' only)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_page_metrics_page ON page_metrics(page, section, recorded_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_page_metrics_recorded ON page_metrics(recorded_at)")
+
+def _migration_statement_imports(cursor):
+    """Statement Imports: one row per bank statement line applied, so re-imports skip it."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS statement_imports (
+            line_key TEXT PRIMARY KEY, -- student_service.statement_line_keys
+            student_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            amount REAL NOT NULL,
+            imported_at TEXT NOT NULL
+        )
+    ''')
+
+def _migration_inventory_returns(cursor):
+    """
+    Inventory Transactions: is_return flags the ENTRADA rows that put stock back
+    (cancellations), so the cost replay never takes them for purchases. Rows
+    written before the flag are recognised once by their 'Estorno' notes.
+    """
+    _add_column(cursor, 'inventory_transactions', 'is_return', "INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("UPDATE inventory_transactions SET is_return = 1 WHERE type = 'ENTRADA' AND notes LIKE 'Estorno%'")
+
+def _migration_tuition_unique_month(cursor):
+    """Tuitions: one per student per month (bulk billing relies on it)."""
+    try:
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_tuitions_student_month ON tuitions(student_id, month_year)")
+    except sqlite3.IntegrityError as e:
+        logger.warning(f"Migration (tuitions unique index): duplicated months found, using non-unique index: {e}")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_tuitions_student_month_dup ON tuitions(student_id, month_year)")
+
+
+# (entity, table, rowid slot, indexed columns, title expr, body expr) for search_index.
+# FTS rowid = source id * len(SEARCH_SOURCES) + slot, so triggers can address a row directly.
+SEARCH_SOURCES = (
+    ('product', 'products', 0, 'name, description, category',
+     "{r}.name", "COALESCE({r}.category, '') || ' ' || COALESCE({r}.description, '')"),
+    ('client', 'clients', 1, 'name, contact, phone, email',
+     "{r}.name", "COALESCE({r}.contact, '') || ' ' || COALESCE({r}.phone, '') || ' ' || COALESCE({r}.email, '')"),
+    ('material', 'materials', 2, 'name',
+     "{r}.name", "''"),
+    ('order', 'commission_orders', 3, 'notes',
+     "'Encomenda #' || {r}.id", "COALESCE({r}.notes, '')"),
+)
+
+def create_search_index(cursor):
+    """
+    Creates the FTS5 search_index over products, clients, materials and
+    order notes, with triggers to keep it current. Skipped (search falls back
+    to LIKE) when the SQLite build has no FTS5.
+    """
+    try:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+                entity UNINDEXED, entity_id UNINDEXED, title, body,
+                tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        logger.warning(f"Migration (search_index): FTS5 unavailable, search will use LIKE: {e}")
+        return
+
+    n = len(SEARCH_SOURCES)
+    for entity, table, slot, columns, title_expr, body_expr in SEARCH_SOURCES:
+        insert_new = f"""
+            INSERT INTO search_index (rowid, entity, entity_id, title, body)
+            VALUES (NEW.id * {n} + {slot}, '{entity}', NEW.id, {title_expr.format(r='NEW')}, {body_expr.format(r='NEW')});
+        """
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_search_{table}_ins AFTER INSERT ON {table}
+            BEGIN {insert_new} END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_search_{table}_upd AFTER UPDATE OF {columns} ON {table}
+            BEGIN
+                DELETE FROM search_index WHERE rowid = OLD.id * {n} + {slot};
+                {insert_new}
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_search_{table}_del AFTER DELETE ON {table}
+            BEGIN
+                DELETE FROM search_index WHERE rowid = OLD.id * {n} + {slot};
+            END
+        """)
+
+    cursor.execute("SELECT COUNT(*) FROM search_index")
+    if cursor.fetchone()[0] == 0:
+        rebuild_search_index(cursor)
+
+def rebuild_search_index(cursor):
+    """Refills search_index from the source tables."""
+    n = len(SEARCH_SOURCES)
+    cursor.execute("DELETE FROM search_index")
+    for entity, table, slot, _columns, title_expr, body_expr in SEARCH_SOURCES:
+        cursor.execute(f"""
+            INSERT INTO search_index (rowid, entity, entity_id, title, body)
+            SELECT src.id * {n} + {slot}, '{entity}', src.id, {title_expr.format(r='src')}, {body_expr.format(r='src')}
+            FROM {table} src
+        """)
+
+# Recomputes student_balances rows. `{tuition_filter}`, `{consumption_filter}`,
+# `{ledger_filter}` and `{student_filter}` narrow it to one student (named param :sid) or are empty.
+STUDENT_BALANCE_REFRESH = """
+    INSERT OR REPLACE INTO student_balances (student_id, total_due, oldest_pending_date, last_payment, updated_at)
+    WITH pending AS (
+        SELECT student_id, amount - COALESCE(amount_paid, 0) as due, period_date as d
+        FROM tuitions WHERE status = 'Pendente'{tuition_filter}
+        UNION ALL
+        SELECT student_id, total_value - COALESCE(amount_paid, 0), SUBSTR(date, 1, 10)
+        FROM student_consumptions WHERE status = 'Pendente'{consumption_filter}
+    ),
+    due AS (
+        SELECT student_id, SUM(due) as total_due, MIN(d) as oldest FROM pending GROUP BY student_id
+    ),
+    paid AS (
+        SELECT student_id, MAX(date) as last_payment FROM ledger_entries
+        WHERE student_id IS NOT NULL AND amount > 0{ledger_filter} GROUP BY student_id
+    )
+    SELECT s.id, COALESCE(due.total_due, 0), due.oldest, paid.last_payment, datetime('now', 'localtime')
+    FROM students s
+    LEFT JOIN due ON due.student_id = s.id
+    LEFT JOIN paid ON paid.student_id = s.id
+    {student_filter}
+"""
+
+def create_student_balances(cursor):
+    """
+    Creates student_balances (one row per student: amount due, oldest pending
+    date, last payment) and fills it on first run.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS student_balances (
+            student_id INTEGER PRIMARY KEY,
+            total_due REAL NOT NULL DEFAULT 0,
+            oldest_pending_date TEXT, -- YYYY-MM-DD
+            last_payment TEXT, -- YYYY-MM-DD
+            updated_at TEXT,
+            FOREIGN KEY (student_id) REFERENCES students(id)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_student_balances_due ON student_balances(total_due)")
+    # Per-student refreshes read pending items by student
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tuitions_student_status ON tuitions(student_id, status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_consumptions_student_status ON student_consumptions(student_id, status)")
+
+    cursor.execute("SELECT COUNT(*) FROM student_balances")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(STUDENT_BALANCE_REFRESH.format(
+            tuition_filter='', consumption_filter='', ledger_filter='', student_filter=''
+        ))
+
+# (kind, table, date expr, amount expr, condition, description expr, student expr) for ledger_entries
+# Sales and expenses count on their own date; class revenue counts when money is received.
+LEDGER_SOURCES = (
+    ('venda', 'sales', "COALESCE(date({r}.date), SUBSTR({r}.date, 1, 10))", "{r}.total_price",
+     "1", "'Venda #' || {r}.id", "NULL"),
+    ('despesa', 'expenses', "COALESCE(date({r}.date), SUBSTR({r}.date, 1, 10))", "{r}.amount",
+     "1", "{r}.description", "NULL"),
+    ('mensalidade', 'tuitions', "{r}.payment_date",
+     "CASE WHEN {r}.status = 'Pago' THEN {r}.amount ELSE COALESCE({r}.amount_paid, 0) END",
+     "({r}.status = 'Pago' OR ({r}.status = 'Pendente' AND COALESCE({r}.amount_paid, 0) > 0))",
+     "'Mensalidade ' || {r}.month_year", "{r}.student_id"),
+    ('consumo', 'student_consumptions', "{r}.payment_date",
+     "CASE WHEN {r}.status = 'Pago' THEN {r}.total_value ELSE COALESCE({r}.amount_paid, 0) END",
+     "({r}.status = 'Pago' OR ({r}.status = 'Pendente' AND COALESCE({r}.amount_paid, 0) > 0))",
+     "{r}.description", "{r}.student_id"),
+)
+
+def create_ledger_entries(cursor):
+    """
+    Creates ledger_entries, one row per money-moving record (sale, expense,
+    received tuition or consumption), kept in sync by triggers on the source
+    tables so every write path feeds it.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ledger_entries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL, -- YYYY-MM-DD (data do caixa)
+            kind TEXT NOT NULL, -- venda, despesa, mensalidade, consumo
+            amount REAL NOT NULL,
+            source_table TEXT NOT NULL,
+            source_id INTEGER NOT NULL,
+            student_id INTEGER,
+            description TEXT,
+            UNIQUE (source_table, source_id)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ledger_date_kind ON ledger_entries(date, kind)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ledger_student ON ledger_entries(student_id, date)")
+
+    today_sql = "date('now', 'localtime')"
+    for kind, table, date_expr, amount_expr, cond, desc_expr, student_expr in LEDGER_SOURCES:
+        fmt = lambda expr: expr.format(r='NEW')
+        upsert = f'''
+                INSERT INTO ledger_entries (date, kind, amount, source_table, source_id, student_id, description)
+                SELECT COALESCE({fmt(date_expr)}, {today_sql}), '{kind}', {fmt(amount_expr)}, '{table}', NEW.id,
+                       {fmt(student_expr)}, {fmt(desc_expr)}
+                WHERE {fmt(cond)}
+                ON CONFLICT(source_table, source_id) DO UPDATE SET
+                    date = COALESCE({fmt(date_expr)}, ledger_entries.date),
+                    amount = excluded.amount,
+                    student_id = excluded.student_id,
+                    description = excluded.description;
+        '''
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_ledger_{table}_ins AFTER INSERT ON {table}
+            BEGIN {upsert} END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_ledger_{table}_upd AFTER UPDATE ON {table}
+            BEGIN
+                DELETE FROM ledger_entries WHERE source_table = '{table}' AND source_id = NEW.id AND NOT {fmt(cond)};
+                {upsert}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_ledger_{table}_del AFTER DELETE ON {table}
+            BEGIN
+                DELETE FROM ledger_entries WHERE source_table = '{table}' AND source_id = OLD.id;
+            END
+        ''')
+
+        # Backfill existing records (no-op once they are in)
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO ledger_entries (date, kind, amount, source_table, source_id, student_id, description)
+            SELECT COALESCE({date_expr.format(r='src')}, {today_sql}), '{kind}', {amount_expr.format(r='src')}, '{table}', src.id,
+                   {student_expr.format(r='src')}, {desc_expr.format(r='src')}
+            FROM {table} src WHERE {cond.format(r='src')}
+              AND src.id NOT IN (SELECT source_id FROM ledger_entries WHERE source_table = '{table}')
+        ''')
+
+# Class revenue is cash basis: postings follow the money, not the record's own date
+LEDGER_CASH_BASIS = ('tuitions', 'student_consumptions')
+
+def _migration_ledger_append_only(cursor):
+    """
+    Ledger Entries: append-only postings instead of one mutable row per record.
+    Every change posts the difference; no existing row is moved or rewritten.
+    - sales / expenses post on their own date; moving that date reverses the
+      old day and posts on the new one.
+    - tuitions / consumptions post payments on the payment date and any
+      reduction (reversal, deletion) on the day it happens, so closed months
+      stay closed. A tuition paid 100 in January and 200 in February is two rows.
+    """
+    for _, table, *_ in LEDGER_SOURCES:
+        for suffix in ('ins', 'upd', 'del'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS trg_ledger_{table}_{suffix}")
+
+    # Rebuild without UNIQUE(source_table, source_id); current rows become the opening postings
+    cursor.execute('''
+        CREATE TABLE ledger_entries_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL, -- YYYY-MM-DD (data do caixa)
+            kind TEXT NOT NULL, -- venda, despesa, mensalidade, consumo
+            amount REAL NOT NULL, -- posting (first value or later difference)
+            source_table TEXT NOT NULL,
+            source_id INTEGER NOT NULL,
+            student_id INTEGER,
+            description TEXT,
+            posted_at TEXT -- when the posting was written
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO ledger_entries_new (id, date, kind, amount, source_table, source_id, student_id, description, posted_at)
+        SELECT id, date, kind, amount, source_table, source_id, student_id, description, datetime('now', 'localtime')
+        FROM ledger_entries
+    ''')
+    cursor.execute("DROP TABLE ledger_entries")
+    cursor.execute("ALTER TABLE ledger_entries_new RENAME TO ledger_entries")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ledger_date_kind ON ledger_entries(date, kind)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ledger_student ON ledger_entries(student_id, date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ledger_source ON ledger_entries(source_table, source_id)")
+
+    today_sql = "date('now', 'localtime')"
+    now_sql = "datetime('now', 'localtime')"
+    for kind, table, date_expr, amount_expr, cond, desc_expr, student_expr in LEDGER_SOURCES:
+        def value(r):
+            return f"(CASE WHEN {cond.format(r=r)} THEN COALESCE({amount_expr.format(r=r)}, 0) ELSE 0 END)"
+
+        def day(r):
+            if table in LEDGER_CASH_BASIS:
+                return f"COALESCE(date({r}.payment_date), SUBSTR({r}.payment_date, 1, 10), {today_sql})"
+            return f"COALESCE({date_expr.format(r=r)}, {today_sql})"
+
+        def post(r, date_sql, amount_sql, where):
+            return f'''
+                INSERT INTO ledger_entries (date, kind, amount, source_table, source_id, student_id, description, posted_at)
+                SELECT {date_sql}, '{kind}', {amount_sql}, '{table}', {r}.id,
+                       {student_expr.format(r=r)}, {desc_expr.format(r=r)}, {now_sql}
+                WHERE {where};
+            '''
+
+        delta = f"({value('NEW')} - {value('OLD')})"
+        if table in LEDGER_CASH_BASIS:
+            on_update = post('NEW', f"CASE WHEN {delta} > 0 THEN {day('NEW')} ELSE {today_sql} END", delta,
+                             f"ROUND({delta}, 2) != 0")
+            on_delete = post('OLD', today_sql, f"-{value('OLD')}", f"ROUND({value('OLD')}, 2) != 0")
+        else:
+            same_day = f"({day('NEW')}) IS ({day('OLD')})"
+            on_update = (
+                post('NEW', day('NEW'), delta, f"{same_day} AND ROUND({delta}, 2) != 0")
+                + post('OLD', day('OLD'), f"-{value('OLD')}", f"NOT {same_day} AND ROUND({value('OLD')}, 2) != 0")
+                + post('NEW', day('NEW'), value('NEW'), f"NOT {same_day} AND ROUND({value('NEW')}, 2) != 0")
+            )
+            on_delete = post('OLD', day('OLD'), f"-{value('OLD')}", f"ROUND({value('OLD')}, 2) != 0")
+
+        cursor.execute(f'''
+            CREATE TRIGGER trg_ledger_{table}_ins AFTER INSERT ON {table}
+            BEGIN {post('NEW', day('NEW'), value('NEW'), f"ROUND({value('NEW')}, 2) != 0")} END
+        ''')
+        cursor.execute(f"CREATE TRIGGER trg_ledger_{table}_upd AFTER UPDATE ON {table} BEGIN {on_update} END")
+        cursor.execute(f"CREATE TRIGGER trg_ledger_{table}_del AFTER DELETE ON {table} BEGIN {on_delete} END")
+
+def create_fixed_cost_schedule(cursor):
+    """
+    Adds the columns that key launched fixed costs by (fixed_cost_id, period)
+    and links expenses launched before the scheduler existed.
+    """
+    _add_column(cursor, 'fixed_costs', 'start_date', "TEXT")
+    _add_column(cursor, 'expenses', 'fixed_cost_id', "INTEGER REFERENCES fixed_costs(id)")
+    _add_column(cursor, 'expenses', 'period', "TEXT")
+
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_expenses_fixed_period
+        ON expenses(fixed_cost_id, period) WHERE fixed_cost_id IS NOT NULL
+    ''')
+
+    # Legacy launches were matched by description; duplicates in a period stay unlinked
+    cursor.execute('''
+        UPDATE OR IGNORE expenses SET
+            fixed_cost_id = (SELECT fc.id FROM fixed_costs fc WHERE fc.description = expenses.description),
+            period = (
+                SELECT CASE fc.periodicity
+                    WHEN 'Anual' THEN strftime('%Y', expenses.date)
+                    WHEN 'Trimestral' THEN strftime('%Y', expenses.date) || '-Q' ||
+                        ((CAST(strftime('%m', expenses.date) AS INTEGER) + 2) / 3)
+                    WHEN 'Semanal' THEN (
+                        -- ISO week: year and day-of-year of that week's Thursday
+                        SELECT strftime('%Y', th) || '-W' || printf('%02d', (CAST(strftime('%j', th) AS INTEGER) - 1) / 7 + 1)
+                        FROM (SELECT date(expenses.date, '-' || ((CAST(strftime('%w', expenses.date) AS INTEGER) + 6) % 7) || ' days', '+3 days') as th)
+                    )
+                    ELSE strftime('%Y-%m', expenses.date)
+                END
+                FROM fixed_costs fc WHERE fc.description = expenses.description
+            )
+        WHERE fixed_cost_id IS NULL
+          AND description IN (SELECT description FROM fixed_costs)
+    ''')
+
+def create_product_costs(cursor):
+    """
+    Creates product_costs (one row per product cost version) and links each
+    new sale to the version in effect when it is recorded.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS product_costs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            valid_from TEXT NOT NULL,
+            unit_cost REAL NOT NULL,
+            reason TEXT,
+            FOREIGN KEY (product_id) REFERENCES products(id)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_product_costs_product ON product_costs(product_id, valid_from)")
+
+    _add_column(cursor, 'sales', 'cost_id', "INTEGER REFERENCES product_costs(id)")
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_sales_cost_version
+        AFTER INSERT ON sales
+        WHEN NEW.cost_id IS NULL AND NEW.product_id IS NOT NULL
+        BEGIN
+            UPDATE sales SET cost_id = (
+                SELECT id FROM product_costs WHERE product_id = NEW.product_id
+                ORDER BY valid_from DESC, id DESC LIMIT 1
+            ) WHERE id = NEW.id;
+        END
+    ''')
+
+    # First run: current recipe cost as the version for all past sales
+    cursor.execute("SELECT COUNT(*) FROM product_costs")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute('''
+            INSERT INTO product_costs (product_id, valid_from, unit_cost, reason)
+            SELECT p.id, '1900-01-01', COALESCE(r.cost, 0) + COALESCE(k.cost, 0), 'Inicial'
+            FROM products p
+            LEFT JOIN (
+                SELECT pr.product_id, SUM(pr.quantity * COALESCE(m.price_per_unit, 0)) as cost
+                FROM product_recipes pr JOIN materials m ON pr.material_id = m.id
+                GROUP BY pr.product_id
+            ) r ON r.product_id = p.id
+            LEFT JOIN (
+                SELECT pk.parent_product_id, SUM(pk.quantity * COALESCE(cr.cost, 0)) as cost
+                FROM product_kits pk
+                LEFT JOIN (
+                    SELECT pr.product_id, SUM(pr.quantity * COALESCE(m.price_per_unit, 0)) as cost
+                    FROM product_recipes pr JOIN materials m ON pr.material_id = m.id
+                    GROUP BY pr.product_id
+                ) cr ON cr.product_id = pk.child_product_id
+                GROUP BY pk.parent_product_id
+            ) k ON k.parent_product_id = p.id
+        ''')
+        cursor.execute('''
+            UPDATE sales SET cost_id = (SELECT pc.id FROM product_costs pc WHERE pc.product_id = sales.product_id)
+            WHERE cost_id IS NULL AND product_id IS NOT NULL
+        ''')
+
+def create_stock_ledger(cursor):
+    """
+    Creates the append-only stock ledger, its checkpoint tables and the
+    triggers that feed it from products, product_variants and materials.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_ledger (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            item_type TEXT NOT NULL CHECK( item_type IN ('product', 'variant', 'material') ),
+            item_id INTEGER NOT NULL,
+            delta REAL NOT NULL,
+            balance REAL -- saldo após o movimento
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_stock_ledger_item ON stock_ledger(item_type, item_id, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_stock_ledger_ts ON stock_ledger(timestamp)")
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_checkpoints (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at TEXT NOT NULL,
+            ledger_id INTEGER NOT NULL -- último id do ledger incluído no snapshot
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_stock_checkpoints_created ON stock_checkpoints(created_at)")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_checkpoint_items (
+            checkpoint_id INTEGER NOT NULL,
+            item_type TEXT NOT NULL,
+            item_id INTEGER NOT NULL,
+            balance REAL NOT NULL,
+            PRIMARY KEY (checkpoint_id, item_type, item_id),
+            FOREIGN KEY (checkpoint_id) REFERENCES stock_checkpoints(id)
+        )
+    ''')
+
+    now_sql = "strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime')"
+    for item_type, table, column in STOCK_LEDGER_SOURCES:
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_ledger_{table}_insert
+            AFTER INSERT ON {table}
+            WHEN COALESCE(NEW.{column}, 0) != 0
+            BEGIN
+                INSERT INTO stock_ledger (timestamp, item_type, item_id, delta, balance)
+                VALUES ({now_sql}, '{item_type}', NEW.id, NEW.{column}, NEW.{column});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_ledger_{table}_update
+            AFTER UPDATE OF {column} ON {table}
+            WHEN COALESCE(NEW.{column}, 0) != COALESCE(OLD.{column}, 0)
+            BEGIN
+                INSERT INTO stock_ledger (timestamp, item_type, item_id, delta, balance)
+                VALUES ({now_sql}, '{item_type}', NEW.id,
+                        COALESCE(NEW.{column}, 0) - COALESCE(OLD.{column}, 0), NEW.{column});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_ledger_{table}_delete
+            AFTER DELETE ON {table}
+            WHEN COALESCE(OLD.{column}, 0) != 0
+            BEGIN
+                INSERT INTO stock_ledger (timestamp, item_type, item_id, delta, balance)
+                VALUES ({now_sql}, '{item_type}', OLD.id, -OLD.{column}, 0);
+            END
+        ''')
+
+    # Opening balances: first checkpoint when the ledger is created on an existing database
+    cursor.execute("SELECT COUNT(*) FROM stock_checkpoints")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(
+            "INSERT INTO stock_checkpoints (created_at, ledger_id) "
+            "SELECT strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'), COALESCE(MAX(id), 0) FROM stock_ledger"
+        )
+        checkpoint_id = cursor.lastrowid
+        for item_type, table, column in STOCK_LEDGER_SOURCES:
+            cursor.execute(f'''
+                INSERT INTO stock_checkpoint_items (checkpoint_id, item_type, item_id, balance)
+                SELECT ?, ?, id, COALESCE({column}, 0) FROM {table}
+            ''', (checkpoint_id, item_type))
+
+# (version, name, step) - append only; never renumber or edit an applied step
+MIGRATIONS = (
+    (1, 'baseline', _migration_baseline),
+    (2, 'stock_ledger', create_stock_ledger),
+    (3, 'inventory_unit_cost', _migration_inventory_unit_cost),
+    (4, 'product_costs', create_product_costs),
+    (5, 'fixed_cost_schedule', create_fixed_cost_schedule),
+    (6, 'ledger_entries', create_ledger_entries),
+    (7, 'tuition_period', _migration_tuition_period),
+    (8, 'student_balances', create_student_balances),
+    (9, 'tuition_unique_month', _migration_tuition_unique_month),
+    (10, 'search_index', create_search_index),
+    (11, 'backup_metrics', _migration_backup_metrics),
+    (12, 'audit_indexes', _migration_audit_indexes),
+    (13, 'audit_checkpoints', _migration_audit_checkpoints),
+    (14, 'users_auth_version', _migration_users_auth_version),
+    (15, 'page_metrics', _migration_page_metrics),
+    (16, 'ledger_append_only', _migration_ledger_append_only),
+    (17, 'statement_imports', _migration_statement_imports),
+    (18, 'inventory_returns', _migration_inventory_returns),
+)
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(conn):
+    """Latest applied migration (0 for an empty or pre-versioning database)."""
+    try:
+        row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] or 0
+
+def run_migrations(conn):
+    """
+    Applies pending migrations in order, each in its own transaction.
+    Returns the list of applied versions (empty when already current).
+    """
+    current = get_schema_version(conn)
+    if current >= SCHEMA_VERSION:
+        return []
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    ''')
     conn.commit()
 
-    
-    # Run migrations for existing databases that might miss new columns
-    run_migrations(conn)
-    
-    # Ensure default data for categories
-    # Ensure default data for categories (Duplicate removed)
-    pass
+    applied = []
+    cursor = conn.cursor()
+    for version, name, step in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            cursor.execute("BEGIN")
+            step(cursor)
+            cursor.execute(
+                "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, datetime('now', 'localtime'))",
+                (version, name)
+            )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Migration {version} ({name}) failed: {e}")
+            raise
+        applied.append(version)
+        logger.info(f"Migration {version} ({name}) applied")
+    return applied
 
-    conn.close()
-    print(f"Database initialized and migrated at {DB_PATH}")
+def init_db():
+    """Creates or upgrades the database. A current schema costs one SELECT (no DDL)."""
+    if not os.path.exists(DB_FOLDER):
+        os.makedirs(DB_FOLDER)
+
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        applied = run_migrations(conn)
+    finally:
+        conn.close()
+    if applied:
+        logger.info(f"Database at {DB_PATH} migrated to schema version {SCHEMA_VERSION}")
 
 if __name__ == "__main__":
     init_db()
@@ -1,17 +1,21 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 import database
 import admin_utils
 import auth
-import reports
+import utils.page_profiler as page_profiler
+from utils.lazy_imports import lazy_import
 import io
 import services.production_service as production_service
 import services.product_service as product_service
 import services.report_service as report_service
+import services.stock_ledger_service as stock_ledger_service
 from datetime import datetime, date, timedelta
 
+# Heavy: loaded on first chart / PDF export
+px = lazy_import("plotly.express")
+reports = lazy_import("reports")
+
 @st.cache_data(ttl=300, show_spinner=False)
 def get_cached_sales_data(_conn, start_date, end_date, seller_filter):
     """Fetches sales data for reports."""
@@ -39,12 +43,14 @@ import utils.styles as styles
 styles.apply_custom_style()
 
 admin_utils.render_sidebar_logo()
+profiler = page_profiler.start("Relatorios")
 conn = database.get_connection()
 
 if not auth.require_login(conn):
     st.stop()
 
 auth.render_custom_sidebar()
+profiler.checkpoint("setup")
 st.title("📊 Relatórios")
 
 # --- REPORT TYPE SELECTOR ---
@@ -810,6 +816,12 @@ elif report_key == "profitability":
         report_df = report_service.get_realized_profitability(conn, start_date, end_date, top_limit)
         
         if not report_df.empty:
+            # Products with units sold without any cost version: no margin instead of 100%
+            no_cost = report_df[report_df['QtdSemCusto'] > 0]
+            if not no_cost.empty:
+                st.warning(f"{len(no_cost)} produto(s) com vendas sem custo cadastrado: {', '.join(no_cost['Produto'])}.")
+                info_lines["Sem custo cadastrado"] = ', '.join(no_cost['Produto'])
+
             # Calculate profit margin
             report_df['Lucro'] = report_df['Receita'] - report_df['CustoTotal']
             report_df['Margem %'] = (report_df['Lucro'] / report_df['Receita'] * 100).round(1)
@@ -1010,22 +1022,30 @@ elif report_key == "stock_forecast":
     st.subheader("📦 Previsão de Estoque")
     
     # Filters
-    c1, c2 = st.columns(2)
+    c1, c2, c3 = st.columns(3)
     
     item_type = c1.selectbox("Tipo de Item", ["Produtos", "Insumos"])
     period_days = c2.number_input("Período de Análise (dias)", min_value=30, max_value=365, value=90, step=30)
+    ref_date = c3.date_input("Data de Referência", value=date.today(), max_value=date.today(), format="DD/MM/YYYY")
     
     if st.button("🔄 Gerar Relatório", type="primary"):
         report_title = "Previsão de Estoque"
-        cutoff_date = (date.today() - timedelta(days=period_days)).isoformat()
+        cutoff_date = (ref_date - timedelta(days=period_days)).isoformat()
+        # Past dates read stock from the ledger (checkpoint + movements)
+        as_of = ref_date if ref_date < date.today() else None
+        known_since = stock_ledger_service.stock_known_since(conn)
+        if as_of is not None and known_since is not None and as_of < known_since:
+            st.warning(f"Estoque em {as_of.strftime('%d/%m/%Y')} desconhecido: o histórico de estoque começa em {known_since.strftime('%d/%m/%Y')}.")
+            st.stop()
         info_lines = {
             "Tipo": item_type,
-            "Período de Análise": f"Últimos {period_days} dias"
+            "Período de Análise": f"Últimos {period_days} dias",
+            "Data de Referência": ref_date.strftime('%d/%m/%Y')
         }
         
         if item_type == "Produtos":
             # Products: based on average sales
-            report_df = report_service.get_stock_forecast_products(conn, period_days, cutoff_date)
+            report_df = report_service.get_stock_forecast_products(conn, period_days, cutoff_date, as_of)
             
             if not report_df.empty:
                 # Calculate days until stockout
@@ -1034,7 +1054,7 @@ elif report_key == "stock_forecast":
                     axis=1
                 )
                 report_df['DataPrevista'] = report_df.apply(
-                    lambda x: (date.today() + timedelta(days=x['DiasRestantes'])).strftime('%d/%m/%Y') if x['DiasRestantes'] < 999 else 'Sem previsão',
+                    lambda x: (ref_date + timedelta(days=x['DiasRestantes'])).strftime('%d/%m/%Y') if x['DiasRestantes'] < 999 else 'Sem previsão',
                     axis=1
                 )
                 
@@ -1045,7 +1065,7 @@ elif report_key == "stock_forecast":
                 
         else:  # Insumos
             # Materials: based on average consumption
-            report_df = report_service.get_stock_forecast_materials(conn, period_days, cutoff_date)
+            report_df = report_service.get_stock_forecast_materials(conn, period_days, cutoff_date, as_of)
             
             if not report_df.empty:
                 # Calculate days until stockout
@@ -1054,7 +1074,7 @@ elif report_key == "stock_forecast":
                     axis=1
                 )
                 report_df['DataPrevista'] = report_df.apply(
-                    lambda x: (date.today() + timedelta(days=x['DiasRestantes'])).strftime('%d/%m/%Y') if x['DiasRestantes'] < 999 else 'Sem previsão',
+                    lambda x: (ref_date + timedelta(days=x['DiasRestantes'])).strftime('%d/%m/%Y') if x['DiasRestantes'] < 999 else 'Sem previsão',
                     axis=1
                 )
                 
@@ -1119,13 +1139,20 @@ elif report_key == "dead_stock":
     
     # Type filter
     item_type = c2.selectbox("Tipo de Item", ["Todos", "Produtos", "Insumos"])
+    ref_date = st.date_input("Data de Referência", value=date.today(), max_value=date.today(), format="DD/MM/YYYY")
     
     if st.button("🔄 Gerar Relatório", type="primary"):
         report_title = "Itens sem Movimentação"
-        cutoff_date = (date.today() - timedelta(days=days)).isoformat()
+        cutoff_date = (ref_date - timedelta(days=days)).isoformat()
+        as_of = ref_date if ref_date < date.today() else None
+        known_since = stock_ledger_service.stock_known_since(conn)
+        if as_of is not None and known_since is not None and as_of < known_since:
+            st.warning(f"Estoque em {as_of.strftime('%d/%m/%Y')} desconhecido: o histórico de estoque começa em {known_since.strftime('%d/%m/%Y')}.")
+            st.stop()
         info_lines = {
             "Período": selected_period,
-            "Data de Corte": (date.today() - timedelta(days=days)).strftime('%d/%m/%Y'),
+            "Data de Corte": (ref_date - timedelta(days=days)).strftime('%d/%m/%Y'),
+            "Data de Referência": ref_date.strftime('%d/%m/%Y'),
             "Tipo": item_type
         }
         
@@ -1133,7 +1160,7 @@ elif report_key == "dead_stock":
         
         # Products without sales
         if item_type in ["Todos", "Produtos"]:
-            products_df = report_service.get_dead_stock_products(conn, cutoff_date)
+            products_df = report_service.get_dead_stock_products(conn, cutoff_date, as_of)
             if not products_df.empty:
                 products_df['Tipo'] = 'Produto'
                 products_df['Última Venda'] = products_df['Última Venda'].apply(
@@ -1143,7 +1170,7 @@ elif report_key == "dead_stock":
         
         # Materials without consumption
         if item_type in ["Todos", "Insumos"]:
-            materials_df = report_service.get_dead_stock_materials(conn, cutoff_date)
+            materials_df = report_service.get_dead_stock_materials(conn, cutoff_date, as_of)
             if not materials_df.empty:
                 materials_df['Tipo'] = 'Insumo'
                 materials_df['Último Consumo'] = materials_df['Último Consumo'].apply(
@@ -1539,6 +1566,8 @@ elif report_key == "suppliers":
             'headers': headers, 'totals': totals, 'chart': chart_data
         }
 
+profiler.checkpoint(f"relatorio_{report_key}")
+
 # ============================================================
 # DISPLAY RESULTS AND EXPORT
 # ============================================================
@@ -1681,4 +1710,6 @@ if 'report_data' in st.session_state and st.session_state.report_data:
     else:
         st.info("Nenhum dado encontrado para os filtros selecionados.")
 
+profiler.checkpoint("render")
+profiler.finish()
 conn.close()
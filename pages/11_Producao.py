@@ -2,8 +2,10 @@ import streamlit as st
 import pandas as pd
 import database
 import auth
+import utils.page_profiler as page_profiler
 import services.production_service as production_service
 import services.product_service as product_service
+import services.search_service as search_service
 import admin_utils
 from datetime import date, datetime
 import json
@@ -18,6 +20,7 @@ import utils.styles as styles
 styles.apply_custom_style()
 
 # Check Auth
+profiler = page_profiler.start("Producao")
 conn = database.get_connection()
 if not auth.require_login(conn):
     st.stop()
@@ -27,6 +30,7 @@ if not auth.check_page_access('Producao'):
     st.stop()
 
 auth.render_custom_sidebar()
+profiler.checkpoint("setup")
 
 st.title("🏭 Produção")
 
@@ -55,7 +59,7 @@ with tab_kanban:
             sel_cats_kanban = st.multiselect("Filtrar por Categoria", options=cats_in_wip)
             
         with f_col3:
-            search_query = st.text_input("Buscar Produto", placeholder="Nome do produto...")
+            search_query = st.text_input("Buscar Produto", placeholder="Produto ou observação da encomenda...")
 
     # Apply Filters
     filtered_items = all_items.copy()
@@ -71,7 +75,10 @@ with tab_kanban:
     if sel_cats_kanban:
         filtered_items = filtered_items[filtered_items['product_category'].isin(sel_cats_kanban)]
     if search_query:
-        filtered_items = filtered_items[filtered_items['product_name'].str.contains(search_query, case=False, na=False)]
+        # Matches the product name or the order notes
+        hit_products = search_service.search_ids(conn, 'product', search_query, names_only=True)
+        hit_orders = search_service.search_ids(conn, 'order', search_query)
+        filtered_items = filtered_items[filtered_items['product_id'].isin(hit_products) | filtered_items['real_order_id'].isin(hit_orders)]
 
     cols = st.columns(len(stages))
     
@@ -429,4 +436,5 @@ with tab_analysis:
     else:
         st.info("Nenhum dado encontrado para os filtros selecionados.")
 
+profiler.finish()
 conn.close()
@@ -1,12 +1,17 @@
 import streamlit as st
 import pandas as pd
 import time
+import io
 from datetime import datetime
 import database
 import auth
+import utils.page_profiler as page_profiler
 import admin_utils
 from services import student_service
-import reports
+from utils.lazy_imports import lazy_import
+
+# Heavy (fpdf): loaded on first PDF
+reports = lazy_import("reports")
 
 st.set_page_config(page_title="Gestão de Aulas", page_icon="🎓", layout="wide")
 
@@ -15,6 +20,7 @@ import utils.styles as styles
 styles.apply_custom_style()
 
 # Database Connection
+profiler = page_profiler.start("Gestao_Aulas")
 conn = database.get_connection()
 
 # Auth
@@ -30,6 +36,7 @@ if not auth.check_page_access("Gestao_Aulas"): # Ensure this permission exists o
          st.stop()
 
 auth.render_custom_sidebar()
+profiler.checkpoint("setup")
 admin_utils.render_header_logo()
 
 st.title("🎓 Gestão de Aulas e Alunos")
@@ -280,17 +287,56 @@ with tab_finance:
     
     # Global Actions (Generate Monthly Tuition)
     with st.expander("🛠️ Ferramentas em Massa (Gerar Mensalidades)"):
-        c_gen1, c_gen2 = st.columns(2)
+        c_gen1, c_gen2, c_gen3 = st.columns(3)
         month_ref = c_gen1.text_input("Mês/Ano Referência", value=datetime.now().strftime('%m/%Y'))
         default_val = c_gen2.number_input("Valor Mensalidade Padrão", value=350.00)
+        gen_classes_df = student_service.get_all_classes(conn)
+        gen_cls_map = dict(zip(gen_classes_df['name'], gen_classes_df['id'])) if not gen_classes_df.empty else {}
+        gen_cls = c_gen3.selectbox("Turma", ["Todas"] + list(gen_cls_map.keys()), key="gen_tuition_cls")
+        
+        btn_label = "Gerar Mensalidades para TODOS Ativos" if gen_cls == "Todas" else f"Gerar Mensalidades da Turma {gen_cls}"
+        if st.button(btn_label):
+            try:
+                summary = student_service.generate_tuitions_bulk(
+                    conn, month_ref, default_val,
+                    class_id=None if gen_cls == "Todas" else gen_cls_map[gen_cls]
+                )
+                admin_utils.show_feedback_dialog(
+                    f"Geradas {summary['created']} mensalidades para {month_ref}.", level="success",
+                    sub_message=f"{summary['skipped']} aluno(s) já tinham mensalidade no mês. Total lançado: R$ {summary['total_amount']:,.2f}"
+                )
+            except ValueError as e:
+                admin_utils.show_feedback_dialog(str(e), level="warning")
+
+    with st.expander("🏦 Importar Extrato Bancário (Pagamentos em Lote)"):
+        st.caption("Cada linha abate os débitos mais antigos do aluno (mensalidades e consumos). Identifique o aluno pelo ID ou pelo nome exato. A data é obrigatória; linhas já importadas são ignoradas. Preencha a Descrição com o identificador da transação no banco: sem ela, a mesma linha só é reconhecida ao reimportar o mesmo extrato sem alterações.")
+        c_st1, c_st2 = st.columns([1, 2])
+        df_tmpl = pd.DataFrame(columns=["ID Aluno", "Aluno", "Data (AAAA-MM-DD)", "Valor", "Descrição"])
+        buffer = io.BytesIO()
+        with pd.ExcelWriter(buffer, engine='openpyxl') as writer: df_tmpl.to_excel(writer, index=False)
+        c_st1.download_button("⬇️ Baixar Modelo", buffer.getvalue(), "modelo_extrato_alunos.xlsx")
         
-        if st.button("Gerar Mensalidades para TODOS Ativos"):
-            students = student_service.get_all_active_students(conn)
-            count = 0
-            for _, s in students.iterrows():
-                ok, msg = student_service.generate_tuition_record(conn, s['id'], month_ref, default_val)
-                if ok: count += 1
-            admin_utils.show_feedback_dialog(f"Geradas {count} mensalidades for {month_ref}.", level="success")
+        stmt_file = c_st2.file_uploader("Arquivo Excel", type=['xlsx', 'xls'], key="stmt_upload")
+        if stmt_file:
+            stmt_df = pd.read_excel(stmt_file)
+            st.dataframe(stmt_df.head(20), hide_index=True, use_container_width=True)
+            if st.button(f"🚀 Registrar {len(stmt_df)} Pagamentos", type="primary"):
+                try:
+                    summary = student_service.import_bank_statement(conn, stmt_df)
+                    sub_msg = f"{summary['items']} débitos abatidos de {summary['students']} aluno(s)."
+                    if summary['unallocated']:
+                        sub_msg += f"\n\nExcedente sem débito: R$ {sum(summary['unallocated'].values()):,.2f}"
+                    if not summary['unmatched'].empty:
+                        sub_msg += f"\n\n{len(summary['unmatched'])} linha(s) ignorada(s) (aluno não encontrado ou valor inválido)."
+                    if not summary['invalid_dates'].empty:
+                        sub_msg += f"\n\n{len(summary['invalid_dates'])} linha(s) recusada(s) por data inválida."
+                    if not summary['already_imported'].empty:
+                        sub_msg += f"\n\n{len(summary['already_imported'])} linha(s) já importada(s) anteriormente."
+                    admin_utils.show_feedback_dialog(
+                        f"R$ {summary['allocated']:,.2f} registrados!", level="success", sub_message=sub_msg
+                    )
+                except ValueError as e:
+                    admin_utils.show_feedback_dialog(str(e), level="warning")
 
     st.divider()
     
@@ -628,3 +674,4 @@ with tab_history:
     else:
         st.info("Nenhuma movimentação encontrada com os filtros selecionados.")
 
+profiler.finish()
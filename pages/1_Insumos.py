@@ -3,10 +3,12 @@ import pandas as pd
 import os
 import database
 import auth
+import utils.page_profiler as page_profiler
 import audit
 import admin_utils
 from datetime import datetime, date
 import services.material_service as material_service
+import services.search_service as search_service
 
 st.set_page_config(page_title="Insumos", page_icon="🧱", layout="wide")
 
@@ -14,6 +16,7 @@ st.set_page_config(page_title="Insumos", page_icon="🧱", layout="wide")
 import utils.styles as styles
 styles.apply_custom_style()
 
+profiler = page_profiler.start("Insumos")
 conn = database.get_connection()
 
 # Auth
@@ -24,6 +27,7 @@ if not auth.check_page_access("Insumos"):
     st.stop()
 
 auth.render_custom_sidebar()
+profiler.checkpoint("setup")
 st.title("Gestão de Insumos (Matérias-Primas)")
 
 tab_cat, tab_hist_global = st.tabs(["Catálogo", "Movimentações (Histórico)"])
@@ -96,7 +100,7 @@ with tab_cat:
         if f_sup != "Todos":
             df_materials = df_materials[df_materials['supplier_name'] == f_sup]
         if f_search:
-            df_materials = df_materials[df_materials['name'].str.contains(f_search, case=False, na=False)]
+            df_materials = df_materials[df_materials['id'].isin(search_service.search_ids(conn, 'material', f_search, names_only=True))]
 
     # --- 4. Logic: Detail View OR Grid View ---
 
@@ -465,5 +469,6 @@ with tab_hist_global:
     else:
         st.info("Nenhuma movimentação encontrada para os filtros selecionados.")
 
+profiler.finish()
 conn.close()
 
@@ -3,12 +3,16 @@ import pandas as pd
 import database
 import admin_utils
 import auth
+import utils.page_profiler as page_profiler
 import audit
 from datetime import datetime, date, timedelta
-import plotly.express as px
+from utils.lazy_imports import lazy_import
 import io
 import services.finance_service as finance_service
 
+# Heavy: loaded on first chart
+px = lazy_import("plotly.express")
+
 st.set_page_config(page_title="Gestão Financeira", page_icon="💰", layout="wide")
 
 # Apply Global Styles
@@ -16,6 +20,7 @@ import utils.styles as styles
 styles.apply_custom_style()
 
 admin_utils.render_sidebar_logo()
+profiler = page_profiler.start("Financeiro")
 conn = database.get_connection()
 cursor = conn.cursor()
 
@@ -24,6 +29,7 @@ if not auth.require_login(conn):
     st.stop()
 
 auth.render_custom_sidebar()
+profiler.checkpoint("setup")
 
 # Role check - admin only (Both pages were Admin only or restricted)
 # Assuming 'Financeiro' encompasses both.
@@ -354,6 +360,7 @@ with tab_gestao:
             fd_day = 5
             fd_per_idx = 0
             fd_cat_idx = 0
+            fd_start = None
             
             if is_f_edit:
                 frow = finance_service.get_fixed_cost_by_id(conn, st.session_state.fix_edit_id)
@@ -363,6 +370,7 @@ with tab_gestao:
                     fd_day = int(frow['due_day']) if frow['due_day'] else 5
                     if frow['periodicity'] in periodicities: fd_per_idx = periodicities.index(frow['periodicity'])
                     if frow['category'] in expense_categories: fd_cat_idx = expense_categories.index(frow['category'])
+                    if frow.get('start_date'): fd_start = date.fromisoformat(frow['start_date'])
                 else:
                     st.session_state.fix_edit_id = None
                     st.rerun()
@@ -377,12 +385,14 @@ with tab_gestao:
                 f_day = st.number_input("Dia Vencimento", min_value=1, max_value=31, value=fd_day)
                 f_per = st.selectbox("Periodicidade", periodicities, index=fd_per_idx)
                 f_cat = st.selectbox("Categoria", expense_categories, index=fd_cat_idx)
+                f_start = st.date_input("Início (opcional)", value=fd_start, format="DD/MM/YYYY",
+                                        help="Não lança ocorrências antes desta data. Define o mês de referência das despesas anuais e trimestrais.")
                 
                 if st.form_submit_button("Salvar Definição"):
                     if is_f_edit:
                         try:
                             old_data = finance_service.update_fixed_cost(
-                                conn, st.session_state.fix_edit_id, f_desc, f_val, f_day, f_per, f_cat
+                                conn, st.session_state.fix_edit_id, f_desc, f_val, f_day, f_per, f_cat, f_start
                             )
                             audit.log_action(conn, 'UPDATE', 'fixed_costs', st.session_state.fix_edit_id, old_data,
                                 {'description': f_desc, 'value': f_val, 'due_day': f_day, 'category': f_cat})
@@ -394,7 +404,7 @@ with tab_gestao:
                     else:
                         try:
                             new_id = finance_service.create_fixed_cost(
-                                conn, f_desc, f_val, f_day, f_per, f_cat
+                                conn, f_desc, f_val, f_day, f_per, f_cat, f_start
                             )
                             audit.log_action(conn, 'CREATE', 'fixed_costs', new_id, None,
                                 {'description': f_desc, 'value': f_val, 'due_day': f_day, 'category': f_cat})
@@ -440,6 +450,18 @@ with tab_gestao:
             else:
                 st.info("Nenhum custo fixo definido.")
 
+            with st.expander("🔁 Lançar Período Retroativo"):
+                st.caption("Lança todas as ocorrências devidas no período. Ocorrências já lançadas são ignoradas.")
+                bf1, bf2 = st.columns(2)
+                bf_start = bf1.date_input("De", value=date.today().replace(day=1) - timedelta(days=90), format="DD/MM/YYYY", key="bf_start")
+                bf_end = bf2.date_input("Até", value=date.today(), max_value=date.today(), format="DD/MM/YYYY", key="bf_end")
+                if st.button("Lançar Pendentes", key="bf_run"):
+                    try:
+                        n_added = finance_service.process_fixed_costs(conn, bf_start, bf_end)
+                        admin_utils.show_feedback_dialog(f"{n_added} despesas lançadas.", level="success")
+                    except Exception as e:
+                        admin_utils.show_feedback_dialog(f"Erro ao lançar custos fixos: {e}", level="error")
+
 # ==============================================================================
 # TAB 2: RELATÓRIOS & FLUXO (Former pages/3_Financeiro.py)
 # ==============================================================================
@@ -765,4 +787,5 @@ with tab_relatorios:
         else:
             st.info("Sem dados para a tendência mensal.")
 
+profiler.finish()
 conn.close()
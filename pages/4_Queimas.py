@@ -3,6 +3,7 @@ import pandas as pd
 import database
 import admin_utils
 import auth
+import utils.page_profiler as page_profiler
 from datetime import datetime
 import os
 from services import firing_service
@@ -15,6 +16,7 @@ styles.apply_custom_style()
 
 admin_utils.render_sidebar_logo()
 
+profiler = page_profiler.start("Queimas")
 conn = database.get_connection()
 
 if not auth.require_login(conn):
@@ -24,6 +26,7 @@ if not auth.check_page_access("Queimas"):
     st.stop()
 
 auth.render_custom_sidebar()
+profiler.checkpoint("setup")
 st.title("Gestão de Queimas e Manutenção de Fornos")
 
 # Fetch Kilns
@@ -332,4 +335,5 @@ with tab2:
         else:
             st.info("Nenhuma manutenção registrada.")
 
+profiler.finish()
 conn.close()
@@ -6,8 +6,10 @@ import time
 import database  # Use centralized DB connection
 import admin_utils
 import auth
+import utils.page_profiler as page_profiler
 import audit
 from services import product_service
+from services import search_service
 from utils.logging_config import get_logger, log_exception
 import utils.styles as styles
 
@@ -21,6 +23,7 @@ styles.apply_custom_style()
 admin_utils.render_sidebar_logo()
 
 # Database Connection
+profiler = page_profiler.start("Produtos")
 conn = database.get_connection()
 
 if not auth.require_login(conn):
@@ -32,6 +35,7 @@ if not auth.check_page_access("Produtos"):
 # cursor removed — all writes go through product_service
 
 auth.render_custom_sidebar()
+profiler.checkpoint("setup")
 st.title("📦 Produtos e Fichas Técnicas")
 
 tab1, tab2 = st.tabs(["Catálogo & Produção", "Histórico de Produção"])
@@ -86,6 +90,7 @@ with tab1:
     prod_dict = {}
     if not products.empty:
         prod_dict = {f"[{row['id']}] {row['name']} (Est: {row['stock_quantity']})": row['id'] for _, row in products.iterrows()}
+    profiler.checkpoint("query")
 
     if "editing_product_id" not in st.session_state:
         st.session_state.editing_product_id = None
@@ -116,7 +121,7 @@ with tab1:
         # Apply Filters (Global now)
         filtered_products = products.copy()
         if search_term:
-            filtered_products = filtered_products[filtered_products['name'].str.contains(search_term, case=False, na=False)]
+            filtered_products = filtered_products[filtered_products['id'].isin(search_service.search_ids(conn, 'product', search_term, names_only=True))]
         
         if sel_cat_filt != "Todas":
             filtered_products = filtered_products[filtered_products['category'] == sel_cat_filt]
@@ -930,6 +935,8 @@ with tab1:
                     on_confirm=do_delete_prod
                 )
 
+profiler.checkpoint("catalogo")
+
 # --- Tab 2: History (Moved content) ---
 with tab2:
     st.subheader("📜 Histórico de Produção")
@@ -1036,4 +1043,6 @@ with tab2:
     else:
         st.info("Nenhum registro de produção encontrado para os filtros selecionados.")
 
+profiler.checkpoint("historico")
+profiler.finish()
 conn.close()
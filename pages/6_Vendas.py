@@ -3,15 +3,20 @@ import pandas as pd
 import database
 import admin_utils
 import auth
+import utils.page_profiler as page_profiler
 import audit
-import reports
+from utils.lazy_imports import lazy_import
 import services.product_service as product_service
 import services.order_service as order_service
+import services.search_service as search_service
 import utils.styles as styles
 import uuid
 from datetime import datetime, date, timedelta
 from utils.logging_config import get_logger
 
+# Heavy (fpdf): loaded on first PDF
+reports = lazy_import("reports")
+
 logger = get_logger(__name__)
 
 st.set_page_config(page_title="Vendas", page_icon="💰", layout="wide")
@@ -24,6 +29,7 @@ admin_utils.render_sidebar_logo()
 # Sales view matches logic: Salesperson can access this.
 # But Admin can too.
 
+profiler = page_profiler.start("Vendas")
 conn = database.get_connection()
 
 if not auth.require_login(conn):
@@ -33,6 +39,7 @@ if not auth.check_page_access("Vendas"):
     st.stop()
 
 auth.render_custom_sidebar()
+profiler.checkpoint("setup")
 st.title("Frente de Vendas")
 
 # --- Receipt Dialog (Top Level) ---
@@ -121,6 +128,7 @@ client_opts = [""] + list(client_dict.keys())
 
 # 2. Select Product (Visual Catalog) - OUTSIDE FORM for interactivity
 products_df = product_service.get_all_products(conn)
+profiler.checkpoint("query")
 
 # --- Application State ---
 if 'cart' not in st.session_state:
@@ -214,7 +222,7 @@ with tab_pos:
         filtered_df = products_df.copy()
         
         if search_term:
-            filtered_df = filtered_df[filtered_df['name'].str.contains(search_term, case=False, na=False)]
+            filtered_df = filtered_df[filtered_df['id'].isin(search_service.search_ids(conn, 'product', search_term, names_only=True))]
         
         if sel_cats:
             filtered_df = filtered_df[filtered_df['category'].isin(sel_cats)]
@@ -712,6 +720,8 @@ with tab_pos:
             st.info("Seu carrinho está vazio.")
 
 
+profiler.checkpoint("catalogo_carrinho")
+
 # ==============================================================================
 # TAB 2: HISTORY
 # ==============================================================================
@@ -905,4 +915,6 @@ with tab_quotes:
                     order_service.delete_quote(conn, quote['id'])
                     st.rerun()
 
+profiler.checkpoint("historico")
+profiler.finish()
 conn.close()
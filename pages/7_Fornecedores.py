@@ -3,6 +3,7 @@ import pandas as pd
 import database
 import admin_utils
 import auth
+import utils.page_profiler as page_profiler
 import audit
 import services.supplier_service as supplier_service
 import time
@@ -16,6 +17,7 @@ styles.apply_custom_style()
 admin_utils.render_sidebar_logo()
 
 # Auth Check
+profiler = page_profiler.start("Fornecedores")
 conn = database.get_connection()
 
 if not auth.require_login(conn):
@@ -25,6 +27,7 @@ if not auth.check_page_access("Fornecedores"):
     st.stop()
 
 auth.render_custom_sidebar()
+profiler.checkpoint("setup")
 st.title("🚚 Gestão de Fornecedores")
 
 # Session State for Edit Mode
@@ -145,4 +148,5 @@ with col_list:
     else:
         st.info("Nenhum fornecedor cadastrado ou encontrado.")
 
+profiler.finish()
 conn.close()
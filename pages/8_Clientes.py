@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
 import auth
+import utils.page_profiler as page_profiler
 import database
 import admin_utils
 import audit
@@ -13,6 +14,7 @@ st.set_page_config(page_title="Clientes", page_icon="👥", layout="wide")
 import utils.styles as styles
 styles.apply_custom_style()
 
+profiler = page_profiler.start("Clientes")
 conn = database.get_connection()
 
 if not auth.require_login(conn):
@@ -22,6 +24,7 @@ if not auth.check_page_access("Clientes"):
     st.stop()
 
 auth.render_custom_sidebar()
+profiler.checkpoint("setup")
 admin_utils.render_header_logo()
 st.title("👥 Gestão de Clientes")
 
@@ -144,4 +147,5 @@ with col_list:
     else:
         st.info("Nenhum cliente cadastrado ou encontrado.")
 
+profiler.finish()
 conn.close()
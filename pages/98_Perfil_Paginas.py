@@ -0,0 +1,92 @@
+import streamlit as st
+import pandas as pd
+import database
+import admin_utils
+import auth
+import config
+import utils.page_profiler as page_profiler
+import utils.styles as styles
+
+# Hidden page (not in NAV_MENU): linked from Administração > Desempenho
+st.set_page_config(page_title="Perfil de Páginas", page_icon="🔬", layout="wide")
+
+# Apply Global Styles
+styles.apply_custom_style()
+
+admin_utils.render_sidebar_logo()
+
+conn = database.get_connection()
+
+if not auth.require_login(conn):
+    st.stop()
+
+if not auth.check_page_access('Perfil_Paginas'):
+    st.stop()
+
+auth.render_custom_sidebar()
+st.title("🔬 Perfil de Páginas")
+
+# --- CONTROLS ---
+if config.PAGE_PROFILING:
+    st.info("Medição ligada para todas as sessões (AMICANDO_PAGE_PROFILING=1).")
+else:
+    # Plain session key (widget keys are dropped when another page runs)
+    st.session_state[page_profiler.SESSION_FLAG] = st.toggle(
+        "Medir as páginas nesta sessão", value=page_profiler.is_enabled(),
+        help="Cada execução das páginas abertas nesta sessão grava o tempo de cada seção, o tempo de SQL e os widgets criados."
+    )
+if not config.QUERY_PROFILING:
+    st.caption("Tempo de SQL e número de consultas ficam zerados: inicie o app com AMICANDO_QUERY_PROFILING=1 para medi-los.")
+
+c_days, c_page = st.columns(2)
+days = c_days.selectbox("Período", [1, 7, 30], index=1, format_func=lambda d: f"Últimos {d} dia(s)")
+
+page_df = page_profiler.get_page_summary(conn, days)
+
+if page_df.empty:
+    st.info("Nenhuma medição no período. Ligue a medição e navegue pelas páginas.")
+else:
+    # --- SLOWEST PAGES ---
+    st.subheader("🐢 Páginas Mais Lentas")
+    st.caption("Tempo total por execução da página. SQL e Render (chamadas de widgets/elementos) são médias; o restante é Python/pandas.")
+    st.dataframe(
+        page_df.rename(columns={
+            'page': 'Página', 'execucoes': 'Execuções', 'p50_ms': 'p50 (ms)', 'p95_ms': 'p95 (ms)',
+            'max_ms': 'Máx (ms)', 'sql_ms': 'SQL (ms)', 'render_ms': 'Render (ms)',
+            'widgets': 'Widgets', 'elementos': 'Elementos', 'reruns_max': 'Reruns encadeados (máx)'
+        }),
+        hide_index=True, use_container_width=True
+    )
+
+    # --- SLOWEST SECTIONS ---
+    st.subheader("🧩 Seções")
+    sel_page = c_page.selectbox("Página", ["Todas"] + page_df['page'].tolist())
+    section_df = page_profiler.get_section_summary(conn, days, None if sel_page == "Todas" else sel_page)
+    if section_df.empty:
+        st.info("Nenhuma seção registrada para esta página.")
+    else:
+        st.dataframe(
+            section_df.head(50).rename(columns={
+                'page': 'Página', 'section': 'Seção', 'execucoes': 'Execuções', 'p50_ms': 'p50 (ms)',
+                'p95_ms': 'p95 (ms)', 'sql_p95_ms': 'SQL p95 (ms)', 'consultas': 'Consultas (média)',
+                'render_p95_ms': 'Render p95 (ms)', 'widgets': 'Widgets (média)'
+            }),
+            hide_index=True, use_container_width=True
+        )
+
+    # --- TREND ---
+    st.subheader("📈 Evolução (p95 diário)")
+    trend_df = page_profiler.get_daily_trend(conn, max(days, 30))
+    if not trend_df.empty:
+        st.line_chart(trend_df)
+
+st.divider()
+c_prune, c_clear = st.columns(2)
+if c_prune.button(f"🧹 Remover medições com mais de {page_profiler.KEEP_DAYS} dias"):
+    removed = page_profiler.prune_metrics(conn)
+    st.success(f"{removed} registro(s) removido(s).")
+if c_clear.button("🗑️ Apagar todas as medições"):
+    page_profiler.clear_metrics(conn)
+    st.rerun()
+
+conn.close()
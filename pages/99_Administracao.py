@@ -3,13 +3,20 @@ import pandas as pd
 import database
 import admin_utils
 import auth
+import utils.page_profiler as page_profiler
 import audit
 import json
 import os
 import io
 from datetime import datetime
+import config
 import utils.backup_utils as backup_utils
+import utils.query_stats as query_stats
 from services import admin_service
+import services.cost_service as cost_service
+import services.product_service as product_service
+import services.student_service as student_service
+import services.search_service as search_service
 import utils.styles as styles
 
 st.set_page_config(page_title="Administração", page_icon="⚙️", layout="wide")
@@ -17,6 +24,7 @@ st.set_page_config(page_title="Administração", page_icon="⚙️", layout="wid
 # Apply Global Styles
 styles.apply_custom_style()
 
+profiler = page_profiler.start("Administracao")
 conn = database.get_connection()
 
 # Ensure default admin exists
@@ -30,12 +38,13 @@ if not auth.check_page_access('Administracao'):
     st.stop()
 
 auth.render_custom_sidebar()
+profiler.checkpoint("setup")
 
 admin_utils.render_header_logo()
 st.title("⚙️ Administração")
 
 # Create Tabs
-tab_users, tab_audit, tab_db, tab_import, tab_export = st.tabs(["👥 Usuários", "📜 Auditoria", "💾 Banco de Dados", "📥 Importação", "📤 Exportação"])
+tab_users, tab_audit, tab_db, tab_import, tab_export, tab_perf = st.tabs(["👥 Usuários", "📜 Auditoria", "💾 Banco de Dados", "📥 Importação", "📤 Exportação", "⏱️ Desempenho"])
 
 # ==============================================================================
 # TAB 1: USERS
@@ -185,15 +194,12 @@ with tab_audit:
         tables = ["Todas", "products", "sales", "expenses", "materials", "clients", "suppliers", "commission_orders", "firings", "users"]
         sel_table = st.selectbox("Tabela", tables, format_func=lambda x: audit.format_table_name(x) if x != "Todas" else "Todas")
     with f2:
-        actions = ["Todas", "CREATE", "UPDATE", "DELETE", "ROLLBACK"]
+        actions = ["Todas", "CREATE", "UPDATE", "DELETE", "ROLLBACK", "REWIND"]
         sel_action = st.selectbox("Ação", actions, format_func=lambda x: audit.format_action(x) if x != "Todas" else "Todas")
     with f3:
-        # Use simple query or add to service if strictly no SQL here. 
-        # But this is readonly list for UI filter. Safe enough.
-        u_df = pd.read_sql("SELECT DISTINCT username FROM audit_log ORDER BY username", conn)
-        sel_user = st.selectbox("Usuário", ["Todos"] + u_df['username'].tolist())
+        sel_user = st.selectbox("Usuário", ["Todos"] + audit.get_audit_users(conn))
     with f4:
-        limit = st.number_input("Limite", min_value=10, max_value=500, value=100, step=50)
+        page_size = st.number_input("Por página", min_value=10, max_value=200, value=50, step=10)
     
     d1, d2 = st.columns(2)
     start_date = d1.date_input("De", value=None)
@@ -205,46 +211,125 @@ with tab_audit:
     if sel_user != "Todos": filters['username'] = sel_user
     if start_date: filters['start_date'] = start_date.isoformat()
     if end_date: filters['end_date'] = end_date.isoformat() + "T23:59:59"
+
+    # Keyset pagination: stack of page keys, reset whenever the filters change
+    filter_sig = (tuple(sorted(filters.items())), page_size)
+    if st.session_state.get("audit_filter_sig") != filter_sig:
+        st.session_state.audit_filter_sig = filter_sig
+        st.session_state.audit_page_keys = [None]
+    page_keys = st.session_state.audit_page_keys
     
     st.divider()
-    log_df = audit.get_audit_log(conn, filters if filters else None, limit=limit)
-    st.subheader(f"📋 Registros ({len(log_df)})")
+    log_df = audit.get_audit_log(conn, filters if filters else None, limit=page_size, after=page_keys[-1])
+    st.subheader(f"📋 Registros (página {len(page_keys)})")
     
     if log_df.empty:
         st.info("Nenhum registro encontrado.")
     else:
-        for _, row in log_df.iterrows():
-            action_icon = audit.format_action(row['action'])
-            table_icon = audit.format_table_name(row['table_name'])
-            timestamp = row['timestamp'][:16].replace('T', ' ')
-            
-            with st.container(border=True):
-                c1, c2, c3 = st.columns([4, 1, 1])
-                with c1:
-                    st.markdown(f"**{action_icon}** em {table_icon} (ID: {row['record_id']})")
-                    st.caption(f"🕐 {timestamp} | 👤 {row['username']}")
-                with c2:
-                    with st.popover("📋 Detalhes"):
-                        st.markdown("**Dados Anteriores:**")
-                        if row['old_data']:
-                            try: st.json(json.loads(row['old_data']))
-                            except: st.code(row['old_data'])
-                        else: st.caption("N/A")
-                        st.markdown("**Dados Novos:**")
-                        if row['new_data']:
-                            try: st.json(json.loads(row['new_data']))
-                            except: st.code(row['new_data'])
-                        else: st.caption("N/A")
-                with c3:
-                    if row['action'] in ['UPDATE', 'DELETE'] and row['old_data']:
-                        if st.button("↩️ Reverter", key=f"rb_{row['id']}"):
-                            def do_rollback(rid=row['id']):
-                                with database.db_session() as ctx_conn:
-                                    if audit.rollback_record(ctx_conn, rid):
-                                        admin_utils.show_feedback_dialog("Restaurado com sucesso!", level="success")
-                                    else:
-                                        admin_utils.show_feedback_dialog("Erro ao restaurar.", level="error")
-                            admin_utils.show_confirmation_dialog(f"Reverter alteração {row['id']}?", on_confirm=do_rollback)
+        view_df = log_df.copy()
+        view_df['action'] = view_df['action'].map(audit.format_action)
+        view_df['table_name'] = view_df['table_name'].map(audit.format_table_name)
+        view_df['timestamp'] = view_df['timestamp'].str[:16].str.replace('T', ' ')
+        st.dataframe(
+            view_df[['id', 'timestamp', 'action', 'table_name', 'record_id', 'username']].rename(columns={
+                'id': 'Nº', 'timestamp': 'Data', 'action': 'Ação', 'table_name': 'Tabela',
+                'record_id': 'ID Registro', 'username': 'Usuário'
+            }),
+            hide_index=True, use_container_width=True
+        )
+
+    p1, p2 = st.columns(2)
+    if p1.button("⬅️ Anterior", disabled=len(page_keys) == 1):
+        page_keys.pop()
+        st.rerun()
+    if p2.button("Próxima ➡️", disabled=len(log_df) < page_size):
+        page_keys.append(audit.next_page_key(log_df))
+        st.rerun()
+
+    if not log_df.empty:
+        # Payloads are loaded only for the selected entry
+        entries = log_df.set_index('id')
+        sel_id = st.selectbox(
+            "🔎 Detalhes do registro", entries.index.tolist(),
+            format_func=lambda i: f"Nº {i} · {audit.format_action(entries.at[i, 'action'])} em {audit.format_table_name(entries.at[i, 'table_name'])} (ID: {entries.at[i, 'record_id']})"
+        )
+        with st.container(border=True):
+            old_json, new_json = audit.get_audit_payload(conn, sel_id)
+            c1, c2 = st.columns(2)
+            with c1:
+                st.markdown("**Dados Anteriores:**")
+                if old_json:
+                    try: st.json(json.loads(old_json))
+                    except: st.code(old_json)
+                else: st.caption("N/A")
+            with c2:
+                st.markdown("**Dados Novos:**")
+                if new_json:
+                    try: st.json(json.loads(new_json))
+                    except: st.code(new_json)
+                else: st.caption("N/A")
+
+            if entries.at[sel_id, 'action'] in ['UPDATE', 'DELETE'] and old_json:
+                if st.button("↩️ Reverter", key=f"rb_{sel_id}"):
+                    def do_rollback(rid=int(sel_id)):
+                        with database.db_session() as ctx_conn:
+                            if audit.rollback_record(ctx_conn, rid):
+                                admin_utils.show_feedback_dialog("Restaurado com sucesso!", level="success")
+                            else:
+                                admin_utils.show_feedback_dialog("Erro ao restaurar.", level="error")
+                    admin_utils.show_confirmation_dialog(f"Reverter alteração {sel_id}?", on_confirm=do_rollback)
+
+    st.divider()
+    st.subheader("🕰️ Viagem no Tempo")
+    tt_tables = [t for t in tables if t != "Todas"]
+    t1, t2, t3 = st.columns(3)
+    tt_table = t1.selectbox("Tabela ", tt_tables, format_func=audit.format_table_name, key="tt_table")
+    tt_date = t2.date_input("Data", value=datetime.now().date(), key="tt_date")
+    tt_time = t3.time_input("Hora", value=datetime.now().time().replace(second=0, microsecond=0), key="tt_time")
+    tt_at = datetime.combine(tt_date, tt_time)
+
+    with st.expander("🔎 Ver registro nesta data"):
+        tt_id = st.number_input("ID do registro", min_value=1, step=1, key="tt_id")
+        if st.button("Reconstruir", key="tt_rebuild"):
+            try:
+                state = audit.reconstruct_record(conn, tt_table, int(tt_id), tt_at)
+                if state is None:
+                    st.info("O registro não existia nessa data.")
+                else:
+                    st.json(state)
+                    missing = audit.missing_columns(conn, tt_table, state)
+                    if missing:
+                        st.warning(f"Reconstrução incompleta: a auditoria não guarda {', '.join(missing)}.")
+            except Exception as e:
+                st.error(f"Erro ao reconstruir: {e}")
+
+    with st.expander("⏪ Retroceder tabela inteira"):
+        st.caption("Volta todos os registros alterados depois da data escolhida ao estado daquele momento (sem restaurar backup). As alterações ficam registradas na auditoria como Retrocesso.")
+        try:
+            plan_df = audit.rewind_table(conn, tt_table, tt_at, dry_run=True) if st.toggle("Calcular plano", key="tt_plan") else None
+            if plan_df is None:
+                pass
+            elif plan_df.empty:
+                st.info("Nenhuma alteração depois dessa data.")
+            else:
+                st.dataframe(plan_df['operation'].value_counts().rename_axis('Operação').reset_index(name='Registros'), hide_index=True)
+                incomplete_df = plan_df[(plan_df['missing'].str.len() > 0) | plan_df['unreconstructable'].notna()]
+                if not incomplete_df.empty:
+                    st.error(f"{len(incomplete_df)} registro(s) não podem ser reconstruídos por completo (colunas ou ações sem histórico). Retrocesso bloqueado.")
+                    st.dataframe(
+                        incomplete_df.assign(missing=incomplete_df['missing'].str.join(', '))[['record_id', 'operation', 'missing', 'unreconstructable']]
+                            .rename(columns={'record_id': 'ID', 'operation': 'Operação', 'missing': 'Colunas sem histórico',
+                                             'unreconstructable': 'Ação sem mapeamento'}),
+                        hide_index=True
+                    )
+                elif st.button("⏪ Retroceder", key="tt_rewind"):
+                    def do_rewind(t=tt_table, at=tt_at):
+                        with database.db_session() as ctx_conn:
+                            done = audit.rewind_table(ctx_conn, t, at, dry_run=False)
+                        admin_utils.show_feedback_dialog(f"{len(done)} registro(s) retrocedido(s).", level="success")
+                    admin_utils.show_confirmation_dialog(f"Retroceder {audit.format_table_name(tt_table)} para {tt_at:%d/%m/%Y %H:%M}?", on_confirm=do_rewind)
+        except Exception as e:
+            st.error(f"Erro ao planejar retrocesso: {e}")
 
 
 # ==============================================================================
@@ -267,59 +352,159 @@ with tab_db:
         st.divider()
         st.subheader("⚙️ Automático")
         bkp_settings = backup_utils.get_backup_settings(conn)
-        freq_opts = ["Manual", "Diário", "Semanal", "Mensal"]
+        freq_opts = ["Manual", "Horária", "Diário", "Semanal", "Mensal"]
         curr_freq = bkp_settings['frequency']
-        new_freq = st.selectbox("Frequência", freq_opts, index=freq_opts.index(curr_freq) if curr_freq in freq_opts else 1)
+        new_freq = st.selectbox("Frequência", freq_opts, index=freq_opts.index(curr_freq) if curr_freq in freq_opts else 2)
         if new_freq != curr_freq:
             backup_utils.save_backup_settings(conn, new_freq)
             st.success(f"Alterado para: {new_freq}")
             
         st.caption(f"Último: {datetime.fromisoformat(bkp_settings['last_run']).strftime('%d/%m/%Y %H:%M')}")
-        if st.button("Ejecutar Agora"):
-            if backup_utils.perform_backup(conn):
-                admin_utils.show_feedback_dialog("Sucesso!", level="success")
-                st.rerun()
+        if backup_utils.is_backup_running():
+            st.info("⏳ Backup em andamento (segundo plano)...")
+        elif st.button("Executar Agora"):
+            backup_utils.start_background_backup()
+            admin_utils.show_feedback_dialog("Backup iniciado em segundo plano.", level="success",
+                                             sub_message="Ele aparecerá na lista de backups locais ao terminar.")
+
+        with st.expander("🗂️ Retenção"):
+            st.caption(f"Cada backup guarda só as páginas alteradas; um backup completo é feito a cada {backup_utils.FULL_SNAPSHOT_EVERY} incrementais. "
+                       "Backups antigos (.db, de versões anteriores) não entram na retenção: apague-os manualmente na lista.")
+            with st.form("retention_form"):
+                rc1, rc2, rc3 = st.columns(3)
+                keep_h = rc1.number_input("Horários", min_value=0, value=bkp_settings['keep_hourly'], step=1)
+                keep_d = rc2.number_input("Diários", min_value=0, value=bkp_settings['keep_daily'], step=1)
+                keep_w = rc3.number_input("Semanais", min_value=0, value=bkp_settings['keep_weekly'], step=1)
+                if st.form_submit_button("Salvar e Aplicar"):
+                    backup_utils.save_retention_settings(conn, keep_h, keep_d, keep_w)
+                    removed = backup_utils.prune_backups(keep_h, keep_d, keep_w)
+                    admin_utils.show_feedback_dialog(f"Retenção aplicada: {len(removed)} arquivo(s) removido(s).", level="success")
+
+        metrics_df = backup_utils.get_backup_metrics(conn, limit=5)
+        if not metrics_df.empty:
+            metrics_df['db_size_bytes'] = (metrics_df['db_size_bytes'] / 1e6).round(2)
+            metrics_df['file_size_bytes'] = (metrics_df['file_size_bytes'] / 1e6).round(2)
+            st.dataframe(
+                metrics_df.rename(columns={
+                    'started_at': 'Início', 'kind': 'Tipo', 'file_name': 'Arquivo', 'duration_s': 'Duração (s)',
+                    'db_size_bytes': 'Banco (MB)', 'file_size_bytes': 'Arquivo (MB)', 'status': 'Status', 'error': 'Erro'
+                }),
+                hide_index=True, use_container_width=True
+            )
 
     with col_rst:
         st.subheader("📋 Locais")
-        backups = backup_utils.list_backups()
-        if not backups:
+        points = backup_utils.list_restore_points()[::-1][:10]
+        if not points:
             st.info("Sem backups locais.")
         else:
-            for b_file in backups:
+            for point in points:
+                b_file = point['name']
                 with st.container(border=True):
                     bc1, bc2, bc3 = st.columns([3, 1, 1])
-                    bc1.write(f"📄 {b_file}")
-                    b_path = os.path.join(backup_utils.BACKUP_FOLDER, b_file)
-                    with open(b_path, "rb") as bf:
-                        bc2.download_button("⬇️", bf, file_name=b_file, key=f"dl_{b_file}")
-                    if bc3.button("🗑️", key=f"del_{b_file}"):
+                    icon = "📄" if point['kind'] == 'full' else "🧩"
+                    bc1.write(f"{icon} {point['timestamp'].strftime('%d/%m/%Y %H:%M:%S')}")
+                    kind_label = 'Antigo (fora da retenção)' if point['legacy'] else 'Completo' if point['kind'] == 'full' else 'Incremental'
+                    bc1.caption(f"{kind_label} · {point['size'] / 1e6:.2f} MB")
+                    if point['kind'] == 'full':
+                        b_path = os.path.join(backup_utils.BACKUP_FOLDER, b_file)
+                        with open(b_path, "rb") as bf:
+                            bc2.download_button("⬇️", bf, file_name=b_file, key=f"dl_{b_file}")
+                    if bc3.button("🗑️", key=f"del_{b_file}", help="Remove também os incrementais que dependem deste ponto"):
                         backup_utils.delete_backup(b_file)
                         st.rerun()
 
         st.divider()
         st.subheader("⬆️ Restaurar")
-        uploaded_file = st.file_uploader("Arquivo .db", type=['db'])
-        if uploaded_file:
-             # Logic for restore is complex UI interactive, let's keep it minimal or as is
-             # For brevity/safety, I'm keeping the core logic inline here as it involves file replacement
-             if st.button("🚨 Restaurar Banco"):
-                 # Save temp, logic from before...
-                 # Omitted for brevity in this replace, assuming standard behavior
-                 pass 
-             # (In a real scenario I would copy the full restore logic here, 
-             # but to save tokens/time provided it was working: I'll trust the user has backup
-             # and this is advanced admin. I will include Simplified restore logic)
-             temp_path = "temp_restore.db"
-             with open(temp_path, "wb") as f: f.write(uploaded_file.getbuffer())
-             
-             def do_restore(t=temp_path):
-                 conn.close()
-                 import shutil
-                 shutil.copy(t, database.DB_PATH)
-                 os.remove(t)
-                 
-             admin_utils.show_confirmation_dialog("Substituir o banco atual?", on_confirm=do_restore)
+        rst_source = st.radio("Origem", ["Arquivo", "Backup local"], horizontal=True, key="rst_source")
+        try:
+            if rst_source == "Arquivo":
+                uploaded_file = st.file_uploader("Arquivo .db ou .db.gz", type=['db', 'gz'])
+                if uploaded_file and st.button("🔍 Verificar Arquivo"):
+                    staged_path = backup_utils.stage_restore_file(uploaded_file, uploaded_file.name)
+                    st.session_state.restore_staged = {'path': staged_path, 'label': uploaded_file.name}
+            else:
+                point_names = [p['name'] for p in backup_utils.list_restore_points()[::-1]]
+                if not point_names:
+                    st.info("Sem backups locais.")
+                else:
+                    sel_point = st.selectbox("Ponto de restauração", point_names)
+                    if st.button("🔍 Preparar Ponto"):
+                        staged_path = backup_utils.stage_restore_point(sel_point)
+                        st.session_state.restore_staged = {'path': staged_path, 'label': sel_point}
+
+            staged = st.session_state.get('restore_staged')
+            if staged and os.path.exists(staged['path']):
+                info = backup_utils.validate_restore_file(staged['path'])
+                st.success(f"✅ {staged['label']}: íntegro · esquema v{info['schema_version']} · {info['size_bytes'] / 1e6:.1f} MB")
+
+                def do_restore(s=staged):
+                    try:
+                        result = backup_utils.restore_database(s['path'])
+                        st.cache_data.clear()
+                        st.session_state.restore_message = f"Banco restaurado a partir de {s['label']} (migrações aplicadas: {result['migrated'] or 'nenhuma'})."
+                    except Exception as e:
+                        st.session_state.restore_message = f"Erro na restauração: {e}"
+                    finally:
+                        backup_utils.discard_staged(s['path'])
+                        st.session_state.pop('restore_staged', None)
+
+                admin_utils.show_confirmation_dialog("Substituir o banco atual? Um backup de segurança será feito antes.", on_confirm=do_restore)
+        except ValueError as e:
+            if st.session_state.get('restore_staged'):
+                backup_utils.discard_staged(st.session_state.pop('restore_staged')['path'])
+            st.error(f"❌ {e}")
+
+        if 'restore_message' in st.session_state:
+            st.info(st.session_state.pop('restore_message'))
+
+    st.divider()
+    st.subheader("🧮 Manutenção")
+    st.caption("Reprocessa todas as movimentações de insumos em ordem cronológica, recalcula o preço médio ponderado e o custo unitário de cada movimentação, e reconstrói o histórico de custo dos produtos vinculado às vendas.")
+    if st.button("Recalcular Custos Médios"):
+        try:
+            result = cost_service.rebuild_material_costs(conn)
+            prod_result = cost_service.rebuild_product_cost_history(conn)
+            product_service.get_all_materials.clear()
+            admin_utils.show_feedback_dialog(
+                "Custos recalculados!", level="success",
+                sub_message=(f"{result['transactions']} movimentações, {result['materials']} insumos atualizados.\n\n"
+                             f"{prod_result['versions']} versões de custo de produtos, {prod_result['sales']} vendas vinculadas.")
+            )
+        except Exception as e:
+            admin_utils.show_feedback_dialog(f"Erro ao recalcular custos: {e}", level="error")
+
+    st.caption("Compara os saldos dos alunos (valor devido, pendência mais antiga, último pagamento) com um recálculo completo a partir das mensalidades e consumos.")
+    bal_c1, bal_c2 = st.columns(2)
+    if bal_c1.button("Verificar Saldos de Alunos"):
+        diff_df = student_service.verify_student_balances(conn)
+        if diff_df.empty:
+            st.success("Saldos consistentes.")
+        else:
+            st.warning(f"{len(diff_df)} aluno(s) com saldo divergente.")
+            st.dataframe(diff_df, hide_index=True, use_container_width=True)
+    if bal_c2.button("Recalcular Saldos de Alunos"):
+        try:
+            count = student_service.recompute_student_balances(conn)
+            admin_utils.show_feedback_dialog("Saldos recalculados!", level="success", sub_message=f"{count} alunos atualizados.")
+        except Exception as e:
+            admin_utils.show_feedback_dialog(f"Erro ao recalcular saldos: {e}", level="error")
+
+    st.caption("Reconstrói o índice de busca (produtos, clientes, insumos e observações de encomendas).")
+    if st.button("Reconstruir Índice de Busca"):
+        try:
+            search_service.rebuild(conn)
+            admin_utils.show_feedback_dialog("Índice de busca reconstruído!", level="success")
+        except Exception as e:
+            admin_utils.show_feedback_dialog(f"Erro ao reconstruir índice: {e}", level="error")
+
+    st.caption(f"Move registros de auditoria com mais de {audit.HOT_MONTHS} meses para tabelas mensais compactadas (também roda automaticamente toda semana).")
+    if st.button("Arquivar Auditoria Antiga"):
+        try:
+            moved = audit.archive_audit_log(conn)
+            admin_utils.show_feedback_dialog(f"{moved} registro(s) arquivado(s).", level="success")
+        except Exception as e:
+            admin_utils.show_feedback_dialog(f"Erro ao arquivar auditoria: {e}", level="error")
 
 
 # ==============================================================================
@@ -361,6 +546,7 @@ with tab_import:
                         progress = st.progress(0)
                         ok, err = 0, 0
                         cursor = conn.cursor()
+                        imported_materials, imported_products = set(), set()
                         
                         current_uid = 1
                         current_uname = 'system'
@@ -372,9 +558,9 @@ with tab_import:
                         for idx, row in df.iterrows():
                             try:
                                 if import_type == "Insumos (Matérias-Primas)":
-                                    admin_service.upsert_material(cursor, row, current_uid)
+                                    imported_materials.add(admin_service.upsert_material(cursor, row, current_uid))
                                 elif import_type == "Produtos":
-                                    admin_service.upsert_product_and_composition(cursor, row, current_uid, current_uname)
+                                    imported_products.add(admin_service.upsert_product_and_composition(cursor, row, current_uid, current_uname))
                                 elif import_type == "Despesas":
                                     admin_service.upsert_expense(cursor, row)
                                 elif import_type == "Vendas":
@@ -392,6 +578,8 @@ with tab_import:
                             progress.progress((idx + 1) / len(df))
                         
                         conn.commit()
+                        # New prices and compositions need cost versions, or their sales link to none
+                        admin_service.snapshot_import_costs(conn, imported_materials, imported_products)
                         admin_utils.show_feedback_dialog(f"Fim. OK: {ok}, Erros: {err}", level="success")
                         st.balloons()
                         st.rerun()
@@ -441,4 +629,51 @@ with tab_export:
         )
         st.dataframe(df_exp.head())
 
+# ==============================================================================
+# TAB 6: QUERY PERFORMANCE
+# ==============================================================================
+with tab_perf:
+    st.header("⏱️ Consultas SQL")
+    if not config.QUERY_PROFILING:
+        st.info("Medição desativada. Inicie o app com AMICANDO_QUERY_PROFILING=1 para coletar estatísticas.")
+    else:
+        st.caption(f"Estatísticas deste processo desde o último reinício. Consultas acima de {query_stats.SLOW_QUERY_MS} ms entram no log de lentas.")
+        shape_df = pd.DataFrame(query_stats.get_shape_stats())
+        if shape_df.empty:
+            st.info("Nenhuma consulta registrada ainda.")
+        else:
+            k1, k2, k3 = st.columns(3)
+            k1.metric("Formatos de consulta", len(shape_df))
+            k2.metric("Execuções", f"{int(shape_df['count'].sum()):,}".replace(',', '.'))
+            k3.metric("Tempo total (s)", f"{shape_df['total_ms'].sum() / 1000:.1f}")
+
+            order_by = st.radio("Ordenar por", ["p95", "Tempo total", "Execuções"], horizontal=True)
+            sort_col = {'p95': 'p95_ms', 'Tempo total': 'total_ms', 'Execuções': 'count'}[order_by]
+            st.dataframe(
+                shape_df.sort_values(sort_col, ascending=False).head(100).rename(columns={
+                    'sql': 'Consulta', 'count': 'Execuções', 'p50_ms': 'p50 (ms)', 'p95_ms': 'p95 (ms)',
+                    'max_ms': 'Máx (ms)', 'total_ms': 'Total (ms)', 'avg_rows': 'Linhas (média)', 'callers': 'Origem'
+                }),
+                hide_index=True, use_container_width=True
+            )
+
+        st.subheader("🐢 Consultas Lentas Recentes")
+        slow_df = pd.DataFrame(query_stats.get_slow_queries())
+        if slow_df.empty:
+            st.info("Nenhuma consulta lenta registrada.")
+        else:
+            st.dataframe(
+                slow_df.rename(columns={'at': 'Quando', 'ms': 'Duração (ms)', 'rows': 'Linhas', 'caller': 'Origem', 'sql': 'Consulta'}),
+                hide_index=True, use_container_width=True
+            )
+
+        if st.button("🧹 Zerar Estatísticas"):
+            query_stats.reset()
+            st.rerun()
+
+    st.divider()
+    st.caption("Tempo por página e seção (SQL, pandas, widgets), gravado quando a medição de páginas está ligada.")
+    st.page_link("pages/98_Perfil_Paginas.py", label="Perfil de Páginas", icon="🔬")
+
+profiler.finish()
 conn.close()
@@ -6,9 +6,10 @@ import admin_utils
 import services.product_service as product_service
 import services.order_service as order_service
 import audit
-import reports
+from utils.lazy_imports import lazy_import
 import time
 import auth
+import utils.page_profiler as page_profiler
 import uuid
 import os
 import json
@@ -16,6 +17,9 @@ import logging
 import sqlite3
 from utils.logging_config import get_logger, log_exception
 
+# Heavy (fpdf): loaded on first PDF
+reports = lazy_import("reports")
+
 logger = get_logger(__name__)
 
 st.set_page_config(page_title="Encomendas", page_icon="📦")
@@ -25,6 +29,7 @@ import utils.styles as styles
 styles.apply_custom_style()
 
 admin_utils.render_sidebar_logo()
+profiler = page_profiler.start("Encomendas")
 conn = database.get_connection()
 
 if not auth.require_login(conn):
@@ -34,6 +39,7 @@ if not auth.check_page_access("Encomendas"):
     st.stop()
 
 auth.render_custom_sidebar()
+profiler.checkpoint("setup")
 st.title("📦 Gestão de Encomendas")
 cursor = conn.cursor()
 
@@ -612,4 +618,5 @@ else:
                     finally:
                         conn_write.close()
 
+profiler.finish()
 conn.close()
@@ -0,0 +1,164 @@
+"""
+Import-time budget check (python -X importtime).
+
+Imports each core module in a fresh interpreter (Streamlit mocked, as in
+verify_full_project.py), reports its cumulative import time and fails when:
+  - a module exceeds its budget (ms), or
+  - a heavy dependency (plotly, fpdf, matplotlib, openpyxl, PIL) gets
+    imported eagerly - those must go through utils.lazy_imports.
+Pages are checked the same way by running only their top-level import
+statements (the page body needs a session and a database). `reports` is
+itself loaded lazily by the pages, so fpdf is allowed there.
+Also run by tests/test_import_time.py.
+
+Usage:
+    python scripts/check_import_time.py            # check all budgets
+    python scripts/check_import_time.py --top 15   # also list the slowest imports
+"""
+import argparse
+import ast
+import os
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# --- 1. CONFIGURATION ---
+# Cumulative import time budget per module, in milliseconds (pandas alone is ~600ms cold)
+DEFAULT_BUDGET_MS = 1500
+BUDGETS_MS = {
+    'database': 300,
+    'auth': 1200,
+    'admin_utils': 300,
+    'utils.lazy_imports': 50,
+    'reports': 1500,
+}
+
+MODULES = [
+    'database', 'auth', 'audit', 'admin_utils', 'config',
+    'utils.lazy_imports', 'utils.backup_utils', 'utils.styles', 'utils.ui_components',
+    'services.admin_service', 'services.client_service', 'services.cost_service',
+    'services.finance_service', 'services.material_service', 'services.order_service',
+    'services.product_service', 'services.production_service', 'services.report_service',
+    'services.search_service', 'services.stock_ledger_service', 'services.student_service',
+    'reports',
+]
+
+PAGES = ['Dashboard.py'] + sorted(
+    f"pages/{name}" for name in os.listdir(os.path.join(PROJECT_ROOT, "pages")) if name.endswith(".py")
+)
+
+# Must never be imported at module load time
+HEAVY_MODULES = ('plotly', 'fpdf', 'matplotlib', 'openpyxl', 'PIL')
+# Modules that are themselves lazy-loaded and may import these
+ALLOWED_HEAVY = {'reports': ('fpdf', 'PIL')}
+
+_BOOTSTRAP = (
+    "import sys; from unittest.mock import MagicMock; "
+    "sys.modules['streamlit'] = MagicMock(); "
+    "sys.path.insert(0, {root!r}); "
+    "import {module}"
+)
+
+
+# --- 2. HELPERS ---
+def _run_importtime(code, label):
+    """Runs `code` under -X importtime. Returns {imported name: (self_us, cumulative_us, top_level)}."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=PROJECT_ROOT, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Import of {label} failed:\n{proc.stderr[-2000:]}")
+
+    timings = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        name = parts[2].strip()
+        # Nested imports are indented two more spaces per level
+        timings[name] = (int(parts[0]), int(parts[1]), len(parts[2]) - len(parts[2].lstrip()) == 1)
+    return timings
+
+
+def profile_module(module):
+    """Runs `import module` under -X importtime. Returns {imported name: (self_us, cumulative_us, top_level)}."""
+    return _run_importtime(_BOOTSTRAP.format(root=PROJECT_ROOT, module=module), module)
+
+
+def page_imports(page):
+    """Top-level import statements of a page script, as source lines."""
+    with open(os.path.join(PROJECT_ROOT, page), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def profile_page(page):
+    """
+    Runs a page's top-level imports under -X importtime. Returns the timings
+    and the page's cumulative time (top-level imports it names, in ms).
+    """
+    statements = page_imports(page)
+    code = _BOOTSTRAP.format(root=PROJECT_ROOT, module="sys") + "\n" + "\n".join(statements)
+    timings = _run_importtime(code, page)
+    roots = set()
+    for node in ast.parse("\n".join(statements)).body:
+        names = [node.module] if isinstance(node, ast.ImportFrom) else [a.name for a in node.names]
+        roots.update(name.split('.')[0] for name in names if name)
+    roots.discard('streamlit')
+    cumulative_us = sum(cum for name, (_, cum, top) in timings.items() if top and name.split('.')[0] in roots)
+    return timings, cumulative_us / 1000
+
+
+def heavy_imports(timings):
+    """Heavy top-level packages present in an import profile."""
+    return sorted({name.split('.')[0] for name in timings if name.split('.')[0] in HEAVY_MODULES})
+
+
+# --- 3. MAIN ---
+def _profiles():
+    for module in MODULES:
+        timings = profile_module(module)
+        yield module, timings, timings.get(module, (0, 0, True))[1] / 1000
+    for page in PAGES:
+        yield (page, *profile_page(page))
+
+
+def run_check(top=0):
+    failures = []
+    print(f"{'Módulo':<36}{'Tempo (ms)':>12}{'Limite':>10}")
+    for module, timings, cumulative_ms in _profiles():
+        budget = BUDGETS_MS.get(module, DEFAULT_BUDGET_MS)
+        heavy = [name for name in heavy_imports(timings) if name not in ALLOWED_HEAVY.get(module, ())]
+
+        status = "✅"
+        if cumulative_ms > budget:
+            status = "❌"
+            failures.append(f"{module}: {cumulative_ms:.0f}ms > {budget}ms")
+        if heavy:
+            status = "❌"
+            failures.append(f"{module}: importa {', '.join(heavy)} no carregamento (use utils.lazy_imports)")
+        print(f"{status} {module:<34}{cumulative_ms:>10.0f}{budget:>10}")
+
+        if top:
+            slowest = sorted(timings.items(), key=lambda kv: kv[1][0], reverse=True)[:top]
+            for name, (self_us, _, _) in slowest:
+                print(f"      {self_us / 1000:>8.1f}ms  {name}")
+
+    print()
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        return 1
+    print("✅ Todos os módulos dentro do orçamento de importação.")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=0, help="Lista os N imports mais lentos de cada módulo")
+    args = parser.parse_args()
+    sys.exit(run_check(args.top))
@@ -0,0 +1,769 @@
+"""
+Synthetic atelier database for benchmarks and load tests.
+
+Builds a database with the real schema (database.init_db, all migrations and
+triggers) and fills it with a deterministic, realistic history: products with
+recipes, variants and nested kits; materials with purchases and consumption;
+years of POS sales with seasonality; commission orders with their items, WIP
+cards (stage history) and deliveries; firings; classes, students, tuitions
+and consumptions; expenses and fixed costs; audit rows. Derived data (average
+costs, product cost versions, student balances, search index, ledgers) is
+produced by the application's own services and triggers.
+
+The same --seed, profile, overrides and --end-date always give the same rows.
+
+Usage:
+    python scripts/generate_synthetic_data.py --profile medium --out /tmp/medium.db
+    python scripts/generate_synthetic_data.py --profile large --seed 7 --end-date 2025-12-31
+    python scripts/generate_synthetic_data.py --set products=800 --set sales_per_day=40
+    python scripts/generate_synthetic_data.py --config dist.json   # any PROFILES key
+
+Without --out it writes config.DB_PATH (data/ceramic_admin.db) and refuses to
+replace an existing file unless --force is given.
+"""
+import argparse
+import bisect
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+# Add project root to path
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+import config
+import database
+
+# --- 1. CONFIGURATION ---
+# Counts per profile; every key (including the distributions below) can be
+# overridden with --set key=value or --config file.json.
+PROFILES = {
+    'small': {
+        'products': 60, 'materials': 30, 'clients': 150, 'suppliers': 8, 'years': 1,
+        'sales_per_day': 6, 'orders_per_month': 8, 'students': 25, 'stock_wip_cards': 15,
+        'firings_per_month': 6, 'audit_per_day': 10,
+    },
+    'medium': {
+        'products': 300, 'materials': 120, 'clients': 1500, 'suppliers': 25, 'years': 3,
+        'sales_per_day': 25, 'orders_per_month': 40, 'students': 120, 'stock_wip_cards': 60,
+        'firings_per_month': 10, 'audit_per_day': 60,
+    },
+    'large': {
+        'products': 1500, 'materials': 400, 'clients': 10000, 'suppliers': 60, 'years': 6,
+        'sales_per_day': 80, 'orders_per_month': 150, 'students': 400, 'stock_wip_cards': 250,
+        'firings_per_month': 14, 'audit_per_day': 200,
+    },
+}
+
+DISTRIBUTIONS = {
+    # Catalog
+    'kit_share': 0.08,              # products that are kits
+    'nested_kit_share': 0.3,        # kits that contain another kit
+    'kit_components': [2, 4],
+    'variant_share': 0.4,           # products with glaze variants
+    'variants_per_product': [2, 5],
+    'price_median': 75.0,           # lognormal base price (R$)
+    'price_sigma': 0.6,
+    'popularity_zipf': 1.1,         # sales concentration on the top products
+    # Materials
+    'clay_share': 0.15,
+    'glaze_share': 0.35,
+    'purchases_per_month': 1.0,     # per material
+    'monthly_price_drift': 0.01,
+    # Sales
+    'month_weights': [0.7, 0.75, 0.9, 0.95, 1.25, 1.0, 0.9, 0.95, 1.0, 1.05, 1.3, 1.8],
+    'weekday_weights': [0.8, 0.9, 0.9, 1.0, 1.2, 1.6, 0.6],   # Monday..Sunday
+    'items_per_sale': {'1': 0.55, '2': 0.25, '3': 0.12, '4': 0.08},
+    'payment_methods': {'Pix': 0.45, 'Cartão Crédito': 0.25, 'Cartão Débito': 0.15, 'Dinheiro': 0.15},
+    'salespeople': {'Ira': 0.5, 'Neli': 0.5},
+    'identified_client_share': 0.6,
+    'discount_share': 0.15,
+    'discount_pct': [0.05, 0.15],
+    # Commission orders
+    'order_items': [1, 5],
+    'order_item_quantity': [1, 12],
+    'order_deposit_pct': [0.3, 0.5],
+    'order_lead_days': [15, 60],
+    'loss_share': 0.05,             # WIP cards with a recorded breakage
+    # Classes
+    'tuition_amount': 280.0,
+    'tuition_paid_share': 0.92,
+    'student_churn_per_month': 0.03,
+    'consumptions_per_student_month': 0.4,
+    # Expenses
+    'eventual_expenses_per_month': 6,
+    'kwh_price': 0.95,
+}
+
+PRODUCT_TYPES = ['Caneca', 'Prato', 'Tigela', 'Vaso', 'Travessa', 'Bowl', 'Xícara', 'Luminária',
+                 'Porta-Incenso', 'Jarra', 'Moringa', 'Saladeira', 'Petisqueira', 'Cachepô']
+FINISHES = ['Rústica', 'Esmaltada', 'Mármore', 'Terracota', 'Azul Cobalto', 'Areia', 'Verde Musgo',
+            'Off-White', 'Grafite', 'Salpicada', 'Craquelada', 'Mel']
+PRODUCT_CATEGORIES = ['Utilitário', 'Decorativo', 'Outros', 'Canecas', 'Pratos', 'Vasos', 'Kits']
+GLAZES = ['Esmalte Azul Cobalto', 'Esmalte Verde Musgo', 'Esmalte Branco Mate', 'Esmalte Mel',
+          'Esmalte Grafite', 'Esmalte Celadon', 'Esmalte Tenmoku', 'Esmalte Rosa Quartzo']
+CLAYS = ['Massa Grés', 'Argila Vermelha', 'Massa Porcelana', 'Argila Branca', 'Massa Refratária']
+SUPPLIES = ['Óxido de Ferro', 'Engobe', 'Caixa Embalagem', 'Papel Seda', 'Plástico Bolha', 'Lixa', 'Cera']
+FIRST_NAMES = ['Ana', 'Bruno', 'Carla', 'Daniel', 'Eduarda', 'Felipe', 'Gabriela', 'Henrique', 'Isabela',
+               'João', 'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sofia', 'Tiago',
+               'Vitória', 'Luiza', 'Pedro', 'Mariana', 'Lucas', 'Beatriz']
+LAST_NAMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Costa', 'Rodrigues', 'Almeida',
+              'Nascimento', 'Carvalho', 'Araújo', 'Ribeiro', 'Gomes', 'Martins', 'Rocha']
+CLASSES = [('Terça Manhã', 'Terça 09:00 - 12:00'), ('Quarta Noite', 'Quarta 19:00 - 22:00'),
+           ('Quinta Tarde', 'Quinta 14:00 - 17:00'), ('Sábado Manhã', 'Sábado 09:00 - 12:00')]
+FIXED_COSTS = [('Aluguel Ateliê', 2800.0, 5, 'Aluguel'), ('Energia Elétrica', 650.0, 10, 'Energia'),
+               ('Internet', 120.0, 15, 'Internet'), ('Água', 90.0, 20, 'Água')]
+EVENTUAL_EXPENSES = [('Manutenção', 'Reparo de equipamento'), ('Transporte', 'Frete de entrega'),
+                     ('Marketing', 'Impulsionamento redes sociais'), ('Outros', 'Material de escritório'),
+                     ('Impostos', 'DAS MEI'), ('Gasto Eventual', 'Feira de artesanato')]
+STAGES = ['Fila de Espera', 'Modelagem', 'Secagem', 'Biscoito', 'Esmaltação', 'Queima de Alta']
+AUDIT_TABLES = ['products', 'sales', 'commission_orders', 'materials', 'clients', 'expenses', 'students']
+SYNTHETIC_PASSWORD = 'synthetic'
+
+
+# --- 2. HELPERS ---
+def build_settings(profile='small', overrides=None):
+    """Profile counts plus DISTRIBUTIONS, with `overrides` applied on top."""
+    if profile not in PROFILES:
+        raise ValueError(f"Perfil desconhecido: {profile} (use {', '.join(PROFILES)})")
+    settings = {**DISTRIBUTIONS, **PROFILES[profile]}
+    for key, value in (overrides or {}).items():
+        if key not in settings:
+            raise ValueError(f"Parâmetro desconhecido: {key}")
+        settings[key] = value
+    return settings
+
+
+def _parse_value(raw):
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return raw
+
+
+class _Random(random.Random):
+    """random.Random with the few distributions the generator needs."""
+
+    def poisson(self, lam):
+        if lam <= 0:
+            return 0
+        if lam > 30:
+            return max(0, int(round(self.gauss(lam, math.sqrt(lam)))))
+        limit, k, p = math.exp(-lam), 0, 1.0
+        while True:
+            p *= self.random()
+            if p <= limit:
+                return k
+            k += 1
+
+    def weighted(self, weights):
+        """Key of a {key: weight} dict."""
+        return self.choices(list(weights), weights=list(weights.values()))[0]
+
+    def between(self, bounds):
+        return self.randint(int(bounds[0]), int(bounds[1]))
+
+    def person(self):
+        return f"{self.choice(FIRST_NAMES)} {self.choice(LAST_NAMES)}"
+
+    def phone(self):
+        return f"(11) 9{self.randint(1000, 9999)}-{self.randint(1000, 9999)}"
+
+    def moment(self, day, start_hour=9, end_hour=18):
+        return datetime.combine(day, datetime.min.time()) + timedelta(
+            hours=self.randint(start_hour, end_hour - 1), minutes=self.randint(0, 59))
+
+
+def _months(start, end):
+    """First day of every month between start and end."""
+    current = start.replace(day=1)
+    while current <= end:
+        yield current
+        current = (current + timedelta(days=32)).replace(day=1)
+
+
+def _days(start, end):
+    for offset in range((end - start).days + 1):
+        yield start + timedelta(days=offset)
+
+
+def _insert(cursor, table, columns, rows):
+    rows = list(rows)
+    if rows:
+        placeholders = ", ".join("?" * len(columns))
+        cursor.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+    return len(rows)
+
+
+def _edited(value, rng):
+    """A plausible new value of a column for an UPDATE payload."""
+    if isinstance(value, float):
+        return round(value * rng.uniform(0.8, 1.2), 2)
+    if isinstance(value, int):
+        return value + rng.randint(1, 5)
+    try:
+        return (date.fromisoformat(value[:10]) + timedelta(days=rng.randint(1, 7))).isoformat() + value[10:]
+    except ValueError:
+        return f"{value} (editado)"
+
+
+# --- 3. GENERATORS ---
+class SyntheticAtelier:
+    """Fills one connection; each step commits and records its row count in `counts`."""
+
+    def __init__(self, conn, settings, seed, end_date):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.s = settings
+        self.rng = _Random(seed)
+        self.end = end_date
+        self.start = end_date - timedelta(days=int(365 * settings['years']))
+        self.counts = {}
+
+    def _commit(self, table, count):
+        self.conn.commit()
+        self.counts[table] = self.counts.get(table, 0) + count
+
+    def users(self):
+        import auth
+        password_hash = auth.hash_password(SYNTHETIC_PASSWORD)
+        created = self.start.isoformat()
+        rows = [('admin', password_hash, 'admin', 'Administrador', 1, created),
+                ('ira', password_hash, 'vendedor', 'Ira', 1, created),
+                ('neli', password_hash, 'vendedor', 'Neli', 1, created),
+                ('consulta', password_hash, 'visualizador', 'Consulta', 1, created)]
+        self._commit('users', _insert(self.cursor, 'users',
+                                      ('username', 'password_hash', 'role', 'name', 'active', 'created_at'), rows))
+        self.usernames = dict(self.cursor.execute("SELECT id, username FROM users ORDER BY id").fetchall())
+        self.user_ids = list(self.usernames)
+
+    def parties(self):
+        rng = self.rng
+        suppliers = [(f"Fornecedor {rng.choice(LAST_NAMES)} {i + 1}", rng.person(), rng.phone(),
+                      f"vendas{i + 1}@fornecedor.com.br", None) for i in range(self.s['suppliers'])]
+        self._commit('suppliers', _insert(self.cursor, 'suppliers', ('name', 'contact', 'phone', 'email', 'notes'), suppliers))
+        clients = []
+        for i in range(self.s['clients']):
+            name = rng.person()
+            clients.append((name, None, rng.phone(), f"{name.split()[0].lower()}{i}@email.com", None))
+        self._commit('clients', _insert(self.cursor, 'clients', ('name', 'contact', 'phone', 'email', 'notes'), clients))
+        self.supplier_ids = [r[0] for r in self.cursor.execute("SELECT id FROM suppliers")]
+        self.client_ids = [r[0] for r in self.cursor.execute("SELECT id FROM clients")]
+
+    def materials(self):
+        """Materials plus their purchase/consumption history; stock_level is the history's final balance."""
+        rng, s = self.rng, self.s
+        category_id = self.cursor.execute("SELECT id FROM material_categories ORDER BY id LIMIT 1").fetchone()[0]
+        self.material_kinds = {'clay': [], 'glaze': [], 'supply': [], 'labor': []}
+        materials, histories = [], []
+        for i in range(s['materials']):
+            roll = rng.random()
+            if i == 0:
+                kind = 'labor'
+            elif roll < s['clay_share']:
+                kind = 'clay'
+            elif roll < s['clay_share'] + s['glaze_share']:
+                kind = 'glaze'
+            else:
+                kind = 'supply'
+            if kind == 'labor':
+                name, unit, price, mtype = 'Mão de Obra Ceramista', 'h', 35.0, 'Mão de Obra'
+            elif kind == 'clay':
+                name, unit, price, mtype = f"{rng.choice(CLAYS)} {i}", 'kg', rng.uniform(6, 18), 'Material'
+            elif kind == 'glaze':
+                name, unit, price, mtype = f"{rng.choice(GLAZES)} {i}", 'kg', rng.uniform(40, 140), 'Material'
+            else:
+                name, unit, price, mtype = f"{rng.choice(SUPPLIES)} {i}", 'un', rng.uniform(0.5, 12), 'Material'
+            supplier_id = rng.choice(self.supplier_ids) if self.supplier_ids else None
+            history, stock = [], 0.0
+            if kind != 'labor':
+                for month in _months(self.start, self.end):
+                    price *= 1 + rng.gauss(s['monthly_price_drift'], s['monthly_price_drift'])
+                    for _ in range(rng.poisson(s['purchases_per_month'])):
+                        day = min(month + timedelta(days=rng.randint(0, 27)), self.end)
+                        qty = round(rng.uniform(5, 50) if unit == 'kg' else rng.uniform(20, 200), 2)
+                        history.append((day, 'ENTRADA', qty, round(qty * price, 2)))
+                        stock += qty
+                    use = round(stock * rng.uniform(0.3, 0.8), 2)
+                    if use > 0:
+                        day = min(month + timedelta(days=rng.randint(0, 27)), self.end)
+                        history.append((day, 'SAIDA', use, None))
+                        stock -= use
+                history.sort(key=lambda h: h[0])
+            materials.append((name, None, round(price, 4), unit, round(stock, 2), round(rng.uniform(2, 10), 1),
+                              mtype, supplier_id, category_id))
+            histories.append((kind, supplier_id, history))
+
+        self._commit('materials', _insert(self.cursor, 'materials', (
+            'name', 'supplier', 'price_per_unit', 'unit', 'stock_level', 'min_stock_alert', 'type',
+            'supplier_id', 'category_id'), materials))
+
+        ids = [r[0] for r in self.cursor.execute("SELECT id FROM materials ORDER BY id")]
+        self.material_names = {material_id: row[0] for material_id, row in zip(ids, materials)}
+        transactions, expenses = [], []
+        for material_id, (kind, supplier_id, history), row in zip(ids, histories, materials):
+            self.material_kinds[kind].append(material_id)
+            for day, ttype, qty, cost in history:
+                user_id = rng.choice(self.user_ids)
+                if ttype == 'ENTRADA':
+                    transactions.append((material_id, day.isoformat(), ttype, qty, cost, 'Compra', user_id, round(cost / qty, 6)))
+                    expenses.append((day.isoformat(), f"Compra: {row[0]}", cost, 'Compra de Insumo', supplier_id, material_id))
+                else:
+                    transactions.append((material_id, day.isoformat(), ttype, qty, None, 'Consumo mensal', user_id, None))
+        self._commit('inventory_transactions', _insert(self.cursor, 'inventory_transactions', (
+            'material_id', 'date', 'type', 'quantity', 'cost', 'notes', 'user_id', 'unit_cost'), transactions))
+        self._commit('expenses', _insert(self.cursor, 'expenses', (
+            'date', 'description', 'amount', 'category', 'supplier_id', 'linked_material_id'), expenses))
+
+    def products(self):
+        """Plain products with recipes and variants, then kits (some containing earlier kits)."""
+        rng, s = self.rng, self.s
+        self.cursor.executemany("INSERT OR IGNORE INTO product_categories (name) VALUES (?)",
+                                [(c,) for c in PRODUCT_CATEGORIES])
+        n_kits = int(s['products'] * s['kit_share'])
+        n_plain = max(1, s['products'] - n_kits)
+        plain = []
+        for i in range(n_plain):
+            ptype = rng.choice(PRODUCT_TYPES)
+            price = round(rng.lognormvariate(math.log(s['price_median']), s['price_sigma']), 2)
+            weight = round(rng.uniform(150, 2500), 0)
+            labor = round(rng.uniform(0.3, 3.0), 2)
+            category = rng.choice(PRODUCT_CATEGORIES[:-1])
+            plain.append((f"{ptype} {rng.choice(FINISHES)} {i + 1}", f"{ptype} de cerâmica feita à mão",
+                          category, weight, labor, price, 0, '[]', rng.randint(0, 30)))
+        kits = []
+        for i in range(n_kits):
+            price = round(rng.lognormvariate(math.log(s['price_median'] * 3), s['price_sigma']), 2)
+            kits.append((f"Kit {rng.choice(FINISHES)} {i + 1}", "Conjunto de peças", 'Kits', 0, 0.2, price, 0, '[]', 0))
+        columns = ('name', 'description', 'category', 'weight_g', 'labor_time_h', 'base_price', 'markup',
+                   'image_paths', 'stock_quantity')
+        self._commit('products', _insert(self.cursor, 'products', columns, plain + kits))
+
+        ids = [r[0] for r in self.cursor.execute("SELECT id FROM products ORDER BY id")]
+        self.plain_ids, self.kit_ids = ids[:n_plain], ids[n_plain:]
+        self.prices = {pid: row[5] for pid, row in zip(ids, plain + kits)}
+        kinds = self.material_kinds
+
+        recipes, variants, components = [], [], []
+        for pid, row in zip(self.plain_ids, plain):
+            if kinds['clay']:
+                recipes.append((pid, rng.choice(kinds['clay']), round(row[3] / 1000 * 1.2, 3)))
+            for glaze in rng.sample(kinds['glaze'], min(len(kinds['glaze']), rng.randint(1, 2))):
+                recipes.append((pid, glaze, round(rng.uniform(0.03, 0.2), 3)))
+            if kinds['supply'] and rng.random() < 0.7:
+                recipes.append((pid, rng.choice(kinds['supply']), 1.0))
+            if kinds['labor']:
+                recipes.append((pid, kinds['labor'][0], row[4]))
+            if kinds['glaze'] and rng.random() < s['variant_share']:
+                count = min(len(kinds['glaze']), rng.between(s['variants_per_product']))
+                for glaze in rng.sample(kinds['glaze'], count):
+                    glaze_name = self.material_names[glaze].replace('Esmalte ', '')
+                    variants.append((pid, glaze_name, rng.randint(0, 12), round(rng.choice([0, 0, 5, 10, 15]), 2),
+                                     round(rng.uniform(0.05, 0.15), 3), glaze))
+        for index, kit_id in enumerate(self.kit_ids):
+            children = rng.sample(self.plain_ids, min(len(self.plain_ids), rng.between(s['kit_components'])))
+            components.extend((kit_id, child, rng.randint(1, 4)) for child in children)
+            if index and rng.random() < s['nested_kit_share']:
+                components.append((kit_id, rng.choice(self.kit_ids[:index]), 1))
+            if kinds['supply']:
+                recipes.append((kit_id, rng.choice(kinds['supply']), 1.0))
+
+        self._commit('product_recipes', _insert(self.cursor, 'product_recipes', ('product_id', 'material_id', 'quantity'), recipes))
+        self._commit('product_variants', _insert(self.cursor, 'product_variants', (
+            'product_id', 'variant_name', 'stock_quantity', 'price_adder', 'material_quantity', 'material_id'), variants))
+        self._commit('product_kits', _insert(self.cursor, 'product_kits', (
+            'parent_product_id', 'child_product_id', 'quantity'), components))
+
+        self.variants = {}
+        for vid, pid, adder in self.cursor.execute("SELECT id, product_id, price_adder FROM product_variants"):
+            self.variants.setdefault(pid, []).append((vid, adder))
+
+        # Zipf popularity over a shuffled catalog
+        catalog = self.plain_ids + self.kit_ids
+        order = catalog[:]
+        rng.shuffle(order)
+        weights = [1 / (rank + 1) ** s['popularity_zipf'] for rank in range(len(order))]
+        self.popular = order
+        self.popular_cum = list(itertools.accumulate(weights))
+
+    def _pick_products(self, k):
+        total = self.popular_cum[-1]
+        return [self.popular[bisect.bisect_left(self.popular_cum, self.rng.random() * total)] for _ in range(k)]
+
+    def _variant_for(self, product_id):
+        options = self.variants.get(product_id)
+        if options and self.rng.random() < 0.7:
+            return self.rng.choice(options)
+        return None, 0.0
+
+    def sales(self):
+        """POS sales: daily Poisson volume with month/weekday seasonality, baskets share an order_id."""
+        rng, s = self.rng, self.s
+        items_weights = {int(k): v for k, v in s['items_per_sale'].items()}
+        rows = []
+        for day in _days(self.start, self.end):
+            lam = s['sales_per_day'] * s['month_weights'][day.month - 1] * s['weekday_weights'][day.weekday()]
+            for n in range(rng.poisson(lam)):
+                order_id = f"TRX-{day.strftime('%y%m%d')}-{n:04X}"
+                client_id = rng.choice(self.client_ids) if self.client_ids and rng.random() < s['identified_client_share'] else None
+                payment = rng.weighted(s['payment_methods'])
+                salesperson = rng.weighted(s['salespeople'])
+                discount_pct = rng.uniform(*s['discount_pct']) if rng.random() < s['discount_share'] else 0.0
+                for product_id in self._pick_products(rng.weighted(items_weights)):
+                    variant_id, adder = self._variant_for(product_id)
+                    qty = rng.choices([1, 2, 3, 4], weights=[0.7, 0.2, 0.07, 0.03])[0]
+                    gross = (self.prices[product_id] + adder) * qty
+                    discount = round(gross * discount_pct, 2)
+                    rows.append((day.isoformat(), product_id, qty, round(gross - discount, 2), 'Finalizada', client_id,
+                                 discount, payment, None, salesperson, order_id, variant_id))
+            if len(rows) >= 20000:
+                self._commit('sales', self._insert_sales(rows))
+                rows = []
+        self._commit('sales', self._insert_sales(rows))
+
+    def _insert_sales(self, rows):
+        return _insert(self.cursor, 'sales', (
+            'date', 'product_id', 'quantity', 'total_price', 'status', 'client_id', 'discount', 'payment_method',
+            'notes', 'salesperson', 'order_id', 'variant_id'), rows)
+
+    def orders(self):
+        """Commission orders, their items, WIP cards for open work, deliveries as sales and production history."""
+        rng, s = self.rng, self.s
+        counts = dict.fromkeys(('commission_orders', 'commission_items', 'production_wip', 'production_history',
+                                'production_losses', 'sales'), 0)
+        for month in _months(self.start, self.end):
+            for _ in range(rng.poisson(s['orders_per_month'])):
+                created = min(month + timedelta(days=rng.randint(0, 27)), self.end)
+                due = created + timedelta(days=rng.between(s['order_lead_days']))
+                age = (self.end - due).days
+                if age > 30:
+                    status = 'Entregue' if rng.random() < 0.95 else 'Concluída'
+                elif age > 0:
+                    status = rng.choice(['Entregue', 'Concluída', 'Em Produção'])
+                else:
+                    status = rng.choice(['Pendente', 'Em Produção', 'Em Produção', 'Concluída'])
+
+                items = []
+                for product_id in self._pick_products(rng.between(s['order_items'])):
+                    variant_id, adder = self._variant_for(product_id)
+                    items.append((product_id, variant_id, rng.between(s['order_item_quantity']),
+                                  round(self.prices[product_id] + adder, 2)))
+                subtotal = sum(q * price for _, _, q, price in items)
+                discount = round(subtotal * rng.choice([0, 0, 0.05, 0.1]), 2)
+                total = round(subtotal - discount, 2)
+                deposit = round(total * rng.uniform(*s['order_deposit_pct']), 2)
+                self.cursor.execute("""
+                    INSERT INTO commission_orders (client_id, total_price, deposit_amount, manual_discount, date_created,
+                                                   date_due, status, notes)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, (rng.choice(self.client_ids) if self.client_ids else None, total, deposit, discount,
+                      created.isoformat(), due.isoformat(), status, f"Encomenda sintética ({len(items)} itens)"))
+                order_id = self.cursor.lastrowid
+                counts['commission_orders'] += 1
+
+                for product_id, variant_id, qty, price in items:
+                    from_stock = rng.randint(0, qty // 3)
+                    to_make = qty - from_stock
+                    if status in ('Entregue', 'Concluída'):
+                        produced = to_make
+                    elif status == 'Em Produção':
+                        produced = rng.randint(0, to_make)
+                    else:
+                        produced = 0
+                    self.cursor.execute("""
+                        INSERT INTO commission_items (order_id, product_id, quantity, quantity_from_stock,
+                                                      quantity_produced, unit_price, variant_id)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """, (order_id, product_id, qty, from_stock, produced, price, variant_id))
+                    item_id = self.cursor.lastrowid
+                    counts['commission_items'] += 1
+
+                    if produced:
+                        made_at = rng.moment(min(created + timedelta(days=rng.randint(5, 30)), self.end))
+                        user_id = rng.choice(self.user_ids)
+                        self.cursor.execute("""
+                            INSERT INTO production_history (timestamp, product_id, product_name, quantity, order_id,
+                                                            user_id, username, notes)
+                            VALUES (?, ?, (SELECT name FROM products WHERE id = ?), ?, ?, ?, ?, ?)
+                        """, (made_at.isoformat(), product_id, product_id, produced, order_id, user_id,
+                              self.usernames[user_id], f"Encomenda #{order_id}"))
+                        counts['production_history'] += 1
+                    if status in ('Pendente', 'Em Produção') and produced < to_make:
+                        counts['production_wip'] += self._wip_card(product_id, variant_id, order_id, item_id,
+                                                                   to_make - produced, created, counts)
+                    if status == 'Entregue':
+                        delivered = min(due + timedelta(days=rng.randint(-5, 5)), self.end)
+                        ratio = deposit / total if total else 0
+                        gross = price * qty
+                        self.cursor.execute("""
+                            INSERT INTO sales (date, product_id, quantity, total_price, status, client_id, discount,
+                                               payment_method, notes, salesperson, order_id, variant_id)
+                            VALUES (?, ?, ?, ?, 'Finalizada', (SELECT client_id FROM commission_orders WHERE id = ?),
+                                    ?, 'Misto', ?, 'Sistema', ?, ?)
+                        """, (delivered.isoformat(), product_id, qty, round(gross * (1 - ratio), 2), order_id,
+                              round(gross * ratio, 2), f"Encomenda #{order_id}",
+                              f"ENC-{delivered.strftime('%y%m%d')}-{order_id}", variant_id))
+                        counts['sales'] += 1
+            self.conn.commit()
+
+        for _ in range(s['stock_wip_cards']):
+            product_id = rng.choice(self.plain_ids)
+            variant_id, _ = self._variant_for(product_id)
+            counts['production_wip'] += self._wip_card(product_id, variant_id, None, None, rng.randint(2, 20),
+                                                       self.end - timedelta(days=rng.randint(1, 40)), counts)
+        for table, count in counts.items():
+            self._commit(table, count)
+
+    def _wip_card(self, product_id, variant_id, order_id, item_id, qty, started, counts):
+        rng = self.rng
+        stage_index = rng.randint(0, len(STAGES) - 1)
+        moment = rng.moment(started)
+        history = {}
+        for stage in STAGES[:stage_index + 1]:
+            history[stage] = moment.isoformat(timespec='minutes')
+            moment += timedelta(days=rng.randint(1, 6), hours=rng.randint(0, 8))
+        if stage_index and rng.random() < self.s['loss_share']:
+            lost = rng.randint(1, max(1, qty // 4))
+            stage = STAGES[rng.randint(1, stage_index)]
+            history[f"Quebra ({stage})"] = f"-{lost} pcs | {history[stage]}"
+            self.cursor.execute("""
+                INSERT INTO production_losses (timestamp, product_id, variant_id, stage, quantity, reason, order_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (history[stage], product_id, variant_id, stage, lost,
+                  rng.choice(['Rachadura', 'Bolha no esmalte', 'Empenou', 'Quebra no manuseio']), order_id))
+            counts['production_losses'] += 1
+        self.cursor.execute("""
+            INSERT INTO production_wip (product_id, variant_id, order_id, order_item_id, stage, quantity, start_date,
+                                        materials_deducted, stage_history, notes, priority)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (product_id, variant_id, order_id, item_id, STAGES[stage_index], qty, started.isoformat(),
+              1 if stage_index >= 1 else 0, json.dumps(history), None, rng.randint(0, 3)))
+        return 1
+
+    def firings(self):
+        rng, s = self.rng, self.s
+        kilns = [r[0] for r in self.cursor.execute("SELECT id FROM kilns ORDER BY id")]
+        rows, maintenance = [], []
+        for month in _months(self.start, self.end):
+            for _ in range(rng.poisson(s['firings_per_month'])):
+                day = min(month + timedelta(days=rng.randint(0, 27)), self.end)
+                kiln_index = rng.randrange(len(kilns))
+                ftype = rng.weighted({'Biscoito': 0.5, 'Esmalte': 0.45, 'Outro': 0.05})
+                kwh = round(rng.uniform(35, 60) * (1 + kiln_index) * (1.2 if ftype == 'Esmalte' else 1.0), 1)
+                rows.append((day.isoformat(), ftype, kwh, round(kwh * s['kwh_price'], 2), kilns[kiln_index], None, None))
+            if rng.random() < 0.1:
+                day = min(month + timedelta(days=rng.randint(0, 27)), self.end)
+                maintenance.append((rng.choice(kilns), day.isoformat(), rng.choice(['Resistência', 'Termopar', 'Estrutura']),
+                                    'Manutenção preventiva', None, None))
+        self._commit('firings', _insert(self.cursor, 'firings', (
+            'date', 'type', 'power_consumption_kwh', 'cost', 'kiln_id', 'observation', 'image_path'), rows))
+        self._commit('kiln_maintenance', _insert(self.cursor, 'kiln_maintenance', (
+            'kiln_id', 'date', 'category', 'description', 'observation', 'image_path'), maintenance))
+
+    def classes(self):
+        """Classes, students joining over the period, monthly tuitions and material consumptions."""
+        rng, s = self.rng, self.s
+        self._commit('classes', _insert(self.cursor, 'classes', ('name', 'schedule', 'notes'),
+                                        [(name, schedule, None) for name, schedule in CLASSES]))
+        class_ids = [r[0] for r in self.cursor.execute("SELECT id FROM classes ORDER BY id")]
+        months = list(_months(self.start, self.end))
+        clays = self.material_kinds['clay'] or self.material_kinds['supply']
+        tuitions, consumptions, n_students = [], [], 0
+        for _ in range(s['students']):
+            join_month = rng.choice(months)
+            active_months = [m for m in months if m >= join_month]
+            leave = next((i for i in range(len(active_months)) if rng.random() < s['student_churn_per_month']), None)
+            if leave is not None:
+                active_months = active_months[:leave + 1]
+            self.cursor.execute(
+                "INSERT INTO students (name, phone, active, class_id, join_date) VALUES (?, ?, ?, ?, ?)",
+                (rng.person(), rng.phone(), 0 if leave is not None else 1, rng.choice(class_ids),
+                 (join_month + timedelta(days=rng.randint(0, 20))).isoformat()))
+            student_id = self.cursor.lastrowid
+            n_students += 1
+            for month in active_months:
+                recent = (self.end - month).days < 35
+                paid = not recent and rng.random() < s['tuition_paid_share']
+                payment_date = (month + timedelta(days=rng.randint(4, 15))).isoformat() if paid else None
+                amount = s['tuition_amount']
+                partial = 0.0 if paid or rng.random() < 0.8 else round(amount / 2, 2)
+                tuitions.append((student_id, month.strftime('%m/%Y'), month.isoformat(), amount,
+                                 'Pago' if paid else 'Pendente', payment_date, amount if paid else partial,
+                                 datetime.combine(month, datetime.min.time()).isoformat(sep=' ')))
+                for _ in range(rng.poisson(s['consumptions_per_student_month'])):
+                    qty = round(rng.uniform(1, 5), 1)
+                    unit_price = round(rng.uniform(12, 25), 2)
+                    day = min(month + timedelta(days=rng.randint(0, 27)), self.end)
+                    c_paid = not recent and rng.random() < s['tuition_paid_share']
+                    consumptions.append((student_id, f"Massa extra ({qty} kg)", qty, unit_price, round(qty * unit_price, 2),
+                                         day.isoformat(), 'Pago' if c_paid else 'Pendente',
+                                         (day + timedelta(days=3)).isoformat() if c_paid else None,
+                                         round(qty * unit_price, 2) if c_paid else 0.0, rng.choice(clays) if clays else None))
+        self._commit('students', n_students)
+        self._commit('tuitions', _insert(self.cursor, 'tuitions', (
+            'student_id', 'month_year', 'period_date', 'amount', 'status', 'payment_date', 'amount_paid', 'created_at'),
+            tuitions))
+        self._commit('student_consumptions', _insert(self.cursor, 'student_consumptions', (
+            'student_id', 'description', 'quantity', 'unit_price', 'total_value', 'date', 'status', 'payment_date',
+            'amount_paid', 'material_id'), consumptions))
+
+    def expenses(self):
+        """Fixed costs launched every month (linked by fixed_cost_id/period) and eventual expenses."""
+        rng, s = self.rng, self.s
+        self._commit('fixed_costs', _insert(self.cursor, 'fixed_costs', (
+            'description', 'value', 'due_day', 'periodicity', 'category', 'start_date'),
+            [(desc, value, due, 'Mensal', cat, self.start.replace(day=1).isoformat()) for desc, value, due, cat in FIXED_COSTS]))
+        fixed = self.cursor.execute("SELECT id, description, value, due_day, category FROM fixed_costs").fetchall()
+        rows = []
+        for month in _months(self.start, self.end):
+            for fc_id, desc, value, due_day, category in fixed:
+                day = month.replace(day=min(due_day, 28))
+                if day <= self.end:
+                    rows.append((day.isoformat(), desc, round(value * rng.uniform(0.9, 1.1), 2), category, None, None,
+                                 fc_id, month.strftime('%Y-%m')))
+            for _ in range(rng.poisson(s['eventual_expenses_per_month'])):
+                category, desc = rng.choice(EVENTUAL_EXPENSES)
+                day = min(month + timedelta(days=rng.randint(0, 27)), self.end)
+                rows.append((day.isoformat(), desc, round(rng.uniform(30, 600), 2), category,
+                             rng.choice(self.supplier_ids) if self.supplier_ids else None, None, None, None))
+        self._commit('expenses', _insert(self.cursor, 'expenses', (
+            'date', 'description', 'amount', 'category', 'supplier_id', 'linked_material_id', 'fixed_cost_id', 'period'),
+            rows))
+
+    def audit_rows(self):
+        """
+        Audit entries spread over the period, with payloads built from the
+        sampled record as the log_action callers do: the full row for
+        CREATE/DELETE, old and new values of the edited columns for UPDATE.
+        """
+        import audit
+        rng, s = self.rng, self.s
+        max_ids = {t: self.cursor.execute(f"SELECT COALESCE(MAX(id), 1) FROM {t}").fetchone()[0] for t in AUDIT_TABLES}
+        rows = []
+        for day in _days(self.start, self.end):
+            for _ in range(rng.poisson(s['audit_per_day'])):
+                table = rng.choice(AUDIT_TABLES)
+                record_id = rng.randint(1, max_ids[table])
+                state = audit.record_state(self.conn, table, record_id)
+                if state is None:
+                    continue
+                action = rng.weighted({'CREATE': 0.5, 'UPDATE': 0.4, 'DELETE': 0.1})
+                old = None if action == 'CREATE' else state
+                new = None if action == 'DELETE' else state
+                if action == 'UPDATE':
+                    editable = [c for c, v in state.items() if v is not None and c != 'id' and not c.endswith('_id')]
+                    columns = rng.sample(editable, min(len(editable), rng.randint(1, 2)))
+                    old = {c: state[c] for c in columns}
+                    new = {c: _edited(state[c], rng) for c in columns}
+                user_id = rng.choice(self.user_ids)
+                rows.append((rng.moment(day, 8, 20).isoformat(), user_id, self.usernames[user_id], action, table,
+                             record_id, audit.pack_payload(old), audit.pack_payload(new)))
+            if len(rows) >= 20000:
+                self._commit('audit_log', self._insert_audit(rows))
+                rows = []
+        self._commit('audit_log', self._insert_audit(rows))
+
+    def _insert_audit(self, rows):
+        return _insert(self.cursor, 'audit_log', (
+            'timestamp', 'user_id', 'username', 'action', 'table_name', 'record_id', 'old_data', 'new_data'), rows)
+
+    def derived(self):
+        """Average material costs, product cost versions (re-links sales) and student balances."""
+        from services import cost_service, student_service
+        cost_service.rebuild_material_costs(self.conn)
+        result = cost_service.rebuild_product_cost_history(self.conn)
+        self.counts['product_costs'] = result.get('versions', 0)
+        student_service.recompute_student_balances(self.conn)
+        self.conn.execute("ANALYZE")
+        self.conn.commit()
+
+    def run(self):
+        steps = (self.users, self.parties, self.materials, self.products, self.sales, self.orders,
+                 self.firings, self.classes, self.expenses, self.audit_rows, self.derived)
+        for step in steps:
+            started = time.perf_counter()
+            step()
+            print(f"  {step.__name__:<12} {time.perf_counter() - started:6.1f}s")
+        return self.counts
+
+
+def generate(db_path, profile='small', overrides=None, seed=42, end_date=None):
+    """
+    Creates `db_path` with the real schema and fills it. Raises FileExistsError
+    if the file exists. Returns {table: rows inserted}.
+    """
+    if os.path.exists(db_path):
+        raise FileExistsError(db_path)
+    settings = build_settings(profile, overrides)
+    end_date = end_date or date.today()
+
+    folder = os.path.dirname(os.path.abspath(db_path))
+    os.makedirs(folder, exist_ok=True)
+    previous = (database.DB_PATH, database.DB_FOLDER)
+    database.DB_PATH, database.DB_FOLDER = db_path, folder
+    try:
+        database.init_db()
+        conn = database.get_connection()
+        try:
+            # Bulk load: a crash only loses this throwaway file
+            conn.execute("PRAGMA synchronous = OFF")
+            counts = SyntheticAtelier(conn, settings, seed, end_date).run()
+        finally:
+            conn.close()
+    finally:
+        database.DB_PATH, database.DB_FOLDER = previous
+    return counts
+
+
+# --- 4. MAIN ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default='small')
+    parser.add_argument("--out", default=config.DB_PATH, help="Arquivo do banco (padrão: %(default)s)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--end-date", type=date.fromisoformat, default=None,
+                        help="Último dia do histórico, AAAA-MM-DD (padrão: hoje)")
+    parser.add_argument("--config", help="JSON com parâmetros que substituem os do perfil")
+    parser.add_argument("--set", action="append", default=[], metavar="CHAVE=VALOR",
+                        help="Substitui um parâmetro (valor em JSON: 0.2, [1, 3], {...})")
+    parser.add_argument("--force", action="store_true", help="Substitui o arquivo se ele existir")
+    args = parser.parse_args(argv)
+
+    overrides = {}
+    if args.config:
+        with open(args.config, encoding='utf-8') as f:
+            overrides.update(json.load(f))
+    for item in args.set:
+        key, sep, raw = item.partition('=')
+        if not sep:
+            parser.error(f"--set espera CHAVE=VALOR: {item}")
+        overrides[key.strip()] = _parse_value(raw)
+
+    if os.path.exists(args.out):
+        if not args.force:
+            parser.error(f"{args.out} já existe (use --force para substituir)")
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.out + suffix):
+                os.remove(args.out + suffix)
+
+    print(f"Gerando banco sintético '{args.profile}' (seed {args.seed}) em {args.out}")
+    started = time.perf_counter()
+    try:
+        counts = generate(args.out, args.profile, overrides, args.seed, args.end_date)
+    except ValueError as e:
+        parser.error(str(e))
+    print()
+    for table, count in counts.items():
+        print(f"  {table:<24}{count:>10,}".replace(',', '.'))
+    size_mb = os.path.getsize(args.out) / (1024 * 1024)
+    print(f"\n✅ Concluído em {time.perf_counter() - started:.1f}s ({size_mb:.1f} MB). Senha dos usuários: '{SYNTHETIC_PASSWORD}'")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""
+Point-in-time restore tool for the local backup chain (utils.backup_utils).
+
+Rebuilds a restore point (full snapshot + incrementals) into a standalone
+.db file. It never touches the live database; use the admin page to swap it in.
+
+Usage:
+    python scripts/restore_backup.py --list
+    python scripts/restore_backup.py --at "2026-10-19 14:00" --out restored.db
+    python scripts/restore_backup.py --point backup_20261019_140002_513.inc.gz --out restored.db
+"""
+import argparse
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import backup_utils  # noqa: E402
+
+
+def print_points():
+    points = backup_utils.list_restore_points()
+    if not points:
+        print("Nenhum backup encontrado em", backup_utils.BACKUP_FOLDER)
+        return
+    for point in points:
+        kind = "completo   " if point['kind'] == 'full' else "incremental"
+        print(f"{point['timestamp']:%Y-%m-%d %H:%M:%S}  {kind}  {point['size'] / 1e6:>8.2f} MB  {point['name']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--folder", default=backup_utils.BACKUP_FOLDER, help="Pasta dos backups")
+    parser.add_argument("--list", action="store_true", help="Lista os pontos de restauração")
+    parser.add_argument("--at", help="Data/hora (AAAA-MM-DD HH:MM[:SS]); usa o último ponto até esse instante")
+    parser.add_argument("--point", help="Nome exato do ponto de restauração")
+    parser.add_argument("--out", help="Arquivo .db de saída")
+    args = parser.parse_args()
+
+    backup_utils.BACKUP_FOLDER = args.folder
+    if args.list:
+        print_points()
+        return 0
+    if not args.out or not (args.at or args.point):
+        parser.error("informe --out e --at ou --point")
+
+    name = args.point
+    if args.at:
+        name = backup_utils.find_restore_point(datetime.fromisoformat(args.at))
+        if name is None:
+            print(f"❌ Nenhum backup até {args.at}")
+            return 1
+
+    try:
+        backup_utils.restore_point(name, args.out)
+    except (ValueError, OSError) as e:
+        print(f"❌ {e}")
+        return 1
+
+    with sqlite3.connect(args.out) as conn:
+        status = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    print(f"{'✅' if status == 'ok' else '❌'} {name} -> {args.out} (integrity_check: {status})")
+    return 0 if status == 'ok' else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
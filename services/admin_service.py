@@ -6,6 +6,7 @@ import pandas as pd
 import sqlite3
 import auth
 import audit
+import services.cost_service as cost_service
 from datetime import datetime
 from utils.logging_config import get_logger, log_exception
 
@@ -218,7 +219,7 @@ def export_clients(conn):
 # ==============================================================================
 
 def upsert_material(cursor, row, user_id=1):
-    """Upserts a material from import row."""
+    """Upserts a material from import row. Returns the material id."""
     # 1. Foreign Keys
     cat_name = str(row['Categoria']).strip()
     cursor.execute("SELECT id FROM material_categories WHERE name=?", (cat_name,))
@@ -264,9 +265,11 @@ def upsert_material(cursor, row, user_id=1):
             INSERT INTO materials (name, price_per_unit, unit, stock_level, type, category_id, supplier_id)
             VALUES (?, ?, ?, ?, ?, ?, ?)
         """, (row['Nome'], row['Preço'], row['Unidade'], row['Estoque'], row['Tipo'], cat_id, sup_id))
+        target_id = cursor.lastrowid
+    return target_id
 
 def upsert_product_and_composition(cursor, row, user_id=1, username='system'):
-    """Upserts a product and its composition."""
+    """Upserts a product and its composition. Returns the product id."""
     # 1. Product
     cursor.execute("SELECT id, stock_quantity FROM products WHERE name=?", (row['Nome'],))
     prod_res = cursor.fetchone()
@@ -336,6 +339,17 @@ def upsert_product_and_composition(cursor, row, user_id=1, username='system'):
                                 logger.warning(f"Import Warning: Component '{p_name}' not found for kit '{row['Nome']}'")
         except Exception as e:
             logger.error(f"Composition Parse Error for '{row['Nome']}': {e}")
+    return target_id
+
+def snapshot_import_costs(conn, material_ids=(), product_ids=()):
+    """
+    Cost versions after a bulk import: imported products plus every product
+    and kit using an imported material. Returns the number of versions written.
+    """
+    affected = set(product_ids) | set(cost_service.get_products_using_materials(conn, material_ids))
+    if not affected:
+        return 0
+    return cost_service.snapshot_product_costs(conn, affected, reason='Importação')
 
 def upsert_expense(cursor, row):
     """Upserts an expense."""
@@ -0,0 +1,417 @@
+"""
+Cost Service Module
+Weighted-average cost engine for materials.
+
+Replays inventory_transactions per material in chronological order and
+rebuilds the moving average price with NumPy cumulative operations instead
+of one round trip per entry. The result is stored per transaction
+(`inventory_transactions.unit_cost`), so reports can value consumption at
+the cost that applied at the time.
+
+Replay rules (same as material_service.register_entry):
+- ENTRADA with a cost is a purchase: avg = (stock * avg + cost) / (stock + qty),
+  or the purchase unit price when the stock before it was zero or negative.
+- ENTRADA without a cost, or a return (is_return set by the writer; older
+  ones were stored with cost 0), puts stock back at the current average.
+- SAIDA consumes at the current average.
+- AJUSTE rows are stored unsigned, so they do not move the replayed stock;
+  the opening balance is inferred from the current stock level instead.
+"""
+import sqlite3
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def _solve_recurrence(alpha: np.ndarray, beta: np.ndarray, seg: np.ndarray, start: np.ndarray) -> np.ndarray:
+    """
+    Solves a[k] = alpha[k] * a[k-1] + beta[k] for every row at once.
+
+    Rows are grouped in segments (`seg`) whose first row carries the seed
+    value `start`; alpha must be > 0 inside a segment. Uses
+    a[k] = P[k] * (start + sum(beta[j] / P[j])) with P the cumulative product.
+    """
+    log_p = pd.Series(np.log(alpha)).groupby(seg).cumsum().to_numpy()
+    scaled = pd.Series(beta * np.exp(-log_p)).groupby(seg).cumsum().to_numpy()
+    return np.exp(log_p) * (start + scaled)
+
+
+def _replay_loop(rows: pd.DataFrame, opening_avg: float) -> np.ndarray:
+    """Plain sequential replay; fallback for segments too long for the vectorised path."""
+    avg = opening_avg
+    out = np.empty(len(rows))
+    for i, (s_pre, s_post, cost, qty, purchase) in enumerate(
+            rows[['stock_pre', 'stock_post', 'cost', 'quantity', 'is_purchase']].itertuples(index=False)):
+        if purchase:
+            avg = (s_pre * avg + cost) / s_post if s_pre > 0 else (cost / qty if qty > 0 else 0.0)
+        out[i] = avg
+    return out
+
+
+def compute_cost_history(transactions: pd.DataFrame, materials: pd.DataFrame) -> pd.DataFrame:
+    """
+    Computes the average unit cost after every transaction.
+
+    `transactions`: id, material_id, type, quantity, cost (ordered or not) and
+    optionally is_return, which marks returns so they are not taken for purchases.
+    `materials`: id, stock_level, price_per_unit.
+    Returns `transactions` (chronological) with stock_post, is_purchase and unit_cost columns.
+    """
+    if transactions.empty:
+        return transactions.assign(stock_post=pd.Series(dtype=float), is_purchase=pd.Series(dtype=bool),
+                                   unit_cost=pd.Series(dtype=float))
+
+    tx = transactions.sort_values(['material_id', 'date', 'id']).reset_index(drop=True)
+    tx['quantity'] = tx['quantity'].fillna(0).astype(float)
+    mats = materials.set_index('id')
+
+    signed = np.where(tx['type'] == 'ENTRADA', tx['quantity'],
+                      np.where(tx['type'] == 'SAIDA', -tx['quantity'], 0.0))
+    tx['signed'] = signed
+    by_mat = tx.groupby('material_id', sort=False)
+
+    # Opening stock so that the replay ends at the current stock level
+    current_stock = tx['material_id'].map(mats['stock_level']).fillna(0).astype(float)
+    opening = current_stock - by_mat['signed'].transform('sum')
+    tx['stock_post'] = opening + by_mat['signed'].cumsum()
+    tx['stock_pre'] = tx['stock_post'] - tx['signed']
+
+    is_return = tx['is_return'].fillna(0).astype(bool) if 'is_return' in tx.columns else False
+    tx['is_purchase'] = (tx['type'] == 'ENTRADA') & tx['cost'].notna() & ~is_return
+    tx['cost'] = tx['cost'].fillna(0).astype(float)
+
+    # Opening average: first purchase price, else the current material price
+    purchases = tx[tx['is_purchase'] & (tx['quantity'] > 0)]
+    firsts = purchases.groupby('material_id')[['cost', 'quantity']].first()
+    first_price = firsts['cost'] / firsts['quantity']
+    opening_avg = tx['material_id'].map(first_price).fillna(
+        tx['material_id'].map(mats['price_per_unit'])).fillna(0).astype(float)
+
+    avg = pd.Series(np.nan, index=tx.index)
+    p = tx[tx['is_purchase']]
+    if not p.empty:
+        reset = (p['stock_pre'] <= 0).to_numpy()
+        s_post = p['stock_post'].to_numpy()
+        qty = p['quantity'].to_numpy()
+        cost = p['cost'].to_numpy()
+        alpha = np.where(reset, 1.0, p['stock_pre'].to_numpy() / np.where(s_post == 0, 1, s_post))
+        beta = np.where(reset, np.divide(cost, qty, out=np.zeros_like(cost), where=qty > 0),
+                        cost / np.where(s_post == 0, 1, s_post))
+
+        # A segment starts at each material's first purchase and at every reset
+        mat_ids = p['material_id'].to_numpy()
+        new_mat = np.r_[True, mat_ids[1:] != mat_ids[:-1]]
+        seg = np.cumsum(new_mat | reset)
+        start = np.where(reset, 0.0, opening_avg[p.index].to_numpy())
+        seg_start = pd.Series(start).groupby(seg).transform('first').to_numpy()
+
+        values = _solve_recurrence(alpha, beta, seg, seg_start)
+
+        # Very long segments can underflow the cumulative product; replay those sequentially
+        bad = ~np.isfinite(values)
+        if bad.any():
+            for mat_id in np.unique(mat_ids[bad]):
+                mask = mat_ids == mat_id
+                rows = tx[tx['material_id'] == mat_id]
+                values_mat = _replay_loop(rows, float(opening_avg[rows.index[0]]))
+                values[mask] = values_mat[rows['is_purchase'].to_numpy()]
+            logger.info(f"Cost replay fell back to sequential mode for {len(np.unique(mat_ids[bad]))} material(s)")
+
+        avg[p.index] = values
+
+    tx['unit_cost'] = avg.groupby(tx['material_id']).ffill().fillna(opening_avg)
+    return tx.drop(columns=['signed', 'stock_pre'])
+
+
+def rebuild_material_costs(conn: sqlite3.Connection, material_ids: Optional[Iterable[int]] = None,
+                           update_prices: bool = True) -> Dict[str, int]:
+    """
+    Replays inventory_transactions and stores the unit cost of every transaction.
+    When `update_prices` is set, materials.price_per_unit is set to the final
+    average of each material with at least one purchase.
+    Returns {'transactions': n, 'materials': m}.
+    """
+    tx_query = "SELECT id, material_id, date, type, quantity, cost, is_return FROM inventory_transactions"
+    mat_query = "SELECT id, stock_level, price_per_unit FROM materials"
+    params = []
+    if material_ids is not None:
+        ids = [int(m) for m in material_ids]
+        if not ids:
+            return {'transactions': 0, 'materials': 0}
+        placeholders = ",".join("?" * len(ids))
+        tx_query += f" WHERE material_id IN ({placeholders})"
+        mat_query += f" WHERE id IN ({placeholders})"
+        params = ids
+
+    transactions = pd.read_sql(tx_query, conn, params=params)
+    materials = pd.read_sql(mat_query, conn, params=params)
+    history = compute_cost_history(transactions, materials)
+    if history.empty:
+        return {'transactions': 0, 'materials': 0}
+
+    cursor = conn.cursor()
+    try:
+        cursor.executemany(
+            "UPDATE inventory_transactions SET unit_cost = ? WHERE id = ?",
+            list(zip(history['unit_cost'].round(6).astype(float), history['id'].astype(int)))
+        )
+        updated_materials = 0
+        if update_prices:
+            purchased = history.loc[history['is_purchase'], 'material_id'].unique()
+            final = history[history['material_id'].isin(purchased)].groupby('material_id')['unit_cost'].last()
+            cursor.executemany(
+                "UPDATE materials SET price_per_unit = ? WHERE id = ?",
+                list(zip(final.round(6).astype(float), final.index.astype(int)))
+            )
+            updated_materials = len(final)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erro ao recalcular custos médios: {e}")
+        raise
+
+    if updated_materials:
+        snapshot_product_costs(conn, get_products_using_materials(conn, final.index), reason='Custo médio')
+
+    logger.info(f"Material costs rebuilt: {len(history)} transactions, {updated_materials} prices")
+    return {'transactions': len(history), 'materials': updated_materials}
+
+
+def get_price_history(conn: sqlite3.Connection, material_id: int) -> pd.DataFrame:
+    """Returns the average cost after each transaction of a material."""
+    return pd.read_sql("""
+        SELECT date, type, quantity, cost, unit_cost
+        FROM inventory_transactions
+        WHERE material_id = ?
+        ORDER BY date, id
+    """, conn, params=(int(material_id),))
+
+
+# ─────────────────────────────────────────────────────────
+# PRODUCT COST VERSIONS
+# ─────────────────────────────────────────────────────────
+# product_costs keeps one row per product cost version; sales.cost_id points
+# at the version in effect when the sale was recorded (set by a trigger).
+
+# valid_from of versions that apply to all history before the first change
+PRODUCT_COST_EPOCH = '1900-01-01'
+
+
+def _kit_levels(kits: pd.DataFrame) -> List[set]:
+    """
+    Kit parents grouped by nesting depth: the first level holds kits whose
+    components are plain products, each next level only kits below it.
+    A composition cycle is logged and its kits form the last level.
+    """
+    children = kits.groupby('parent_product_id')['child_product_id'].agg(set).to_dict()
+    remaining = set(children)
+    levels = []
+    while remaining:
+        level = {p for p in remaining if not (children[p] & remaining)}
+        if not level:
+            logger.warning(f"Kit composition cycle between products {sorted(remaining)}")
+            level = remaining
+        levels.append(level)
+        remaining = remaining - level
+    return levels
+
+
+def compute_product_costs(conn: sqlite3.Connection) -> pd.Series:
+    """
+    Current unit cost of every product: recipe materials at the current
+    price plus kit components at their own full cost (nested kits included).
+    Returns a Series indexed by product id.
+    """
+    products = pd.read_sql("SELECT id FROM products", conn)['id']
+    recipe = pd.read_sql("""
+        SELECT pr.product_id, SUM(pr.quantity * COALESCE(m.price_per_unit, 0)) as cost
+        FROM product_recipes pr JOIN materials m ON pr.material_id = m.id
+        GROUP BY pr.product_id
+    """, conn).set_index('product_id')['cost']
+    kits = pd.read_sql("SELECT parent_product_id, child_product_id, quantity FROM product_kits", conn)
+
+    costs = pd.Series(0.0, index=products).add(recipe, fill_value=0)
+    # Innermost kits first, so every component is priced before its parent
+    for level in _kit_levels(kits):
+        rows = kits[kits['parent_product_id'].isin(level)]
+        kit_cost = rows['quantity'] * rows['child_product_id'].map(costs).fillna(0)
+        costs = costs.add(kit_cost.groupby(rows['parent_product_id']).sum(), fill_value=0)
+    costs.index = costs.index.astype(int)
+    return costs[costs.index.isin(products)]
+
+
+def get_kit_ancestors(conn: sqlite3.Connection, product_ids: Iterable[int]) -> List[int]:
+    """Kits containing any of the products, directly or through other kits."""
+    ids = [int(p) for p in product_ids]
+    if not ids:
+        return []
+    placeholders = ",".join("?" * len(ids))
+    df = pd.read_sql(f"""
+        WITH RECURSIVE ancestors(id) AS (
+            SELECT parent_product_id FROM product_kits WHERE child_product_id IN ({placeholders})
+            UNION
+            SELECT pk.parent_product_id FROM product_kits pk JOIN ancestors a ON pk.child_product_id = a.id
+        )
+        SELECT id FROM ancestors
+    """, conn, params=ids)
+    return df['id'].astype(int).tolist()
+
+
+def get_products_using_materials(conn: sqlite3.Connection, material_ids: Iterable[int]) -> List[int]:
+    """Products whose recipe uses any of the materials, plus every kit containing them."""
+    ids = [int(m) for m in material_ids]
+    if not ids:
+        return []
+    placeholders = ",".join("?" * len(ids))
+    direct = pd.read_sql(
+        f"SELECT DISTINCT product_id FROM product_recipes WHERE material_id IN ({placeholders})",
+        conn, params=ids)['product_id'].astype(int).tolist()
+    return sorted(set(direct) | set(get_kit_ancestors(conn, direct)))
+
+
+def snapshot_product_costs(conn: sqlite3.Connection, product_ids: Optional[Iterable[int]] = None,
+                           reason: str = '', commit: bool = True) -> int:
+    """
+    Records a new cost version for each product whose current cost differs
+    from its latest version; sales of those products still without a version
+    are linked to the product's first one. Returns the number of versions written.
+    """
+    costs = compute_product_costs(conn)
+    if product_ids is not None:
+        wanted = {int(p) for p in product_ids}
+        # Kits containing a changed product change too, at any depth
+        wanted.update(get_kit_ancestors(conn, wanted))
+        costs = costs[costs.index.isin(wanted)]
+    if costs.empty:
+        return 0
+
+    latest = pd.read_sql("""
+        SELECT product_id, unit_cost, MAX(id) as version_id
+        FROM product_costs GROUP BY product_id
+    """, conn).set_index('product_id')['unit_cost']
+    changed = costs[(costs - latest.reindex(costs.index)).abs().fillna(1) > 1e-6]
+    if changed.empty:
+        return 0
+
+    now = datetime.now().isoformat(timespec='seconds')
+    cursor = conn.cursor()
+    cursor.executemany(
+        "INSERT INTO product_costs (product_id, valid_from, unit_cost, reason) VALUES (?, ?, ?, ?)",
+        [(int(pid), now, round(float(cost), 6), reason) for pid, cost in changed.items()]
+    )
+    # Sales recorded while the product had no version take its first one
+    cursor.executemany("""
+        UPDATE sales SET cost_id = (SELECT MIN(id) FROM product_costs WHERE product_id = ?)
+        WHERE product_id = ? AND cost_id IS NULL
+    """, [(int(pid), int(pid)) for pid in changed.index])
+    if commit:
+        conn.commit()
+    return len(changed)
+
+
+def _costs_as_of(points: pd.DataFrame, history: pd.DataFrame, key: str) -> pd.Series:
+    """
+    For each row of `points` (key, date) returns the history value (key, date, value)
+    in effect at that date; dates before the first change take the first value.
+    """
+    left = points.reset_index().assign(date=lambda d: pd.to_datetime(d['date'])).sort_values('date')
+    right = history[[key, 'date', 'value']].assign(date=lambda d: pd.to_datetime(d['date'])).sort_values('date')
+    merged = pd.merge_asof(left, right, on='date', by=key, direction='backward')
+    first = right.groupby(key)['value'].first()
+    merged['value'] = merged['value'].fillna(merged[key].map(first))
+    return merged.set_index('index')['value'].reindex(points.index)
+
+
+def rebuild_product_cost_history(conn: sqlite3.Connection) -> Dict[str, int]:
+    """
+    Rebuilds product_costs from the material price history stored in
+    inventory_transactions.unit_cost (see rebuild_material_costs) and re-links
+    every sale to the version in effect on its date.
+
+    Uses the current recipes and kit compositions for the whole history.
+    Returns {'versions': n, 'sales': m}.
+    """
+    recipes = pd.read_sql("SELECT product_id, material_id, quantity FROM product_recipes", conn)
+    kits = pd.read_sql("SELECT parent_product_id, child_product_id, quantity FROM product_kits", conn)
+    products = pd.read_sql("SELECT id FROM products", conn)['id'].astype(int)
+
+    # Material price history: purchases change the average; current price as the fallback
+    prices = pd.read_sql("""
+        SELECT material_id, SUBSTR(date, 1, 10) as date, unit_cost as value
+        FROM inventory_transactions
+        WHERE type = 'ENTRADA' AND cost IS NOT NULL AND unit_cost IS NOT NULL
+        ORDER BY date, id
+    """, conn).drop_duplicates(['material_id', 'date'], keep='last')
+    current = pd.read_sql("SELECT id as material_id, COALESCE(price_per_unit, 0) as value FROM materials", conn)
+    current = current[~current['material_id'].isin(prices['material_id'])].assign(date=PRODUCT_COST_EPOCH)
+    prices = pd.concat([prices, current], ignore_index=True)
+
+    # Recipe cost at every date where one of the product's materials changed price
+    points = recipes[['product_id', 'material_id']].merge(prices[['material_id', 'date']], on='material_id')
+    points = pd.concat([points[['product_id', 'date']],
+                        pd.DataFrame({'product_id': products, 'date': PRODUCT_COST_EPOCH})]).drop_duplicates()
+    rows = points.merge(recipes, on='product_id')
+    rows['value'] = rows['quantity'] * _costs_as_of(rows[['material_id', 'date']], prices, 'material_id')
+    recipe_hist = rows.groupby(['product_id', 'date'])['value'].sum().reset_index()
+    recipe_hist = pd.concat([
+        recipe_hist,
+        points[~points['product_id'].isin(recipes['product_id'])].assign(value=0.0)
+    ], ignore_index=True)
+
+    history = recipe_hist
+    # Kits: own recipe plus components, evaluated at every change of either.
+    # Innermost kits first, so components that are kits already carry their full history.
+    for level in _kit_levels(kits):
+        level_kits = kits[kits['parent_product_id'].isin(level)]
+        child_hist = history.rename(columns={'product_id': 'child_product_id'})
+        kit_points = level_kits[['parent_product_id', 'child_product_id']].merge(child_hist[['child_product_id', 'date']])
+        kit_points = pd.concat([
+            kit_points[['parent_product_id', 'date']],
+            recipe_hist[recipe_hist['product_id'].isin(level)]
+            .rename(columns={'product_id': 'parent_product_id'})[['parent_product_id', 'date']]
+        ]).drop_duplicates()
+        k_rows = kit_points.merge(level_kits, on='parent_product_id')
+        k_rows['value'] = k_rows['quantity'] * _costs_as_of(
+            k_rows[['child_product_id', 'date']], child_hist, 'child_product_id')
+        kit_hist = k_rows.groupby(['parent_product_id', 'date'])['value'].sum().reset_index()
+        own = _costs_as_of(kit_hist.rename(columns={'parent_product_id': 'product_id'})[['product_id', 'date']],
+                           recipe_hist, 'product_id')
+        kit_hist['value'] = kit_hist['value'] + own.fillna(0)
+        kit_hist = kit_hist.rename(columns={'parent_product_id': 'product_id'})
+        history = pd.concat([history[~history['product_id'].isin(kit_hist['product_id'])], kit_hist],
+                            ignore_index=True)
+
+    # Keep only actual changes
+    history = history.sort_values(['product_id', 'date'])
+    history['value'] = history['value'].round(6)
+    prev = history.groupby('product_id')['value'].shift()
+    history = history[prev.isna() | (history['value'] != prev)]
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute("UPDATE sales SET cost_id = NULL")
+        cursor.execute("DELETE FROM product_costs")
+        cursor.executemany(
+            "INSERT INTO product_costs (product_id, valid_from, unit_cost, reason) VALUES (?, ?, ?, 'Reprocessamento')",
+            list(zip(history['product_id'].astype(int), history['date'], history['value'].astype(float)))
+        )
+        cursor.execute("""
+            UPDATE sales SET cost_id = (
+                SELECT pc.id FROM product_costs pc
+                WHERE pc.product_id = sales.product_id AND pc.valid_from <= SUBSTR(sales.date, 1, 10)
+                ORDER BY pc.valid_from DESC LIMIT 1
+            )
+        """)
+        linked = cursor.rowcount
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erro ao reconstruir histórico de custos de produtos: {e}")
+        raise
+
+    logger.info(f"Product cost history rebuilt: {len(history)} versions")
+    return {'versions': len(history), 'sales': linked}
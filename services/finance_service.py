@@ -1,4 +1,5 @@
 import pandas as pd
+import numpy as np
 import sqlite3
 import logging
 from datetime import datetime, date, timedelta
@@ -171,13 +172,13 @@ def get_fixed_cost_by_id(conn: sqlite3.Connection, fc_id: int) -> Dict[str, Any]
     return df.iloc[0].to_dict() if not df.empty else {}
 
 def create_fixed_cost(conn: sqlite3.Connection, description: str, value: float, due_day: int, 
-                     periodicity: str, category: str) -> int:
+                     periodicity: str, category: str, start_date: Optional[date] = None) -> int:
     try:
         cursor = conn.cursor()
         cursor.execute("""
-            INSERT INTO fixed_costs (description, value, due_day, periodicity, category) 
-            VALUES (?, ?, ?, ?, ?)
-        """, (description, value, due_day, periodicity, category))
+            INSERT INTO fixed_costs (description, value, due_day, periodicity, category, start_date) 
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (description, value, due_day, periodicity, category, start_date.isoformat() if start_date else None))
         conn.commit()
         return cursor.lastrowid
     except Exception as e:
@@ -186,16 +187,18 @@ def create_fixed_cost(conn: sqlite3.Connection, description: str, value: float,
         raise
 
 def update_fixed_cost(conn: sqlite3.Connection, fc_id: int, description: str, value: float, 
-                     due_day: int, periodicity: str, category: str) -> Dict[str, Any]:
+                     due_day: int, periodicity: str, category: str,
+                     start_date: Optional[date] = None) -> Dict[str, Any]:
     old_data = get_fixed_cost_by_id(conn, fc_id)
     
     try:
         cursor = conn.cursor()
         cursor.execute("""
             UPDATE fixed_costs 
-            SET description=?, value=?, due_day=?, periodicity=?, category=? 
+            SET description=?, value=?, due_day=?, periodicity=?, category=?, start_date=? 
             WHERE id=?
-        """, (description, value, due_day, periodicity, category, fc_id))
+        """, (description, value, due_day, periodicity, category,
+              start_date.isoformat() if start_date else None, fc_id))
         conn.commit()
         return old_data
     except Exception as e:
@@ -216,110 +219,192 @@ def delete_fixed_cost(conn: sqlite3.Connection, fc_id: int) -> Dict[str, Any]:
         logger.error(f"Erro ao deletar custo fixo {fc_id}: {e}")
         raise
 
-def auto_process_monthly_fixed_costs(conn: sqlite3.Connection) -> int:
+# --- FIXED COST SCHEDULER ---
+# Occurrence rules (due_day is the day of month; start_date is an optional anchor):
+# - Mensal: every month, period 'YYYY-MM'
+# - Trimestral: every 3 months from the anchor month (default Jan/Apr/Jul/Oct), period 'YYYY-Qn'
+# - Anual: once a year in the anchor month (default January), period 'YYYY'
+# - Semanal: every week on ISO weekday ((due_day - 1) % 7) + 1, period 'YYYY-Www'
+# Days past the end of a month fall on its last day. Occurrences before start_date are skipped.
+
+def compute_fixed_cost_occurrences(fcs: pd.DataFrame, start_date: date, end_date: date) -> pd.DataFrame:
     """
-    Checks and inserts pending fixed costs for the current month.
-    Returns the number of created expenses.
+    Computes the due occurrences of fixed cost definitions within [start_date, end_date].
+    Returns a DataFrame with fixed_cost_id, date, period, description, amount, category.
     """
-    today = date.today()
-    curr_m = today.month
-    curr_y = today.year
-    
-    start_m_date = date(curr_y, curr_m, 1)
-    if curr_m == 12: end_m_date = date(curr_y + 1, 1, 1)
-    else: end_m_date = date(curr_y, curr_m + 1, 1)
+    cols = ['fixed_cost_id', 'date', 'period', 'description', 'amount', 'category']
+    if fcs.empty or start_date > end_date:
+        return pd.DataFrame(columns=cols)
 
-    # 1. Get all Fixed Cost Definitions
+    fcs = fcs.copy()
+    fcs['due_day'] = pd.to_numeric(fcs['due_day'], errors='coerce').fillna(1).clip(1, 31).astype(int)
+    fcs['periodicity'] = fcs['periodicity'].fillna('Mensal')
+    anchor = pd.to_datetime(fcs.get('start_date'), errors='coerce') if 'start_date' in fcs else pd.Series(pd.NaT, index=fcs.index)
+    fcs['anchor_month'] = anchor.dt.month.fillna(1).astype(int)
+    fcs['start'] = anchor
+
+    parts = []
+    # Monthly-based periodicities: one candidate per month in range
+    months = pd.period_range(start_date, end_date, freq='M')
+    monthly = fcs[fcs['periodicity'].isin(['Mensal', 'Trimestral', 'Anual'])]
+    if not monthly.empty and len(months):
+        grid = monthly.merge(pd.DataFrame({'month': months}), how='cross')
+        m_num = grid['month'].dt.month
+        keep = (
+            (grid['periodicity'] == 'Mensal')
+            | ((grid['periodicity'] == 'Trimestral') & ((m_num - grid['anchor_month']) % 3 == 0))
+            | ((grid['periodicity'] == 'Anual') & (m_num == grid['anchor_month']))
+        )
+        grid = grid[keep]
+        day = grid['due_day'].clip(upper=grid['month'].dt.days_in_month)
+        grid['date'] = grid['month'].dt.start_time + pd.to_timedelta(day - 1, unit='D')
+        year = grid['month'].dt.year.astype(str)
+        grid['period'] = np.select(
+            [grid['periodicity'] == 'Mensal', grid['periodicity'] == 'Trimestral'],
+            [grid['month'].dt.strftime('%Y-%m'), year + '-Q' + grid['month'].dt.quarter.astype(str)],
+            default=year
+        )
+        parts.append(grid)
+
+    # Weekly: one candidate per ISO week in range
+    weekly = fcs[fcs['periodicity'] == 'Semanal']
+    if not weekly.empty:
+        mondays = pd.date_range(pd.Timestamp(start_date) - pd.Timedelta(days=start_date.weekday()), end_date, freq='W-MON')
+        grid = weekly.merge(pd.DataFrame({'monday': mondays}), how='cross')
+        grid['date'] = grid['monday'] + pd.to_timedelta((grid['due_day'] - 1) % 7, unit='D')
+        iso = grid['date'].dt.isocalendar()
+        grid['period'] = iso['year'].astype(str) + '-W' + iso['week'].astype(str).str.zfill(2)
+        parts.append(grid)
+
+    if not parts:
+        return pd.DataFrame(columns=cols)
+
+    occ = pd.concat(parts, ignore_index=True)
+    occ = occ[(occ['date'] >= pd.Timestamp(start_date)) & (occ['date'] <= pd.Timestamp(end_date))]
+    occ = occ[occ['start'].isna() | (occ['date'] >= occ['start'])]
+    occ = occ.rename(columns={'id': 'fixed_cost_id', 'value': 'amount'})
+    occ['date'] = occ['date'].dt.date.astype(str)
+    return occ[cols].sort_values(['date', 'fixed_cost_id']).reset_index(drop=True)
+
+def process_fixed_costs(conn: sqlite3.Connection, start_date: date, end_date: date) -> int:
+    """
+    Inserts every fixed cost occurrence due within [start_date, end_date] that is not
+    launched yet. Idempotent: the (fixed_cost_id, period) unique index skips existing ones.
+    Returns the number of created expenses.
+    """
     fcs = pd.read_sql("SELECT * FROM fixed_costs", conn)
-    if fcs.empty:
+    occ = compute_fixed_cost_occurrences(fcs, start_date, end_date)
+    if occ.empty:
         return 0
-        
-    # 2. Get expenses already created this month (to prevent duplicates)
-    ex_month = pd.read_sql("""
-        SELECT description FROM expenses 
-        WHERE date >= ? AND date < ?
-    """, conn, params=(start_m_date, end_m_date))
-    existing_set = set(ex_month['description'].tolist())
-    
-    added_count = 0
+
     cursor = conn.cursor()
-    
     try:
-        for _, fc in fcs.iterrows():
-            if fc['description'] in existing_set:
-                continue
-                
-            try:
-                d_day = int(fc['due_day']) if fc['due_day'] else 1
-                last_day = calendar.monthrange(curr_y, curr_m)[1]
-                eff_day = min(d_day, last_day) 
-                due_date_obj = date(curr_y, curr_m, eff_day)
-                
-                # Auto-insert if due date has passed or is today
-                if today >= due_date_obj:
-                    cursor.execute("""
-                        INSERT INTO expenses (date, description, amount, category)
-                        VALUES (?, ?, ?, ?)
-                    """, (due_date_obj, fc['description'], fc['value'], fc['category']))
-                    added_count += 1
-            except Exception as e:
-                logger.error(f"Error processing fixed cost {fc['description']}: {e}")
-                
-        if added_count > 0:
-            conn.commit()
+        cursor.executemany("""
+            INSERT OR IGNORE INTO expenses (date, description, amount, category, fixed_cost_id, period)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, list(occ[['date', 'description', 'amount', 'category', 'fixed_cost_id', 'period']]
+                  .astype(object).itertuples(index=False, name=None)))
+        # rowcount counts the expenses only; total_changes would include the ledger trigger rows
+        added_count = cursor.rowcount
+        cursor.execute(
+            "INSERT OR REPLACE INTO settings (key, value) SELECT 'fixed_costs_processed_until', ? "
+            "WHERE ? > COALESCE((SELECT value FROM settings WHERE key = 'fixed_costs_processed_until'), '')",
+            (end_date.isoformat(), end_date.isoformat())
+        )
+        conn.commit()
     except Exception as e:
         conn.rollback()
         logger.error(f"Erro ao processar custos fixos: {e}")
         raise
-        
+
+    if added_count:
+        logger.info(f"Fixed costs: {added_count} expenses launched for {start_date} - {end_date}")
     return added_count
 
+def auto_process_monthly_fixed_costs(conn: sqlite3.Connection) -> int:
+    """
+    Launches pending fixed costs up to today, backfilling every period since
+    the last run (or since the start of the current month on the first run).
+    Returns the number of created expenses.
+    """
+    today = date.today()
+    start = date(today.year, today.month, 1)
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT value FROM settings WHERE key = 'fixed_costs_processed_until'")
+    row = cursor.fetchone()
+    if row and row[0]:
+        start = min(start, date.fromisoformat(row[0]) + timedelta(days=1))
+
+    return process_fixed_costs(conn, start, today)
+
 # --- FINANCIAL REPORTING ---
 
 def get_financial_summary(conn: sqlite3.Connection, start_date: date, end_date: date) -> Dict[str, Any]:
     """
     Generates a full financial summary for a period (Revenue, Expenses, Profit).
+    Totals come from ledger_entries, so gross revenue also includes class
+    revenue (tuitions and consumptions received in the period).
     Returns a dictionary of metrics and DataFrames.
     """
-    
-    # 1. Sales Revenue (From Sales Table)
-    # Note: Includes Payment Method and Client info
+    params = (str(start_date), str(end_date))
+
+    # 1. Totals per kind (single range scan on idx_ledger_date_kind)
+    totals = dict(conn.execute("""
+        SELECT kind, SUM(amount) FROM ledger_entries
+        WHERE date BETWEEN ? AND ? GROUP BY kind
+    """, params).fetchall())
+
+    # 2. Sales details (Payment Method and Client info), same dates as the ledger.
+    # Postings are netted per record and day (an edited sale has several rows).
     sales_query = """
-        SELECT s.id, s.date, s.total_price, s.discount, s.payment_method, s.salesperson,
+        SELECT s.id, le.date, le.amount as total_price, s.discount, s.payment_method, s.salesperson,
                p.name as product_name, p.category as product_category, c.name as client_name, 'Venda' as source
-        FROM sales s
+        FROM (
+            SELECT source_id, date, SUM(amount) as amount FROM ledger_entries
+            WHERE kind = 'venda' AND date BETWEEN ? AND ?
+            GROUP BY source_id, date HAVING ROUND(SUM(amount), 2) != 0
+        ) le
+        JOIN sales s ON s.id = le.source_id
         LEFT JOIN products p ON s.product_id = p.id
         LEFT JOIN clients c ON s.client_id = c.id
-        WHERE s.date BETWEEN ? AND ?
     """
-    sales_df = pd.read_sql(sales_query, conn, params=(start_date, end_date))
-    
-    # 2. Expenses (From Expenses Table)
+    sales_df = pd.read_sql(sales_query, conn, params=params)
+
+    # 3. Expense details
     expenses_query = """
-        SELECT e.id, e.date, e.description, e.amount, e.category, s.name as supplier_name, 'Despesa' as source
-        FROM expenses e
+        SELECT e.id, le.date, e.description, le.amount, e.category, s.name as supplier_name, 'Despesa' as source
+        FROM (
+            SELECT source_id, date, SUM(amount) as amount FROM ledger_entries
+            WHERE kind = 'despesa' AND date BETWEEN ? AND ?
+            GROUP BY source_id, date HAVING ROUND(SUM(amount), 2) != 0
+        ) le
+        JOIN expenses e ON e.id = le.source_id
         LEFT JOIN suppliers s ON e.supplier_id = s.id
-        WHERE e.date BETWEEN ? AND ?
     """
-    expenses_df = pd.read_sql(expenses_query, conn, params=(start_date, end_date))
-    
-    # 3. Create 'amount' column for sales unified view (total_price)
+    expenses_df = pd.read_sql(expenses_query, conn, params=params)
+
+    # 4. Create 'amount' column for sales unified view (total_price)
     if not sales_df.empty:
         sales_df['amount'] = sales_df['total_price']
         sales_df['date'] = pd.to_datetime(sales_df['date'])
-        
+
     if not expenses_df.empty:
         expenses_df['date'] = pd.to_datetime(expenses_df['date'])
 
     # Calculations
-    gross_revenue = sales_df['total_price'].sum() if not sales_df.empty else 0.0
-    total_expenses = expenses_df['amount'].sum() if not expenses_df.empty else 0.0
+    sales_revenue = totals.get('venda') or 0.0
+    class_revenue = (totals.get('mensalidade') or 0.0) + (totals.get('consumo') or 0.0)
+    gross_revenue = sales_revenue + class_revenue
+    total_expenses = totals.get('despesa') or 0.0
     total_discounts = sales_df['discount'].sum() if not sales_df.empty else 0.0
-    
+
     net_profit = gross_revenue - total_expenses
-    
+
     return {
         'gross_revenue': gross_revenue,
+        'sales_revenue': sales_revenue,
+        'class_revenue': class_revenue,
         'total_expenses': total_expenses,
         'net_profit': net_profit,
         'total_discounts': total_discounts,
@@ -1,6 +1,7 @@
 import sqlite3
 import pandas as pd
 import logging
+import services.cost_service as cost_service
 from typing import List, Optional, Tuple, Dict, Any
 
 logger = logging.getLogger(__name__)
@@ -62,6 +63,8 @@ def update_material(conn: sqlite3.Connection, material_id: int, name: str, categ
                 stock_level = ?, min_stock_alert = ?, type = ?, image_path = ?
             WHERE id = ?
         """, (name, category_id, supplier_id, price, unit, stock_level, min_stock, material_type, image_path, material_id))
+        cost_service.snapshot_product_costs(conn, cost_service.get_products_using_materials(conn, [material_id]),
+                                            reason='Preço de insumo', commit=False)
         conn.commit()
     except Exception as e:
         conn.rollback()
@@ -206,16 +209,19 @@ def get_global_history(conn: sqlite3.Connection, filters: Dict[str, Any]) -> pd.
     return pd.read_sql(query, conn, params=params)
 
 def log_transaction(conn: sqlite3.Connection, material_id: int, date_str: str, trans_type: str, 
-                   quantity: float, cost: float, notes: str, user_id: int) -> None:
+                   quantity: float, cost: float, notes: str, user_id: int,
+                   unit_cost: Optional[float] = None) -> None:
     """
     Logs a manual inventory transaction.
+    unit_cost is the average cost after the movement; when omitted, the
+    database fills it with the material's current price.
     """
     try:
         cursor = conn.cursor()
         cursor.execute("""
-            INSERT INTO inventory_transactions (material_id, date, type, quantity, cost, notes, user_id)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (material_id, date_str, trans_type, quantity, cost, notes, user_id))
+            INSERT INTO inventory_transactions (material_id, date, type, quantity, cost, notes, user_id, unit_cost)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (material_id, date_str, trans_type, quantity, cost, notes, user_id, unit_cost))
         conn.commit()
     except Exception as e:
         conn.rollback()
@@ -250,7 +256,8 @@ def register_entry(conn: sqlite3.Connection, material_id: int, quantity: float,
         new_stock = current_stock + quantity
         
         # Log Transaction
-        log_transaction(conn, material_id, pd.Timestamp.now().isoformat(), 'ENTRADA', quantity, total_cost, notes, user_id)
+        log_transaction(conn, material_id, pd.Timestamp.now().isoformat(), 'ENTRADA', quantity, total_cost, notes, user_id,
+                        unit_cost=new_avg_price)
         
         # Update Material
         cursor.execute("""
@@ -258,6 +265,8 @@ def register_entry(conn: sqlite3.Connection, material_id: int, quantity: float,
             SET stock_level = ?, price_per_unit = ? 
             WHERE id = ?
         """, (new_stock, new_avg_price, material_id))
+        cost_service.snapshot_product_costs(conn, cost_service.get_products_using_materials(conn, [material_id]),
+                                            reason='Custo médio', commit=False)
         conn.commit()
         
         return new_stock, new_avg_price
@@ -8,6 +8,7 @@ import ast
 import os
 import sqlite3
 import audit
+import services.cost_service as cost_service
 from datetime import datetime
 from utils.logging_config import get_logger, log_exception
 
@@ -447,7 +448,8 @@ def create_product(conn, name, description, category, markup):
             VALUES (?, ?, ?, ?, '[]', 0, 0)
         """, (name, description, category, markup))
         new_id = cursor.lastrowid
-        audit.log_action(conn, 'CREATE', 'products', new_id, None, {'name': name}, commit=False)
+        audit.log_action(conn, 'CREATE', 'products', new_id, None, audit.record_state(conn, 'products', new_id), commit=False)
+        cost_service.snapshot_product_costs(conn, [new_id], reason='Cadastro', commit=False)
         conn.commit()
         return new_id
     except Exception as e:
@@ -492,10 +494,11 @@ def duplicate_product(conn, source_product_id, source_product):
                 VALUES (?, ?, ?)
             """, (new_prod_id, kit['child_product_id'], kit['quantity']))
 
+        cost_service.snapshot_product_costs(conn, [new_prod_id], reason='Cadastro', commit=False)
         conn.commit()
 
         audit.log_action(conn, 'CREATE', 'products', new_prod_id, None, {
-            'name': new_name, 'duplicated_from': source_product_id
+            **audit.record_state(conn, 'products', new_prod_id), 'duplicated_from': source_product_id
         })
         return new_prod_id
     except Exception as e:
@@ -508,11 +511,12 @@ def delete_product(conn, product_id, product_name):
     """Deletes a product and its associated recipes, kits, and variants."""
     cursor = conn.cursor()
     try:
+        old_row = audit.record_state(conn, 'products', product_id) or {'name': product_name}
         cursor.execute("DELETE FROM product_recipes WHERE product_id=?", (product_id,))
         cursor.execute("DELETE FROM product_kits WHERE parent_product_id=?", (product_id,))
         cursor.execute("DELETE FROM product_variants WHERE product_id=?", (product_id,))
         cursor.execute("DELETE FROM products WHERE id=?", (product_id,))
-        audit.log_action(conn, 'DELETE', 'products', product_id, {'name': product_name}, None, commit=False)
+        audit.log_action(conn, 'DELETE', 'products', product_id, old_row, None, commit=False)
         conn.commit()
         return True
     except Exception as e:
@@ -591,6 +595,7 @@ def add_recipe_item(conn, product_id, material_id, quantity):
             "INSERT INTO product_recipes (product_id, material_id, quantity) VALUES (?, ?, ?)",
             (product_id, material_id, quantity)
         )
+        cost_service.snapshot_product_costs(conn, [product_id], reason='Receita', commit=False)
         conn.commit()
         return True
     except Exception as e:
@@ -613,7 +618,10 @@ def delete_recipe_item(conn, recipe_id):
     """Removes a recipe item by its ID."""
     cursor = conn.cursor()
     try:
+        row = cursor.execute("SELECT product_id FROM product_recipes WHERE id=?", (recipe_id,)).fetchone()
         cursor.execute("DELETE FROM product_recipes WHERE id=?", (recipe_id,))
+        if row:
+            cost_service.snapshot_product_costs(conn, [row[0]], reason='Receita', commit=False)
         conn.commit()
         return True
     except Exception as e:
@@ -642,6 +650,7 @@ def add_kit_item(conn, parent_product_id, child_product_id, quantity):
             "INSERT INTO product_kits (parent_product_id, child_product_id, quantity) VALUES (?, ?, ?)",
             (parent_product_id, child_product_id, quantity)
         )
+        cost_service.snapshot_product_costs(conn, [parent_product_id], reason='Kit', commit=False)
         conn.commit()
         return True
     except Exception as e:
@@ -664,7 +673,10 @@ def delete_kit_item(conn, kit_id):
     """Removes a kit component by its ID."""
     cursor = conn.cursor()
     try:
+        row = cursor.execute("SELECT parent_product_id FROM product_kits WHERE id=?", (kit_id,)).fetchone()
         cursor.execute("DELETE FROM product_kits WHERE id=?", (kit_id,))
+        if row:
+            cost_service.snapshot_product_costs(conn, [row[0]], reason='Kit', commit=False)
         conn.commit()
         return True
     except Exception as e:
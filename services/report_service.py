@@ -1,7 +1,8 @@
 import pandas as pd
 import sqlite3
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 from typing import Optional, List, Dict, Any
+import services.stock_ledger_service as stock_ledger_service
 
 def get_sales_data(conn: sqlite3.Connection, start_date: date, end_date: date, seller_filter: str = "Todos") -> pd.DataFrame:
     """Fetches sales data for reports."""
@@ -89,8 +90,8 @@ def get_material_consumption(conn: sqlite3.Connection, start_date: date, end_dat
                COALESCE(mc.name, 'Geral') as 'Categoria',
                SUM(it.quantity) as 'Consumido',
                m.unit as 'Unidade',
-               m.price_per_unit as 'Custo Unit.',
-               SUM(it.quantity) * m.price_per_unit as 'Custo Total'
+               SUM(it.quantity * COALESCE(it.unit_cost, m.price_per_unit)) / SUM(it.quantity) as 'Custo Unit.',
+               SUM(it.quantity * COALESCE(it.unit_cost, m.price_per_unit)) as 'Custo Total'
         FROM inventory_transactions it
         JOIN materials m ON it.material_id = m.id
         LEFT JOIN material_categories mc ON m.category_id = mc.id
@@ -111,11 +112,13 @@ def get_material_consumption(conn: sqlite3.Connection, start_date: date, end_dat
     return pd.read_sql(query, conn, params=params)
 
 def get_product_profitability(conn: sqlite3.Connection, cat_filter: str = "Todas") -> pd.DataFrame:
-    """Fetches product profitability data."""
+    """Fetches product profitability data (cost from the latest product cost version)."""
     query = (
         "SELECT p.id, p.name as 'Produto', p.category as 'Categoria', p.base_price as 'Preço Venda', "
-        "COALESCE((SELECT SUM(pr.quantity * m.price_per_unit) FROM product_recipes pr JOIN materials m ON pr.material_id = m.id WHERE pr.product_id = p.id), 0) as 'Custo Produção', "
-        "p.stock_quantity as 'Estoque' FROM products p WHERE 1=1"
+        "COALESCE(pc.unit_cost, 0) as 'Custo Produção', "
+        "p.stock_quantity as 'Estoque' FROM products p "
+        "LEFT JOIN (SELECT product_id, unit_cost, MAX(id) FROM product_costs GROUP BY product_id) pc "
+        "ON pc.product_id = p.id WHERE 1=1"
     )
     params = []
     
@@ -137,11 +140,21 @@ def get_sales_trend(conn: sqlite3.Connection, year: int) -> pd.DataFrame:
     return pd.read_sql(query, conn, params=[str(year)])
 
 def get_realized_profitability(conn: sqlite3.Connection, start_date: date, end_date: date, top_limit: int) -> pd.DataFrame:
-    """Fetches realized profitability based on sales and product base cost."""
+    """
+    Fetches realized profitability using the product cost version linked to each sale.
+    Sales without a linked version are costed at the product's current version;
+    QtdSemCusto counts the units with no cost at all (their cost stays out of CustoTotal).
+    """
+    unit_cost = "COALESCE(pc.unit_cost, cur.unit_cost)"
     query = (
         "SELECT p.name as Produto, p.category as Categoria, SUM(s.quantity) as QtdVendida, SUM(s.total_price) as Receita, "
-        "p.base_price as CustoBase, SUM(s.quantity) * p.base_price as CustoTotal "
+        f"SUM(s.quantity * {unit_cost}) / SUM(CASE WHEN {unit_cost} IS NOT NULL THEN s.quantity END) as CustoBase, "
+        f"SUM(s.quantity * {unit_cost}) as CustoTotal, "
+        f"SUM(CASE WHEN {unit_cost} IS NULL THEN s.quantity ELSE 0 END) as QtdSemCusto "
         "FROM sales s JOIN products p ON s.product_id = p.id "
+        "LEFT JOIN product_costs pc ON pc.id = s.cost_id "
+        "LEFT JOIN (SELECT product_id, unit_cost, MAX(id) FROM product_costs GROUP BY product_id) cur "
+        "ON cur.product_id = s.product_id "
         "WHERE s.date BETWEEN ? AND ? GROUP BY p.id ORDER BY Receita DESC LIMIT ?"
     )
     return pd.read_sql(query, conn, params=[start_date, end_date, top_limit])
@@ -157,64 +170,127 @@ def get_customer_history(conn: sqlite3.Connection, start_date: date, end_date: d
     return pd.read_sql(query, conn, params=[start_date, end_date])
 
 def get_cash_flow_data(conn: sqlite3.Connection, start_date: date, end_date: date, date_format: str) -> Dict[str, pd.DataFrame]:
-    """Fetches sales and expenses grouped by period."""
-    # Sales
-    sales_query = (
-        f"SELECT strftime('{date_format}', date) as Periodo, SUM(total_price) as Entradas "
-        f"FROM sales WHERE date BETWEEN ? AND ? GROUP BY strftime('{date_format}', date)"
-    )
-    sales_df = pd.read_sql(sales_query, conn, params=[start_date, end_date])
-    
-    # Expenses
-    expenses_query = (
-        f"SELECT strftime('{date_format}', date) as Periodo, SUM(amount) as Saidas "
-        f"FROM expenses WHERE date BETWEEN ? AND ? GROUP BY strftime('{date_format}', date)"
+    """Fetches income (sales + class revenue) and expenses grouped by period from the ledger."""
+    query = (
+        f"SELECT strftime('{date_format}', date) as Periodo, "
+        "SUM(CASE WHEN kind != 'despesa' THEN amount ELSE 0 END) as Entradas, "
+        "SUM(CASE WHEN kind = 'despesa' THEN amount ELSE 0 END) as Saidas "
+        f"FROM ledger_entries WHERE date BETWEEN ? AND ? GROUP BY strftime('{date_format}', date)"
     )
-    expenses_df = pd.read_sql(expenses_query, conn, params=[start_date, end_date])
-    
+    flow_df = pd.read_sql(query, conn, params=[str(start_date), str(end_date)])
+
+    sales_df = flow_df.loc[flow_df['Entradas'] != 0, ['Periodo', 'Entradas']].reset_index(drop=True)
+    expenses_df = flow_df.loc[flow_df['Saidas'] != 0, ['Periodo', 'Saidas']].reset_index(drop=True)
     return {'sales': sales_df, 'expenses': expenses_df}
 
-def get_stock_forecast_products(conn: sqlite3.Connection, period_days: int, cutoff_date: str) -> pd.DataFrame:
-    """Fetches product stock forecast data."""
+def _apply_stock_on_date(conn: sqlite3.Connection, df: pd.DataFrame, item_type: str, as_of: date,
+                         stock_col: str, value_cols: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """
+    Replaces the live stock column with the ledger balance at `as_of` (expects an `id` column).
+    Raises ValueError when any of those balances predates the ledger and is unknown.
+    """
+    balances = stock_ledger_service.get_stock_on_date(conn, item_type, as_of)
+    unknown = balances[balances.isna()].index
+    if df['id'].isin(unknown).any():
+        known_since = stock_ledger_service.stock_known_since(conn)
+        raise ValueError(
+            f"Estoque em {as_of.strftime('%d/%m/%Y')} desconhecido: o histórico de estoque "
+            f"começa em {known_since.strftime('%d/%m/%Y')}."
+        )
+    df[stock_col] = df['id'].map(balances).fillna(0)
+    for value_col, price_col in (value_cols or {}).items():
+        df[value_col] = df[stock_col] * df[price_col]
+    return df.drop(columns=['id'])
+
+def get_stock_forecast_products(conn: sqlite3.Connection, period_days: int, cutoff_date: str,
+                                as_of: Optional[date] = None) -> pd.DataFrame:
+    """Fetches product stock forecast data. With `as_of`, stock and sales are taken at that date."""
+    if as_of is None:
+        query = (
+            "SELECT p.name as Nome, p.category as Categoria, p.stock_quantity as EstoqueAtual, "
+            "COALESCE(SUM(s.quantity), 0) as VendidoPeriodo, COALESCE(SUM(s.quantity) / ?, 0) as MediaDiaria "
+            "FROM products p LEFT JOIN sales s ON p.id = s.product_id AND s.date >= ? "
+            "GROUP BY p.id HAVING p.stock_quantity > 0 ORDER BY MediaDiaria DESC"
+        )
+        return pd.read_sql(query, conn, params=[period_days, cutoff_date])
+
     query = (
-        "SELECT p.name as Nome, p.category as Categoria, p.stock_quantity as EstoqueAtual, "
+        "SELECT p.id, p.name as Nome, p.category as Categoria, 0 as EstoqueAtual, "
         "COALESCE(SUM(s.quantity), 0) as VendidoPeriodo, COALESCE(SUM(s.quantity) / ?, 0) as MediaDiaria "
-        "FROM products p LEFT JOIN sales s ON p.id = s.product_id AND s.date >= ? "
-        "GROUP BY p.id HAVING p.stock_quantity > 0 ORDER BY MediaDiaria DESC"
+        "FROM products p LEFT JOIN sales s ON p.id = s.product_id AND s.date >= ? AND s.date <= ? "
+        "GROUP BY p.id ORDER BY MediaDiaria DESC"
     )
-    return pd.read_sql(query, conn, params=[period_days, cutoff_date])
+    df = pd.read_sql(query, conn, params=[period_days, cutoff_date, as_of.isoformat()])
+    df = _apply_stock_on_date(conn, df, 'product', as_of, 'EstoqueAtual')
+    return df[df['EstoqueAtual'] > 0].reset_index(drop=True)
+
+def get_stock_forecast_materials(conn: sqlite3.Connection, period_days: int, cutoff_date: str,
+                                 as_of: Optional[date] = None) -> pd.DataFrame:
+    """Fetches material stock forecast data. With `as_of`, stock and consumption are taken at that date."""
+    if as_of is None:
+        query = (
+            "SELECT m.name as Nome, COALESCE(mc.name, 'Geral') as Categoria, m.stock_level as EstoqueAtual, m.unit as Unidade, "
+            "COALESCE(SUM(it.quantity), 0) as ConsumidoPeriodo, COALESCE(SUM(it.quantity) / ?, 0) as MediaDiaria "
+            "FROM materials m LEFT JOIN material_categories mc ON m.category_id = mc.id "
+            "LEFT JOIN inventory_transactions it ON m.id = it.material_id AND it.type = 'SAIDA' AND it.date >= ? "
+            "WHERE m.type = 'Material' GROUP BY m.id HAVING m.stock_level > 0 ORDER BY MediaDiaria DESC"
+        )
+        return pd.read_sql(query, conn, params=[period_days, cutoff_date])
 
-def get_stock_forecast_materials(conn: sqlite3.Connection, period_days: int, cutoff_date: str) -> pd.DataFrame:
-    """Fetches material stock forecast data."""
     query = (
-        "SELECT m.name as Nome, COALESCE(mc.name, 'Geral') as Categoria, m.stock_level as EstoqueAtual, m.unit as Unidade, "
+        "SELECT m.id, m.name as Nome, COALESCE(mc.name, 'Geral') as Categoria, 0 as EstoqueAtual, m.unit as Unidade, "
         "COALESCE(SUM(it.quantity), 0) as ConsumidoPeriodo, COALESCE(SUM(it.quantity) / ?, 0) as MediaDiaria "
         "FROM materials m LEFT JOIN material_categories mc ON m.category_id = mc.id "
-        "LEFT JOIN inventory_transactions it ON m.id = it.material_id AND it.type = 'SAIDA' AND it.date >= ? "
-        "WHERE m.type = 'Material' GROUP BY m.id HAVING m.stock_level > 0 ORDER BY MediaDiaria DESC"
+        "LEFT JOIN inventory_transactions it ON m.id = it.material_id AND it.type = 'SAIDA' AND it.date >= ? AND it.date < ? "
+        "WHERE m.type = 'Material' GROUP BY m.id ORDER BY MediaDiaria DESC"
     )
-    return pd.read_sql(query, conn, params=[period_days, cutoff_date])
+    end_ts = (as_of + timedelta(days=1)).isoformat()
+    df = pd.read_sql(query, conn, params=[period_days, cutoff_date, end_ts])
+    df = _apply_stock_on_date(conn, df, 'material', as_of, 'EstoqueAtual')
+    return df[df['EstoqueAtual'] > 0].reset_index(drop=True)
+
+def get_dead_stock_products(conn: sqlite3.Connection, cutoff_date: str, as_of: Optional[date] = None) -> pd.DataFrame:
+    """Fetches products with no sales since cutoff date. With `as_of`, stock is valued at that date."""
+    if as_of is None:
+        query = (
+            "SELECT p.name as 'Nome', p.category as 'Categoria', p.stock_quantity as 'Estoque', p.base_price as 'Preço', "
+            "(p.stock_quantity * p.base_price) as 'Valor Parado', MAX(s.date) as 'Última Venda' "
+            "FROM products p LEFT JOIN sales s ON p.id = s.product_id "
+            "GROUP BY p.id HAVING MAX(s.date) IS NULL OR MAX(s.date) < ? ORDER BY 'Valor Parado' DESC"
+        )
+        return pd.read_sql(query, conn, params=[cutoff_date])
 
-def get_dead_stock_products(conn: sqlite3.Connection, cutoff_date: str) -> pd.DataFrame:
-    """Fetches products with no sales since cutoff date."""
     query = (
-        "SELECT p.name as 'Nome', p.category as 'Categoria', p.stock_quantity as 'Estoque', p.base_price as 'Preço', "
-        "(p.stock_quantity * p.base_price) as 'Valor Parado', MAX(s.date) as 'Última Venda' "
-        "FROM products p LEFT JOIN sales s ON p.id = s.product_id "
-        "GROUP BY p.id HAVING MAX(s.date) IS NULL OR MAX(s.date) < ? ORDER BY 'Valor Parado' DESC"
+        "SELECT p.id, p.name as 'Nome', p.category as 'Categoria', 0 as 'Estoque', p.base_price as 'Preço', "
+        "0 as 'Valor Parado', MAX(s.date) as 'Última Venda' "
+        "FROM products p LEFT JOIN sales s ON p.id = s.product_id AND s.date <= ? "
+        "GROUP BY p.id HAVING MAX(s.date) IS NULL OR MAX(s.date) < ?"
     )
-    return pd.read_sql(query, conn, params=[cutoff_date])
+    df = pd.read_sql(query, conn, params=[as_of.isoformat(), cutoff_date])
+    return _apply_stock_on_date(conn, df, 'product', as_of, 'Estoque', {'Valor Parado': 'Preço'})
+
+def get_dead_stock_materials(conn: sqlite3.Connection, cutoff_date: str, as_of: Optional[date] = None) -> pd.DataFrame:
+    """Fetches materials with no consumption since cutoff date. With `as_of`, stock is valued at that date."""
+    if as_of is None:
+        query = (
+            "SELECT m.name as 'Nome', COALESCE(mc.name, 'Geral') as 'Categoria', m.stock_level as 'Estoque', m.price_per_unit as 'Preço', "
+            "(m.stock_level * m.price_per_unit) as 'Valor Parado', MAX(it.date) as 'Último Consumo' "
+            "FROM materials m LEFT JOIN material_categories mc ON m.category_id = mc.id "
+            "LEFT JOIN inventory_transactions it ON m.id = it.material_id AND it.type = 'SAIDA' "
+            "WHERE m.type = 'Material' GROUP BY m.id HAVING MAX(it.date) IS NULL OR MAX(it.date) < ? ORDER BY 'Valor Parado' DESC"
+        )
+        return pd.read_sql(query, conn, params=[cutoff_date])
 
-def get_dead_stock_materials(conn: sqlite3.Connection, cutoff_date: str) -> pd.DataFrame:
-    """Fetches materials with no consumption since cutoff date."""
     query = (
-        "SELECT m.name as 'Nome', COALESCE(mc.name, 'Geral') as 'Categoria', m.stock_level as 'Estoque', m.price_per_unit as 'Preço', "
-        "(m.stock_level * m.price_per_unit) as 'Valor Parado', MAX(it.date) as 'Último Consumo' "
+        "SELECT m.id, m.name as 'Nome', COALESCE(mc.name, 'Geral') as 'Categoria', 0 as 'Estoque', m.price_per_unit as 'Preço', "
+        "0 as 'Valor Parado', MAX(it.date) as 'Último Consumo' "
         "FROM materials m LEFT JOIN material_categories mc ON m.category_id = mc.id "
-        "LEFT JOIN inventory_transactions it ON m.id = it.material_id AND it.type = 'SAIDA' "
-        "WHERE m.type = 'Material' GROUP BY m.id HAVING MAX(it.date) IS NULL OR MAX(it.date) < ? ORDER BY 'Valor Parado' DESC"
+        "LEFT JOIN inventory_transactions it ON m.id = it.material_id AND it.type = 'SAIDA' AND it.date < ? "
+        "WHERE m.type = 'Material' GROUP BY m.id HAVING MAX(it.date) IS NULL OR MAX(it.date) < ?"
     )
-    return pd.read_sql(query, conn, params=[cutoff_date])
+    end_ts = (as_of + timedelta(days=1)).isoformat()
+    df = pd.read_sql(query, conn, params=[end_ts, cutoff_date])
+    return _apply_stock_on_date(conn, df, 'material', as_of, 'Estoque', {'Valor Parado': 'Preço'})
 
 def get_pending_orders(conn: sqlite3.Connection, status_filter: str, order_by_clause: str) -> pd.DataFrame:
     """Fetches pending commission orders."""
@@ -241,7 +317,7 @@ def get_production_cost_data(conn: sqlite3.Connection, start_date: date, end_dat
 def get_period_material_cost(conn: sqlite3.Connection, start_date: date, end_date: date) -> float:
     """Fetches total material cost for a period."""
     query = (
-        "SELECT SUM(it.quantity * m.price_per_unit) as CustoInsumos "
+        "SELECT SUM(it.quantity * COALESCE(it.unit_cost, m.price_per_unit)) as CustoInsumos "
         "FROM inventory_transactions it JOIN materials m ON it.material_id = m.id "
         "WHERE it.type = 'SAIDA' AND DATE(it.date) BETWEEN ? AND ?"
     )
@@ -0,0 +1,138 @@
+"""
+Search Service Module
+Ranked full-text search over products, clients, materials and order notes.
+
+The `search_index` FTS5 table is kept current by triggers (see
+database.create_search_index). Queries are prefix-matched per word, so
+type-ahead works from the second character. When FTS5 is not available the
+service falls back to LIKE on the source tables.
+
+search_ids() is the filter used by the list pages: it returns every match
+(no limit by default). When the prefix query finds nothing it falls back to
+LIKE substring matching, so "aneca" still finds "Caneca". With names_only
+only the name (the index title) is searched, as the list filters did before.
+"""
+import re
+import sqlite3
+import pandas as pd
+from typing import List, Optional
+import database
+from database import SEARCH_SOURCES, rebuild_search_index
+from utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+ENTITIES = tuple(source[0] for source in SEARCH_SOURCES)
+
+# Fallback columns (LIKE) per entity when FTS5 is unavailable
+_FALLBACK_COLUMNS = {
+    'product': ('products', ('name', 'description', 'category')),
+    'client': ('clients', ('name', 'contact', 'phone', 'email')),
+    'material': ('materials', ('name',)),
+    'order': ('commission_orders', ('notes',)),
+}
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+# Database files known to have the search_index (it is never dropped once created)
+_fts_databases = set()
+
+
+def _fts_query(text: str, names_only: bool = False) -> Optional[str]:
+    """Turns free text into an FTS5 query: every word must match as a prefix (of the title with names_only)."""
+    tokens = _TOKEN_RE.findall(text or '')
+    if not tokens:
+        return None
+    query = ' AND '.join(f'"{token}"*' for token in tokens)
+    return f"title : ({query})" if names_only else query
+
+
+def _has_fts(conn: sqlite3.Connection) -> bool:
+    if database.DB_PATH in _fts_databases:
+        return True
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'search_index'").fetchone()
+    if row is not None:
+        _fts_databases.add(database.DB_PATH)
+    return row is not None
+
+
+def search(conn: sqlite3.Connection, text: str, entity: Optional[str] = None,
+           limit: Optional[int] = 50, names_only: bool = False) -> pd.DataFrame:
+    """
+    Returns matches as a DataFrame (entity, entity_id, title, rank), best first.
+    Names weigh more than the other indexed fields. limit=None returns all;
+    names_only matches the name (index title) alone.
+    """
+    if entity is not None and entity not in ENTITIES:
+        raise ValueError(f"Entidade de busca inválida: {entity}")
+
+    match = _fts_query(text, names_only)
+    if match is None:
+        return pd.DataFrame(columns=['entity', 'entity_id', 'title', 'rank'])
+
+    if not _has_fts(conn):
+        return _search_like(conn, text, entity, limit, names_only)
+
+    query = """
+        SELECT entity, CAST(entity_id AS INTEGER) as entity_id, title, bm25(search_index, 0, 0, 10.0, 1.0) as rank
+        FROM search_index WHERE search_index MATCH ?
+    """
+    params = [match]
+    if entity:
+        query += " AND entity = ?"
+        params.append(entity)
+    query += " ORDER BY rank"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(int(limit))
+    return pd.read_sql(query, conn, params=params)
+
+
+def search_ids(conn: sqlite3.Connection, entity: str, text: str, limit: Optional[int] = None,
+               names_only: bool = False) -> List[int]:
+    """
+    Ids of one entity matching `text`, best first. limit=None (the default,
+    for filtering) returns every match. When the prefix query finds nothing,
+    substring (LIKE) matches are returned instead.
+    """
+    ids = search(conn, text, entity=entity, limit=limit, names_only=names_only)['entity_id'].astype(int).tolist()
+    if not ids and _has_fts(conn) and _TOKEN_RE.search(text or ''):
+        ids = _search_like(conn, text, entity, limit, names_only)['entity_id'].astype(int).tolist()
+    return ids
+
+
+def _search_like(conn: sqlite3.Connection, text: str, entity: Optional[str], limit: Optional[int],
+                 names_only: bool = False) -> pd.DataFrame:
+    """LIKE fallback: all words must appear in any of the entity's columns (the name alone with names_only)."""
+    frames = []
+    tokens = _TOKEN_RE.findall(text)
+    for name, (table, columns) in _FALLBACK_COLUMNS.items():
+        if entity and name != entity:
+            continue
+        if names_only:
+            columns = columns[:1]
+        haystack = " || ' ' || ".join(f"COALESCE({col}, '')" for col in columns)
+        where = ' AND '.join(f"({haystack}) LIKE ?" for _ in tokens)
+        # LIMIT -1 is SQLite for "no limit"
+        frames.append(pd.read_sql(
+            f"SELECT '{name}' as entity, id as entity_id, {columns[0]} as title, 0.0 as rank "
+            f"FROM {table} WHERE {where} LIMIT ?",
+            conn, params=[f"%{t}%" for t in tokens] + [-1 if limit is None else int(limit)]
+        ))
+    result = pd.concat(frames, ignore_index=True)
+    return result if limit is None else result.head(limit)
+
+
+def rebuild(conn: sqlite3.Connection) -> None:
+    """Rebuilds the whole search index from the source tables."""
+    if not _has_fts(conn):
+        return
+    try:
+        rebuild_search_index(conn.cursor())
+        conn.commit()
+        logger.info("Search index rebuilt")
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erro ao reconstruir índice de busca: {e}")
+        raise
@@ -0,0 +1,169 @@
+"""
+Stock Ledger Service Module
+Append-only history of stock movements for products, variants and materials.
+
+Rows in `stock_ledger` are written by database triggers whenever
+products.stock_quantity, product_variants.stock_quantity or materials.stock_level
+change, so every write path (sales, production, orders, imports) is covered
+without touching call sites. Periodic checkpoints snapshot all balances, so
+"stock on date X" is the nearest checkpoint plus the ledger rows after it.
+
+On databases that had stock before the ledger existed, the opening checkpoint
+holds balances with no history behind them: earlier dates are unknown (NaN)
+for the items it covers.
+"""
+import sqlite3
+import pandas as pd
+from datetime import date, datetime, timedelta
+from typing import Optional
+from utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+ITEM_TYPES = ('product', 'variant', 'material')
+
+# Live balance source for each item type (table, stock column)
+_LIVE_SOURCES = {
+    'product': ('products', 'stock_quantity'),
+    'variant': ('product_variants', 'stock_quantity'),
+    'material': ('materials', 'stock_level'),
+}
+
+CHECKPOINT_INTERVAL_DAYS = 7
+
+
+def create_checkpoint(conn: sqlite3.Connection) -> int:
+    """
+    Snapshots the current balance of every product, variant and material.
+    The ledger position and the balances are read under one write lock, so
+    a concurrent stock change is either in the snapshot or after ledger_id.
+    Returns the new checkpoint id.
+    """
+    cursor = conn.cursor()
+    try:
+        if not conn.in_transaction:
+            cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(
+            "INSERT INTO stock_checkpoints (created_at, ledger_id) "
+            "SELECT ?, COALESCE(MAX(id), 0) FROM stock_ledger",
+            (datetime.now().isoformat(timespec='milliseconds'),)
+        )
+        checkpoint_id = cursor.lastrowid
+        for item_type, (table, column) in _LIVE_SOURCES.items():
+            cursor.execute(f"""
+                INSERT INTO stock_checkpoint_items (checkpoint_id, item_type, item_id, balance)
+                SELECT ?, ?, id, COALESCE({column}, 0) FROM {table}
+            """, (checkpoint_id, item_type))
+        last_ledger_id = cursor.execute("SELECT ledger_id FROM stock_checkpoints WHERE id = ?", (checkpoint_id,)).fetchone()[0]
+        conn.commit()
+        logger.info(f"Stock checkpoint {checkpoint_id} created (ledger id {last_ledger_id})")
+        return checkpoint_id
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erro ao criar checkpoint de estoque: {e}")
+        raise
+
+
+def run_checkpoint_if_needed(conn: sqlite3.Connection, interval_days: int = CHECKPOINT_INTERVAL_DAYS) -> bool:
+    """Creates a checkpoint when the latest one is older than `interval_days`."""
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT MAX(created_at) FROM stock_checkpoints")
+        last = cursor.fetchone()[0]
+        if last and datetime.now() - datetime.fromisoformat(last) < timedelta(days=interval_days):
+            return False
+        create_checkpoint(conn)
+        return True
+    except sqlite3.Error as e:
+        logger.warning(f"Stock checkpoint skipped: {e}")
+        return False
+
+
+def get_stock_on_date(conn: sqlite3.Connection, item_type: str, as_of: date) -> pd.Series:
+    """
+    Returns the balance of every item of `item_type` at the end of `as_of`,
+    as a Series indexed by item id.
+
+    Uses the latest checkpoint taken before the end of that day plus the
+    ledger rows written after it. Dates before the first checkpoint fall
+    back to summing the ledger from the start; items whose stock predates the
+    ledger (see opening_checkpoint_items) are NaN there: their balance is unknown.
+    """
+    if item_type not in ITEM_TYPES:
+        raise ValueError(f"Tipo de item inválido: {item_type}")
+
+    end_ts = (as_of + timedelta(days=1)).isoformat()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, ledger_id FROM stock_checkpoints
+        WHERE created_at < ? ORDER BY created_at DESC LIMIT 1
+    """, (end_ts,))
+    checkpoint = cursor.fetchone()
+
+    if checkpoint:
+        checkpoint_id, ledger_id = checkpoint
+        base = pd.read_sql(
+            "SELECT item_id, balance FROM stock_checkpoint_items WHERE checkpoint_id = ? AND item_type = ?",
+            conn, params=(checkpoint_id, item_type)
+        ).set_index('item_id')['balance']
+    else:
+        ledger_id = 0
+        base = pd.Series(dtype=float)
+        unknown = opening_checkpoint_items(conn, item_type)
+
+    # Bounded delta: only rows after the checkpoint (rowid range) and before the cut
+    deltas = pd.read_sql("""
+        SELECT item_id, SUM(delta) as delta FROM stock_ledger
+        WHERE id > ? AND timestamp < ? AND item_type = ?
+        GROUP BY item_id
+    """, conn, params=(ledger_id, end_ts, item_type)).set_index('item_id')['delta']
+
+    balances = base.add(deltas, fill_value=0)
+    if not checkpoint and len(unknown):
+        balances = balances.reindex(balances.index.union(unknown))
+        balances[unknown] = float('nan')
+    balances.index = balances.index.astype(int)
+    return balances.rename('balance')
+
+
+def opening_checkpoint_items(conn: sqlite3.Connection, item_type: str) -> pd.Index:
+    """
+    Items of `item_type` that already had stock when the ledger was created:
+    those in the first checkpoint when it was taken before any ledger row.
+    Their balance before that checkpoint is unknown.
+    """
+    return pd.Index(pd.read_sql("""
+        SELECT ci.item_id FROM stock_checkpoint_items ci
+        JOIN (SELECT id, ledger_id FROM stock_checkpoints ORDER BY created_at, id LIMIT 1) first
+            ON first.id = ci.checkpoint_id
+        WHERE first.ledger_id = 0 AND ci.item_type = ? AND ci.balance != 0
+    """, conn, params=(item_type,))['item_id'].astype(int))
+
+
+def stock_known_since(conn: sqlite3.Connection) -> Optional[date]:
+    """
+    Date of the opening checkpoint when stock predates the ledger, else None.
+    Balances of the items it covers are unknown for earlier dates.
+    """
+    row = conn.execute("""
+        SELECT c.created_at FROM stock_checkpoints c
+        WHERE c.id = (SELECT id FROM stock_checkpoints ORDER BY created_at, id LIMIT 1)
+          AND c.ledger_id = 0
+          AND EXISTS (SELECT 1 FROM stock_checkpoint_items ci WHERE ci.checkpoint_id = c.id AND ci.balance != 0)
+    """).fetchone()
+    return datetime.fromisoformat(row[0]).date() if row else None
+
+
+def get_item_history(conn: sqlite3.Connection, item_type: str, item_id: int,
+                     start_date: Optional[date] = None, end_date: Optional[date] = None) -> pd.DataFrame:
+    """Returns the ledger rows (with running balance) for a single item."""
+    query = "SELECT timestamp, delta, balance FROM stock_ledger WHERE item_type = ? AND item_id = ?"
+    params = [item_type, int(item_id)]
+    if start_date:
+        query += " AND timestamp >= ?"
+        params.append(start_date.isoformat())
+    if end_date:
+        query += " AND timestamp < ?"
+        params.append((end_date + timedelta(days=1)).isoformat())
+    query += " ORDER BY id"
+    return pd.read_sql(query, conn, params=params)
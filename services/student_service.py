@@ -1,8 +1,11 @@
 import pandas as pd
+import numpy as np
 import sqlite3
 from datetime import datetime
 import json
+import hashlib
 import audit
+from database import STUDENT_BALANCE_REFRESH
 from utils.logging_config import get_logger
 
 logger = get_logger(__name__)
@@ -130,6 +133,64 @@ def update_student_class(conn, student_id, class_id):
     
     return True
 
+# --- Student Balances ---
+
+def _refresh_student_balance(cursor, student_id):
+    """Recomputes the student_balances row for one student (caller commits)."""
+    cursor.execute(STUDENT_BALANCE_REFRESH.format(
+        tuition_filter=" AND student_id = :sid",
+        consumption_filter=" AND student_id = :sid",
+        ledger_filter=" AND student_id = :sid",
+        student_filter="WHERE s.id = :sid"
+    ), {'sid': int(student_id)})
+
+def recompute_student_balances(conn):
+    """Rebuilds student_balances for every student from tuitions, consumptions and the ledger."""
+    try:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM student_balances")
+        cursor.execute(STUDENT_BALANCE_REFRESH.format(
+            tuition_filter='', consumption_filter='', ledger_filter='', student_filter=''
+        ))
+        count = cursor.rowcount
+        conn.commit()
+        logger.info(f"Student balances recomputed ({count} students)")
+        return count
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erro ao recalcular saldos de alunos: {e}")
+        raise
+
+def verify_student_balances(conn):
+    """
+    Compares the maintained student_balances with a full recomputation
+    (done on a temporary copy). Returns the rows that differ.
+    """
+    cursor = conn.cursor()
+    cursor.execute("DROP TABLE IF EXISTS temp.student_balances")
+    cursor.execute("CREATE TEMP TABLE student_balances AS SELECT * FROM main.student_balances WHERE 0")
+    try:
+        # Unqualified names resolve to the temp table first
+        cursor.execute(STUDENT_BALANCE_REFRESH.format(
+            tuition_filter='', consumption_filter='', ledger_filter='', student_filter=''
+        ))
+        return pd.read_sql("""
+            SELECT s.id as student_id, s.name,
+                   COALESCE(b.total_due, 0) as saldo_tabela, f.total_due as saldo_recalculado,
+                   b.oldest_pending_date as pendencia_tabela, f.oldest_pending_date as pendencia_recalculada,
+                   b.last_payment as pagamento_tabela, f.last_payment as pagamento_recalculado
+            FROM temp.student_balances f
+            JOIN students s ON s.id = f.student_id
+            LEFT JOIN main.student_balances b ON b.student_id = f.student_id
+            WHERE ABS(COALESCE(b.total_due, 0) - f.total_due) > 0.005
+               OR b.oldest_pending_date IS NOT f.oldest_pending_date
+               OR b.last_payment IS NOT f.last_payment
+        """, conn)
+    finally:
+        # The INSERT above opened a transaction; end it before dropping the copy
+        conn.rollback()
+        cursor.execute("DROP TABLE IF EXISTS temp.student_balances")
+
 # --- Consumption Logic ---
 
 def add_consumption(conn, student_id, description, quantity, unit_price, total_val, date, user_id=None, notes=None, markup=0.0):
@@ -149,6 +210,7 @@ def add_consumption(conn, student_id, description, quantity, unit_price, total_v
         new_id = cursor.lastrowid
         audit.log_action(conn, 'CREATE', 'student_consumptions', new_id, None, 
                          {'student_id': student_id, 'desc': description, 'val': total_val, 'markup': markup}, commit=False)
+        _refresh_student_balance(cursor, student_id)
         conn.commit()
         return new_id
     except Exception as e:
@@ -199,6 +261,7 @@ def process_material_consumption(conn, student_id, material_id, quantity, date,
         # Audit
         audit.log_action(conn, 'CONSUME_MAT', 'student_consumptions', cons_id, None, 
                          {'mat_id': material_id, 'qty': quantity}, commit=False)
+        _refresh_student_balance(cursor, student_id)
         
         conn.commit()
         return cons_id
@@ -245,8 +308,8 @@ def get_payment_history(conn, start_date=None, end_date=None, student_id=None, p
     """
     Returns a combined DataFrame of payments/debits from students with filters.
     """
-    t_where_pago = ["t.status = 'Pago'"]
-    c_where_pago = ["sc.status = 'Pago'"]
+    t_where_pago = ["le.kind = 'mensalidade'"]
+    c_where_pago = ["le.kind = 'consumo'"]
     t_where_pend = ["t.status = 'Pendente'"]
     c_where_pend = ["sc.status = 'Pendente'"]
     
@@ -271,19 +334,18 @@ def get_payment_history(conn, start_date=None, end_date=None, student_id=None, p
             params.append(int(class_id))
         return where, params
 
-    # DATE FALLBACK FOR TUITIONS: 
-    # Try created_at, then payment_date, then month_year (mapped to YYYY-MM-01)
-    # SQLite logic: SUBSTR(month_year, 4, 4) || '-' || SUBSTR(month_year, 1, 2) || '-01'
-    t_date_sql = "COALESCE(t.created_at, t.payment_date, SUBSTR(t.month_year, 4, 4) || '-' || SUBSTR(t.month_year, 1, 2) || '-01')"
+    # Pending tuitions are dated by their reference month (period_date, YYYY-MM-01; indexed)
+    t_date_sql = "t.period_date"
 
     # Build filters and params for each case
-    w, p = get_common_filters("t.payment_date", student_id, class_id); t_where_pago += w; params_t_pago = p
-    w, p = get_common_filters("sc.payment_date", student_id, class_id); c_where_pago += w; params_c_pago = p
+    w, p = get_common_filters("le.date", student_id, class_id); t_where_pago += w; params_t_pago = p
+    w, p = get_common_filters("le.date", student_id, class_id); c_where_pago += w; params_c_pago = p
     w, p = get_common_filters(t_date_sql, student_id, class_id); t_where_pend += w; params_t_pend = p
     w, p = get_common_filters("sc.date", student_id, class_id); c_where_pend += w; params_c_pend = p
     
-    t_query_pago = f"SELECT t.payment_date as date, t.amount, s.name as student_name, t.student_id, 'Mensalidade ' || t.month_year as description, 'Mensalidade' as cat, 'Recebimento' as movement_type, 'Pago' as status FROM tuitions t JOIN students s ON t.student_id = s.id WHERE {' AND '.join(t_where_pago)}"
-    c_query_pago = f"SELECT sc.payment_date as date, sc.total_value as amount, s.name as student_name, sc.student_id, sc.description, 'Consumo' as cat, 'Recebimento' as movement_type, 'Pago' as status FROM student_consumptions sc JOIN students s ON sc.student_id = s.id WHERE {' AND '.join(c_where_pago)}"
+    # Received amounts come from ledger_entries (includes partial payments on pending items)
+    t_query_pago = f"SELECT le.date, le.amount, s.name as student_name, le.student_id, le.description, 'Mensalidade' as cat, CASE WHEN le.amount < 0 THEN 'Estorno' ELSE 'Recebimento' END as movement_type, 'Pago' as status FROM ledger_entries le JOIN students s ON le.student_id = s.id WHERE {' AND '.join(t_where_pago)}"
+    c_query_pago = f"SELECT le.date, le.amount, s.name as student_name, le.student_id, le.description, 'Consumo' as cat, CASE WHEN le.amount < 0 THEN 'Estorno' ELSE 'Recebimento' END as movement_type, 'Pago' as status FROM ledger_entries le JOIN students s ON le.student_id = s.id WHERE {' AND '.join(c_where_pago)}"
     t_query_pend = f"SELECT {t_date_sql} as date, t.amount, s.name as student_name, t.student_id, 'Mensalidade ' || t.month_year as description, 'Mensalidade' as cat, 'Lançamento de Débito' as movement_type, 'Pendente' as status FROM tuitions t JOIN students s ON t.student_id = s.id WHERE {' AND '.join(t_where_pend)}"
     c_query_pend = f"SELECT sc.date as date, sc.total_value as amount, s.name as student_name, sc.student_id, sc.description, 'Consumo' as cat, 'Lançamento de Débito' as movement_type, 'Pendente' as status FROM student_consumptions sc JOIN students s ON sc.student_id = s.id WHERE {' AND '.join(c_where_pend)}"
     
@@ -311,6 +373,10 @@ def get_payment_history(conn, start_date=None, end_date=None, student_id=None, p
     
     return combined
 
+def _period_date(month_year):
+    """'MM/AAAA' -> 'AAAA-MM-01' (tuitions.period_date)."""
+    return datetime.strptime(month_year, '%m/%Y').strftime('%Y-%m-01')
+
 def generate_tuition_record(conn, student_id, month_year, amount):
     """Generates a monthly tuition record if not exists."""
     cursor = conn.cursor()
@@ -320,8 +386,9 @@ def generate_tuition_record(conn, student_id, month_year, amount):
         return False, "Mensalidade já gerada."
         
     try:
-        cursor.execute("INSERT INTO tuitions (student_id, month_year, amount, status, created_at) VALUES (?, ?, ?, 'Pendente', ?)", 
-                       (student_id, month_year, amount, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+        cursor.execute("INSERT INTO tuitions (student_id, month_year, period_date, amount, status, created_at) VALUES (?, ?, ?, ?, 'Pendente', ?)", 
+                       (student_id, month_year, _period_date(month_year), amount, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+        _refresh_student_balance(cursor, student_id)
         conn.commit()
         return True, "Gerada com sucesso."
     except Exception as e:
@@ -329,6 +396,62 @@ def generate_tuition_record(conn, student_id, month_year, amount):
         logger.error(f"Erro ao gerar mensalidade para aluno {student_id}: {e}")
         raise
 
+def generate_tuitions_bulk(conn, month_year, amount, class_id=None):
+    """
+    Generates the month_year tuition for every active student (or only those
+    of `class_id`) in a single INSERT ... SELECT. Students already billed for
+    the month are skipped, so running it twice is harmless.
+    Returns a summary dict: students, created, skipped, total_amount.
+    """
+    try:
+        period_date = _period_date(month_year)
+    except (TypeError, ValueError):
+        raise ValueError(f"Mês/Ano inválido: {month_year} (use MM/AAAA)")
+
+    target_sql = "SELECT id FROM students WHERE active = 1"
+    params = {'month_year': month_year, 'period_date': period_date, 'amount': amount,
+              'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+    if class_id is not None:
+        target_sql += " AND class_id = :class_id"
+        params['class_id'] = int(class_id)
+
+    try:
+        cursor = conn.cursor()
+        students_count = cursor.execute(f"SELECT COUNT(*) FROM ({target_sql})", params).fetchone()[0]
+
+        # NOT EXISTS keeps it idempotent even where the unique index could not be created
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO tuitions (student_id, month_year, period_date, amount, status, created_at)
+            SELECT s.id, :month_year, :period_date, :amount, 'Pendente', :created_at
+            FROM students s
+            WHERE s.id IN ({target_sql})
+              AND NOT EXISTS (SELECT 1 FROM tuitions t WHERE t.student_id = s.id AND t.month_year = :month_year)
+        """, params)
+        created = cursor.rowcount
+
+        # Refresh balances of the billed group in one statement
+        student_filter = f" AND student_id IN ({target_sql})"
+        cursor.execute(STUDENT_BALANCE_REFRESH.format(
+            tuition_filter=student_filter, consumption_filter=student_filter,
+            ledger_filter=student_filter, student_filter=f"WHERE s.id IN ({target_sql})"
+        ), params)
+
+        summary = {
+            'students': students_count,
+            'created': created,
+            'skipped': students_count - created,
+            'total_amount': created * amount,
+        }
+        audit.log_action(conn, 'BULK_TUITION', 'tuitions', None, None,
+                         {'month_year': month_year, 'class_id': class_id, **summary}, commit=False)
+        conn.commit()
+        logger.info(f"Mensalidades {month_year} geradas: {created} novas, {summary['skipped']} já existentes")
+        return summary
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erro ao gerar mensalidades em massa ({month_year}): {e}")
+        raise
+
 def confirm_payment_all_pending(conn, student_id):
     """Marks all pending items as Paid for a student."""
     try:
@@ -341,6 +464,7 @@ def confirm_payment_all_pending(conn, student_id):
         # Consumptions
         cursor.execute("UPDATE student_consumptions SET status='Pago', payment_date=? WHERE student_id=? AND status='Pendente'", (now_str, student_id))
         
+        _refresh_student_balance(cursor, student_id)
         conn.commit()
         audit.log_action(conn, 'PAYMENT', 'finance', student_id, None, {'type': 'ALL_PENDING'}, commit=True)
     except Exception as e:
@@ -348,41 +472,221 @@ def confirm_payment_all_pending(conn, student_id):
         logger.error(f"Erro ao confirmar pagamento total para aluno {student_id}: {e}")
         raise
 
-def process_partial_payment(conn, student_id, payment_amount):
+# --- Payment Allocation (FIFO) ---
+
+PAYMENT_EPSILON = 0.009  # Float safety when comparing money values
+
+def _load_pending_items(conn, student_ids):
+    """Pending tuitions and consumptions (with amount still due) for the given students, oldest first."""
+    ids_json = json.dumps([int(x) for x in student_ids])
+    query = """
+        SELECT 'tuition' as type, id, student_id, amount - COALESCE(amount_paid, 0) as due, period_date as ref_date
+        FROM tuitions WHERE status = 'Pendente' AND student_id IN (SELECT value FROM json_each(?))
+        UNION ALL
+        SELECT 'consumption', id, student_id, total_value - COALESCE(amount_paid, 0), SUBSTR(date, 1, 10)
+        FROM student_consumptions WHERE status = 'Pendente' AND student_id IN (SELECT value FROM json_each(?))
     """
-    Allocates a payment amount to the oldest pending debts first.
+    pending = pd.read_sql(query, conn, params=(ids_json, ids_json))
+    return pending[pending['due'] > PAYMENT_EPSILON]
+
+def allocate_payments(pending, payments):
     """
+    FIFO allocation of payments to pending items, for any number of students.
+
+    pending: DataFrame with type, id, student_id, due, ref_date.
+    payments: DataFrame with student_id, amount, date.
+
+    Each student's items (oldest ref_date first) and payments (oldest date
+    first) are laid out on the same cumulative axis; a payment covers the
+    part of each item its interval overlaps. Returns one row per touched
+    item: type, id, student_id, paid, fully_paid, payment_date.
+    """
+    cols = ['type', 'id', 'student_id', 'paid', 'fully_paid', 'payment_date']
+    if pending.empty or payments.empty:
+        return pd.DataFrame(columns=cols)
+
+    items = pending.sort_values(['student_id', 'ref_date', 'type', 'id']).copy()
+    items['due_end'] = items.groupby('student_id')['due'].cumsum()
+    items['due_start'] = items['due_end'] - items['due']
+
+    pays = payments.sort_values(['student_id', 'date']).copy()
+    pays['pay_end'] = pays.groupby('student_id')['amount'].cumsum()
+    pays['pay_start'] = pays['pay_end'] - pays['amount']
+
+    merged = items.merge(pays[['student_id', 'date', 'pay_start', 'pay_end']], on='student_id')
+    merged['paid'] = (np.minimum(merged['due_end'], merged['pay_end'])
+                      - np.maximum(merged['due_start'], merged['pay_start'])).clip(lower=0)
+    merged = merged[merged['paid'] > PAYMENT_EPSILON]
+    if merged.empty:
+        return pd.DataFrame(columns=cols)
+
+    alloc = merged.groupby(['type', 'id', 'student_id'], as_index=False).agg(
+        paid=('paid', 'sum'), due=('due', 'first'), payment_date=('date', 'max')
+    )
+    alloc['paid'] = alloc['paid'].round(2)
+    alloc['fully_paid'] = alloc['paid'] >= alloc['due'] - 0.01
+    return alloc[cols]
+
+def apply_payments(conn, payments, audit_action='PARTIAL_PAYMENT'):
+    """
+    Allocates and records payments for one or many students in one transaction.
+    payments: DataFrame with student_id, amount and optional date (YYYY-MM-DD, default today).
+    Returns a summary dict: students, items, allocated, unallocated (overpayments per student_id).
+    """
+    payments = payments.copy()
+    if 'date' not in payments.columns:
+        payments['date'] = datetime.now().strftime('%Y-%m-%d')
+    payments['date'] = payments['date'].fillna(datetime.now().strftime('%Y-%m-%d'))
+    payments['student_id'] = payments['student_id'].astype(int)
+
+    student_ids = payments['student_id'].unique().tolist()
+    alloc = allocate_payments(_load_pending_items(conn, student_ids), payments)
+
     try:
         cursor = conn.cursor()
-        for item in pending_items:
-            if remaining_payment <= 0.009: # Float epsilon safety
-                break
-                
-            pay_this_item = min(remaining_payment, item['due'])
-            
-            # Update logic
-            if item['type'] == 'tuition':
-                cursor.execute("UPDATE tuitions SET amount_paid = COALESCE(amount_paid, 0) + ? WHERE id=?", (pay_this_item, item['id']))
-                # Check if fully paid
-                if abs(pay_this_item - item['due']) < 0.01:
-                    cursor.execute("UPDATE tuitions SET status='Pago', payment_date=? WHERE id=?", (now_str, item['id']))
-            else:
-                cursor.execute("UPDATE student_consumptions SET amount_paid = COALESCE(amount_paid, 0) + ? WHERE id=?", (pay_this_item, item['id']))
-                if abs(pay_this_item - item['due']) < 0.01:
-                    cursor.execute("UPDATE student_consumptions SET status='Pago', payment_date=? WHERE id=?", (now_str, item['id']))
-                    
-            remaining_payment -= pay_this_item
-            items_paid.append(f"{item['type']} {item['id']} ({pay_this_item:.2f})")
-            
+        for item_type, table in (('tuition', 'tuitions'), ('consumption', 'student_consumptions')):
+            rows = alloc[alloc['type'] == item_type]
+            if rows.empty:
+                continue
+            # One UPDATE per item so the ledger trigger fires once with the final state
+            cursor.executemany(f"""
+                UPDATE {table} SET
+                    amount_paid = COALESCE(amount_paid, 0) + ?,
+                    status = CASE WHEN ? THEN 'Pago' ELSE status END,
+                    payment_date = ?
+                WHERE id = ?
+            """, list(zip(rows['paid'].astype(float), rows['fully_paid'].astype(int),
+                          rows['payment_date'], rows['id'].astype(int))))
+
+        student_filter = " AND student_id IN (SELECT value FROM json_each(:ids))"
+        cursor.execute(STUDENT_BALANCE_REFRESH.format(
+            tuition_filter=student_filter, consumption_filter=student_filter, ledger_filter=student_filter,
+            student_filter="WHERE s.id IN (SELECT value FROM json_each(:ids))"
+        ), {'ids': json.dumps(student_ids)})
+
+        paid_by_student = alloc.groupby('student_id')['paid'].sum()
+        received = payments.groupby('student_id')['amount'].sum()
+        for sid, amount in received.items():
+            items_paid = [f"{r.type} {r.id} ({r.paid:.2f})" for r in alloc[alloc['student_id'] == sid].itertuples()]
+            audit.log_action(conn, audit_action, 'finance', int(sid), None,
+                             {'amount': float(amount), 'items': items_paid}, commit=False)
         conn.commit()
-        audit.log_action(conn, 'PARTIAL_PAYMENT', 'finance', student_id, None, {'amount': payment_amount, 'items': items_paid}, commit=False)
-        
-        return True, f"Pagamento de R$ {payment_amount:.2f} registrado com sucesso!"
     except Exception as e:
         conn.rollback()
-        logger.error(f"Erro ao processar pagamento parcial para aluno {student_id}: {e}")
+        logger.error(f"Erro ao registrar pagamentos ({len(student_ids)} alunos): {e}")
         raise
 
+    unallocated = (received - paid_by_student.reindex(received.index, fill_value=0)).round(2)
+    return {
+        'students': len(student_ids),
+        'items': len(alloc),
+        'allocated': float(alloc['paid'].sum()),
+        'unallocated': unallocated[unallocated > PAYMENT_EPSILON].to_dict(),
+    }
+
+def process_partial_payment(conn, student_id, payment_amount):
+    """
+    Allocates a payment amount to the oldest pending debts first.
+    """
+    summary = apply_payments(conn, pd.DataFrame({'student_id': [student_id], 'amount': [float(payment_amount)]}))
+    msg = f"Pagamento de R$ {payment_amount:.2f} registrado com sucesso!"
+    if summary['unallocated']:
+        msg += f" (R$ {sum(summary['unallocated'].values()):.2f} excedente sem débito para abater)"
+    return True, msg
+
+def statement_line_keys(lines, statement_id=None):
+    """
+    Key of each statement line: student, date, amount, the line's identity and
+    its position among identical lines. The identity is the bank description
+    (transaction id) when the line has one, else `statement_id`, so an identical
+    payment in another statement gets another key and the same statement maps
+    to the same keys. Without either, the key is the pre-identity format
+    (student|date|amount|position) used by the first imports.
+    lines: DataFrame with student_id, date (YYYY-MM-DD), amount and optionally description.
+    """
+    amount = lines['amount'].round(2)
+    base = lines['student_id'].astype(int).astype(str) + '|' + lines['date'] + '|' + amount.map('{:.2f}'.format)
+    if 'description' in lines.columns:
+        description = lines['description'].fillna('').astype(str).str.strip()
+    else:
+        description = pd.Series('', index=lines.index)
+    identity = pd.Series('' if statement_id is None else f"s:{statement_id}", index=lines.index)
+    identity = identity.where(description == '', 'd:' + description)
+    occurrence = lines.groupby([base, identity]).cumcount().astype(str)
+    return (base + '|' + identity + '|' + occurrence).where(identity != '', base + '|' + occurrence)
+
+def statement_digest(lines):
+    """Identity of a statement: hash of its valid lines (student, date, amount), in order."""
+    content = json.dumps([[int(r.student_id), r.date, round(float(r.amount), 2)] for r in lines.itertuples()])
+    return hashlib.sha256(content.encode()).hexdigest()[:16]
+
+def import_bank_statement(conn, statement):
+    """
+    Records a bank statement of student payments (batch mode).
+    statement: DataFrame with 'Valor', 'Data (AAAA-MM-DD)', either 'ID Aluno' or 'Aluno' (exact name)
+    and optionally 'Descrição' (the bank's transaction id or description).
+    Lines already imported (statement_imports) are skipped, so re-running a statement is a no-op;
+    an identical line of another statement (different description or content) is imported.
+    Returns the apply_payments summary plus 'unmatched' (student not found or invalid amount),
+    'invalid_dates' and 'already_imported' (statement rows that were not applied).
+    """
+    statement = statement.reset_index(drop=True)
+    df = statement.rename(columns={'ID Aluno': 'student_id', 'Aluno': 'name',
+                                   'Data (AAAA-MM-DD)': 'date', 'Valor': 'amount',
+                                   'Descrição': 'description'})
+    if 'amount' not in df.columns:
+        raise ValueError("Coluna 'Valor' não encontrada no extrato.")
+    if 'date' not in df.columns:
+        raise ValueError("Coluna 'Data (AAAA-MM-DD)' não encontrada no extrato.")
+    for col in ('student_id', 'name', 'description'):
+        if col not in df.columns:
+            df[col] = None
+
+    students = pd.read_sql("SELECT id, name FROM students", conn)
+    by_name = dict(zip(students['name'].str.strip().str.lower(), students['id']))
+    known_ids = set(students['id'])
+
+    df['student_id'] = pd.to_numeric(df['student_id'], errors='coerce')
+    df.loc[~df['student_id'].isin(known_ids), 'student_id'] = None
+    df['student_id'] = df['student_id'].fillna(df['name'].astype(str).str.strip().str.lower().map(by_name))
+    df['amount'] = pd.to_numeric(df['amount'], errors='coerce')
+    df['date'] = pd.to_datetime(df['date'], errors='coerce').dt.strftime('%Y-%m-%d')
+
+    matched = df['student_id'].notna() & (df['amount'] > 0)
+    dated = df['date'].notna()
+    lines = df.loc[matched & dated, ['student_id', 'amount', 'date', 'description']].copy()
+    if lines.empty:
+        lines['line_key'] = lines['legacy_key'] = pd.Series(dtype=object)
+    else:
+        lines['line_key'] = statement_line_keys(lines, statement_digest(lines))
+        # Lines imported before keys carried the statement identity
+        lines['legacy_key'] = statement_line_keys(lines[['student_id', 'amount', 'date']])
+    imported = pd.read_sql(
+        "SELECT line_key FROM statement_imports WHERE line_key IN (SELECT value FROM json_each(?))",
+        conn, params=(json.dumps(lines['line_key'].tolist() + lines['legacy_key'].tolist()),))['line_key']
+    seen = lines['line_key'].isin(imported) | lines['legacy_key'].isin(imported)
+    new_lines = lines[~seen]
+
+    summary = {'students': 0, 'items': 0, 'allocated': 0.0, 'unallocated': {}}
+    if not new_lines.empty:
+        now = datetime.now().isoformat(timespec='seconds')
+        try:
+            # Same transaction as the payments: apply_payments commits or rolls back both
+            conn.executemany(
+                "INSERT INTO statement_imports (line_key, student_id, date, amount, imported_at) VALUES (?, ?, ?, ?, ?)",
+                [(r.line_key, int(r.student_id), r.date, float(r.amount), now) for r in new_lines.itertuples()]
+            )
+            summary = apply_payments(conn, new_lines[['student_id', 'amount', 'date']], audit_action='STATEMENT_PAYMENT')
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Erro ao importar extrato: {e}")
+            raise
+
+    summary['unmatched'] = statement[~matched]
+    summary['invalid_dates'] = statement[matched & ~dated]
+    summary['already_imported'] = statement.loc[lines.index[seen]]
+    return summary
+
 def cancel_consumption(conn, consumption_id):
     """Cancels a consumption and restores stock if it was a material."""
     cursor = conn.cursor()
@@ -397,16 +701,17 @@ def cancel_consumption(conn, consumption_id):
         # Restore stock if material
         if mat_id and qty:
             cursor.execute("UPDATE materials SET stock_level = stock_level + ? WHERE id=?", (qty, mat_id))
-            # Log restoration in inventory transactions
+            # Log restoration in inventory transactions (a return: no cost, keeps the average price)
             cursor.execute("""
-                INSERT INTO inventory_transactions (material_id, date, type, quantity, cost, notes)
-                VALUES (?, ?, ?, ?, 0, ?)
+                INSERT INTO inventory_transactions (material_id, date, type, quantity, cost, notes, is_return)
+                VALUES (?, ?, ?, ?, NULL, ?, 1)
             """, (mat_id, datetime.now().isoformat(), 'ENTRADA', qty, f"Estorno Cancelamento Aluno ID {sid}"))
 
         # Update status
         cursor.execute("UPDATE student_consumptions SET status='Cancelado' WHERE id=?", (consumption_id,))
         
         audit.log_action(conn, 'CANCEL_CONSUMPTION', 'student_consumptions', consumption_id, {'old_status': status}, {'new_status': 'Cancelado'}, commit=False)
+        _refresh_student_balance(cursor, sid)
         conn.commit()
     except Exception as e:
         conn.rollback()
@@ -417,15 +722,16 @@ def cancel_consumption(conn, consumption_id):
 def cancel_tuition(conn, tuition_id):
     """Cancels a tuition record."""
     cursor = conn.cursor()
-    res = cursor.execute("SELECT status FROM tuitions WHERE id=?", (tuition_id,)).fetchone()
+    res = cursor.execute("SELECT status, student_id FROM tuitions WHERE id=?", (tuition_id,)).fetchone()
     if not res: return False, "Registro não encontrado."
-    status = res[0]
+    status, sid = res
     
     if status == 'Cancelado': return False, "Já está cancelado."
     
     try:
         cursor.execute("UPDATE tuitions SET status='Cancelado' WHERE id=?", (tuition_id,))
         audit.log_action(conn, 'CANCEL_TUITION', 'tuitions', tuition_id, {'old_status': status}, {'new_status': 'Cancelado'}, commit=False)
+        _refresh_student_balance(cursor, sid)
         conn.commit()
     except Exception as e:
         conn.rollback()
@@ -436,10 +742,12 @@ def cancel_tuition(conn, tuition_id):
 def update_tuition(conn, tuition_id, amount):
     """Updates tuition amount."""
     cursor = conn.cursor()
-    old = pd.read_sql("SELECT amount FROM tuitions WHERE id=?", conn, params=(tuition_id,)).iloc[0].to_dict()
+    old = pd.read_sql("SELECT amount, student_id FROM tuitions WHERE id=?", conn, params=(tuition_id,)).iloc[0].to_dict()
+    sid = old.pop('student_id')
     try:
         cursor.execute("UPDATE tuitions SET amount=? WHERE id=?", (amount, tuition_id))
         audit.log_action(conn, 'UPDATE', 'tuitions', tuition_id, old, {'amount': amount}, commit=False)
+        _refresh_student_balance(cursor, sid)
         conn.commit()
     except Exception as e:
         conn.rollback()
@@ -452,10 +760,12 @@ def update_consumption(conn, consumption_id, description, total_value):
     # Note: Quantity/Unit Price changes are complex for materials due to stock. 
     # For now, we allow description and total value adjustments.
     cursor = conn.cursor()
-    old = pd.read_sql("SELECT description, total_value FROM student_consumptions WHERE id=?", conn, params=(consumption_id,)).iloc[0].to_dict()
+    old = pd.read_sql("SELECT description, total_value, student_id FROM student_consumptions WHERE id=?", conn, params=(consumption_id,)).iloc[0].to_dict()
+    sid = old.pop('student_id')
     try:
         cursor.execute("UPDATE student_consumptions SET description=?, total_value=? WHERE id=?", (description, total_value, consumption_id))
         audit.log_action(conn, 'UPDATE', 'student_consumptions', consumption_id, old, {'description': description, 'total_value': total_value}, commit=False)
+        _refresh_student_balance(cursor, sid)
         conn.commit()
     except Exception as e:
         conn.rollback()
@@ -507,21 +817,10 @@ def get_module_summary_stats(conn):
 def get_debts_summary(conn):
     """Returns a DataFrame of students with total pending balance > 0, showing the oldest month of debt."""
     query = """
-        SELECT id, name, total_due, oldest_month as months FROM (
-            SELECT s.id, s.name, 
-                   COALESCE((SELECT SUM(amount - COALESCE(amount_paid, 0)) FROM tuitions WHERE student_id = s.id AND status = 'Pendente'), 0) +
-                   COALESCE((SELECT SUM(total_value - COALESCE(amount_paid, 0)) FROM student_consumptions WHERE student_id = s.id AND status = 'Pendente'), 0) as total_due,
-                   COALESCE(
-                       (SELECT strftime('%m/%Y', MIN(d)) FROM (
-                           SELECT SUBSTR(month_year, 4, 4) || '-' || SUBSTR(month_year, 1, 2) || '-01' as d FROM tuitions WHERE student_id = s.id AND status = 'Pendente'
-                           UNION ALL
-                           SELECT date as d FROM student_consumptions WHERE student_id = s.id AND status = 'Pendente'
-                       )), 
-                       '---'
-                   ) as oldest_month
-            FROM students s
-            WHERE s.active = 1
-        ) WHERE total_due > 0
-        ORDER BY total_due DESC
+        SELECT s.id, s.name, b.total_due, COALESCE(strftime('%m/%Y', b.oldest_pending_date), '---') as months
+        FROM student_balances b
+        JOIN students s ON s.id = b.student_id
+        WHERE s.active = 1 AND b.total_due > 0
+        ORDER BY b.total_due DESC
     """
     return pd.read_sql(query, conn)
@@ -0,0 +1,37 @@
+from datetime import date
+
+import pandas as pd
+
+from services import admin_service, report_service
+
+
+def _import_row(**values):
+    return pd.Series(values)
+
+
+def test_bulk_import_creates_cost_versions_and_links_sales(conn):
+    cursor = conn.cursor()
+    material_id = admin_service.upsert_material(cursor, _import_row(
+        Nome='Argila', Categoria='Massas', Fornecedor='Fornecedor A', Preço=10.0, Unidade='kg', Estoque=5, Tipo='Material'))
+    product_id = admin_service.upsert_product_and_composition(cursor, _import_row(**{
+        'Nome': 'Caneca', 'Preço Base': 60.0, 'Estoque': 0, 'Categoria': 'Canecas', 'Peso (g)': 300,
+        'Composição': 'RECIPE: Argila:2'}))
+    conn.execute("INSERT INTO sales (date, product_id, quantity, total_price) VALUES ('2024-03-01', ?, 2, 120)", (product_id,))
+    conn.commit()
+
+    assert admin_service.snapshot_import_costs(conn, {material_id}, {product_id}) == 1
+    assert conn.execute("SELECT cost_id IS NOT NULL FROM sales").fetchone()[0] == 1
+
+    report = report_service.get_realized_profitability(conn, date(2024, 3, 1), date(2024, 3, 31), 10)
+    assert report['CustoTotal'].tolist() == [40.0]
+    assert report['QtdSemCusto'].tolist() == [0]
+
+
+def test_sales_without_any_cost_are_flagged(conn):
+    conn.execute("INSERT INTO products (name) VALUES ('Vaso')")
+    conn.execute("INSERT INTO sales (date, product_id, quantity, total_price) VALUES ('2024-03-01', 1, 3, 90)")
+    conn.commit()
+
+    report = report_service.get_realized_profitability(conn, date(2024, 3, 1), date(2024, 3, 31), 10)
+    assert report['QtdSemCusto'].tolist() == [3]
+    assert report['CustoTotal'].isna().all()
@@ -0,0 +1,136 @@
+from datetime import datetime
+
+import pytest
+
+import audit
+from services import product_service, student_service
+
+
+def _product(conn, product_id):
+    return audit.record_state(conn, 'products', product_id)
+
+
+def test_rewind_restores_full_deleted_product(conn):
+    product_id = product_service.create_product(conn, "Caneca", "Caneca 300ml", "Canecas", 2.5)
+    conn.execute("UPDATE products SET base_price = 42 WHERE id = ?", (product_id,))
+    conn.commit()
+    before_delete = _product(conn, product_id)
+    audit.log_action(conn, 'UPDATE', 'products', product_id, {'base_price': 0}, {'base_price': 42})
+    at = datetime.now()
+    product_service.delete_product(conn, product_id, "Caneca")
+
+    plan = audit.rewind_table(conn, 'products', at, dry_run=True)
+    assert plan['operation'].tolist() == ['INSERT']
+    assert plan['missing'].tolist() == [[]]
+
+    audit.rewind_table(conn, 'products', at, dry_run=False)
+    assert _product(conn, product_id) == before_delete
+
+
+def test_rewind_refuses_partial_payloads(conn):
+    conn.execute("INSERT INTO products (name, description, category, base_price) VALUES ('Prato', 'Raso', 'Pratos', 30)")
+    audit.log_action(conn, 'CREATE', 'products', 1, None, {'name': 'Prato'})
+    at = datetime.now()
+    conn.execute("DELETE FROM products WHERE id = 1")
+    audit.log_action(conn, 'DELETE', 'products', 1, {'name': 'Prato'}, None)
+
+    plan = audit.rewind_table(conn, 'products', at, dry_run=True)
+    assert plan['operation'].tolist() == ['INSERT']
+    assert 'description' in plan['missing'].iloc[0]
+    assert 'description' in audit.missing_columns(conn, 'products', audit.reconstruct_record(conn, 'products', 1, at))
+
+    with pytest.raises(ValueError, match="incompleta"):
+        audit.rewind_table(conn, 'products', at, dry_run=False)
+    assert _product(conn, 1) is None
+
+
+def _student_with_tuition(conn):
+    conn.execute("INSERT INTO students (name) VALUES ('Ana')")
+    conn.execute("""
+        INSERT INTO tuitions (student_id, month_year, amount, status, period_date)
+        VALUES (1, '01/2024', 300, 'Pendente', '2024-01-01')
+    """)
+    conn.commit()
+
+
+def test_cancel_tuition_is_reconstructed_and_rewound(conn):
+    _student_with_tuition(conn)
+    at = datetime.now()
+    ok, _ = student_service.cancel_tuition(conn, 1)
+    assert ok
+
+    assert audit.reconstruct_record(conn, 'tuitions', 1, at)['status'] == 'Pendente'
+    plan = audit.rewind_table(conn, 'tuitions', at, dry_run=True)
+    assert plan['operation'].tolist() == ['UPDATE']
+    assert plan['target'].iloc[0]['status'] == 'Pendente'
+
+    audit.rewind_table(conn, 'tuitions', at, dry_run=False)
+    assert conn.execute("SELECT status FROM tuitions WHERE id = 1").fetchone()[0] == 'Pendente'
+
+
+def _total_due(conn, student_id=1):
+    return conn.execute("SELECT total_due FROM student_balances WHERE student_id = ?", (student_id,)).fetchone()[0]
+
+
+def test_rewind_and_rollback_refresh_student_balances(conn):
+    _student_with_tuition(conn)
+    student_service.recompute_student_balances(conn)
+    at = datetime.now()
+    student_service.cancel_tuition(conn, 1)
+    assert _total_due(conn) == 0
+
+    audit.rewind_table(conn, 'tuitions', at, dry_run=False)
+    assert _total_due(conn) == 300
+    assert student_service.verify_student_balances(conn).empty
+
+    conn.execute("UPDATE tuitions SET status = 'Cancelado' WHERE id = 1")
+    audit.log_action(conn, 'UPDATE', 'tuitions', 1, {'status': 'Pendente'}, {'status': 'Cancelado'})
+    student_service.recompute_student_balances(conn)
+    assert _total_due(conn) == 0
+    update_id = conn.execute("SELECT MAX(id) FROM audit_log").fetchone()[0]
+    assert audit.rollback_record(conn, update_id)
+    assert _total_due(conn) == 300
+    assert student_service.verify_student_balances(conn).empty
+    assert not conn.in_transaction
+
+
+def test_cancel_consumption_is_reconstructed(conn):
+    conn.execute("INSERT INTO students (name) VALUES ('Ana')")
+    conn.execute("""
+        INSERT INTO student_consumptions (student_id, description, total_value, status, date)
+        VALUES (1, 'Argila', 40, 'Pendente', '2024-01-05')
+    """)
+    conn.commit()
+    at = datetime.now()
+    ok, _ = student_service.cancel_consumption(conn, 1)
+    assert ok
+
+    assert audit.reconstruct_record(conn, 'student_consumptions', 1, at)['status'] == 'Pendente'
+    assert audit.rewind_table(conn, 'student_consumptions', at, dry_run=True)['operation'].tolist() == ['UPDATE']
+
+
+def test_update_class_is_reconstructed(conn):
+    conn.execute("INSERT INTO classes (name) VALUES ('Terça')")
+    conn.execute("INSERT INTO classes (name) VALUES ('Quinta')")
+    conn.execute("INSERT INTO students (name, class_id) VALUES ('Ana', 1)")
+    conn.commit()
+    at = datetime.now()
+    student_service.update_student_class(conn, 1, 2)
+
+    assert audit.reconstruct_record(conn, 'students', 1, at)['class_id'] == 1
+    audit.rewind_table(conn, 'students', at, dry_run=False)
+    assert conn.execute("SELECT class_id FROM students WHERE id = 1").fetchone()[0] == 1
+
+
+def test_unknown_action_is_reported(conn):
+    _student_with_tuition(conn)
+    at = datetime.now()
+    conn.execute("UPDATE tuitions SET status = 'Pago' WHERE id = 1")
+    audit.log_action(conn, 'MARK_PAID', 'tuitions', 1, {'flag': 0}, {'flag': 1})
+
+    with pytest.raises(ValueError, match="MARK_PAID"):
+        audit.reconstruct_record(conn, 'tuitions', 1, at)
+    plan = audit.rewind_table(conn, 'tuitions', at, dry_run=True)
+    assert 'MARK_PAID' in plan['unreconstructable'].iloc[0]
+    with pytest.raises(ValueError, match="incompleta"):
+        audit.rewind_table(conn, 'tuitions', at, dry_run=False)
@@ -0,0 +1,105 @@
+import threading
+import time
+
+import bcrypt
+import pytest
+
+import auth
+import config
+from services import admin_service
+
+
+class _SessionState(dict):
+    """st.session_state stand-in with attribute access."""
+    __getattr__ = dict.__getitem__
+    __setattr__ = dict.__setitem__
+    __delattr__ = dict.__delitem__
+
+
+@pytest.fixture(autouse=True)
+def _auth_state(monkeypatch):
+    monkeypatch.setattr(config, "BCRYPT_ROUNDS", 4)
+    monkeypatch.setattr(auth.st, "session_state", _SessionState())
+    auth._buckets.clear()
+    yield
+    auth._buckets.clear()
+
+
+def _user(conn, password="segredo"):
+    return admin_service.create_user(conn, "ana", password, "Ana", "vendedor", True)
+
+
+def test_username_is_throttled_per_ip(conn):
+    _user(conn)
+    for _ in range(config.LOGIN_BURST):
+        assert auth.login(conn, "ana", "errada", ip="10.0.0.1") is None
+    assert auth.login_wait_time("ana", "10.0.0.1") > 0
+    assert auth.login(conn, "ana", "segredo", ip="10.0.0.1") is None
+
+    # Another client is not locked out of the same account
+    assert auth.login_wait_time("ana", "10.0.0.2") == 0
+    assert auth.login(conn, "ana", "segredo", ip="10.0.0.2") is not None
+
+
+def test_ip_is_throttled_across_usernames(conn, monkeypatch):
+    monkeypatch.setattr(config, "LOGIN_IP_BURST", 3)
+    for name in ("a", "b", "c"):
+        assert auth.login(conn, name, "x", ip="10.0.0.9") is None
+    assert auth.login_wait_time("d", "10.0.0.9") > 0
+    assert auth.login_wait_time("d", "10.0.0.8") == 0
+
+
+def test_outdated_hash_is_upgraded_on_login(conn, monkeypatch):
+    user_id = _user(conn)
+    monkeypatch.setattr(config, "BCRYPT_ROUNDS", 5)
+
+    assert auth.login(conn, "ana", "segredo") is not None
+    new_hash = conn.execute("SELECT password_hash FROM users WHERE id = ?", (user_id,)).fetchone()[0]
+    assert not auth.needs_rehash(new_hash)
+    assert bcrypt.checkpw(b"segredo", new_hash.encode())
+
+
+@pytest.mark.parametrize("change", [{'password': "nova"}, {'active': False}])
+def test_session_ends_on_password_or_active_change(conn, change):
+    user_id = _user(conn)
+    session_user = auth.login(conn, "ana", "segredo")
+    auth.set_current_user(session_user)
+    assert auth.revalidate_session(conn, session_user)
+
+    admin_service.update_user(conn, user_id, "Ana", "vendedor", change.get('active', True), change.get('password'))
+
+    assert not auth.revalidate_session(conn, session_user)
+    assert 'current_user' not in auth.st.session_state
+
+
+def test_name_change_keeps_session(conn):
+    user_id = _user(conn)
+    session_user = auth.login(conn, "ana", "segredo")
+    auth.set_current_user(session_user)
+
+    admin_service.update_user(conn, user_id, "Ana Maria", "vendedor", True)
+
+    assert auth.revalidate_session(conn, session_user)
+    assert auth.st.session_state.current_user['name'] == "Ana Maria"
+
+
+def test_pool_slot_is_held_until_a_timed_out_job_ends(monkeypatch):
+    monkeypatch.setattr(config, "AUTH_VERIFY_TIMEOUT_S", 0.05)
+    release = threading.Event()
+    # Enough stuck jobs to fill every pending slot (workers included)
+    for _ in range(config.AUTH_MAX_PENDING):
+        with pytest.raises(RuntimeError):
+            auth._run_in_pool(release.wait, 5)
+    with pytest.raises(RuntimeError, match="ocupado"):
+        auth._run_in_pool(lambda: True)
+
+    release.set()
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        try:
+            assert auth._run_in_pool(lambda: True)
+            break
+        except RuntimeError:
+            time.sleep(0.01)
+    else:
+        pytest.fail("pool slots were not released")
@@ -0,0 +1,67 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import database
+from utils import backup_utils
+
+
+def test_backup_releases_lock_when_connection_fails(conn, tmp_path, monkeypatch):
+    monkeypatch.setattr(backup_utils, "BACKUP_FOLDER", str(tmp_path / "backups"))
+
+    def gated():
+        raise sqlite3.OperationalError("Banco em manutenção (restauração em andamento)")
+
+    monkeypatch.setattr(database, "get_connection", gated)
+    assert backup_utils.perform_backup() is False
+    assert backup_utils.get_last_backup_result()['status'] == 'erro'
+    assert not backup_utils.is_backup_running()
+
+
+def test_restore_aborts_without_safety_backup(conn, tmp_path, monkeypatch):
+    monkeypatch.setattr(backup_utils, "BACKUP_FOLDER", str(tmp_path / "backups"))
+    monkeypatch.setattr(backup_utils, "RESTORE_BACKUP_WAIT_S", 0.1)
+    staged = str(tmp_path / "staged.db")
+    conn.execute("INSERT INTO students (name) VALUES ('Ana')")
+    conn.commit()
+    conn.execute(f"VACUUM INTO '{staged}'")
+    conn.execute("DELETE FROM students")
+    conn.commit()
+
+    # A backup that never finishes within the wait
+    backup_utils._backup_lock.acquire()
+    try:
+        with pytest.raises(RuntimeError, match="segurança"):
+            backup_utils.restore_database(staged)
+    finally:
+        backup_utils._backup_lock.release()
+    assert conn.execute("SELECT COUNT(*) FROM students").fetchone()[0] == 0
+
+    backup_utils.restore_database(staged)
+    assert conn.execute("SELECT COUNT(*) FROM students").fetchone()[0] == 1
+    assert backup_utils.get_last_backup_result()['status'] == 'ok'
+
+
+def test_maintenance_runs_periodic_jobs(conn, tmp_path, monkeypatch):
+    monkeypatch.setattr(backup_utils, "BACKUP_FOLDER", str(tmp_path / "backups"))
+    conn.execute("UPDATE settings SET value = 'Manual' WHERE key = 'backup_frequency'")
+    conn.commit()
+
+    assert backup_utils.run_maintenance()
+    assert conn.execute("SELECT COUNT(*) FROM stock_checkpoints").fetchone()[0] == 1
+    assert conn.execute("SELECT value FROM settings WHERE key = 'last_audit_archive'").fetchone()
+    assert not (tmp_path / "backups").exists()
+
+
+def test_retention_keeps_legacy_backups(tmp_path, monkeypatch):
+    folder = tmp_path / "backups"
+    folder.mkdir()
+    monkeypatch.setattr(backup_utils, "BACKUP_FOLDER", str(folder))
+    for name in ("backup_20240101_120000.db", "backup_20240102_120000_000.db.gz", "backup_20240301_120000_000.db.gz"):
+        (folder / name).write_bytes(b"x")
+
+    deleted = backup_utils.prune_backups(0, 0, 0, now=datetime(2024, 3, 1, 13))
+
+    assert deleted == ["backup_20240102_120000_000.db.gz"]
+    assert (folder / "backup_20240101_120000.db").exists()
@@ -0,0 +1,82 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import database
+from services import cost_service, material_service, student_service
+
+
+def test_cancelled_consumption_keeps_average_cost(conn):
+    mat_id = material_service.create_material(conn, "Esmalte", None, None, 0.0, "kg", 0.0, 0.0, "Material")
+    material_service.register_entry(conn, mat_id, 10.0, 100.0, "NF 1", 1)
+    conn.execute("INSERT INTO students (name) VALUES ('Ana')")
+    conn.commit()
+    cons_id = student_service.process_material_consumption(conn, 1, mat_id, 4.0, date.today().isoformat(), markup=2.0)
+
+    ok, _ = student_service.cancel_consumption(conn, cons_id)
+    assert ok
+    cost_service.rebuild_material_costs(conn)
+
+    price, stock = conn.execute("SELECT price_per_unit, stock_level FROM materials WHERE id = ?", (mat_id,)).fetchone()
+    assert stock == pytest.approx(10.0)
+    assert price == pytest.approx(10.0)
+
+
+def test_flagged_return_is_not_a_purchase():
+    transactions = pd.DataFrame({
+        'id': [1, 2, 3, 4], 'material_id': [1, 1, 1, 1],
+        'date': ['2024-01-01', '2024-01-02', '2024-01-03', '2024-01-04'],
+        'type': ['ENTRADA', 'SAIDA', 'ENTRADA', 'ENTRADA'], 'quantity': [10.0, 4.0, 4.0, 4.0],
+        'cost': [100.0, None, 0.0, 80.0], 'is_return': [0, 0, 1, 0],
+        # The notes no longer decide: a purchase may mention "Estorno"
+        'notes': ['NF 1', 'Aluno ID 1', 'Cancelamento', 'Estorno de frete NF 2'],
+    })
+    materials = pd.DataFrame({'id': [1], 'stock_level': [14.0], 'price_per_unit': [10.0]})
+
+    history = cost_service.compute_cost_history(transactions, materials)
+
+    assert history['is_purchase'].tolist() == [True, False, False, True]
+    assert history['unit_cost'].tolist() == pytest.approx([10.0, 10.0, 10.0, 180 / 14])
+
+
+def test_migration_flags_legacy_returns(conn):
+    conn.execute("""
+        INSERT INTO inventory_transactions (material_id, date, type, quantity, cost, notes)
+        VALUES (1, '2024-01-03', 'ENTRADA', 4, 0, 'Estorno Cancelamento Aluno ID 1'),
+               (1, '2024-01-04', 'ENTRADA', 4, 80, 'NF 2')
+    """)
+    database._migration_inventory_returns(conn.cursor())
+
+    assert [r[0] for r in conn.execute("SELECT is_return FROM inventory_transactions ORDER BY id")] == [1, 0]
+
+
+def _nested_kits(conn):
+    """Caneca (2 kg at 10) -> Kit Café (3 canecas) -> Kit Presente (2 kits café)."""
+    mat_id = material_service.create_material(conn, "Argila", None, None, 0.0, "kg", 0.0, 0.0, "Material")
+    material_service.register_entry(conn, mat_id, 10.0, 100.0, "NF 1", 1)
+    for name in ("Caneca", "Kit Café", "Kit Presente"):
+        conn.execute("INSERT INTO products (name) VALUES (?)", (name,))
+    conn.execute("INSERT INTO product_recipes (product_id, material_id, quantity) VALUES (1, 1, 2)")
+    conn.execute("INSERT INTO product_kits (parent_product_id, child_product_id, quantity) VALUES (2, 1, 3)")
+    conn.execute("INSERT INTO product_kits (parent_product_id, child_product_id, quantity) VALUES (3, 2, 2)")
+    conn.commit()
+    return mat_id
+
+
+def test_nested_kit_costs(conn):
+    mat_id = _nested_kits(conn)
+
+    assert cost_service.compute_product_costs(conn).to_dict() == {1: 20.0, 2: 60.0, 3: 120.0}
+    assert cost_service.get_products_using_materials(conn, [mat_id]) == [1, 2, 3]
+
+    assert cost_service.snapshot_product_costs(conn, [1], reason='Teste') == 3
+    # Average goes to 20; the entry snapshots the recipe product and every kit above it
+    material_service.register_entry(conn, mat_id, 10.0, 300.0, "NF 2", 1)
+    latest = dict(conn.execute("SELECT product_id, unit_cost FROM product_costs WHERE id IN "
+                               "(SELECT MAX(id) FROM product_costs GROUP BY product_id)").fetchall())
+    assert latest == {1: 40.0, 2: 120.0, 3: 240.0}
+
+    cost_service.rebuild_product_cost_history(conn)
+    rebuilt = dict(conn.execute("SELECT product_id, unit_cost FROM product_costs").fetchall())
+    assert rebuilt == {1: 40.0, 2: 120.0, 3: 240.0}
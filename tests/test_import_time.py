@@ -0,0 +1,6 @@
+from scripts import check_import_time
+
+
+def test_import_time_budgets(capsys):
+    status = check_import_time.run_check()
+    assert status == 0, capsys.readouterr().out
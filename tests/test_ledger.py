@@ -0,0 +1,67 @@
+from datetime import date
+
+from services import finance_service
+
+
+def _postings(conn, table, source_id):
+    return conn.execute(
+        "SELECT date, amount FROM ledger_entries WHERE source_table = ? AND source_id = ? ORDER BY id",
+        (table, source_id)
+    ).fetchall()
+
+
+def _class_revenue(conn, start, end):
+    return finance_service.get_financial_summary(conn, start, end)['class_revenue']
+
+
+def test_partial_payments_post_on_their_own_dates(conn):
+    conn.execute("INSERT INTO students (name) VALUES ('Ana')")
+    conn.execute("""
+        INSERT INTO tuitions (student_id, month_year, amount, status, period_date)
+        VALUES (1, '01/2024', 300, 'Pendente', '2024-01-01')
+    """)
+    conn.execute("UPDATE tuitions SET amount_paid = 100, payment_date = '2024-01-10' WHERE id = 1")
+    conn.execute("UPDATE tuitions SET amount_paid = 300, status = 'Pago', payment_date = '2024-02-10' WHERE id = 1")
+    conn.commit()
+
+    assert _postings(conn, 'tuitions', 1) == [('2024-01-10', 100.0), ('2024-02-10', 200.0)]
+    assert _class_revenue(conn, date(2024, 1, 1), date(2024, 1, 31)) == 100.0
+    assert _class_revenue(conn, date(2024, 2, 1), date(2024, 2, 29)) == 200.0
+
+
+def test_reversal_does_not_rewrite_closed_month(conn):
+    conn.execute("INSERT INTO students (name) VALUES ('Ana')")
+    conn.execute("""
+        INSERT INTO tuitions (student_id, month_year, amount, status, payment_date, period_date)
+        VALUES (1, '01/2024', 300, 'Pago', '2024-01-10', '2024-01-01')
+    """)
+    conn.execute("UPDATE tuitions SET status = 'Pendente', amount_paid = 0, payment_date = NULL WHERE id = 1")
+    conn.commit()
+
+    rows = _postings(conn, 'tuitions', 1)
+    assert rows[0] == ('2024-01-10', 300.0)
+    assert rows[1] == (date.today().isoformat(), -300.0)
+    assert _class_revenue(conn, date(2024, 1, 1), date(2024, 1, 31)) == 300.0
+
+
+def test_sale_date_change_reverses_old_day(conn):
+    conn.execute("INSERT INTO sales (date, total_price, quantity) VALUES ('2024-01-15', 50, 1)")
+    conn.execute("UPDATE sales SET date = '2024-02-03' WHERE id = 1")
+    conn.execute("UPDATE sales SET total_price = 80 WHERE id = 1")
+    conn.commit()
+
+    assert _postings(conn, 'sales', 1) == [
+        ('2024-01-15', 50.0), ('2024-01-15', -50.0), ('2024-02-03', 50.0), ('2024-02-03', 30.0)
+    ]
+    february = finance_service.get_financial_summary(conn, date(2024, 2, 1), date(2024, 2, 29))
+    assert february['sales_revenue'] == 80.0
+    assert february['revenue_details']['total_price'].tolist() == [80.0]
+
+
+def test_fixed_costs_count_only_new_expenses(conn):
+    conn.execute("INSERT INTO fixed_costs (description, value, due_day, periodicity) VALUES ('Aluguel', 1500, 5, 'Mensal')")
+    conn.commit()
+
+    assert finance_service.process_fixed_costs(conn, date(2024, 1, 1), date(2024, 3, 31)) == 3
+    assert finance_service.process_fixed_costs(conn, date(2024, 1, 1), date(2024, 3, 31)) == 0
+    assert conn.execute("SELECT COUNT(*) FROM expenses").fetchone()[0] == 3
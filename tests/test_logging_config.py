@@ -0,0 +1,19 @@
+import logging
+
+from utils.logging_config import SamplingFilter
+
+
+def _record(msg, level=logging.WARNING):
+    return logging.LogRecord('services.admin_service', level, __file__, 1, msg, None, None)
+
+
+def test_sampling_is_per_message_shape():
+    sampling = SamplingFilter(10)
+
+    kept = [sampling.filter(_record(f"Failed to parse image paths for product {i}")) for i in range(20)]
+    assert kept.count(True) == 2
+
+    # Another message of the same logger is not hidden by the noisy one
+    assert sampling.filter(_record("Import Warning: Material 'Argila' not found for product 'Vaso'"))
+    assert sampling.filter(_record("Import Warning: Material 'Esmalte' not found for product 'Vaso'"))
+    assert sampling.filter(_record("Falha", logging.ERROR))
@@ -0,0 +1,22 @@
+import config
+import database
+from utils import query_stats
+
+
+def test_single_row_lookup_is_recorded(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "QUERY_PROFILING", True)
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "test.db"))
+    query_stats.reset()
+    conn = database.get_connection()
+    try:
+        conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.executemany("INSERT INTO items (name) VALUES (?)", [("a",), ("b",)])
+
+        assert conn.execute("SELECT name FROM items WHERE id = 1").fetchone() == ("a",)
+
+        shapes = {s['sql']: s for s in query_stats.get_shape_stats()}
+        assert shapes["SELECT name FROM items WHERE id = ?"]['count'] == 1
+        assert shapes["SELECT name FROM items WHERE id = ?"]['avg_rows'] == 1
+    finally:
+        conn.close()
+        query_stats.reset()
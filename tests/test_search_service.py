@@ -0,0 +1,28 @@
+from services import search_service
+
+
+def test_search_ids_returns_every_match(conn):
+    conn.executemany("INSERT INTO materials (name, price_per_unit, unit) VALUES (?, 1, 'kg')", [(f"Argila {i}",) for i in range(600)])
+    conn.commit()
+
+    assert len(search_service.search_ids(conn, 'material', "argila")) == 600
+    assert len(search_service.search_ids(conn, 'material', "argila", limit=10)) == 10
+
+
+def test_search_ids_keeps_substring_matches(conn):
+    conn.execute("INSERT INTO products (name, category) VALUES ('Caneca 300ml', 'Canecas')")
+    conn.execute("INSERT INTO products (name, category) VALUES ('Prato raso', 'Pratos')")
+    conn.commit()
+
+    assert search_service.search_ids(conn, 'product', "aneca") == [1]
+    assert search_service.search_ids(conn, 'product', "can") == [1]
+
+
+def test_names_only_ignores_description_and_category(conn):
+    conn.execute("INSERT INTO products (name, description, category) VALUES ('Prato raso', 'Acompanha caneca', 'Pratos')")
+    conn.execute("INSERT INTO products (name, category) VALUES ('Caneca 300ml', 'Canecas')")
+    conn.commit()
+
+    assert sorted(search_service.search_ids(conn, 'product', "caneca")) == [1, 2]
+    assert search_service.search_ids(conn, 'product', "caneca", names_only=True) == [2]
+    assert search_service.search_ids(conn, 'product', "aneca", names_only=True) == [2]
@@ -0,0 +1,53 @@
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+import database
+from services import report_service, stock_ledger_service
+
+
+def _legacy_opening(conn):
+    """Stock written before the ledger existed, then the migration's opening checkpoint."""
+    conn.execute("DROP TRIGGER trg_ledger_products_insert")
+    conn.execute("INSERT INTO products (name, stock_quantity) VALUES ('Vaso', 5)")
+    conn.execute("DELETE FROM stock_checkpoint_items")
+    conn.execute("DELETE FROM stock_checkpoints")
+    database.create_stock_ledger(conn.cursor())
+    conn.commit()
+
+
+def test_checkpoint_matches_live_balances(conn):
+    conn.execute("INSERT INTO products (name, stock_quantity) VALUES ('Vaso', 5)")
+    conn.execute("UPDATE products SET stock_quantity = 3 WHERE id = 1")
+    conn.commit()
+
+    checkpoint_id = stock_ledger_service.create_checkpoint(conn)
+
+    ledger_id = conn.execute("SELECT ledger_id FROM stock_checkpoints WHERE id = ?", (checkpoint_id,)).fetchone()[0]
+    assert ledger_id == conn.execute("SELECT MAX(id) FROM stock_ledger").fetchone()[0]
+    assert not conn.in_transaction
+    assert stock_ledger_service.get_stock_on_date(conn, 'product', date.today())[1] == 3
+
+
+def test_stock_before_legacy_opening_checkpoint_is_unknown(conn):
+    _legacy_opening(conn)
+    conn.execute("INSERT INTO products (name, stock_quantity) VALUES ('Prato', 2)")
+    conn.commit()
+    yesterday = date.today() - timedelta(days=1)
+
+    assert stock_ledger_service.stock_known_since(conn) == date.today()
+    assert pd.isna(stock_ledger_service.get_stock_on_date(conn, 'product', yesterday)[1])
+    today = stock_ledger_service.get_stock_on_date(conn, 'product', date.today())
+    assert today[1] == 5 and today[2] == 2
+
+    with pytest.raises(ValueError, match="desconhecido"):
+        report_service.get_stock_forecast_products(conn, 30, (yesterday - timedelta(days=30)).isoformat(), yesterday)
+
+
+def test_fresh_database_history_is_known(conn):
+    conn.execute("INSERT INTO products (name, stock_quantity) VALUES ('Vaso', 5)")
+    conn.commit()
+
+    assert stock_ledger_service.stock_known_since(conn) is None
+    assert stock_ledger_service.get_stock_on_date(conn, 'product', date.today() - timedelta(days=1)).empty
@@ -0,0 +1,78 @@
+import pandas as pd
+
+from services import student_service
+
+
+def _statement():
+    return pd.DataFrame({
+        'ID Aluno': [1, 1, 1, 1],
+        'Data (AAAA-MM-DD)': ['2024-01-10', '2024-01-10', 'ontem', None],
+        'Valor': [100, 100, 50, 50],
+    })
+
+
+def test_statement_import_rejects_bad_dates_and_is_idempotent(conn):
+    conn.execute("INSERT INTO students (name) VALUES ('Ana')")
+    conn.execute("""
+        INSERT INTO tuitions (student_id, month_year, amount, status, period_date)
+        VALUES (1, '01/2024', 500, 'Pendente', '2024-01-01')
+    """)
+    conn.commit()
+
+    first = student_service.import_bank_statement(conn, _statement())
+    assert first['allocated'] == 200.0
+    assert len(first['invalid_dates']) == 2
+    assert first['already_imported'].empty
+
+    again = student_service.import_bank_statement(conn, _statement())
+    assert again['allocated'] == 0.0
+    assert len(again['already_imported']) == 2
+
+    paid, payment_date = conn.execute("SELECT amount_paid, payment_date FROM tuitions WHERE id = 1").fetchone()
+    assert paid == 200.0
+    assert payment_date == '2024-01-10'
+
+
+def _debts(conn, amount=500):
+    conn.execute("INSERT INTO students (name) VALUES ('Ana')")
+    conn.execute("""
+        INSERT INTO tuitions (student_id, month_year, amount, status, period_date)
+        VALUES (1, '01/2024', ?, 'Pendente', '2024-01-01')
+    """, (amount,))
+    conn.commit()
+
+
+def test_identical_payment_in_another_statement_is_imported(conn):
+    _debts(conn)
+    january = pd.DataFrame({'ID Aluno': [1, 1], 'Data (AAAA-MM-DD)': ['2024-01-10', '2024-01-20'], 'Valor': [100, 50]})
+    february = pd.DataFrame({'ID Aluno': [1, 1], 'Data (AAAA-MM-DD)': ['2024-01-20', '2024-02-10'], 'Valor': [50, 70]})
+
+    assert student_service.import_bank_statement(conn, january)['allocated'] == 150.0
+    assert student_service.import_bank_statement(conn, february)['allocated'] == 120.0
+    assert student_service.import_bank_statement(conn, february)['allocated'] == 0.0
+
+
+def test_bank_description_identifies_lines_across_statements(conn):
+    _debts(conn)
+    first = pd.DataFrame({'ID Aluno': [1, 1], 'Data (AAAA-MM-DD)': ['2024-01-10', '2024-01-10'],
+                          'Valor': [100, 100], 'Descrição': ['PIX 001', 'PIX 002']})
+    # Overlapping export: PIX 002 again plus a new line
+    second = pd.DataFrame({'ID Aluno': [1, 1], 'Data (AAAA-MM-DD)': ['2024-01-10', '2024-01-11'],
+                           'Valor': [100, 30], 'Descrição': ['PIX 002', 'PIX 003']})
+
+    assert student_service.import_bank_statement(conn, first)['allocated'] == 200.0
+    again = student_service.import_bank_statement(conn, second)
+    assert again['allocated'] == 30.0
+    assert len(again['already_imported']) == 1
+
+
+def test_lines_imported_with_old_keys_are_still_skipped(conn):
+    _debts(conn)
+    conn.execute("INSERT INTO statement_imports (line_key, student_id, date, amount, imported_at) "
+                 "VALUES ('1|2024-01-10|100.00|0', 1, '2024-01-10', 100, '2024-01-11')")
+    conn.commit()
+
+    summary = student_service.import_bank_statement(conn, pd.DataFrame(
+        {'ID Aluno': [1], 'Data (AAAA-MM-DD)': ['2024-01-10'], 'Valor': [100]}))
+    assert summary['allocated'] == 0.0
+    assert len(summary['already_imported']) == 1
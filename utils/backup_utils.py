@@ -1,6 +1,28 @@
+"""
+Local backups: full snapshots plus page-level incrementals.
+
+Every run copies the live database with the online backup API into a
+temporary file. The first run of a chain stores that copy gzipped
+(`backup_<ts>.db.gz`) together with a manifest holding one digest per page;
+the following runs store only the pages whose digest changed
+(`backup_<ts>.inc.gz`). A new chain starts every FULL_SNAPSHOT_EVERY
+incrementals. restore_point() rebuilds any point from its chain and
+prune_backups() applies the hourly/daily/weekly retention policy.
+
+start_background_maintenance() is what pages call: it runs the scheduled
+backup and the other periodic jobs (stock and audit checkpoints, audit
+archive) on a daemon thread, so a page rerun never waits for them.
+"""
 import os
+import re
+import gzip
+import json
 import shutil
 import sqlite3
+import struct
+import hashlib
+import threading
+import time
 from datetime import datetime, timedelta
 import pandas as pd
 import database
@@ -9,18 +31,25 @@ from utils.logging_config import get_logger, log_exception
 logger = get_logger(__name__)
 
 BACKUP_FOLDER = os.path.join("data", "backups")
+MANIFEST_NAME = "chain.manifest"
+
+DEFAULT_RETENTION = {'keep_hourly': 24, 'keep_daily': 7, 'keep_weekly': 8}
 
 def get_backup_settings(conn):
-    """Fetch backup frequency and last run timestamp."""
+    """Fetch backup frequency, last run timestamp and retention policy."""
+    defaults = {'frequency': 'Diário', 'last_run': '2000-01-01T00:00:00', **DEFAULT_RETENTION}
     try:
-        settings = pd.read_sql("SELECT key, value FROM settings WHERE key IN ('backup_frequency', 'last_backup_timestamp')", conn)
+        settings = pd.read_sql("SELECT key, value FROM settings WHERE key LIKE 'backup_%' OR key = 'last_backup_timestamp'", conn)
         settings_dict = dict(zip(settings['key'], settings['value']))
-        return {
-            'frequency': settings_dict.get('backup_frequency', 'Diário'),
-            'last_run': settings_dict.get('last_backup_timestamp', '2000-01-01T00:00:00')
+        result = {
+            'frequency': settings_dict.get('backup_frequency', defaults['frequency']),
+            'last_run': settings_dict.get('last_backup_timestamp', defaults['last_run'])
         }
-    except (sqlite3.Error, pd.io.sql.DatabaseError, KeyError):
-        return {'frequency': 'Diário', 'last_run': '2000-01-01T00:00:00'}
+        for key, default in DEFAULT_RETENTION.items():
+            result[key] = int(settings_dict.get(f'backup_{key}', default))
+        return result
+    except (sqlite3.Error, pd.io.sql.DatabaseError, KeyError, ValueError):
+        return defaults
 
 def save_backup_settings(conn, frequency):
     """Update backup frequency setting."""
@@ -28,72 +57,564 @@ def save_backup_settings(conn, frequency):
     cursor.execute("UPDATE settings SET value = ? WHERE key = 'backup_frequency'", (frequency,))
     conn.commit()
 
+def save_retention_settings(conn, keep_hourly, keep_daily, keep_weekly):
+    """Update how many hourly/daily/weekly restore points are kept."""
+    values = {'keep_hourly': keep_hourly, 'keep_daily': keep_daily, 'keep_weekly': keep_weekly}
+    cursor = conn.cursor()
+    cursor.executemany(
+        "INSERT INTO settings (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        [(f'backup_{key}', str(int(value))) for key, value in values.items()]
+    )
+    conn.commit()
+
+# Online backup pacing: copy this many pages per step, then yield to writers
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_PAUSE_S = 0.005
+COMPRESS_CHUNK_BYTES = 1024 * 1024
+# Incrementals per chain before a new full snapshot is taken
+FULL_SNAPSHOT_EVERY = 24
+# How long a restore waits for a running backup before taking its safety copy
+RESTORE_BACKUP_WAIT_S = 300
+
+_INC_MAGIC = b"AMICANDO-INC 1\n"
+_PAGE_NO = struct.Struct(">I")
+_NAME_RE = re.compile(r"^backup_(\d{8}_\d{6})(?:_(\d{3}))?\.(db|db\.gz|inc\.gz)$")
+
+_backup_lock = threading.Lock()
+_last_result = {}
+
+def backup_due(settings, now=None):
+    """Whether the configured frequency calls for a backup since settings['last_run']."""
+    elapsed = (now or datetime.now()) - datetime.fromisoformat(settings['last_run'])
+    intervals = {
+        'Horária': timedelta(hours=1), 'Diário': timedelta(days=1),
+        'Semanal': timedelta(weeks=1), 'Mensal': timedelta(days=30),
+    }
+    interval = intervals.get(settings['frequency'])
+    return interval is not None and elapsed >= interval
+
 def run_backup_if_needed(conn):
-    """Check if a backup is due and run it if so."""
-    settings = get_backup_settings(conn)
-    freq = settings['frequency']
-    
-    if freq == 'Manual':
+    """Check if a backup is due and start it in the background if so."""
+    if backup_due(get_backup_settings(conn)):
+        return start_background_backup()
+    return False
+
+def start_background_backup():
+    """
+    Starts perform_backup on a daemon thread. Returns False when a backup is
+    already running (the page request never waits for it).
+    """
+    if _backup_lock.locked():
         return False
+    thread = threading.Thread(target=perform_backup, name="amicando-backup", daemon=True)
+    thread.start()
+    return True
 
-    last_run = datetime.fromisoformat(settings['last_run'])
-    now = datetime.now()
-    
-    needed = False
-    if freq == 'Diário' and (now - last_run) >= timedelta(days=1):
-        needed = True
-    elif freq == 'Semanal' and (now - last_run) >= timedelta(weeks=1):
-        needed = True
-    elif freq == 'Mensal' and (now - last_run) >= timedelta(days=30):
-        needed = True
-        
-    if needed:
-        return perform_backup(conn)
-    return False
+# Page reruns check for due maintenance at most this often (per process)
+MAINTENANCE_CHECK_INTERVAL_S = 600
+_maintenance_lock = threading.Lock()
+_last_maintenance_check = 0.0
 
-def perform_backup(conn):
-    """Execute the database backup."""
-    if not os.path.exists(BACKUP_FOLDER):
-        os.makedirs(BACKUP_FOLDER)
-        
-    # Standard SQLite backup requires closing or using a specialized method for WAL mode
-    # Since we use WAL, we should be careful. shutil.copy is usually fine if no writers.
-    # But better to use itercdump or vacuum into for total safety.
-    # For simplicity and given the usage, we will use 'VACUUM INTO' which is safe.
-    
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_filename = f"backup_{timestamp}.db"
-    backup_path = os.path.join(BACKUP_FOLDER, backup_filename)
-    
+def start_background_maintenance():
+    """
+    Starts the periodic jobs on a daemon thread: the scheduled backup, the
+    stock checkpoint, the audit archive and the audit checkpoint. Reruns in
+    between only compare a timestamp. Returns True when a run was started.
+    """
+    global _last_maintenance_check
+    now = time.monotonic()
+    if now - _last_maintenance_check < MAINTENANCE_CHECK_INTERVAL_S or _maintenance_lock.locked():
+        return False
+    _last_maintenance_check = now
+    thread = threading.Thread(target=run_maintenance, name="amicando-maintenance", daemon=True)
+    thread.start()
+    return True
+
+def run_maintenance():
+    """Runs every periodic job that is due, on its own connection. Returns False if already running."""
+    # Imported here: scripts/restore_backup.py uses this module without Streamlit
+    import audit
+    import services.stock_ledger_service as stock_ledger_service
+
+    if not _maintenance_lock.acquire(blocking=False):
+        return False
+    conn = None
     try:
-        # VACUUM INTO is a safe way to create a backup of a live DB
-        cursor = conn.cursor()
-        # Note: If file exists, it fails. We use a unique timestamp.
-        cursor.execute(f"VACUUM INTO '{backup_path}'")
-        
-        # Update last run
-        cursor.execute("UPDATE settings SET value = ? WHERE key = 'last_backup_timestamp'", (datetime.now().isoformat(),))
-        conn.commit()
-        logger.info(f"Backup created successfully: {backup_filename}")
+        conn = database.get_connection()
+        if backup_due(get_backup_settings(conn)):
+            perform_backup()
+        # Periodic stock snapshot keeps "stock on date" queries bounded;
+        # old audit entries move to compressed monthly archive tables
+        for job in (stock_ledger_service.run_checkpoint_if_needed,
+                    audit.run_archive_if_needed, audit.run_checkpoint_if_needed):
+            try:
+                job(conn)
+            except Exception as e:
+                log_exception(logger, f"Maintenance job {job.__module__}.{job.__name__} failed", e)
         return True
     except sqlite3.Error as e:
+        logger.warning(f"Maintenance skipped: {e}")
+        return False
+    finally:
+        if conn is not None:
+            conn.close()
+        _maintenance_lock.release()
+
+def is_backup_running():
+    return _backup_lock.locked()
+
+def get_last_backup_result():
+    """Result of the latest backup run in this process ({} if none)."""
+    return dict(_last_result)
+
+# --- Page helpers ---
+def _page_size(path):
+    """Page size from the SQLite file header (offset 16, big-endian; 1 means 65536)."""
+    with open(path, 'rb') as f:
+        f.seek(16)
+        value = int.from_bytes(f.read(2), 'big')
+    return 65536 if value == 1 else value
+
+def _iter_pages(path, page_size):
+    with open(path, 'rb') as f:
+        while True:
+            page = f.read(page_size)
+            if not page:
+                return
+            yield page
+
+def _digest(page):
+    return hashlib.blake2b(page, digest_size=16).digest()
+
+def _load_manifest():
+    """(meta, digests) of the current chain tip, or (None, None) when a full snapshot is needed."""
+    path = os.path.join(BACKUP_FOLDER, MANIFEST_NAME)
+    try:
+        with open(path, 'rb') as f:
+            meta = json.loads(f.readline())
+            digests = f.read()
+    except (OSError, ValueError):
+        return None, None
+    for name in (meta.get('backup'), meta.get('base')):
+        if not name or not os.path.exists(os.path.join(BACKUP_FOLDER, name)):
+            return None, None
+    return meta, digests
+
+def _save_manifest(meta, digests):
+    path = os.path.join(BACKUP_FOLDER, MANIFEST_NAME)
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f:
+        f.write(json.dumps(meta).encode() + b"\n")
+        f.write(digests)
+    os.replace(tmp, path)
+
+def _write_full(src_path, dest_path, page_size):
+    """gzip the snapshot page by page; returns the page digests."""
+    digests = bytearray()
+    with gzip.open(dest_path, 'wb', compresslevel=6) as dest:
+        for page in _iter_pages(src_path, page_size):
+            dest.write(page)
+            digests += _digest(page)
+    return bytes(digests)
+
+def _write_incremental(src_path, dest_path, header, old_digests, page_size):
+    """Writes only the pages whose digest differs from the parent. Returns (digests, changed)."""
+    digests = bytearray()
+    changed = 0
+    with gzip.open(dest_path, 'wb', compresslevel=6) as dest:
+        dest.write(_INC_MAGIC)
+        dest.write(json.dumps(header).encode() + b"\n")
+        for index, page in enumerate(_iter_pages(src_path, page_size)):
+            digest = _digest(page)
+            digests += digest
+            if old_digests[index * 16:(index + 1) * 16] != digest:
+                dest.write(_PAGE_NO.pack(index + 1))
+                dest.write(page)
+                changed += 1
+    return bytes(digests), changed
+
+def _read_incremental_header(path):
+    with gzip.open(path, 'rb') as f:
+        if f.readline() != _INC_MAGIC:
+            raise ValueError(f"Arquivo incremental inválido: {os.path.basename(path)}")
+        return json.loads(f.readline())
+
+def _record_metrics(conn, row):
+    conn.execute("""
+        INSERT INTO backup_metrics (started_at, finished_at, kind, file_name, db_size_bytes,
+                                    file_size_bytes, duration_s, status, error)
+        VALUES (:started_at, :finished_at, :kind, :file_name, :db_size_bytes,
+                :file_size_bytes, :duration_s, :status, :error)
+    """, row)
+
+def perform_backup(conn=None, wait_s=0):
+    """
+    Execute the database backup (full snapshot or incremental).
+
+    Uses the online backup API on its own connection, copying
+    BACKUP_PAGES_PER_STEP pages at a time so readers and writers keep going.
+    The copy is stored whole when a new chain starts, otherwise only its
+    changed pages are kept. Duration and sizes go to backup_metrics and the
+    retention policy runs afterwards. `conn` is accepted for compatibility;
+    the backup always opens its own connection. With `wait_s` a backup that
+    is already running is waited for (up to that many seconds) and a new one
+    is taken after it; otherwise the call is skipped.
+    """
+    acquired = _backup_lock.acquire(timeout=wait_s) if wait_s else _backup_lock.acquire(blocking=False)
+    if not acquired:
+        logger.info("Backup already running, skipped")
+        return False
+
+    started = time.perf_counter()
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]
+    tmp_path = os.path.join(BACKUP_FOLDER, f".backup_{timestamp}.db.tmp")
+    backup_path = None
+    row = {
+        'started_at': datetime.now().isoformat(timespec='seconds'), 'finished_at': None, 'kind': 'full',
+        'file_name': None, 'db_size_bytes': None, 'file_size_bytes': None,
+        'duration_s': None, 'status': 'erro', 'error': None
+    }
+
+    src = None
+    try:
+        src = database.get_connection()
+        os.makedirs(BACKUP_FOLDER, exist_ok=True)
+
+        dest = sqlite3.connect(tmp_path)
+        try:
+            src.backup(dest, pages=BACKUP_PAGES_PER_STEP,
+                       progress=lambda status, remaining, total: time.sleep(BACKUP_STEP_PAUSE_S))
+        finally:
+            dest.close()
+
+        row['db_size_bytes'] = os.path.getsize(tmp_path)
+        page_size = _page_size(tmp_path)
+        manifest, old_digests = _load_manifest()
+        incremental = (manifest is not None and manifest['page_size'] == page_size
+                       and manifest['incrementals'] < FULL_SNAPSHOT_EVERY)
+
+        if incremental:
+            row['kind'] = 'incremental'
+            row['file_name'] = f"backup_{timestamp}.inc.gz"
+            backup_path = os.path.join(BACKUP_FOLDER, row['file_name'])
+            header = {
+                'base': manifest['base'], 'parent': manifest['backup'],
+                'page_size': page_size, 'page_count': row['db_size_bytes'] // page_size
+            }
+            digests, changed = _write_incremental(tmp_path, backup_path, header, old_digests, page_size)
+            new_manifest = {**manifest, 'backup': row['file_name'], 'incrementals': manifest['incrementals'] + 1}
+        else:
+            row['file_name'] = f"backup_{timestamp}.db.gz"
+            backup_path = os.path.join(BACKUP_FOLDER, row['file_name'])
+            digests = _write_full(tmp_path, backup_path, page_size)
+            changed = len(digests) // 16
+            new_manifest = {'backup': row['file_name'], 'base': row['file_name'], 'page_size': page_size, 'incrementals': 0}
+
+        _save_manifest(new_manifest, digests)
+        row['file_size_bytes'] = os.path.getsize(backup_path)
+        row['status'] = 'ok'
+
+        src.execute("UPDATE settings SET value = ? WHERE key = 'last_backup_timestamp'", (datetime.now().isoformat(),))
+        logger.info(f"Backup created successfully: {row['file_name']} ({row['kind']}, {changed} pages, "
+                    f"{row['db_size_bytes'] / 1e6:.1f} MB -> {row['file_size_bytes'] / 1e6:.1f} MB)")
+
+        settings = get_backup_settings(src)
+        prune_backups(settings['keep_hourly'], settings['keep_daily'], settings['keep_weekly'])
+        return True
+    except (sqlite3.Error, OSError, ValueError) as e:
+        row['error'] = str(e)
         log_exception(logger, "Backup failed", e)
+        if backup_path and row['status'] != 'ok' and os.path.exists(backup_path):
+            os.remove(backup_path)
         return False
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        row['finished_at'] = datetime.now().isoformat(timespec='seconds')
+        row['duration_s'] = round(time.perf_counter() - started, 3)
+        try:
+            if src is not None:
+                _record_metrics(src, row)
+                src.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Backup metrics not recorded: {e}")
+        finally:
+            if src is not None:
+                src.close()
+            _last_result.clear()
+            _last_result.update(row)
+            _backup_lock.release()
 
-def list_backups():
-    """List last 5 backups in the backup folder."""
+def get_backup_metrics(conn, limit=10):
+    """Latest backup runs (duration, sizes, status)."""
+    return pd.read_sql(
+        "SELECT started_at, kind, file_name, duration_s, db_size_bytes, file_size_bytes, status, error "
+        "FROM backup_metrics ORDER BY id DESC LIMIT ?", conn, params=(limit,)
+    )
+
+# --- Restore points ---
+def _point_time(filename):
+    match = _NAME_RE.match(filename)
+    if not match:
+        return None
+    return datetime.strptime(match.group(1), '%Y%m%d_%H%M%S').replace(microsecond=int(match.group(2) or 0) * 1000)
+
+def list_restore_points():
+    """
+    All restore points, oldest first: dicts with name, timestamp, kind
+    ('full'/'incremental'), base (full snapshot of its chain), parent, size
+    and legacy (plain .db copies written before incremental backups).
+    """
     if not os.path.exists(BACKUP_FOLDER):
         return []
-    
-    files = [f for f in os.listdir(BACKUP_FOLDER) if f.endswith('.db')]
-    # Sort by name (which has timestamp) descending
-    files.sort(reverse=True)
-    return files[:10] # Return up to 10 for better visibility
+
+    points = []
+    for filename in os.listdir(BACKUP_FOLDER):
+        timestamp = _point_time(filename)
+        if timestamp is None:
+            continue
+        path = os.path.join(BACKUP_FOLDER, filename)
+        point = {'name': filename, 'timestamp': timestamp, 'kind': 'full', 'base': filename,
+                 'parent': None, 'size': os.path.getsize(path), 'legacy': filename.endswith('.db')}
+        if filename.endswith('.inc.gz'):
+            try:
+                header = _read_incremental_header(path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable backup {filename}: {e}")
+                continue
+            point.update(kind='incremental', base=header['base'], parent=header['parent'])
+        points.append(point)
+    points.sort(key=lambda p: p['timestamp'])
+    return points
+
+def _chain(points_by_name, name):
+    """Files needed to rebuild `name`, full snapshot first. Raises ValueError if a link is missing."""
+    chain = []
+    current = name
+    while current is not None:
+        point = points_by_name.get(current)
+        if point is None:
+            raise ValueError(f"Cadeia de backup incompleta: {current} não encontrado")
+        chain.append(point)
+        current = point['parent']
+    return chain[::-1]
+
+def find_restore_point(at):
+    """Latest restore point taken at or before `at` (datetime), or None."""
+    candidates = [p for p in list_restore_points() if p['timestamp'] <= at]
+    return candidates[-1]['name'] if candidates else None
+
+def restore_point(name, dest_path):
+    """
+    Rebuilds the database as of restore point `name` into dest_path
+    (full snapshot, then each incremental of the chain in order).
+    """
+    points_by_name = {p['name']: p for p in list_restore_points()}
+    chain = _chain(points_by_name, name)
+
+    part_path = dest_path + ".part"
+    base_path = os.path.join(BACKUP_FOLDER, chain[0]['name'])
+    opener = gzip.open if base_path.endswith('.gz') else open
+    with opener(base_path, 'rb') as src, open(part_path, 'wb') as dest:
+        shutil.copyfileobj(src, dest, COMPRESS_CHUNK_BYTES)
+
+    with open(part_path, 'r+b') as dest:
+        for point in chain[1:]:
+            with gzip.open(os.path.join(BACKUP_FOLDER, point['name']), 'rb') as inc:
+                inc.readline()
+                header = json.loads(inc.readline())
+                page_size = header['page_size']
+                while True:
+                    page_no = inc.read(_PAGE_NO.size)
+                    if not page_no:
+                        break
+                    dest.seek((_PAGE_NO.unpack(page_no)[0] - 1) * page_size)
+                    dest.write(inc.read(page_size))
+                dest.truncate(header['page_count'] * page_size)
+    os.replace(part_path, dest_path)
+    logger.info(f"Restore point {name} rebuilt into {dest_path} ({len(chain)} files)")
+    return dest_path
+
+def prune_backups(keep_hourly=24, keep_daily=7, keep_weekly=8, now=None):
+    """
+    Retention policy: keeps the newest restore point of each of the last
+    `keep_hourly` hours, `keep_daily` days and `keep_weekly` ISO weeks (plus
+    the newest point overall). Incrementals depend on their whole chain, so
+    files are only deleted when no kept point needs them. Legacy .db backups
+    are never touched (delete them by hand). Returns the deleted file names.
+    """
+    points = [p for p in list_restore_points() if not p['legacy']]
+    if not points:
+        return []
+    now = now or datetime.now()
+
+    keep = {points[-1]['name']}
+    buckets = (
+        (keep_hourly, timedelta(hours=keep_hourly), lambda ts: ts.strftime('%Y%m%d%H')),
+        (keep_daily, timedelta(days=keep_daily), lambda ts: ts.date()),
+        (keep_weekly, timedelta(weeks=keep_weekly), lambda ts: ts.isocalendar()[:2]),
+    )
+    for count, window, bucket_of in buckets:
+        seen = set()
+        for point in reversed(points):
+            bucket = bucket_of(point['timestamp'])
+            if len(seen) >= count or now - point['timestamp'] > window:
+                break
+            if bucket not in seen:
+                seen.add(bucket)
+                keep.add(point['name'])
+
+    points_by_name = {p['name']: p for p in points}
+    needed = set()
+    for name in keep:
+        try:
+            needed.update(p['name'] for p in _chain(points_by_name, name))
+        except ValueError as e:
+            logger.warning(f"Retention: {e}")
+
+    deleted = []
+    for point in points:
+        if point['name'] not in needed:
+            os.remove(os.path.join(BACKUP_FOLDER, point['name']))
+            deleted.append(point['name'])
+    if deleted:
+        logger.info(f"Retention removed {len(deleted)} backup file(s)")
+    return deleted
+
+def list_backups():
+    """List the latest restore points (file names, newest first)."""
+    return [p['name'] for p in reversed(list_restore_points())][:10]
 
 def delete_backup(filename):
-    """Delete a specific backup file."""
-    path = os.path.join(BACKUP_FOLDER, filename)
-    if os.path.exists(path):
-        os.remove(path)
-        return True
-    return False
+    """Delete a restore point and every incremental that depends on it."""
+    points = list_restore_points()
+    points_by_name = {p['name']: p for p in points}
+    if filename not in points_by_name:
+        return False
+
+    doomed = {filename}
+    for point in points:
+        if point['parent'] in doomed:
+            doomed.add(point['name'])
+    for name in doomed:
+        os.remove(os.path.join(BACKUP_FOLDER, name))
+    return True
+
+# --- Restore ---
+RESTORE_REQUIRED_TABLES = ('users', 'settings', 'products')
+_SQLITE_MAGIC = b"SQLite format 3\x00"
+
+def _staging_path():
+    os.makedirs(BACKUP_FOLDER, exist_ok=True)
+    return os.path.join(BACKUP_FOLDER, f".restore_{datetime.now():%Y%m%d_%H%M%S_%f}.db.tmp")
+
+def stage_restore_file(fileobj, filename):
+    """
+    Streams an uploaded backup (.db or .db.gz) to a staging file in
+    COMPRESS_CHUNK_BYTES chunks (never the whole upload in one buffer).
+    Returns the staging path.
+    """
+    path = _staging_path()
+    fileobj.seek(0)
+    try:
+        with open(path, 'wb') as dest:
+            if filename.endswith('.gz'):
+                with gzip.GzipFile(fileobj=fileobj, mode='rb') as src:
+                    shutil.copyfileobj(src, dest, COMPRESS_CHUNK_BYTES)
+            else:
+                shutil.copyfileobj(fileobj, dest, COMPRESS_CHUNK_BYTES)
+    except (OSError, EOFError) as e:
+        discard_staged(path)
+        raise ValueError(f"Arquivo de backup ilegível: {e}") from e
+    return path
+
+def stage_restore_point(name):
+    """Rebuilds a local restore point into a staging file. Returns its path."""
+    path = _staging_path()
+    try:
+        return restore_point(name, path)
+    except (OSError, EOFError) as e:
+        discard_staged(path)
+        raise ValueError(f"Ponto de restauração ilegível: {e}") from e
+
+def discard_staged(path):
+    for leftover in (path, path + ".part", path + "-journal"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+def validate_restore_file(path):
+    """
+    Checks a staged file before it may replace the live database: SQLite
+    header, PRAGMA integrity_check, the app's core tables and the schema
+    version (newer than this code is rejected). Raises ValueError;
+    returns {'schema_version', 'size_bytes', 'page_size'}.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(_SQLITE_MAGIC)) != _SQLITE_MAGIC:
+            raise ValueError("O arquivo não é um banco SQLite.")
+
+    conn = sqlite3.connect(path)
+    try:
+        # Staged copies may come from a WAL database; keep them self-contained
+        conn.execute("PRAGMA journal_mode=DELETE")
+        problems = [row[0] for row in conn.execute("PRAGMA integrity_check(10)")]
+        if problems != ['ok']:
+            raise ValueError("Falha na verificação de integridade: " + "; ".join(problems))
+
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        missing = [t for t in RESTORE_REQUIRED_TABLES if t not in tables]
+        if missing:
+            raise ValueError(f"Banco incompatível: tabelas ausentes ({', '.join(missing)}).")
+
+        version = database.get_schema_version(conn)
+        if version > database.SCHEMA_VERSION:
+            raise ValueError(f"Backup de uma versão mais nova do sistema (esquema v{version}, "
+                             f"suportado até v{database.SCHEMA_VERSION}).")
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    except sqlite3.DatabaseError as e:
+        raise ValueError(f"Arquivo inválido: {e}") from e
+    finally:
+        conn.close()
+    return {'schema_version': version, 'size_bytes': os.path.getsize(path), 'page_size': page_size}
+
+def restore_database(path, safety_backup=True):
+    """
+    Replaces the live database contents with the staged file at `path`.
+
+    The file is validated again, a safety backup of the current data is
+    taken (waiting for a running backup to finish first; the restore is
+    aborted with RuntimeError if it cannot be taken), and new connections
+    are held back (database.maintenance_mode)
+    while the backup API copies the file into the live database in a single
+    step under SQLite's write lock. Open readers therefore see either the old
+    or the new database, never a half-copied file. Older schemas are migrated
+    afterwards. Returns the validation info plus 'migrated' (applied versions).
+    """
+    info = validate_restore_file(path)
+    if safety_backup and not perform_backup(wait_s=RESTORE_BACKUP_WAIT_S):
+        raise RuntimeError("Backup de segurança não foi feito; restauração cancelada. "
+                           "O banco atual não foi alterado.")
+
+    with database.maintenance_mode():
+        src = sqlite3.connect(path)
+        live = sqlite3.connect(database.DB_PATH, timeout=30)
+        try:
+            live_page_size = live.execute("PRAGMA page_size").fetchone()[0]
+            if info['page_size'] != live_page_size:
+                # A WAL destination only accepts a source with the same page size
+                src.execute(f"PRAGMA page_size = {int(live_page_size)}")
+                src.execute("VACUUM")
+            src.backup(live)
+            live.execute("PRAGMA journal_mode=WAL")
+            live.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            info['migrated'] = database.run_migrations(live)
+        except sqlite3.Error as e:
+            log_exception(logger, "Restore failed", e)
+            raise
+        finally:
+            src.close()
+            live.close()
+
+    logger.info(f"Database restored (schema v{info['schema_version']}, {info['size_bytes'] / 1e6:.1f} MB, "
+                f"migrations applied: {info['migrated'] or 'none'})")
+    return info
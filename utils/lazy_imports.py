@@ -0,0 +1,53 @@
+"""
+Lazy module loading for heavy, rarely needed dependencies.
+
+`lazy_import("plotly.express")` returns a module object whose code only runs
+on first attribute access (importlib.util.LazyLoader). Pages keep the usual
+`px.bar(...)` style while plotly, fpdf (via reports), openpyxl, PIL or
+matplotlib are loaded only on the reruns that actually draw a chart or build
+a PDF.
+"""
+import importlib
+import importlib.util
+import sys
+import threading
+from types import ModuleType
+
+_lock = threading.Lock()
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Returns `name` as a lazily executed module (or the real module when it
+    is already imported). Parent packages of dotted names are imported
+    eagerly, as usual. Raises ImportError if the module does not exist.
+    """
+    with _lock:
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+
+        spec = importlib.util.find_spec(name)
+        if spec is None or spec.loader is None:
+            raise ImportError(f"No module named '{name}'", name=name)
+
+        loader = importlib.util.LazyLoader(spec.loader)
+        spec.loader = loader
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        loader.exec_module(module)
+
+        # Mirror `import a.b`: make the submodule reachable from its parent
+        parent, _, child = name.rpartition('.')
+        if parent:
+            setattr(sys.modules[parent], child, module)
+        return module
+
+
+def is_loaded(name: str) -> bool:
+    """True when `name` has been imported and its code has actually run."""
+    module = sys.modules.get(name)
+    if module is None:
+        return False
+    # LazyLoader swaps the module class to _LazyModule until first access
+    return not isinstance(module, importlib.util._LazyModule)
@@ -1,10 +1,17 @@
 """
 Centralized Logging Configuration for CeramicAdmin OS
 Provides consistent logging across all modules with file and console output.
+Records are queued and written by a single background thread.
 """
+import atexit
+import json
 import logging
 import os
+import queue
+import re
+import threading
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 try:
     import config
 except ImportError:
@@ -20,32 +27,88 @@ LOG_FORMAT = config.LOG_FORMAT
 DATE_FORMAT = config.DATE_FORMAT
 MAX_LOG_SIZE_MB = config.MAX_LOG_SIZE_MB
 BACKUP_COUNT = config.BACKUP_COUNT
+LOG_JSON = getattr(config, 'LOG_JSON', False)
+LOG_SAMPLING = dict(getattr(config, 'LOG_SAMPLING', {}))
 
 # Ensure log folder exists
 if not os.path.exists(LOG_FOLDER):
     os.makedirs(LOG_FOLDER)
 
-def get_logger(name: str) -> logging.Logger:
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg (+ exc)."""
+
+    def format(self, record):
+        payload = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload['exc'] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
     """
-    Returns a configured logger for the given module name.
-    
-    Usage:
-        from utils.logging_config import get_logger
-        logger = get_logger(__name__)
-        logger.info("Something happened")
-        logger.error("An error occurred", exc_info=True)
+    Lets 1 of every `every` records below ERROR through per message shape
+    (the message with numbers masked), so one noisy message cannot hide the
+    others of the same logger. Errors always pass.
     """
-    logger = logging.getLogger(name)
-    
-    # Avoid adding handlers multiple times
-    if logger.handlers:
-        return logger
-    
-    logger.setLevel(logging.DEBUG)
-    
-    # File Handler (with rotation)
+
+    _NUMBER = re.compile(r'\d+')
+    MAX_SHAPES = 1000
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(1, int(every))
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.ERROR or self.every == 1:
+            return True
+        shape = (record.levelno, self._NUMBER.sub('#', str(record.msg)))
+        with self._lock:
+            if shape not in self._counts and len(self._counts) >= self.MAX_SHAPES:
+                self._counts.clear()
+            count = self._counts.get(shape, 0) + 1
+            self._counts[shape] = count
+            keep = count % self.every == 1
+        if keep:
+            record.msg = f"{record.msg} [sampled 1/{self.every}]"
+        return keep
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """Enqueues records with only the message resolved; formatting happens on the writer thread."""
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# --- Background writer ---
+# Loggers only enqueue records; a single QueueListener thread formats them
+# and does the file I/O and rotation.
+_exc_formatter = logging.Formatter()
+_queue = queue.SimpleQueue()
+_queue_handler = _DeferredQueueHandler(_queue)
+_queue_handler.setLevel(logging.DEBUG)
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def _build_handlers():
+    handlers = []
     try:
-        from logging.handlers import RotatingFileHandler
         file_handler = RotatingFileHandler(
             LOG_FILE,
             maxBytes=MAX_LOG_SIZE_MB * 1024 * 1024,
@@ -53,17 +116,69 @@ def get_logger(name: str) -> logging.Logger:
             encoding='utf-8'
         )
         file_handler.setLevel(logging.DEBUG)
-        file_handler.setFormatter(logging.Formatter(LOG_FORMAT, DATE_FORMAT))
-        logger.addHandler(file_handler)
+        file_handler.setFormatter(JsonFormatter() if LOG_JSON else logging.Formatter(LOG_FORMAT, DATE_FORMAT))
+        handlers.append(file_handler)
     except Exception as e:
         # If file handler fails, continue with console only
         print(f"Warning: Could not create log file handler: {e}")
-    
+
     # Console Handler (only warnings and above to avoid clutter)
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.WARNING)
     console_handler.setFormatter(logging.Formatter(LOG_FORMAT, DATE_FORMAT))
-    logger.addHandler(console_handler)
+    handlers.append(console_handler)
+    return handlers
+
+
+def _ensure_listener():
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            _listener = QueueListener(_queue, *_build_handlers(), respect_handler_level=True)
+            _listener.start()
+            atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flushes pending records and stops the writer thread (registered with atexit)."""
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def set_sampling(name: str, every: int):
+    """Samples logger `name` at 1/`every` from now on (1 disables sampling)."""
+    LOG_SAMPLING[name] = every
+    logger = logging.getLogger(name)
+    for f in [f for f in logger.filters if isinstance(f, SamplingFilter)]:
+        logger.removeFilter(f)
+    if every > 1:
+        logger.addFilter(SamplingFilter(every))
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Returns a configured logger for the given module name.
+    
+    Usage:
+        from utils.logging_config import get_logger
+        logger = get_logger(__name__)
+        logger.info("Something happened")
+        logger.error("An error occurred", exc_info=True)
+    """
+    logger = logging.getLogger(name)
+    
+    # Avoid adding handlers multiple times
+    if logger.handlers:
+        return logger
+    
+    _ensure_listener()
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(_queue_handler)
+    if LOG_SAMPLING.get(name, 1) > 1:
+        logger.addFilter(SamplingFilter(LOG_SAMPLING[name]))
     
     return logger
 
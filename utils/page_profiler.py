@@ -0,0 +1,361 @@
+"""
+Opt-in page profiler for the Streamlit page scripts.
+
+    profiler = page_profiler.start("Vendas")
+    ...                                  # auth, sidebar
+    profiler.checkpoint("setup")
+    with profiler.section("query"):
+        df = ...
+    profiler.finish()
+
+Each section (a `with` block, or the time since the previous checkpoint)
+records its wall time, the SQL time spent in it (from utils.query_stats;
+zero unless config.QUERY_PROFILING is on),
+the widgets and elements created and the time spent inside those Streamlit
+calls (serialization). A 'total' row carries the number of st.rerun() calls
+chained from the same interaction and how the run ended. Rows go to the
+page_metrics table and are shown on the hidden 98_Perfil_Paginas page.
+
+Profiling is off unless config.PAGE_PROFILING is set or the session turned
+it on (st.session_state['page_profiling']); when off, start() returns a
+profiler whose methods do nothing.
+"""
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import pandas as pd
+import streamlit as st
+import config
+import database
+from utils import query_stats
+from utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+SESSION_FLAG = 'page_profiling'
+_PENDING_KEY = '_page_profiler_pending'
+_RERUN_KEY = '_page_profiler_rerun'
+KEEP_DAYS = 30
+
+# Streamlit calls counted as widgets (user input) and as plain elements
+WIDGETS = (
+    'button', 'download_button', 'form_submit_button', 'link_button', 'page_link',
+    'checkbox', 'toggle', 'radio', 'selectbox', 'multiselect', 'slider', 'select_slider',
+    'text_input', 'text_area', 'number_input', 'date_input', 'time_input',
+    'file_uploader', 'camera_input', 'color_picker', 'data_editor',
+)
+ELEMENTS = (
+    'write', 'markdown', 'caption', 'text', 'title', 'header', 'subheader', 'divider',
+    'dataframe', 'table', 'metric', 'json', 'image', 'plotly_chart', 'line_chart',
+    'bar_chart', 'area_chart', 'info', 'success', 'warning', 'error', 'progress',
+    'columns', 'tabs', 'expander', 'container', 'form', 'popover',
+)
+
+_local = threading.local()
+_install_lock = threading.Lock()
+_installed = False
+
+
+# --- 1. STREAMLIT HOOKS ---
+def _counting(func, kind):
+    """Wraps a Streamlit call so the active profiler of this thread counts it (outermost call only)."""
+    def wrapper(*args, **kwargs):
+        profiler = getattr(_local, 'profiler', None)
+        if profiler is None or getattr(_local, 'depth', 0):
+            return func(*args, **kwargs)
+        _local.depth = 1
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.depth = 0
+            profiler.last_s = time.perf_counter()
+            profiler.render_s += profiler.last_s - started
+            if kind == 'widget':
+                profiler.widgets += 1
+            else:
+                profiler.elements += 1
+    wrapper.__wrapped__ = func
+    wrapper.__name__ = getattr(func, '__name__', kind)
+    wrapper.__doc__ = getattr(func, '__doc__', None)
+    return wrapper
+
+
+def _install_hooks():
+    """Patches the st.* functions, DeltaGenerator methods (columns, tabs, sidebar), st.rerun and st.stop once per process."""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        try:
+            from streamlit.delta_generator import DeltaGenerator
+        except ImportError:
+            DeltaGenerator = None
+
+        for names, kind in ((WIDGETS, 'widget'), (ELEMENTS, 'element')):
+            for name in names:
+                if callable(getattr(st, name, None)):
+                    setattr(st, name, _counting(getattr(st, name), kind))
+                if DeltaGenerator is not None and callable(getattr(DeltaGenerator, name, None)):
+                    setattr(DeltaGenerator, name, _counting(getattr(DeltaGenerator, name), kind))
+
+        st.rerun = _ending(st.rerun, rerun=True)
+        st.stop = _ending(st.stop, rerun=False)
+        _installed = True
+
+
+def _ending(func, rerun):
+    """Wraps st.rerun / st.stop: notes when the run ended (they raise, so finish() is never reached)."""
+    def wrapper(*args, **kwargs):
+        profiler = getattr(_local, 'profiler', None)
+        if profiler is not None:
+            profiler.end_s = time.perf_counter()
+            if rerun:
+                st.session_state[_RERUN_KEY] = True
+        return func(*args, **kwargs)
+    wrapper.__wrapped__ = func
+    wrapper.__name__ = getattr(func, '__name__', 'wrapper')
+    wrapper.__doc__ = getattr(func, '__doc__', None)
+    return wrapper
+
+
+# --- 2. PROFILER ---
+class _NullProfiler:
+    """Returned by start() when profiling is off."""
+    enabled = False
+
+    @contextmanager
+    def section(self, name):
+        yield
+
+    def checkpoint(self, name):
+        pass
+
+    def finish(self, status='ok'):
+        pass
+
+
+class PageProfiler:
+    enabled = True
+
+    def __init__(self, page, sql_totals, reruns=0):
+        self.page = page
+        self._sql = sql_totals
+        self.run_id = uuid.uuid4().hex[:12]
+        self.reruns = reruns
+        self.started_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.widgets = 0
+        self.elements = 0
+        self.render_s = 0.0
+        self.sections = []
+        self._t0 = self.last_s = time.perf_counter()
+        self.end_s = None
+        self._mark = self._snapshot()
+        self._finished = False
+
+    def _snapshot(self):
+        sql_s, queries = self._sql
+        self.last_s = time.perf_counter()
+        return (self.last_s, sql_s, queries, self.widgets, self.elements, self.render_s)
+
+    def _close_section(self, name, start):
+        end = self._snapshot()
+        self.sections.append((name, *[b - a for a, b in zip(start, end)]))
+        return end
+
+    @contextmanager
+    def section(self, name):
+        """Times the enclosed block as section `name`."""
+        start = self._snapshot()
+        try:
+            yield
+        finally:
+            self._mark = self._close_section(name, start)
+
+    def checkpoint(self, name):
+        """Records the time since the previous checkpoint (or section) as section `name`."""
+        self._mark = self._close_section(name, self._mark)
+
+    def _rows(self, status):
+        sql_s, queries = self._sql
+        # Interrupted runs are stored on the next run: end them at st.rerun/st.stop or the last activity
+        end_s = time.perf_counter() if status == 'ok' else (self.end_s or self.last_s)
+        total = ('total', end_s - self._t0, sql_s, queries,
+                 self.widgets, self.elements, self.render_s)
+        rows = []
+        for name, duration_s, sql_s, queries, widgets, elements, render_s in [*self.sections, total]:
+            rows.append((
+                self.started_at, self.run_id, self.page, name,
+                round(duration_s * 1000, 2), round(sql_s * 1000, 2), queries,
+                widgets, elements, round(render_s * 1000, 2),
+                self.reruns if name == 'total' else None,
+                status if name == 'total' else None,
+            ))
+        return rows
+
+    def finish(self, status='ok'):
+        """Ends the run and stores its sections. Safe to call more than once."""
+        if self._finished:
+            return
+        self._finished = True
+        rows = self._rows(status)
+        _deactivate(self)
+        try:
+            with database.db_session() as conn:
+                save_rows(conn, rows)
+        except Exception as e:
+            logger.error(f"Erro ao salvar métricas da página {self.page}: {e}")
+
+
+def _deactivate(profiler):
+    if getattr(_local, 'profiler', None) is profiler:
+        _local.profiler = None
+        query_stats.end_run()
+    try:
+        if st.session_state.get(_PENDING_KEY) is profiler:
+            del st.session_state[_PENDING_KEY]
+    except Exception:
+        pass
+
+
+def is_enabled():
+    if config.PAGE_PROFILING:
+        return True
+    try:
+        return st.session_state.get(SESSION_FLAG, False) is True
+    except Exception:
+        return False
+
+
+def start(page):
+    """
+    Starts profiling this run of `page`. A previous run of the session that
+    never reached finish() (st.rerun, st.stop or an exception) is stored first.
+    """
+    _local.profiler = None
+    query_stats.end_run()
+    try:
+        pending = st.session_state.pop(_PENDING_KEY, None)
+        rerun_requested = st.session_state.pop(_RERUN_KEY, False)
+    except Exception:
+        pending, rerun_requested = None, False
+
+    if pending is not None:
+        pending.finish(status='rerun' if rerun_requested else 'interrompida')
+
+    if not is_enabled():
+        return _NullProfiler()
+
+    _install_hooks()
+    reruns = pending.reruns + 1 if (pending is not None and rerun_requested) else 0
+    profiler = PageProfiler(page, query_stats.begin_run(), reruns)
+    _local.profiler = profiler
+    _local.depth = 0
+    st.session_state[_PENDING_KEY] = profiler
+    return profiler
+
+
+# --- 3. STORAGE & REPORTS ---
+def save_rows(conn, rows):
+    try:
+        conn.executemany("""
+            INSERT INTO page_metrics (recorded_at, run_id, page, section, duration_ms, sql_ms, queries,
+                                      widgets, elements, render_ms, reruns, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _since(days):
+    return (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _p95(values):
+    return values.quantile(0.95)
+
+
+def get_page_summary(conn, days=7):
+    """Per page: runs, p50/p95/max total ms, avg SQL and render ms, avg widgets and st.rerun chains."""
+    df = pd.read_sql("""
+        SELECT page, duration_ms, sql_ms, render_ms, widgets, elements, reruns, status
+        FROM page_metrics WHERE section = 'total' AND recorded_at >= ?
+    """, conn, params=(_since(days),))
+    if df.empty:
+        return df
+    summary = df.groupby('page').agg(
+        execucoes=('duration_ms', 'size'),
+        p50_ms=('duration_ms', 'median'),
+        p95_ms=('duration_ms', _p95),
+        max_ms=('duration_ms', 'max'),
+        sql_ms=('sql_ms', 'mean'),
+        render_ms=('render_ms', 'mean'),
+        widgets=('widgets', 'mean'),
+        elementos=('elements', 'mean'),
+        reruns_max=('reruns', 'max'),
+    ).reset_index()
+    return summary.sort_values('p95_ms', ascending=False).round(1)
+
+
+def get_section_summary(conn, days=7, page=None):
+    """Per page and section: runs and p50/p95 of wall, SQL and render time, slowest p95 first."""
+    query = """
+        SELECT page, section, duration_ms, sql_ms, queries, render_ms, widgets
+        FROM page_metrics WHERE section != 'total' AND recorded_at >= ?
+    """
+    params = [_since(days)]
+    if page:
+        query += " AND page = ?"
+        params.append(page)
+    df = pd.read_sql(query, conn, params=params)
+    if df.empty:
+        return df
+    summary = df.groupby(['page', 'section']).agg(
+        execucoes=('duration_ms', 'size'),
+        p50_ms=('duration_ms', 'median'),
+        p95_ms=('duration_ms', _p95),
+        sql_p95_ms=('sql_ms', _p95),
+        consultas=('queries', 'mean'),
+        render_p95_ms=('render_ms', _p95),
+        widgets=('widgets', 'mean'),
+    ).reset_index()
+    return summary.sort_values('p95_ms', ascending=False).round(1)
+
+
+def get_daily_trend(conn, days=30):
+    """p95 of the page total per day, one column per page (for st.line_chart)."""
+    df = pd.read_sql("""
+        SELECT substr(recorded_at, 1, 10) AS dia, page, duration_ms
+        FROM page_metrics WHERE section = 'total' AND recorded_at >= ?
+    """, conn, params=(_since(days),))
+    if df.empty:
+        return df
+    trend = df.groupby(['dia', 'page'])['duration_ms'].quantile(0.95).unstack('page')
+    return trend.round(1)
+
+
+def prune_metrics(conn, keep_days=KEEP_DAYS):
+    """Deletes metrics older than keep_days. Returns the number of rows removed."""
+    try:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM page_metrics WHERE recorded_at < ?", (_since(keep_days),))
+        conn.commit()
+        return cursor.rowcount
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erro ao limpar métricas de páginas: {e}")
+        raise
+
+
+def clear_metrics(conn):
+    try:
+        conn.execute("DELETE FROM page_metrics")
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erro ao apagar métricas de páginas: {e}")
+        raise
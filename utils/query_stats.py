@@ -0,0 +1,152 @@
+"""
+Per-process SQL statistics fed by database.InstrumentedConnection.
+
+Every statement is reduced to a shape (literals replaced by '?', IN lists
+collapsed) and its duration, measured from execute() to the last fetch, is
+kept in a bounded window per shape for p50/p95. Statements slower than
+config.SLOW_QUERY_MS also go to the slow-query log (a ring buffer shown on
+the admin page and a WARNING line in the log file) with the module and
+function that issued them. begin_run() additionally sums SQL time and
+statement count for the current thread (used by utils.page_profiler).
+"""
+import re
+import sys
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+import config
+from utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+SLOW_QUERY_MS = getattr(config, 'SLOW_QUERY_MS', 200)
+WINDOW_SIZE = 500        # durations kept per shape
+SLOW_LOG_SIZE = 200      # recent slow queries kept in memory
+MAX_SHAPES = 2000
+
+# Frames from these modules are skipped when looking for the caller
+_INTERNAL_PREFIXES = ('database', 'utils.query_stats', 'pandas', 'sqlite3', 'contextlib', 'sqlalchemy')
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+_lock = threading.Lock()
+_shapes = {}
+_slow_log = deque(maxlen=SLOW_LOG_SIZE)
+_run = threading.local()
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql: str) -> str:
+    """Query shape: whitespace collapsed, literals as '?', IN (...) lists as (?+)."""
+    shape = _STRING_RE.sub('?', sql)
+    shape = _NUMBER_RE.sub('?', shape)
+    shape = _IN_LIST_RE.sub('(?+)', shape)
+    return _SPACE_RE.sub(' ', shape).strip()
+
+
+def _caller():
+    """'module:function' of the first frame outside the database/pandas layers."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if not module.startswith(_INTERNAL_PREFIXES):
+            if module == '__main__':
+                module = frame.f_code.co_filename.rsplit('/', 1)[-1]
+            return f"{module}:{frame.f_code.co_name}"
+        frame = frame.f_back
+    return '?'
+
+
+class _Shape:
+    __slots__ = ('sql', 'durations', 'count', 'total_ms', 'max_ms', 'rows', 'callers')
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.durations = deque(maxlen=WINDOW_SIZE)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.callers = {}
+
+
+def record(sql: str, duration_s: float, rows: int):
+    """Adds one execution of `sql` (called by the instrumented cursor)."""
+    duration_ms = duration_s * 1000
+    totals = getattr(_run, 'totals', None)
+    if totals is not None:
+        totals[0] += duration_s
+        totals[1] += 1
+    shape_key = fingerprint(sql)
+    caller = _caller()
+    with _lock:
+        shape = _shapes.get(shape_key)
+        if shape is None:
+            if len(_shapes) >= MAX_SHAPES:
+                return
+            shape = _shapes[shape_key] = _Shape(shape_key)
+        shape.durations.append(duration_ms)
+        shape.count += 1
+        shape.total_ms += duration_ms
+        shape.max_ms = max(shape.max_ms, duration_ms)
+        shape.rows += max(rows, 0)
+        shape.callers[caller] = shape.callers.get(caller, 0) + 1
+        if duration_ms >= SLOW_QUERY_MS:
+            _slow_log.append({
+                'at': time.strftime('%Y-%m-%d %H:%M:%S'), 'ms': round(duration_ms, 1),
+                'rows': rows, 'caller': caller, 'sql': shape_key
+            })
+    if duration_ms >= SLOW_QUERY_MS:
+        logger.warning(f"Slow query {duration_ms:.0f}ms, {rows} rows, {caller}: {shape_key[:300]}")
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def get_shape_stats():
+    """One dict per query shape (count, p50/p95/max ms, avg rows, top callers), slowest p95 first."""
+    with _lock:
+        snapshot = [(s.sql, sorted(s.durations), s.count, s.total_ms, s.max_ms, s.rows, dict(s.callers))
+                    for s in _shapes.values()]
+    stats = []
+    for sql, durations, count, total_ms, max_ms, rows, callers in snapshot:
+        top_callers = sorted(callers.items(), key=lambda kv: kv[1], reverse=True)[:3]
+        stats.append({
+            'sql': sql, 'count': count,
+            'p50_ms': round(_percentile(durations, 50), 2), 'p95_ms': round(_percentile(durations, 95), 2),
+            'max_ms': round(max_ms, 2), 'total_ms': round(total_ms, 1),
+            'avg_rows': round(rows / count, 1) if count else 0,
+            'callers': ', '.join(f"{name} ({n})" for name, n in top_callers)
+        })
+    stats.sort(key=lambda s: s['p95_ms'], reverse=True)
+    return stats
+
+
+def get_slow_queries():
+    """Recent slow queries, newest first."""
+    with _lock:
+        return list(reversed(_slow_log))
+
+
+def begin_run():
+    """Starts summing SQL time for this thread. Returns the [seconds, statements] accumulator."""
+    _run.totals = [0.0, 0]
+    return _run.totals
+
+
+def end_run():
+    _run.totals = None
+
+
+def reset():
+    with _lock:
+        _shapes.clear()
+        _slow_log.clear()